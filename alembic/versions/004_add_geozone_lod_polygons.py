@@ -0,0 +1,53 @@
+"""Add geozone level-of-detail polygons
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-02-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+# Должны совпадать с LOD_TOLERANCES_DEGREES в app/services/geozone.py
+LOD_TOLERANCES = [
+    ('polygon_fine', 0.0001),
+    ('polygon_medium', 0.0005),
+    ('polygon_coarse', 0.002),
+]
+
+
+def upgrade() -> None:
+    for column, _ in LOD_TOLERANCES:
+        op.add_column(
+            'geozones',
+            sa.Column(column, Geometry(geometry_type='POLYGON', srid=4326, spatial_index=False), nullable=True),
+        )
+    op.create_index('idx_geozone_polygon_coarse', 'geozones', ['polygon_coarse'], unique=False, postgresql_using='gist')
+
+    # Заполняем упрощённые варианты для существующих геозон.
+    # Уровень сохраняется, только если упрощение уменьшает число вершин.
+    for column, tolerance in LOD_TOLERANCES:
+        op.execute(f"""
+            UPDATE geozones
+            SET {column} = simplified.geom
+            FROM (
+                SELECT id, ST_SimplifyPreserveTopology(polygon, {tolerance}) AS geom
+                FROM geozones
+            ) AS simplified
+            WHERE geozones.id = simplified.id
+                AND GeometryType(simplified.geom) = 'POLYGON'
+                AND ST_NPoints(simplified.geom) < ST_NPoints(geozones.polygon)
+        """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_geozone_polygon_coarse', table_name='geozones')
+    for column, _ in reversed(LOD_TOLERANCES):
+        op.drop_column('geozones', column)
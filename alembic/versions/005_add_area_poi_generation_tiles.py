@@ -0,0 +1,51 @@
+"""Add area POI generation tile checkpoints
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-02-05 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'area_poi_generation_tiles',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('run_key', sa.String(length=64), nullable=False),
+        sa.Column('tile_x', sa.Integer(), nullable=False),
+        sa.Column('tile_y', sa.Integer(), nullable=False),
+        sa.Column('min_lon', sa.Float(), nullable=False),
+        sa.Column('min_lat', sa.Float(), nullable=False),
+        sa.Column('max_lon', sa.Float(), nullable=False),
+        sa.Column('max_lat', sa.Float(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'),
+        sa.Column('features_processed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('geozones_created', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('company_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('run_key', 'tile_x', 'tile_y', name='uq_area_poi_generation_tiles_run_tile')
+    )
+    op.create_index(op.f('ix_area_poi_generation_tiles_id'), 'area_poi_generation_tiles', ['id'], unique=False)
+    op.create_index(op.f('ix_area_poi_generation_tiles_run_key'), 'area_poi_generation_tiles', ['run_key'], unique=False)
+    op.create_index(op.f('ix_area_poi_generation_tiles_status'), 'area_poi_generation_tiles', ['status'], unique=False)
+    op.create_index(op.f('ix_area_poi_generation_tiles_company_id'), 'area_poi_generation_tiles', ['company_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_area_poi_generation_tiles_company_id'), table_name='area_poi_generation_tiles')
+    op.drop_index(op.f('ix_area_poi_generation_tiles_status'), table_name='area_poi_generation_tiles')
+    op.drop_index(op.f('ix_area_poi_generation_tiles_run_key'), table_name='area_poi_generation_tiles')
+    op.drop_index(op.f('ix_area_poi_generation_tiles_id'), table_name='area_poi_generation_tiles')
+    op.drop_table('area_poi_generation_tiles')
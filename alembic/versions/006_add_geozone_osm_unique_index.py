@@ -0,0 +1,47 @@
+"""Add unique OSM geozone index for bulk upsert
+
+Revision ID: 006
+Revises: 005
+Create Date: 2024-02-08 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Мягко удаляем дубликаты, оставляя самую раннюю геозону для каждого объекта OSM
+    op.execute("""
+        UPDATE geozones
+        SET deleted_at = now()
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT
+                    id,
+                    row_number() OVER (
+                        PARTITION BY osm_id, area_type, COALESCE(company_id, 0)
+                        ORDER BY id
+                    ) AS rn
+                FROM geozones
+                WHERE osm_id IS NOT NULL AND deleted_at IS NULL
+            ) AS ranked
+            WHERE ranked.rn > 1
+        )
+    """)
+    op.create_index(
+        'uq_geozones_osm_area_company',
+        'geozones',
+        ['osm_id', 'area_type', sa.text('COALESCE(company_id, 0)')],
+        unique=True,
+        postgresql_where=sa.text('osm_id IS NOT NULL AND deleted_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_geozones_osm_area_company', table_name='geozones')
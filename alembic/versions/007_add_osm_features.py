@@ -0,0 +1,50 @@
+"""Add osm_features table for local OSM import
+
+Revision ID: 007
+Revises: 006
+Create Date: 2024-02-12 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'osm_features',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('osm_id', sa.BigInteger(), nullable=False),
+        sa.Column('osm_type', sa.String(length=1), nullable=False),
+        sa.Column('name', sa.Text(), nullable=True),
+        sa.Column('tags', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('geometry', Geometry(geometry_type='MULTIPOLYGON', srid=4326, spatial_index=False), nullable=False),
+        sa.Column('area_m2', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('osm_type', 'osm_id', name='uq_osm_features_type_id')
+    )
+    op.create_index('idx_osm_features_geometry', 'osm_features', ['geometry'], unique=False, postgresql_using='gist')
+    op.create_index(
+        'ix_osm_features_tags',
+        'osm_features',
+        ['tags'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'tags': 'jsonb_path_ops'},
+    )
+    op.create_index(op.f('ix_osm_features_area_m2'), 'osm_features', ['area_m2'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_osm_features_area_m2'), table_name='osm_features')
+    op.drop_index('ix_osm_features_tags', table_name='osm_features')
+    op.drop_index('idx_osm_features_geometry', table_name='osm_features')
+    op.drop_table('osm_features')
@@ -0,0 +1,25 @@
+"""Recompute geozone areas geodesically
+
+Revision ID: 008
+Revises: 007
+Create Date: 2024-02-15 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Ранее площадь считалась в EPSG:3857 и была завышена вдали от экватора
+    # (или не заполнялась вовсе для геозон, созданных вручную)
+    op.execute("UPDATE geozones SET area_square_meters = ST_Area(polygon::geography)")
+
+
+def downgrade() -> None:
+    # Прежние значения не восстанавливаются: геодезическая площадь корректна для любой версии
+    pass
@@ -0,0 +1,59 @@
+"""Add home/work analysis watermarks and unique user location type
+
+Revision ID: 009
+Revises: 008
+Create Date: 2024-02-20 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Оставляем по одной записи на пользователя и тип (самую уверенную, затем самую свежую)
+    op.execute("""
+        DELETE FROM user_home_work
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT
+                    id,
+                    row_number() OVER (
+                        PARTITION BY user_id, location_type
+                        ORDER BY is_confirmed DESC, confidence_score DESC, last_updated_at DESC, id DESC
+                    ) AS rn
+                FROM user_home_work
+            ) AS ranked
+            WHERE ranked.rn > 1
+        )
+    """)
+    op.create_unique_constraint('uq_user_home_work_user_type', 'user_home_work', ['user_id', 'location_type'])
+
+    op.create_table(
+        'home_work_analysis_states',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('last_point_at', sa.DateTime(), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('points_processed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('company_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id'),
+    )
+    op.create_index(op.f('ix_home_work_analysis_states_id'), 'home_work_analysis_states', ['id'], unique=False)
+    op.create_index(op.f('ix_home_work_analysis_states_company_id'), 'home_work_analysis_states', ['company_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_home_work_analysis_states_company_id'), table_name='home_work_analysis_states')
+    op.drop_index(op.f('ix_home_work_analysis_states_id'), table_name='home_work_analysis_states')
+    op.drop_table('home_work_analysis_states')
+    op.drop_constraint('uq_user_home_work_user_type', 'user_home_work', type_='unique')
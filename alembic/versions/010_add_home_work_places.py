@@ -0,0 +1,52 @@
+"""Add incremental home/work place statistics
+
+Revision ID: 010
+Revises: 009
+Create Date: 2024-02-22 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('home_work_analysis_states', sa.Column('resume_from', sa.DateTime(), nullable=True))
+
+    op.create_table(
+        'home_work_places',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('latitude_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('longitude_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('stay_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_dwell_minutes', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('hour_of_week_minutes', sa.JSON(), nullable=False),
+        sa.Column('first_seen_at', sa.DateTime(), nullable=False),
+        sa.Column('last_seen_at', sa.DateTime(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_home_work_places_id'), 'home_work_places', ['id'], unique=False)
+    op.create_index(op.f('ix_home_work_places_user_id'), 'home_work_places', ['user_id'], unique=False)
+    op.create_index(op.f('ix_home_work_places_company_id'), 'home_work_places', ['company_id'], unique=False)
+
+    # Статистики мест накапливаются с нуля: сбрасываем водяные знаки,
+    # чтобы следующий запуск обработал окно анализа целиком
+    op.execute("UPDATE home_work_analysis_states SET last_point_at = NULL")
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_home_work_places_company_id'), table_name='home_work_places')
+    op.drop_index(op.f('ix_home_work_places_user_id'), table_name='home_work_places')
+    op.drop_index(op.f('ix_home_work_places_id'), table_name='home_work_places')
+    op.drop_table('home_work_places')
+    op.drop_column('home_work_analysis_states', 'resume_from')
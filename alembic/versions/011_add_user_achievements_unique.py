@@ -0,0 +1,42 @@
+"""Add unique user achievement constraint
+
+Revision ID: 011
+Revises: 010
+Create Date: 2024-02-26 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Оставляем самую раннюю разблокировку каждого достижения пользователя
+    op.execute("""
+        DELETE FROM user_achievements
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT
+                    id,
+                    row_number() OVER (
+                        PARTITION BY user_id, achievement_id
+                        ORDER BY unlocked_at, id
+                    ) AS rn
+                FROM user_achievements
+            ) AS ranked
+            WHERE ranked.rn > 1
+        )
+    """)
+    op.create_unique_constraint(
+        'uq_user_achievements_user_achievement',
+        'user_achievements',
+        ['user_id', 'achievement_id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_user_achievements_user_achievement', 'user_achievements', type_='unique')
@@ -0,0 +1,62 @@
+"""Add keyset pagination indexes
+
+Revision ID: 012
+Revises: 011
+Create Date: 2024-02-27 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+# (имя индекса, таблица, колонки, условие частичного индекса)
+KEYSET_INDEXES = [
+    ('ix_location_points_user_timestamp_id', 'location_points', ['user_id', 'timestamp', 'id'], None),
+    ('ix_geozone_visits_user_started_id', 'geozone_visits', ['user_id', 'visit_started_at', 'id'], None),
+    ('ix_area_discoveries_user_updated_id', 'area_discoveries', ['user_id', 'last_updated_at', 'id'], None),
+    ('ix_user_artifacts_user_obtained_id', 'user_artifacts', ['user_id', 'obtained_at', 'id'], None),
+    ('ix_user_cosmetics_user_obtained_id', 'user_cosmetics', ['user_id', 'obtained_at', 'id'], None),
+    ('ix_user_achievements_user_unlocked_id', 'user_achievements', ['user_id', 'unlocked_at', 'id'], None),
+    ('ix_user_quests_user_created_id', 'user_quests', ['user_id', 'created_at', 'id'], None),
+    ('ix_memories_user_created_id', 'memories', ['user_id', 'created_at', 'id'], 'deleted_at IS NULL'),
+    ('ix_quests_company_created_id', 'quests', ['company_id', 'created_at', 'id'], 'deleted_at IS NULL'),
+    ('ix_events_company_start_id', 'events', ['company_id', 'start_date', 'id'], 'deleted_at IS NULL'),
+    ('ix_marketplace_listings_status_created_id', 'marketplace_listings', ['status', 'created_at', 'id'], None),
+]
+
+
+def upgrade() -> None:
+    # Копия user_id сессии в точках: история пользователя выбирается по
+    # индексу (user_id, timestamp, id) без соединения с location_sessions
+    op.add_column('location_points', sa.Column('user_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_location_points_user_id', 'location_points', 'users', ['user_id'], ['id']
+    )
+    op.execute("""
+        UPDATE location_points AS lp
+        SET user_id = ls.user_id
+        FROM location_sessions AS ls
+        WHERE ls.id = lp.session_id
+          AND lp.user_id IS NULL
+    """)
+
+    for name, table, columns, where in KEYSET_INDEXES:
+        op.create_index(
+            name,
+            table,
+            columns,
+            unique=False,
+            postgresql_where=sa.text(where) if where else None,
+        )
+
+
+def downgrade() -> None:
+    for name, table, _, _ in reversed(KEYSET_INDEXES):
+        op.drop_index(name, table_name=table)
+    op.drop_constraint('fk_location_points_user_id', 'location_points', type_='foreignkey')
+    op.drop_column('location_points', 'user_id')
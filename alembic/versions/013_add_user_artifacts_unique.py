@@ -0,0 +1,63 @@
+"""Add unique user artifact index
+
+Revision ID: 013
+Revises: 012
+Create Date: 2024-02-28 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Дубликаты сливаются в самую раннюю строку: количество суммируется,
+    # избранное сохраняется, остальные строки удаляются
+    op.execute("""
+        WITH grouped AS (
+            SELECT
+                id,
+                row_number() OVER w AS rn,
+                sum(quantity) OVER (PARTITION BY user_id, artifact_id, COALESCE(company_id, 0)) AS total_quantity,
+                bool_or(is_favorite) OVER (PARTITION BY user_id, artifact_id, COALESCE(company_id, 0)) AS any_favorite
+            FROM user_artifacts
+            WINDOW w AS (PARTITION BY user_id, artifact_id, COALESCE(company_id, 0) ORDER BY obtained_at, id)
+        )
+        UPDATE user_artifacts AS ua
+        SET quantity = grouped.total_quantity,
+            is_favorite = grouped.any_favorite
+        FROM grouped
+        WHERE ua.id = grouped.id
+          AND grouped.rn = 1
+          AND (ua.quantity <> grouped.total_quantity OR ua.is_favorite <> grouped.any_favorite)
+    """)
+    op.execute("""
+        DELETE FROM user_artifacts
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT
+                    id,
+                    row_number() OVER (
+                        PARTITION BY user_id, artifact_id, COALESCE(company_id, 0)
+                        ORDER BY obtained_at, id
+                    ) AS rn
+                FROM user_artifacts
+            ) AS ranked
+            WHERE ranked.rn > 1
+        )
+    """)
+    op.create_index(
+        'uq_user_artifacts_user_artifact_company',
+        'user_artifacts',
+        ['user_id', 'artifact_id', sa.text('COALESCE(company_id, 0)')],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_user_artifacts_user_artifact_company', table_name='user_artifacts')
@@ -0,0 +1,85 @@
+"""Add listing search projection
+
+Revision ID: 014
+Revises: 013
+Create Date: 2024-02-29 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+# (имя индекса, колонки) частичных индексов активных объявлений
+ACTIVE_INDEXES = [
+    ('ix_listing_search_active_created', ['company_id', 'created_at', 'id']),
+    ('ix_listing_search_active_type_rarity_price', ['company_id', 'listing_type', 'rarity', 'price', 'id']),
+    ('ix_listing_search_active_item_price', ['company_id', 'listing_type', 'item_id', 'price']),
+]
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    op.create_table(
+        'listing_search',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('seller_id', sa.Integer(), nullable=False),
+        sa.Column('listing_type', postgresql.ENUM('ARTIFACT', 'COSMETIC', name='listingtype', create_type=False), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('item_name', sa.String(length=255), nullable=False),
+        sa.Column('rarity', sa.String(length=50), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Integer(), nullable=False),
+        sa.Column('status', postgresql.ENUM('ACTIVE', 'SOLD', 'CANCELLED', 'EXPIRED', name='listingstatus', create_type=False), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('company_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['id'], ['marketplace_listings.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Заполнить проекцию существующими объявлениями
+    op.execute("""
+        INSERT INTO listing_search (
+            id, seller_id, listing_type, item_id, item_name, rarity,
+            quantity, price, status, expires_at, company_id, created_at
+        )
+        SELECT
+            ml.id, ml.seller_id, ml.listing_type, ml.item_id,
+            COALESCE(a.name, c.name, ''), COALESCE(a.rarity, c.rarity, ''),
+            ml.quantity, ml.price, ml.status, ml.expires_at, ml.company_id, ml.created_at
+        FROM marketplace_listings AS ml
+        LEFT JOIN artifacts AS a ON ml.listing_type = 'ARTIFACT' AND a.id = ml.item_id
+        LEFT JOIN cosmetics AS c ON ml.listing_type = 'COSMETIC' AND c.id = ml.item_id
+    """)
+
+    for name, columns in ACTIVE_INDEXES:
+        op.create_index(
+            name,
+            'listing_search',
+            columns,
+            unique=False,
+            postgresql_where=sa.text("status = 'ACTIVE'"),
+        )
+    op.create_index(
+        'ix_listing_search_active_item_name_trgm',
+        'listing_search',
+        ['item_name'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'item_name': 'gin_trgm_ops'},
+        postgresql_where=sa.text("status = 'ACTIVE'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_listing_search_active_item_name_trgm', table_name='listing_search')
+    for name, _ in reversed(ACTIVE_INDEXES):
+        op.drop_index(name, table_name='listing_search')
+    op.drop_table('listing_search')
@@ -0,0 +1,53 @@
+"""Add partial indexes for active listings
+
+Revision ID: 015
+Revises: 014
+Create Date: 2024-03-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+# (имя индекса, колонки, условие частичного индекса)
+ACTIVE_LISTING_INDEXES = [
+    ('ix_marketplace_listings_active_created_id', ['created_at', 'id'], "status = 'ACTIVE'"),
+    ('ix_marketplace_listings_active_company_created_id', ['company_id', 'created_at', 'id'], "status = 'ACTIVE'"),
+    ('ix_marketplace_listings_active_expires_at', ['expires_at'], "status = 'ACTIVE' AND expires_at IS NOT NULL"),
+]
+
+
+def upgrade() -> None:
+    # Уже истекшие объявления снимаются сразу, дальше это делает app.jobs.listing_expiry
+    op.execute("""
+        UPDATE marketplace_listings
+        SET status = 'EXPIRED', updated_at = now()
+        WHERE status = 'ACTIVE' AND expires_at <= now()
+    """)
+    op.execute("""
+        UPDATE listing_search AS ls
+        SET status = ml.status
+        FROM marketplace_listings AS ml
+        WHERE ml.id = ls.id AND ls.status <> ml.status
+    """)
+
+    for name, columns, where in ACTIVE_LISTING_INDEXES:
+        op.create_index(name, 'marketplace_listings', columns, unique=False, postgresql_where=sa.text(where))
+    # Полный индекс по (status, created_at, id) заменён частичными
+    op.drop_index('ix_marketplace_listings_status_created_id', table_name='marketplace_listings')
+
+
+def downgrade() -> None:
+    op.create_index(
+        'ix_marketplace_listings_status_created_id',
+        'marketplace_listings',
+        ['status', 'created_at', 'id'],
+        unique=False,
+    )
+    for name, _, _ in reversed(ACTIVE_LISTING_INDEXES):
+        op.drop_index(name, table_name='marketplace_listings')
@@ -0,0 +1,62 @@
+"""Add market price rollups
+
+Revision ID: 016
+Revises: 015
+Create Date: 2024-03-02 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '016'
+down_revision = '015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'market_price_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('listing_type', postgresql.ENUM('ARTIFACT', 'COSMETIC', name='listingtype', create_type=False), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('period', sa.String(length=10), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('open_price', sa.Float(), nullable=False),
+        sa.Column('high_price', sa.Float(), nullable=False),
+        sa.Column('low_price', sa.Float(), nullable=False),
+        sa.Column('close_price', sa.Float(), nullable=False),
+        sa.Column('volume', sa.Integer(), nullable=False),
+        sa.Column('turnover', sa.Integer(), nullable=False),
+        sa.Column('trade_count', sa.Integer(), nullable=False),
+        sa.Column('first_trade_id', sa.Integer(), nullable=False),
+        sa.Column('last_trade_id', sa.Integer(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_market_price_rollups_id'), 'market_price_rollups', ['id'], unique=False)
+    op.create_index(
+        'uq_market_price_rollups_item_period_bucket',
+        'market_price_rollups',
+        ['listing_type', 'item_id', 'period', sa.text('COALESCE(company_id, 0)'), 'bucket_start'],
+        unique=True,
+    )
+
+    # Водяной знак 0: первый запуск app.jobs.market_rollups свернёт всю историю сделок
+    op.create_table(
+        'rollup_watermarks',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('last_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rollup_watermarks')
+    op.drop_index('uq_market_price_rollups_item_period_bucket', table_name='market_price_rollups')
+    op.drop_index(op.f('ix_market_price_rollups_id'), table_name='market_price_rollups')
+    op.drop_table('market_price_rollups')
@@ -0,0 +1,87 @@
+"""Add currency ledger snapshots
+
+Revision ID: 017
+Revises: 016
+Create Date: 2024-03-03 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '017'
+down_revision = '016'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('user_currency', sa.Column('snapshot_entry_id', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('user_currency', sa.Column('snapshot_at', sa.DateTime(), nullable=True))
+
+    # Журнал до этой ревизии мог расходиться с балансом (списания без записей,
+    # начальные балансы) - разница фиксируется записью opening_balance, чтобы
+    # сумма журнала каждого счёта совпала с балансом
+    for currency_type in ('coins', 'gems'):
+        op.execute(f"""
+            INSERT INTO currency_transactions
+                (user_currency_id, transaction_type, amount, currency_type, description, company_id, created_at)
+            SELECT uc.id, 'opening_balance', uc.{currency_type} - COALESCE(ct.total, 0), '{currency_type}',
+                   'Начальный баланс журнала', uc.company_id, now()
+            FROM user_currency AS uc
+            LEFT JOIN (
+                SELECT user_currency_id, SUM(amount) AS total
+                FROM currency_transactions
+                WHERE currency_type = '{currency_type}'
+                GROUP BY user_currency_id
+            ) AS ct ON ct.user_currency_id = uc.id
+            WHERE uc.{currency_type} <> COALESCE(ct.total, 0)
+        """)
+
+    # Текущие балансы становятся снимком по последней записи счёта
+    op.execute("""
+        UPDATE user_currency AS uc
+        SET snapshot_entry_id = ct.last_entry_id, snapshot_at = now()
+        FROM (
+            SELECT user_currency_id, MAX(id) AS last_entry_id
+            FROM currency_transactions
+            GROUP BY user_currency_id
+        ) AS ct
+        WHERE ct.user_currency_id = uc.id
+    """)
+
+    # Хвост журнала счёта читается диапазоном по (user_currency_id, id)
+    op.create_index(
+        'ix_currency_transactions_user_currency_id_id',
+        'currency_transactions',
+        ['user_currency_id', 'id'],
+        unique=False,
+    )
+    op.drop_index('ix_currency_transactions_user_currency_id', table_name='currency_transactions')
+
+
+def downgrade() -> None:
+    # Балансы приводятся к текущим (снимок + хвост), записи opening_balance остаются
+    op.execute("""
+        UPDATE user_currency AS uc
+        SET coins = uc.coins + ct.coins, gems = uc.gems + ct.gems
+        FROM (
+            SELECT user_currency_id,
+                   COALESCE(SUM(amount) FILTER (WHERE currency_type = 'coins'), 0) AS coins,
+                   COALESCE(SUM(amount) FILTER (WHERE currency_type = 'gems'), 0) AS gems
+            FROM currency_transactions AS t
+            JOIN user_currency AS u ON u.id = t.user_currency_id
+            WHERE t.id > u.snapshot_entry_id
+            GROUP BY user_currency_id
+        ) AS ct
+        WHERE ct.user_currency_id = uc.id
+    """)
+    op.create_index(
+        'ix_currency_transactions_user_currency_id',
+        'currency_transactions',
+        ['user_currency_id'],
+        unique=False,
+    )
+    op.drop_index('ix_currency_transactions_user_currency_id_id', table_name='currency_transactions')
+    op.drop_column('user_currency', 'snapshot_at')
+    op.drop_column('user_currency', 'snapshot_entry_id')
@@ -0,0 +1,34 @@
+"""Add guild scores
+
+Revision ID: 018
+Revises: 017
+Create Date: 2024-03-04 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '018'
+down_revision = '017'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Агрегаты заполняются по истории задачей app.jobs.guild_score_recompute
+    op.add_column('guilds', sa.Column('total_visits', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('guilds', sa.Column('total_discoveries', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('guilds', sa.Column('score', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('guild_members', sa.Column('xp', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('guild_members', sa.Column('visits', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('guild_members', sa.Column('discoveries', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('guild_members', 'discoveries')
+    op.drop_column('guild_members', 'visits')
+    op.drop_column('guild_members', 'xp')
+    op.drop_column('guilds', 'score')
+    op.drop_column('guilds', 'total_discoveries')
+    op.drop_column('guilds', 'total_visits')
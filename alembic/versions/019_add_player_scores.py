@@ -0,0 +1,49 @@
+"""Add player scores
+
+Revision ID: 019
+Revises: 018
+Create Date: 2024-03-05 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '019'
+down_revision = '018'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Очки global, company и geozone заполняются по истории задачей app.jobs.player_score_recompute
+    op.create_table(
+        'player_scores',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('metric', sa.String(length=20), nullable=False),
+        sa.Column('scope', sa.String(length=100), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_player_scores_id'), 'player_scores', ['id'], unique=False)
+    op.create_index(op.f('ix_player_scores_user_id'), 'player_scores', ['user_id'], unique=False)
+    op.create_index(op.f('ix_player_scores_company_id'), 'player_scores', ['company_id'], unique=False)
+    op.create_index(
+        'uq_player_scores_metric_scope_user',
+        'player_scores',
+        ['metric', 'scope', 'user_id'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_player_scores_metric_scope_user', table_name='player_scores')
+    op.drop_index(op.f('ix_player_scores_company_id'), table_name='player_scores')
+    op.drop_index(op.f('ix_player_scores_user_id'), table_name='player_scores')
+    op.drop_index(op.f('ix_player_scores_id'), table_name='player_scores')
+    op.drop_table('player_scores')
@@ -0,0 +1,49 @@
+"""Add guild member count
+
+Revision ID: 020
+Revises: 019
+Create Date: 2024-03-06 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '020'
+down_revision = '019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Гонки вступления могли создать повторные строки участника - остаётся самая ранняя
+    op.execute("""
+        DELETE FROM guild_members AS gm
+        USING guild_members AS earlier
+        WHERE earlier.guild_id = gm.guild_id
+          AND earlier.user_id = gm.user_id
+          AND earlier.id < gm.id
+    """)
+    op.create_index(
+        'uq_guild_members_guild_user',
+        'guild_members',
+        ['guild_id', 'user_id'],
+        unique=True,
+    )
+
+    op.add_column('guilds', sa.Column('member_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE guilds AS g
+        SET member_count = gm.member_count
+        FROM (
+            SELECT guild_id, COUNT(*) AS member_count
+            FROM guild_members
+            GROUP BY guild_id
+        ) AS gm
+        WHERE gm.guild_id = g.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('guilds', 'member_count')
+    op.drop_index('uq_guild_members_guild_user', table_name='guild_members')
@@ -0,0 +1,34 @@
+"""Add player score shard
+
+Revision ID: 021
+Revises: 020
+Create Date: 2024-03-07 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '021'
+down_revision = '020'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 16 - значение player_leaderboard_shards по умолчанию; при другом значении
+    # строки перераспределяет задача app.jobs.player_score_recompute
+    op.add_column('player_scores', sa.Column('shard', sa.Integer(), nullable=True))
+    op.execute("UPDATE player_scores SET shard = user_id % 16")
+    op.alter_column('player_scores', 'shard', nullable=False)
+    op.create_index(
+        'ix_player_scores_metric_scope_shard',
+        'player_scores',
+        ['metric', 'scope', 'shard'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_player_scores_metric_scope_shard', table_name='player_scores')
+    op.drop_column('player_scores', 'shard')
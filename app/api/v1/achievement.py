@@ -1,12 +1,13 @@
 """API endpoints для достижений."""
 import logging
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Response, status
 from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
 from app.core.database import get_db
+from app.core.pagination import set_next_cursor
 from app.models.user import User
 from app.schemas.achievement import AchievementResponse, UserAchievementResponse
 from app.services.achievement import AchievementService
@@ -17,8 +18,10 @@ logger = logging.getLogger(__name__)
 
 @router.get("/my", response_model=List[UserAchievementResponse])
 def get_my_achievements(
+    response: Response,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -36,8 +39,10 @@ def get_my_achievements(
         company_id=current_user.company_id,
         limit=limit,
         offset=offset,
+        cursor=cursor,
     )
     logger.debug(f"Получено {len(achievements)} достижений для пользователя {current_user.id}")
+    set_next_cursor(response, achievements, "unlocked_at", limit)
     return achievements
 
 
@@ -2,12 +2,13 @@
 import logging
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
 from app.core.database import get_db
+from app.core.pagination import set_next_cursor
 from app.models.user import User
 from app.services.artifact import ArtifactService
 from app.schemas.artifact import (
@@ -15,6 +16,7 @@ from app.schemas.artifact import (
     UserArtifactResponse,
     ArtifactCreate,
     ArtifactStatisticsResponse,
+    CraftableRecipeResponse,
 )
 
 router = APIRouter(prefix="/artifact", tags=["artifact"])
@@ -54,10 +56,12 @@ def get_artifacts(
 
 @router.get("/my", response_model=List[UserArtifactResponse])
 def get_my_artifacts(
+    response: Response,
     artifact_id: Optional[int] = None,
     rarity: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -70,7 +74,9 @@ def get_my_artifacts(
         company_id=current_user.company_id,
         limit=limit,
         offset=offset,
+        cursor=cursor,
     )
+    set_next_cursor(response, artifacts, "obtained_at", limit)
     return artifacts
 
 
@@ -88,6 +94,30 @@ def get_artifact_statistics(
     return stats
 
 
+@router.get("/craftable", response_model=List[CraftableRecipeResponse])
+def get_craftable(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Получить рецепты артефактов и косметики, доступные для крафта сейчас."""
+    service = ArtifactService(db)
+    craftable = service.get_craftable(
+        user_id=current_user.id,
+        company_id=current_user.company_id,
+    )
+    return [
+        {
+            "result_type": recipe.result_type,
+            "result_id": recipe.result_id,
+            "name": recipe.name,
+            "max_crafts": max_crafts,
+            "artifacts": [{"item_id": item_id, "quantity": quantity} for item_id, quantity in recipe.artifacts],
+            "cosmetics": [{"item_id": item_id, "quantity": quantity} for item_id, quantity in recipe.cosmetics],
+        }
+        for recipe, max_crafts in craftable
+    ]
+
+
 @router.post("/craft/{artifact_id}", response_model=UserArtifactResponse, status_code=status.HTTP_201_CREATED)
 def craft_artifact(
     artifact_id: int,
@@ -2,12 +2,13 @@
 import logging
 from typing import List, Optional, Dict
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
 from app.core.database import get_db
+from app.core.pagination import set_next_cursor
 from app.models.user import User
 from app.services.cosmetic import CosmeticService
 from app.schemas.cosmetic import (
@@ -54,10 +55,12 @@ def get_cosmetics(
 
 @router.get("/my", response_model=List[UserCosmeticResponse])
 def get_my_cosmetics(
+    response: Response,
     cosmetic_type: Optional[str] = None,
     is_equipped: Optional[bool] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -70,7 +73,9 @@ def get_my_cosmetics(
         company_id=current_user.company_id,
         limit=limit,
         offset=offset,
+        cursor=cursor,
     )
+    set_next_cursor(response, cosmetics, "obtained_at", limit)
     return cosmetics
 
 
@@ -120,16 +125,21 @@ def unequip_cosmetic(
 
 @router.get("/avatar", response_model=AvatarConfigResponse)
 def get_avatar_config(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Получить конфигурацию аватара."""
+    """Получить конфигурацию аватара (с ETag; If-None-Match -> 304)."""
     service = CosmeticService(db)
-    config = service.get_avatar_config(
+    avatar = service.get_avatar(
         user_id=current_user.id,
         company_id=current_user.company_id,
     )
-    return {"avatar_config": config or {}}
+    if request.headers.get("if-none-match") == avatar.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": avatar.etag})
+    response.headers["ETag"] = avatar.etag
+    return {"avatar_config": avatar.config}
 
 
 @router.post("/craft/{cosmetic_id}", response_model=UserCosmeticResponse, status_code=status.HTTP_201_CREATED)
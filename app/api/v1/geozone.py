@@ -2,20 +2,22 @@
 import logging
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
 from app.core.database import get_db
+from app.core.pagination import set_next_cursor
 from app.models.user import User
 from app.schemas.geozone import (
     GeozoneCreate,
+    GeozoneGeometryResponse,
     GeozoneResponse,
     GeozoneVisitResponse,
     AreaDiscoveryResponse,
 )
-from app.services.geozone import GeozoneService
+from app.services.geozone import GeozoneLOD, GeozoneService
 from app.services.area_discovery import AreaDiscoveryService
 
 router = APIRouter(prefix="/geozone", tags=["geozone"])
@@ -99,6 +101,31 @@ def get_geozone(
     return geozone
 
 
+@router.get("/{geozone_id}/geometry", response_model=GeozoneGeometryResponse)
+def get_geozone_geometry(
+    geozone_id: int,
+    lod: GeozoneLOD = GeozoneLOD.MEDIUM,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Получить полигон геозоны на заданном уровне детализации (coarse для обзорных карт)."""
+    service = GeozoneService(db)
+    geozone = service.get_geozone_by_id(geozone_id, company_id=current_user.company_id)
+    if not geozone:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Геозона не найдена",
+        )
+    polygon = service.get_geozone_shape(geozone, lod)
+    coords = [[lon, lat] for lon, lat in polygon.exterior.coords]
+    return {
+        "id": geozone.id,
+        "lod": lod.value,
+        "polygon_coordinates": coords,
+        "vertex_count": len(coords),
+    }
+
+
 @router.post("/{geozone_id}/check", response_model=dict)
 def check_point_in_geozone(
     geozone_id: int,
@@ -168,9 +195,11 @@ def check_nearby_geozones(
 
 @router.get("/visits/my", response_model=List[GeozoneVisitResponse])
 def get_my_visits(
+    response: Response,
     geozone_id: Optional[int] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -189,16 +218,20 @@ def get_my_visits(
         company_id=current_user.company_id,
         limit=limit,
         offset=offset,
+        cursor=cursor,
     )
+    set_next_cursor(response, visits, "visit_started_at", limit)
     return visits
 
 
 @router.get("/area-discoveries/my", response_model=List[AreaDiscoveryResponse])
 def get_my_area_discoveries(
+    response: Response,
     geozone_id: Optional[int] = None,
     status: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -218,7 +251,9 @@ def get_my_area_discoveries(
         company_id=current_user.company_id,
         limit=limit,
         offset=offset,
+        cursor=cursor,
     )
+    set_next_cursor(response, discoveries, "last_updated_at", limit)
     return discoveries
 
 
@@ -10,11 +10,13 @@ from app.api.dependencies import get_current_user
 from app.core.database import get_db
 from app.models.user import User
 from app.services.guild import GuildService
+from app.services.guild_scoring import GuildScoringService
 from app.schemas.guild import (
     GuildResponse,
     GuildMemberResponse,
     GuildCreate,
     JoinGuildRequest,
+    LeaderboardEntryResponse,
 )
 
 router = APIRouter(prefix="/guild", tags=["guild"])
@@ -82,17 +84,69 @@ def get_my_guild(
     db: Session = Depends(get_db),
 ):
     """Получить мою гильдию."""
-    from app.models.guild import GuildMember
-    
-    member = (
-        db.query(GuildMember)
-        .filter(GuildMember.user_id == current_user.id)
-    )
-    if current_user.company_id is not None:
-        member = member.filter(GuildMember.company_id == current_user.company_id)
-    member = member.first()
-    
-    return member
+    return GuildService(db).get_membership(current_user.id, current_user.company_id)
+
+
+@router.get("/leaderboard", response_model=List[LeaderboardEntryResponse])
+def get_guild_leaderboard(
+    limit: int = 10,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Топ гильдий по очкам."""
+    return GuildScoringService(db).top_guilds(current_user.company_id, limit=limit)
+
+
+def _get_guild_or_404(db: Session, guild_id: int, company_id: Optional[int]):
+    """Активная гильдия компании или 404."""
+    from app.models.guild import Guild
+
+    guild = db.query(Guild).filter(Guild.id == guild_id, Guild.deleted_at.is_(None))
+    if company_id is not None:
+        guild = guild.filter(Guild.company_id == company_id)
+    guild = guild.first()
+    if not guild:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Гильдия не найдена",
+        )
+    return guild
+
+
+@router.get("/{guild_id}/rank", response_model=List[LeaderboardEntryResponse])
+def get_guild_rank(
+    guild_id: int,
+    radius: int = 5,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Место гильдии в рейтинге и соседние гильдии."""
+    _get_guild_or_404(db, guild_id, current_user.company_id)
+    return GuildScoringService(db).guilds_around(guild_id, current_user.company_id, radius=radius)
+
+
+@router.get("/{guild_id}/leaderboard", response_model=List[LeaderboardEntryResponse])
+def get_guild_members_leaderboard(
+    guild_id: int,
+    limit: int = 10,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Топ участников гильдии по вкладу."""
+    _get_guild_or_404(db, guild_id, current_user.company_id)
+    return GuildScoringService(db).top_members(guild_id, limit=limit)
+
+
+@router.get("/{guild_id}/leaderboard/me", response_model=List[LeaderboardEntryResponse])
+def get_my_guild_rank(
+    guild_id: int,
+    radius: int = 5,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Моё место в рейтинге гильдии и соседние участники."""
+    _get_guild_or_404(db, guild_id, current_user.company_id)
+    return GuildScoringService(db).members_around(guild_id, current_user.id, radius=radius)
 
 
 @router.get("/{guild_id}", response_model=GuildResponse)
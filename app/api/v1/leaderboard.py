@@ -0,0 +1,99 @@
+"""API endpoints для рейтингов игроков."""
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.api.dependencies import get_current_user
+from app.core.database import get_db
+from app.models.event import Event
+from app.models.geozone import Geozone
+from app.models.leaderboard import LeaderboardMetric
+from app.models.user import User
+from app.schemas.leaderboard import PlayerLeaderboardEntryResponse, PlayerStandingResponse
+from app.services.player_leaderboard import (
+    GLOBAL_SCOPE,
+    PlayerLeaderboardService,
+    cell_scope,
+    company_scope,
+    geozone_scope,
+    season_scope,
+)
+
+router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
+logger = logging.getLogger(__name__)
+
+
+def _resolve_scope(
+    db: Session,
+    current_user: User,
+    scope: str,
+    scope_id: Optional[int],
+    latitude: Optional[float],
+    longitude: Optional[float],
+) -> str:
+    """Область рейтинга по параметрам запроса: global, tenant, geozone, cell, season."""
+    if scope == "global":
+        return GLOBAL_SCOPE
+    if scope == "tenant":
+        return company_scope(current_user.company_id) if current_user.company_id is not None else GLOBAL_SCOPE
+    if scope == "cell":
+        if latitude is None or longitude is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Для рейтинга ячейки нужны latitude и longitude",
+            )
+        return cell_scope(latitude, longitude, current_user.company_id)
+    if scope in ("geozone", "season"):
+        if scope_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Для рейтинга геозоны или сезона нужен scope_id",
+            )
+        model = Geozone if scope == "geozone" else Event
+        query = db.query(model.id).filter(model.id == scope_id, model.deleted_at.is_(None))
+        if current_user.company_id is not None:
+            query = query.filter(model.company_id == current_user.company_id)
+        if query.first() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Геозона не найдена" if scope == "geozone" else "Событие не найдено",
+            )
+        return geozone_scope(scope_id) if scope == "geozone" else season_scope(scope_id)
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Неизвестная область рейтинга",
+    )
+
+
+@router.get("/{metric}", response_model=List[PlayerLeaderboardEntryResponse])
+def get_leaderboard(
+    metric: LeaderboardMetric,
+    scope: str = "tenant",
+    scope_id: Optional[int] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    limit: int = 20,
+    offset: int = 0,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Топ игроков по показателю (страницы в пределах топ-100)."""
+    resolved = _resolve_scope(db, current_user, scope, scope_id, latitude, longitude)
+    return PlayerLeaderboardService(db).top(metric, resolved, offset=offset, limit=limit)
+
+
+@router.get("/{metric}/me", response_model=Optional[PlayerStandingResponse])
+def get_my_standing(
+    metric: LeaderboardMetric,
+    scope: str = "tenant",
+    scope_id: Optional[int] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Моё место и перцентиль в рейтинге по показателю."""
+    resolved = _resolve_scope(db, current_user, scope, scope_id, latitude, longitude)
+    return PlayerLeaderboardService(db).standing(metric, resolved, current_user.id)
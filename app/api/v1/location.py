@@ -2,7 +2,7 @@
 from datetime import datetime, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from sqlalchemy.exc import IntegrityError
@@ -10,6 +10,7 @@ from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
 from app.core.database import get_db
+from app.core.pagination import set_next_cursor
 from app.models.location import LocationSession
 from app.models.user import User
 from app.schemas.location import (
@@ -193,10 +194,12 @@ def batch_sync_offline_data(
 
 @router.get("/points", response_model=List[LocationPointResponse])
 def get_location_points(
+    response: Response,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -218,9 +221,11 @@ def get_location_points(
         end_time=end_time,
         limit=limit,
         offset=offset,
+        cursor=cursor,
         company_id=current_user.company_id,
     )
     logger.debug(f"Получено {len(points)} точек для пользователя {current_user.id}")
+    set_next_cursor(response, points, "timestamp", limit)
     return points
 
 
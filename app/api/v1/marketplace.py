@@ -1,22 +1,31 @@
 """API endpoints для торговой площадки."""
 import logging
+from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
 from app.core.database import get_db
+from app.core.pagination import set_next_cursor
 from app.models.user import User
 from app.models.marketplace import ListingType
+from app.services.listing_search import SORT_OPTIONS, ListingSearchService
+from app.services.market_stats import MarketStatsService
 from app.services.marketplace import MarketplaceService
 from app.schemas.marketplace import (
     MarketplaceListingResponse,
+    ListingSearchResponse,
+    ListingFacetsResponse,
+    FloorPriceResponse,
+    PriceHistoryResponse,
     TransactionResponse,
     ListingCreate,
     PurchaseRequest,
     CurrencyResponse,
+    CurrencyTransactionResponse,
     AddCurrencyRequest,
 )
 
@@ -60,12 +69,14 @@ def create_listing(
 
 @router.get("/listings", response_model=List[MarketplaceListingResponse])
 def get_listings(
+    response: Response,
     listing_type: Optional[str] = None,
     seller_id: Optional[int] = None,
     min_price: Optional[int] = None,
     max_price: Optional[int] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -79,10 +90,133 @@ def get_listings(
         company_id=current_user.company_id,
         limit=limit,
         offset=offset,
+        cursor=cursor,
     )
+    set_next_cursor(response, listings, "created_at", limit)
     return listings
 
 
+@router.get("/search", response_model=List[ListingSearchResponse])
+def search_listings(
+    response: Response,
+    q: Optional[str] = None,
+    listing_type: Optional[str] = None,
+    rarity: Optional[str] = None,
+    seller_id: Optional[int] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    sort: str = "newest",
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Найти объявления по названию, редкости, типу и цене."""
+    service = ListingSearchService(db)
+    try:
+        listings = service.search(
+            item_query=q,
+            listing_type=ListingType(listing_type) if listing_type else None,
+            rarity=rarity,
+            seller_id=seller_id,
+            min_price=min_price,
+            max_price=max_price,
+            company_id=current_user.company_id,
+            sort=sort,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    set_next_cursor(response, listings, SORT_OPTIONS[sort][0], limit)
+    return listings
+
+
+@router.get("/search/facets", response_model=ListingFacetsResponse)
+def get_listing_facets(
+    q: Optional[str] = None,
+    seller_id: Optional[int] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Получить количество активных объявлений по редкости и типу предмета."""
+    service = ListingSearchService(db)
+    return service.facets(
+        item_query=q,
+        seller_id=seller_id,
+        min_price=min_price,
+        max_price=max_price,
+        company_id=current_user.company_id,
+    )
+
+
+@router.get("/floor-price", response_model=FloorPriceResponse)
+def get_floor_price(
+    listing_type: str,
+    item_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Получить минимальную цену активных объявлений предмета."""
+    try:
+        item_type = ListingType(listing_type)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    service = ListingSearchService(db)
+    return FloorPriceResponse(
+        listing_type=item_type.value,
+        item_id=item_id,
+        floor_price=service.get_floor_price(item_type, item_id, current_user.company_id),
+    )
+
+
+@router.get("/stats/{listing_type}/{item_id}", response_model=PriceHistoryResponse)
+def get_price_history(
+    listing_type: str,
+    item_id: int,
+    period: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 90,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Получить историю цен, объём и число сделок по предмету."""
+    service = MarketStatsService(db)
+    try:
+        item_type = ListingType(listing_type)
+        buckets = service.get_price_history(
+            listing_type=item_type,
+            item_id=item_id,
+            period=period,
+            start=start,
+            end=end,
+            company_id=current_user.company_id,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    return PriceHistoryResponse(
+        listing_type=item_type.value,
+        item_id=item_id,
+        period=period,
+        buckets=buckets,
+    )
+
+
 @router.post("/listings/{listing_id}/purchase", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
 def purchase_listing(
     listing_id: int,
@@ -119,13 +253,35 @@ def get_currency(
 ):
     """Получить баланс валюты."""
     service = MarketplaceService(db)
-    currency = service._get_or_create_currency(
+    currency = service.get_currency(
         user_id=current_user.id,
         company_id=current_user.company_id,
     )
+    db.commit()
     return currency
 
 
+@router.get("/currency/history", response_model=List[CurrencyTransactionResponse])
+def get_currency_history(
+    response: Response,
+    currency_type: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Получить историю операций с валютой."""
+    service = MarketplaceService(db)
+    entries = service.get_currency_history(
+        user_id=current_user.id,
+        currency_type=currency_type,
+        limit=limit,
+        cursor=cursor,
+    )
+    set_next_cursor(response, entries, "id", limit)
+    return entries
+
+
 @router.post("/currency/add", response_model=CurrencyResponse)
 def add_currency(
     request: AddCurrencyRequest,
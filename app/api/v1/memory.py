@@ -2,11 +2,12 @@
 import logging
 from typing import List, Optional, Dict
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
 from app.core.database import get_db
+from app.core.pagination import set_next_cursor
 from app.models.user import User
 from app.services.memory import MemoryService
 from app.schemas.memory import (
@@ -48,10 +49,12 @@ def create_memory(
 
 @router.get("/my", response_model=List[MemoryResponse])
 def get_my_memories(
+    response: Response,
     memory_type: Optional[str] = None,
     is_favorite: Optional[bool] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -64,7 +67,9 @@ def get_my_memories(
         company_id=current_user.company_id,
         limit=limit,
         offset=offset,
+        cursor=cursor,
     )
+    set_next_cursor(response, memories, "created_at", limit)
     return memories
 
 
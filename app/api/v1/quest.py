@@ -3,12 +3,13 @@ import logging
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.api.dependencies import get_current_user
 from app.core.database import get_db
+from app.core.pagination import paginate, set_next_cursor
 from app.models.user import User
 from app.services.quest import QuestService
 from app.schemas.quest import (
@@ -25,9 +26,11 @@ logger = logging.getLogger(__name__)
 
 @router.get("/events", response_model=List[EventResponse])
 def get_events(
+    response: Response,
     event_type: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -48,15 +51,18 @@ def get_events(
     if current_user.company_id is not None:
         query = query.filter(Event.company_id == current_user.company_id)
     
-    events = query.order_by(Event.start_date.desc()).offset(offset).limit(limit).all()
+    events = paginate(query, Event.start_date, Event.id, limit, offset, cursor).all()
+    set_next_cursor(response, events, "start_date", limit)
     return events
 
 
 @router.get("/available", response_model=List[QuestResponse])
 def get_available_quests(
+    response: Response,
     event_id: Optional[int] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -68,15 +74,19 @@ def get_available_quests(
         company_id=current_user.company_id,
         limit=limit,
         offset=offset,
+        cursor=cursor,
     )
+    set_next_cursor(response, quests, "created_at", limit)
     return quests
 
 
 @router.get("/my", response_model=List[UserQuestResponse])
 def get_my_quests(
+    response: Response,
     status: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -93,7 +103,8 @@ def get_my_quests(
     if current_user.company_id is not None:
         query = query.filter(UserQuest.company_id == current_user.company_id)
     
-    quests = query.order_by(UserQuest.created_at.desc()).offset(offset).limit(limit).all()
+    quests = paginate(query, UserQuest.created_at, UserQuest.id, limit, offset, cursor).all()
+    set_next_cursor(response, quests, "created_at", limit)
     return quests
 
 
@@ -4,7 +4,7 @@ from fastapi import APIRouter
 from app.api.v1 import (
     achievement, auth, geozone, home_work, location,
     artifact, cosmetic, marketplace, quest, guild,
-    verification, creator, ai, portal, memory, analytics
+    verification, creator, ai, portal, memory, analytics, leaderboard
 )
 
 api_router = APIRouter()
@@ -24,6 +24,7 @@ api_router.include_router(quest.router)
 
 # Версия 3.0: Социальный слой
 api_router.include_router(guild.router)
+api_router.include_router(leaderboard.router)
 api_router.include_router(verification.router)
 api_router.include_router(creator.router)
 
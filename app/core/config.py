@@ -42,6 +42,59 @@ class Settings(BaseSettings):
     home_work_min_visits: int = 5
     home_work_min_time_minutes: int = 30
     home_work_cluster_radius_meters: float = 200.0
+    home_work_stay_radius_meters: float = 100.0
+    home_work_stay_min_minutes: int = 10
+    home_work_window_days: int = 30
+    home_work_job_workers: int = 4
+    home_work_job_batch_size: int = 100
+
+    # Quests
+    quest_trigger_cache_ttl_seconds: int = 60
+    quest_recompute_chunk_size: int = 5000
+
+    # Artifacts
+    artifact_drop_table_cache_ttl_seconds: int = 300
+    crafting_recipe_cache_ttl_seconds: int = 300
+
+    # Avatar cache
+    avatar_cache_size: int = 10000
+    avatar_cache_local_ttl_seconds: int = 30
+    avatar_cache_ttl_seconds: int = 3600
+    avatar_cache_redis_enabled: bool = False
+
+    # Guilds
+    guild_membership_cache_size: int = 10000
+    guild_membership_cache_ttl_seconds: int = 60
+
+    # Guild scoring and leaderboards
+    guild_score_visit_weight: int = 10
+    guild_score_discovery_weight: int = 25
+    guild_score_recompute_batch_size: int = 500
+    leaderboard_redis_enabled: bool = False
+    leaderboard_memory_ttl_seconds: int = 60
+
+    # Player leaderboards
+    player_leaderboard_shards: int = 16
+    player_leaderboard_top_size: int = 100
+    player_leaderboard_top_cache_ttl_seconds: int = 10
+    player_leaderboard_cell_size_degrees: float = 0.1
+    player_leaderboard_season_cache_ttl_seconds: int = 60
+    player_score_recompute_batch_size: int = 1000
+
+    # Marketplace
+    marketplace_floor_price_cache_ttl_seconds: int = 60
+    marketplace_expiry_batch_size: int = 1000
+    market_rollup_batch_size: int = 10000
+    market_rollup_safety_lag_seconds: int = 60
+
+    # Currency ledger
+    currency_ledger_batch_size: int = 1000
+    currency_ledger_snapshot_lag_seconds: int = 300
+
+    # Area POI generation
+    area_poi_tile_size_degrees: float = 0.5
+    area_poi_workers: int = 4
+    area_poi_stream_batch_size: int = 500
 
     # CORS
     cors_origins: list[str] = ["*"]
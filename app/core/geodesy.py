@@ -0,0 +1,56 @@
+"""Геодезические вычисления: площади и длины геометрий в метрах."""
+from functools import lru_cache
+from typing import Callable
+
+import numpy as np
+import pyproj
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+WGS84 = "EPSG:4326"
+# Равновеликая цилиндрическая проекция (EASE-Grid 2.0): площадь сохраняется на любой широте
+EQUAL_AREA = "EPSG:6933"
+
+GEOD = pyproj.Geod(ellps="WGS84")
+
+
+@lru_cache(maxsize=128)
+def get_transformer(source_crs: str, target_crs: str) -> pyproj.Transformer:
+    """Получить трансформер между проекциями (кэшируется на процесс)."""
+    return pyproj.Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+
+def project_coords(source_crs: str, target_crs: str) -> Callable[[np.ndarray], np.ndarray]:
+    """Функция перепроецирования массива координат (N, 2) для shapely.transform."""
+    transformer = get_transformer(source_crs, target_crs)
+
+    def project(coords: np.ndarray) -> np.ndarray:
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+
+    return project
+
+
+def areas_m2(geometries: np.ndarray) -> np.ndarray:
+    """
+    Площади массива геометрий WGS84 в м².
+
+    Все вершины перепроецируются в равновеликую проекцию за один вызов.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    if len(geometries) == 0:
+        return np.zeros(0)
+    return shapely.area(shapely.transform(geometries, project_coords(WGS84, EQUAL_AREA)))
+
+
+def area_m2(geometry: BaseGeometry) -> float:
+    """Геодезическая площадь геометрии WGS84 в м² (на эллипсоиде)."""
+    area, _ = GEOD.geometry_area_perimeter(geometry)
+    return abs(area)
+
+
+def length_m(geometry: BaseGeometry) -> float:
+    """Геодезическая длина линейной геометрии WGS84 в метрах."""
+    if geometry.is_empty:
+        return 0.0
+    return GEOD.geometry_length(geometry)
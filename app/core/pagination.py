@@ -0,0 +1,94 @@
+"""
+Keyset-пагинация с непрозрачными курсорами.
+
+Списки сортируются по (sort_key DESC, id DESC). Курсор кодирует пару
+значений последней строки страницы, следующая страница выбирается условием
+(sort_key, id) < (значение, id) по составному индексу, поэтому время
+получения страницы не зависит от её глубины (для сортировки по возрастанию
+условие обратное). OFFSET поддерживается для совместимости, когда курсор не
+передан.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple
+
+from fastapi import Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(ValueError):
+    """Курсор пагинации не удалось разобрать."""
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """Закодировать (sort_key, id) последней строки страницы в курсор."""
+    if isinstance(sort_value, datetime):
+        payload = {"k": "dt", "v": sort_value.isoformat(), "id": row_id}
+    else:
+        payload = {"k": "raw", "v": sort_value, "id": row_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Раскодировать курсор в (sort_key, id)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = payload["v"]
+        if payload["k"] == "dt":
+            value = datetime.fromisoformat(value)
+        return value, int(payload["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Некорректный курсор пагинации") from e
+
+
+def paginate(
+    query: Query,
+    sort_column: Any,
+    id_column: Any,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    ascending: bool = False,
+) -> Query:
+    """
+    Отсортировать запрос по (sort_column DESC, id DESC) и выбрать страницу.
+
+    С курсором страница выбирается keyset-условием, без курсора - через OFFSET.
+    ascending=True сортирует по (sort_column ASC, id ASC).
+    """
+    if ascending:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    else:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if ascending:
+            query = query.filter(tuple_(sort_column, id_column) > tuple_(sort_value, row_id))
+        else:
+            query = query.filter(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    elif offset:
+        query = query.offset(offset)
+    return query.limit(limit)
+
+
+def next_cursor(items: Sequence[Any], sort_attr: str, limit: int) -> Optional[str]:
+    """Курсор следующей страницы или None, если страница последняя."""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(getattr(last, sort_attr), last.id)
+
+
+def set_next_cursor(response: Response, items: Sequence[Any], sort_attr: str, limit: int) -> None:
+    """Передать курсор следующей страницы в заголовке ответа."""
+    cursor = next_cursor(items, sort_attr, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
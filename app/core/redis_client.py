@@ -0,0 +1,32 @@
+"""
+Подключение к Redis.
+
+Redis - необязательная зависимость (pip install redis): кэши и рейтинги
+используют его, только если он включён в настройках, и без него работают
+в памяти процесса.
+"""
+import logging
+import threading
+from typing import Any, Optional
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_client: Any = None
+_client_lock = threading.Lock()
+
+
+def get_redis() -> Optional[Any]:
+    """Общий клиент Redis процесса или None, если пакет redis не установлен."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            try:
+                import redis
+            except ImportError:
+                logger.warning("Пакет redis не установлен, используется хранилище в памяти: pip install redis")
+                return None
+            _client = redis.Redis.from_url(settings.redis_url)
+        return _client
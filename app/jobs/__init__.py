@@ -0,0 +1 @@
+"""Фоновые и пакетные задачи."""
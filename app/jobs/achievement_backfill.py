@@ -0,0 +1,93 @@
+"""
+Пакетная проверка достижений для всех пользователей.
+
+Нужна после добавления новых достижений или изменения порогов: правила
+компилируются один раз, пользователи обрабатываются пачками по ID, для каждой
+пачки выполняются анти-join, агрегатные запросы статистики и один INSERT
+разблокировок.
+
+Запуск:
+    python -m app.jobs.achievement_backfill --company-id 1 --batch-size 1000
+"""
+import argparse
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.user import User
+from app.services.achievement_rules import AchievementRuleEngine
+
+logger = logging.getLogger(__name__)
+
+
+class AchievementBackfill:
+    """Пакетная разблокировка достижений."""
+
+    def __init__(self, db: Session, batch_size: int = 1000):
+        """Инициализация задачи."""
+        self.db = db
+        self.batch_size = batch_size
+
+    def run(self, company_id: Optional[int] = None) -> Dict[str, Any]:
+        """Проверить достижения всех активных пользователей компании."""
+        # Расстояние - по истории точек: накопленные итоги могут отставать от неё
+        engine = AchievementRuleEngine(self.db, exact_distance=True)
+        rules = engine.compile(company_id)
+        stats: Dict[str, Any] = {"rules": len(rules), "users_processed": 0, "unlocked": 0}
+        if not len(rules):
+            logger.info("Нет достижений с автоматической проверкой")
+            return stats
+
+        started = time.monotonic()
+        last_user_id = 0
+        while True:
+            query = self.db.query(User.id).filter(
+                User.id > last_user_id,
+                User.is_active.is_(True),
+                User.deleted_at.is_(None),
+            )
+            if company_id is not None:
+                query = query.filter(User.company_id == company_id)
+            user_ids = [user_id for (user_id,) in query.order_by(User.id).limit(self.batch_size)]
+            if not user_ids:
+                break
+
+            unlocks = engine.evaluate(user_ids, company_id, rules)
+            created = engine.unlock(unlocks, company_id)
+            self.db.commit()
+
+            last_user_id = user_ids[-1]
+            stats["users_processed"] += len(user_ids)
+            stats["unlocked"] += len(created)
+            logger.info(
+                f"Достижения: обработано {stats['users_processed']} пользователей, "
+                f"разблокировано {stats['unlocked']}"
+            )
+
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(f"Пакетная проверка достижений завершена: {stats}")
+        return stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Пакетная проверка достижений для всех пользователей")
+    parser.add_argument("--company-id", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_logging()
+    db = SessionLocal()
+    try:
+        AchievementBackfill(db, batch_size=args.batch_size).run(company_id=args.company_id)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Параллельная генерация Area POI для крупных регионов.
+
+Регион разбивается на тайлы, тайлы обрабатываются в пуле процессов
+(у каждого воркера своё соединение с БД), объекты OSM читаются потоково
+через серверный курсор. Прогресс по тайлам сохраняется в таблице
+area_poi_generation_tiles, поэтому прерванный запуск можно продолжить.
+
+Запуск:
+    python -m app.jobs.area_poi_generation --bbox 36.8,55.1,38.4,56.2 --workers 8
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import get_settings
+from app.models.osm import AreaPOIGenerationTile
+from app.services.area_poi_generator import DEFAULT_AREA_TYPES, OSM_TAG_MAPPING, AreaPOIGenerator
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# (обработано тайлов, всего тайлов, накопленная статистика)
+ProgressCallback = Callable[[int, int, Dict[str, int]], None]
+
+# Состояние процесса-воркера: собственный engine и фабрика сессий
+_worker_engine: Optional[Engine] = None
+_worker_session_factory: Optional[sessionmaker] = None
+
+
+def _init_worker(database_url: str) -> None:
+    """Создать соединение с БД в процессе-воркере."""
+    from app.core.logging_config import setup_logging
+
+    global _worker_engine, _worker_session_factory
+    setup_logging()
+    _worker_engine = create_engine(database_url, pool_pre_ping=True, pool_size=2, max_overflow=0)
+    _worker_session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_worker_engine)
+
+
+def _mark_tile(
+    db: Session,
+    run_key: str,
+    tile: Dict[str, Any],
+    status: str,
+    features_processed: int,
+    geozones_created: int,
+    error: Optional[str] = None,
+) -> None:
+    """Сохранить результат обработки тайла в контрольной точке."""
+    db.query(AreaPOIGenerationTile).filter(
+        AreaPOIGenerationTile.run_key == run_key,
+        AreaPOIGenerationTile.tile_x == tile["tile_x"],
+        AreaPOIGenerationTile.tile_y == tile["tile_y"],
+    ).update(
+        {
+            AreaPOIGenerationTile.status: status,
+            AreaPOIGenerationTile.features_processed: features_processed,
+            AreaPOIGenerationTile.geozones_created: geozones_created,
+            AreaPOIGenerationTile.error: error,
+            AreaPOIGenerationTile.completed_at: datetime.now(timezone.utc) if status == "done" else None,
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def _process_tile(
+    run_key: str,
+    tile: Dict[str, Any],
+    area_types: List[str],
+    company_id: Optional[int],
+) -> Dict[str, Any]:
+    """Обработать один тайл в процессе-воркере."""
+    db = _worker_session_factory()
+    features_processed = 0
+    geozones_created = 0
+    status = "done"
+    error = None
+    try:
+        generator = AreaPOIGenerator(db)
+        with _worker_engine.connect() as read_connection:
+            for area_type in area_types:
+                rows = generator.iter_osm_rows(
+                    read_connection, OSM_TAG_MAPPING[area_type], tile, assign_by_point=True
+                )
+                area_stats = generator.bulk_upsert_osm_rows(rows, area_type, company_id)
+                features_processed += area_stats["processed"]
+                geozones_created += area_stats["inserted"]
+                # Пачка с ошибкой записи откатана - тайл нужно обработать заново при возобновлении
+                if area_stats["failed"]:
+                    status = "failed"
+                    error = f"Не записано объектов {area_type}: {area_stats['failed']}"
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ошибка обработки тайла ({tile['tile_x']}, {tile['tile_y']}): {e}", exc_info=True)
+        status = "failed"
+        error = str(e)
+
+    try:
+        _mark_tile(db, run_key, tile, status, features_processed, geozones_created, error)
+    finally:
+        db.close()
+
+    return {
+        "tile_x": tile["tile_x"],
+        "tile_y": tile["tile_y"],
+        "status": status,
+        "features_processed": features_processed,
+        "geozones_created": geozones_created,
+    }
+
+
+class AreaPOIRegionGenerator:
+    """Генератор Area POI для крупных регионов с разбиением на тайлы."""
+
+    def __init__(
+        self,
+        db: Session,
+        tile_size_degrees: Optional[float] = None,
+        max_workers: Optional[int] = None,
+        database_url: Optional[str] = None,
+    ):
+        """Инициализация генератора."""
+        self.db = db
+        self.tile_size_degrees = tile_size_degrees or settings.area_poi_tile_size_degrees
+        self.max_workers = max_workers or settings.area_poi_workers
+        self.database_url = database_url or settings.database_url
+
+    def split_bbox(self, bbox: Dict[str, float]) -> List[Dict[str, Any]]:
+        """Разбить bbox на тайлы заданного размера."""
+        size = self.tile_size_degrees
+        columns = max(1, math.ceil((bbox["max_lon"] - bbox["min_lon"]) / size))
+        rows = max(1, math.ceil((bbox["max_lat"] - bbox["min_lat"]) / size))
+
+        tiles = []
+        for tile_y in range(rows):
+            for tile_x in range(columns):
+                min_lon = bbox["min_lon"] + tile_x * size
+                min_lat = bbox["min_lat"] + tile_y * size
+                tiles.append({
+                    "tile_x": tile_x,
+                    "tile_y": tile_y,
+                    "min_lon": min_lon,
+                    "min_lat": min_lat,
+                    "max_lon": min(min_lon + size, bbox["max_lon"]),
+                    "max_lat": min(min_lat + size, bbox["max_lat"]),
+                })
+        return tiles
+
+    def make_run_key(
+        self,
+        bbox: Dict[str, float],
+        area_types: List[str],
+        company_id: Optional[int],
+    ) -> str:
+        """Вычислить ключ запуска: одинаковые параметры продолжают тот же запуск."""
+        payload = json.dumps(
+            {
+                "bbox": [bbox["min_lon"], bbox["min_lat"], bbox["max_lon"], bbox["max_lat"]],
+                "area_types": sorted(area_types),
+                "company_id": company_id,
+                "tile_size": self.tile_size_degrees,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _ensure_checkpoints(
+        self,
+        run_key: str,
+        tiles: List[Dict[str, Any]],
+        company_id: Optional[int],
+    ) -> Set[Tuple[int, int]]:
+        """Создать недостающие контрольные точки и вернуть уже обработанные тайлы."""
+        for start in range(0, len(tiles), 1000):
+            chunk = [
+                {**tile, "run_key": run_key, "status": "pending", "company_id": company_id}
+                for tile in tiles[start:start + 1000]
+            ]
+            self.db.execute(
+                pg_insert(AreaPOIGenerationTile)
+                .values(chunk)
+                .on_conflict_do_nothing(constraint="uq_area_poi_generation_tiles_run_tile")
+            )
+        self.db.commit()
+
+        done_tiles = (
+            self.db.query(AreaPOIGenerationTile.tile_x, AreaPOIGenerationTile.tile_y)
+            .filter(
+                AreaPOIGenerationTile.run_key == run_key,
+                AreaPOIGenerationTile.status == "done",
+            )
+            .all()
+        )
+        return {(tile_x, tile_y) for tile_x, tile_y in done_tiles}
+
+    def generate(
+        self,
+        bbox: Dict[str, float],
+        area_types: Optional[List[str]] = None,
+        company_id: Optional[int] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> Dict[str, Any]:
+        """
+        Сгенерировать Area POI для региона.
+
+        Args:
+            bbox: Границы региона {'min_lon', 'min_lat', 'max_lon', 'max_lat'}
+            area_types: Типы областей (если None - все типы)
+            company_id: ID компании
+            progress_callback: Вызывается после каждого обработанного тайла
+
+        Returns:
+            Статистика запуска
+        """
+        if area_types is None:
+            area_types = DEFAULT_AREA_TYPES
+        area_types = [area_type for area_type in area_types if area_type in OSM_TAG_MAPPING]
+
+        tiles = self.split_bbox(bbox)
+        run_key = self.make_run_key(bbox, area_types, company_id)
+        done_tiles = self._ensure_checkpoints(run_key, tiles, company_id)
+        pending = [tile for tile in tiles if (tile["tile_x"], tile["tile_y"]) not in done_tiles]
+
+        stats = {
+            "tiles_total": len(tiles),
+            "tiles_skipped": len(tiles) - len(pending),
+            "tiles_done": 0,
+            "tiles_failed": 0,
+            "features_processed": 0,
+            "geozones_created": 0,
+        }
+        logger.info(
+            f"Генерация Area POI {run_key[:12]}: {len(tiles)} тайлов, "
+            f"{stats['tiles_skipped']} уже обработано, воркеров: {self.max_workers}"
+        )
+
+        # Ограничиваем число задач в полёте, чтобы не держать в памяти все тайлы страны
+        max_in_flight = self.max_workers * 2
+        pending_iter = iter(pending)
+        in_flight: Set[Future] = set()
+        completed = stats["tiles_skipped"]
+
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.database_url,),
+        ) as executor:
+            while True:
+                while len(in_flight) < max_in_flight:
+                    tile = next(pending_iter, None)
+                    if tile is None:
+                        break
+                    in_flight.add(executor.submit(_process_tile, run_key, tile, area_types, company_id))
+
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    completed += 1
+                    if result["status"] == "done":
+                        stats["tiles_done"] += 1
+                    else:
+                        stats["tiles_failed"] += 1
+                    stats["features_processed"] += result["features_processed"]
+                    stats["geozones_created"] += result["geozones_created"]
+
+                    logger.info(
+                        f"Тайл ({result['tile_x']}, {result['tile_y']}) {result['status']}: "
+                        f"{completed}/{len(tiles)}, объектов {result['features_processed']}, "
+                        f"геозон {result['geozones_created']}"
+                    )
+                    if progress_callback:
+                        progress_callback(completed, len(tiles), stats)
+
+        stats["run_key"] = run_key
+        logger.info(f"Генерация Area POI {run_key[:12]} завершена: {stats}")
+        return stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Параллельная генерация Area POI по тайлам региона")
+    parser.add_argument("--bbox", required=True, help="min_lon,min_lat,max_lon,max_lat")
+    parser.add_argument("--area-types", default=None, help="Типы областей через запятую")
+    parser.add_argument("--company-id", type=int, default=None)
+    parser.add_argument("--tile-size", type=float, default=None, help="Размер тайла в градусах")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    setup_logging()
+    min_lon, min_lat, max_lon, max_lat = (float(v) for v in args.bbox.split(","))
+    area_types = args.area_types.split(",") if args.area_types else None
+
+    db = SessionLocal()
+    try:
+        generator = AreaPOIRegionGenerator(db, tile_size_degrees=args.tile_size, max_workers=args.workers)
+        generator.generate(
+            bbox={"min_lon": min_lon, "min_lat": min_lat, "max_lon": max_lon, "max_lat": max_lat},
+            area_types=area_types,
+            company_id=args.company_id,
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
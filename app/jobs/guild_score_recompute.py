@@ -0,0 +1,213 @@
+"""
+Точный пересчёт очков гильдий.
+
+Инкрементальные очки (app.services.guild_scoring) могут разойтись с
+историей: события, прошедшие мимо GuildScoringService.record, изменения
+состава, откаты после записи в рейтинг. Задача пересчитывает агрегаты
+участников по истории с момента вступления (XP из журнала валюты,
+geozone_visits, area_discoveries), затем агрегаты гильдий как суммы по
+участникам, и перестраивает общие рейтинги в Redis. Гильдии обрабатываются
+пачками по ID, пачка - два UPDATE ... FROM в своей транзакции.
+
+Инкремент, зафиксированный во время пересчёта пачки, может быть перезаписан
+значением, посчитанным до него; его учтёт следующий запуск.
+
+Запуск:
+    python -m app.jobs.guild_score_recompute                  # один проход (cron)
+    python -m app.jobs.guild_score_recompute --interval 3600  # периодически
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.geozone import AreaDiscovery, GeozoneVisit
+from app.models.guild import Guild, GuildMember
+from app.models.marketplace import CurrencyTransaction, UserCurrency
+from app.services.guild_scoring import GuildScoringService
+from app.services.sorted_sets import get_sorted_sets
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class GuildScoreRecompute:
+    """Пакетный пересчёт очков гильдий."""
+
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        """Инициализация задачи."""
+        self.db = db
+        self.batch_size = batch_size or settings.guild_score_recompute_batch_size
+
+    def _recompute_members(self, guild_ids: List[int], now: datetime) -> int:
+        """Пересчитать агрегаты участников гильдий пачки; вернуть число участников."""
+        members = GuildMember.__table__
+        member = members.alias("member")
+        entries = CurrencyTransaction.__table__
+        currency = UserCurrency.__table__
+        visits = GeozoneVisit.__table__
+        discoveries = AreaDiscovery.__table__
+
+        xp = (
+            select(func.coalesce(func.sum(entries.c.amount), 0))
+            .select_from(entries.join(currency, currency.c.id == entries.c.user_currency_id))
+            .where(
+                currency.c.user_id == member.c.user_id,
+                entries.c.transaction_type == "xp",
+                entries.c.created_at >= member.c.joined_at,
+            )
+            .scalar_subquery()
+        )
+        visit_count = (
+            select(func.count())
+            .select_from(visits)
+            .where(visits.c.user_id == member.c.user_id, visits.c.visit_started_at >= member.c.joined_at)
+            .scalar_subquery()
+        )
+        discovery_count = (
+            select(func.count())
+            .select_from(discoveries)
+            .where(
+                discoveries.c.user_id == member.c.user_id,
+                discoveries.c.first_discovered_at >= member.c.joined_at,
+            )
+            .scalar_subquery()
+        )
+        stats = (
+            select(
+                member.c.id,
+                xp.label("xp"),
+                visit_count.label("visits"),
+                discovery_count.label("discoveries"),
+            )
+            .where(member.c.guild_id.in_(guild_ids))
+            .subquery("stats")
+        )
+        result = self.db.execute(
+            members.update()
+            .where(members.c.id == stats.c.id)
+            .values(
+                xp=stats.c.xp,
+                visits=stats.c.visits,
+                discoveries=stats.c.discoveries,
+                contribution_score=(
+                    stats.c.xp
+                    + stats.c.visits * settings.guild_score_visit_weight
+                    + stats.c.discoveries * settings.guild_score_discovery_weight
+                ),
+                updated_at=now,
+            )
+        )
+        return result.rowcount
+
+    def _recompute_guilds(self, guild_ids: List[int], now: datetime) -> None:
+        """Пересчитать агрегаты гильдий пачки как суммы по участникам."""
+        guilds = Guild.__table__
+        members = GuildMember.__table__
+        totals = (
+            select(
+                guilds.c.id,
+                func.coalesce(func.sum(members.c.xp), 0).label("xp"),
+                func.coalesce(func.sum(members.c.visits), 0).label("visits"),
+                func.coalesce(func.sum(members.c.discoveries), 0).label("discoveries"),
+                func.coalesce(func.sum(members.c.contribution_score), 0).label("score"),
+            )
+            .select_from(guilds.outerjoin(members, members.c.guild_id == guilds.c.id))
+            .where(guilds.c.id.in_(guild_ids))
+            .group_by(guilds.c.id)
+            .subquery("totals")
+        )
+        self.db.execute(
+            guilds.update()
+            .where(guilds.c.id == totals.c.id)
+            .values(
+                experience=totals.c.xp,
+                total_visits=totals.c.visits,
+                total_discoveries=totals.c.discoveries,
+                score=totals.c.score,
+                updated_at=now,
+            )
+        )
+
+    def run(self) -> Dict[str, Any]:
+        """Пересчитать очки всех гильдий."""
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        stats: Dict[str, Any] = {"guilds": 0, "members": 0}
+        scoring = GuildScoringService(self.db)
+        # Рейтинги в памяти процесса задачи никто не читает - перестраиваются только общие
+        rebuild = get_sorted_sets().shared
+        company_ids: Set[Optional[int]] = set()
+        guilds = Guild.__table__
+        last_guild_id = 0
+        try:
+            while True:
+                rows = self.db.execute(
+                    select(guilds.c.id, guilds.c.company_id)
+                    .where(guilds.c.id > last_guild_id)
+                    .order_by(guilds.c.id)
+                    .limit(self.batch_size)
+                ).all()
+                if not rows:
+                    break
+
+                guild_ids = [row.id for row in rows]
+                stats["members"] += self._recompute_members(guild_ids, now)
+                self._recompute_guilds(guild_ids, now)
+                self.db.commit()
+
+                if rebuild:
+                    for guild_id in guild_ids:
+                        scoring.rebuild_members(guild_id)
+                company_ids.update(row.company_id for row in rows)
+                stats["guilds"] += len(rows)
+                last_guild_id = guild_ids[-1]
+
+            if rebuild:
+                for company_id in company_ids:
+                    scoring.rebuild_guilds(company_id)
+        except Exception:
+            self.db.rollback()
+            raise
+
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(f"Пересчёт очков гильдий: {stats}")
+        return stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Точный пересчёт очков и рейтингов гильдий")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument(
+        "--interval", type=float, default=None, help="Повторять каждые N секунд (без флага - один проход)"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    while True:
+        db = SessionLocal()
+        try:
+            GuildScoreRecompute(db, batch_size=args.batch_size).run()
+        except Exception:
+            if args.interval is None:
+                raise
+            logger.exception("Ошибка при пересчёте очков гильдий")
+        finally:
+            db.close()
+
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Плановый анализ дома/работы по всем пользователям.
+
+Пользователи с новыми точками геолокации (новее водяного знака в
+home_work_analysis_states) делятся на пачки, пачки обрабатываются в пуле
+процессов (у каждого воркера своё соединение с БД). Новые точки
+пользователя загружаются одним запросом в массивы и добавляются в
+статистики его мест, результаты пачки сохраняются массовым upsert в
+user_home_work вместе с водяными знаками.
+
+Запуск (можно разнести по шардам на несколько машин):
+    python -m app.jobs.home_work_analysis --workers 8
+    python -m app.jobs.home_work_analysis --shard-index 0 --shard-count 4
+"""
+import argparse
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import create_engine, func, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import get_settings
+from app.models.location import LocationPoint, LocationSession
+from app.models.user import User
+from app.models.user_home_work import HomeWorkAnalysisState
+from app.services.home_work import HomeWorkDetectionService
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# (user_id, company_id, время последней точки)
+PendingUser = Tuple[int, Optional[int], datetime]
+
+# (обработано пользователей, всего пользователей, накопленная статистика)
+ProgressCallback = Callable[[int, int, Dict[str, Any]], None]
+
+# Состояние процесса-воркера: собственный engine и фабрика сессий
+_worker_engine: Optional[Engine] = None
+_worker_session_factory: Optional[sessionmaker] = None
+
+
+def _init_worker(database_url: str) -> None:
+    """Создать соединение с БД в процессе-воркере."""
+    from app.core.logging_config import setup_logging
+
+    global _worker_engine, _worker_session_factory
+    setup_logging()
+    _worker_engine = create_engine(database_url, pool_pre_ping=True, pool_size=2, max_overflow=0)
+    _worker_session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_worker_engine)
+
+
+def _analyze_batch(users: List[PendingUser]) -> Dict[str, Any]:
+    """Обработать новые данные пачки пользователей в процессе-воркере."""
+    db = _worker_session_factory()
+    service = HomeWorkDetectionService(db)
+    rows: List[Dict[str, Any]] = []
+    states: List[Dict[str, Any]] = []
+    points_processed = 0
+
+    try:
+        for user_id, company_id, last_point_at in users:
+            result = service.process_new_data(user_id, company_id)
+            points_processed += result["points_processed"]
+            rows.extend(result["locations"])
+            state = result["state"]
+            # Точки другой компании не загружаются, но водяной знак должен их пропустить
+            state["last_point_at"] = max(filter(None, [state["last_point_at"], last_point_at]))
+            states.append(state)
+
+        service.upsert_home_work(rows)
+        service.upsert_analysis_states(states)
+        db.commit()
+        status = "done"
+    except Exception as e:
+        # Водяные знаки и места не меняются, пачка будет обработана при следующем запуске
+        db.rollback()
+        logger.error(f"Ошибка анализа пачки из {len(users)} пользователей: {e}", exc_info=True)
+        status = "failed"
+        rows = []
+    finally:
+        db.close()
+
+    return {
+        "status": status,
+        "users": len(users),
+        "points_processed": points_processed,
+        "locations_saved": len(rows),
+    }
+
+
+class HomeWorkAnalysisJob:
+    """Пакетный анализ дома/работы по всем пользователям с новыми данными."""
+
+    def __init__(
+        self,
+        db: Session,
+        max_workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        database_url: Optional[str] = None,
+    ):
+        """Инициализация задачи."""
+        self.db = db
+        self.max_workers = max_workers or settings.home_work_job_workers
+        self.batch_size = batch_size or settings.home_work_job_batch_size
+        self.database_url = database_url or settings.database_url
+
+    def find_pending_users(
+        self,
+        window_start: datetime,
+        shard_index: int = 0,
+        shard_count: int = 1,
+    ) -> List[PendingUser]:
+        """Найти активных пользователей, у которых есть точки новее водяного знака."""
+        latest_points = (
+            self.db.query(
+                LocationSession.user_id.label("user_id"),
+                func.max(LocationPoint.timestamp).label("last_point_at"),
+            )
+            .join(LocationPoint, LocationPoint.session_id == LocationSession.id)
+            .filter(LocationPoint.timestamp >= window_start)
+            .group_by(LocationSession.user_id)
+            .subquery()
+        )
+
+        query = (
+            self.db.query(latest_points.c.user_id, User.company_id, latest_points.c.last_point_at)
+            .join(User, User.id == latest_points.c.user_id)
+            .outerjoin(HomeWorkAnalysisState, HomeWorkAnalysisState.user_id == latest_points.c.user_id)
+            .filter(
+                User.is_active.is_(True),
+                User.deleted_at.is_(None),
+                or_(
+                    HomeWorkAnalysisState.last_point_at.is_(None),
+                    latest_points.c.last_point_at > HomeWorkAnalysisState.last_point_at,
+                ),
+            )
+        )
+
+        if shard_count > 1:
+            query = query.filter(latest_points.c.user_id % shard_count == shard_index)
+
+        return [tuple(row) for row in query.order_by(latest_points.c.user_id).all()]
+
+    def _batches(self, users: List[PendingUser]) -> Iterator[List[PendingUser]]:
+        """Разбить пользователей на пачки."""
+        for start in range(0, len(users), self.batch_size):
+            yield users[start:start + self.batch_size]
+
+    def run(
+        self,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> Dict[str, Any]:
+        """
+        Проанализировать всех пользователей шарда с новыми данными.
+
+        Returns:
+            Статистика запуска: объём, пропускная способность и остаток очереди
+        """
+        window_start = datetime.now(timezone.utc) - timedelta(days=settings.home_work_window_days)
+        users = self.find_pending_users(window_start, shard_index, shard_count)
+
+        stats: Dict[str, Any] = {
+            "users_total": len(users),
+            "users_processed": 0,
+            "users_failed": 0,
+            "points_processed": 0,
+            "locations_saved": 0,
+        }
+        logger.info(
+            f"Анализ дома/работы (шард {shard_index}/{shard_count}): "
+            f"{len(users)} пользователей с новыми данными, воркеров: {self.max_workers}"
+        )
+
+        started = time.monotonic()
+        max_in_flight = self.max_workers * 2
+        batches = self._batches(users)
+        in_flight: Set[Future] = set()
+
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.database_url,),
+        ) as executor:
+            while True:
+                while len(in_flight) < max_in_flight:
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    in_flight.add(executor.submit(_analyze_batch, batch))
+
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    if result["status"] == "done":
+                        stats["users_processed"] += result["users"]
+                    else:
+                        stats["users_failed"] += result["users"]
+                    stats["points_processed"] += result["points_processed"]
+                    stats["locations_saved"] += result["locations_saved"]
+
+                    completed = stats["users_processed"] + stats["users_failed"]
+                    elapsed = max(time.monotonic() - started, 1e-9)
+                    logger.info(
+                        f"Дом/работа: {completed}/{len(users)} пользователей, "
+                        f"{completed / elapsed:.1f} польз./с, "
+                        f"{stats['points_processed'] / elapsed:.0f} точек/с, "
+                        f"в очереди {len(users) - completed}"
+                    )
+                    if progress_callback:
+                        progress_callback(completed, len(users), stats)
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["users_per_second"] = round(stats["users_processed"] / elapsed, 3)
+        stats["points_per_second"] = round(stats["points_processed"] / elapsed, 3)
+        # Неудачные пачки остаются в очереди до следующего запуска
+        stats["backlog"] = stats["users_failed"]
+        logger.info(f"Анализ дома/работы завершён: {stats}")
+        return stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Плановый анализ дома/работы по всем пользователям")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None, help="Пользователей в одной пачке")
+    parser.add_argument("--shard-index", type=int, default=0)
+    parser.add_argument("--shard-count", type=int, default=1)
+    args = parser.parse_args()
+
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index должен быть в диапазоне [0, shard-count)")
+
+    setup_logging()
+    db = SessionLocal()
+    try:
+        job = HomeWorkAnalysisJob(db, max_workers=args.workers, batch_size=args.batch_size)
+        job.run(shard_index=args.shard_index, shard_count=args.shard_count)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
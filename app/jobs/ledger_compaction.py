@@ -0,0 +1,164 @@
+"""
+Сворачивание журнала валюты в снимки балансов.
+
+Для каждого счёта записи журнала после snapshot_entry_id прибавляются к
+снимку (user_currency.coins/gems), snapshot_entry_id сдвигается на последнюю
+свёрнутую запись. Так хвост, который LedgerService суммирует при чтении
+баланса, остаётся коротким. Счета обрабатываются пачками по ID, пачка - один
+UPDATE ... FROM (агрегат хвоста) в своей транзакции; UPDATE применяется
+только если снимок не сдвинули параллельно.
+
+Записи моложе currency_ledger_snapshot_lag_seconds не сворачиваются: ID
+выдаются до коммита, и более ранняя запись может стать видимой позже.
+
+Запуск:
+    python -m app.jobs.ledger_compaction                # один проход (cron)
+    python -m app.jobs.ledger_compaction --interval 300  # периодически
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.marketplace import CurrencyTransaction, UserCurrency
+from app.services.ledger import CURRENCY_TYPES
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class LedgerCompaction:
+    """Пакетное обновление снимков балансов."""
+
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        """Инициализация задачи."""
+        self.db = db
+        self.batch_size = batch_size or settings.currency_ledger_batch_size
+
+    def _horizon_entry_id(self, cutoff: datetime) -> Optional[int]:
+        """Последняя запись журнала старше защитного интервала."""
+        entries = CurrencyTransaction.__table__
+        # Обход по первичному ключу с конца: читаются только записи моложе cutoff
+        return self.db.execute(
+            select(entries.c.id)
+            .where(entries.c.created_at <= cutoff)
+            .order_by(entries.c.id.desc())
+            .limit(1)
+        ).scalar()
+
+    def _compact_batch(self, account_ids: List[int], horizon_id: int, now: datetime) -> int:
+        """Свернуть хвосты журнала счетов пачки; вернуть число обновлённых снимков."""
+        currency = UserCurrency.__table__
+        entries = CurrencyTransaction.__table__
+        tail = (
+            select(
+                entries.c.user_currency_id,
+                currency.c.snapshot_entry_id.label("previous_entry_id"),
+                func.max(entries.c.id).label("last_entry_id"),
+                *[
+                    func.coalesce(
+                        func.sum(entries.c.amount).filter(entries.c.currency_type == currency_type), 0
+                    ).label(currency_type)
+                    for currency_type in CURRENCY_TYPES
+                ],
+            )
+            .select_from(
+                entries.join(
+                    currency,
+                    and_(
+                        currency.c.id == entries.c.user_currency_id,
+                        entries.c.id > currency.c.snapshot_entry_id,
+                    ),
+                )
+            )
+            .where(currency.c.id.in_(account_ids), entries.c.id <= horizon_id)
+            .group_by(entries.c.user_currency_id, currency.c.snapshot_entry_id)
+            .cte("tail")
+        )
+        result = self.db.execute(
+            currency.update()
+            .where(
+                currency.c.id == tail.c.user_currency_id,
+                # Снимок сдвинут параллельным запуском - хвост посчитан от старой границы
+                currency.c.snapshot_entry_id == tail.c.previous_entry_id,
+            )
+            .values(
+                coins=currency.c.coins + tail.c.coins,
+                gems=currency.c.gems + tail.c.gems,
+                snapshot_entry_id=tail.c.last_entry_id,
+                snapshot_at=now,
+            )
+        )
+        self.db.commit()
+        return result.rowcount
+
+    def run(self) -> Dict[str, Any]:
+        """Обновить снимки всех счетов."""
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        stats: Dict[str, Any] = {"accounts": 0, "snapshots_updated": 0}
+        horizon_id = self._horizon_entry_id(now - timedelta(seconds=settings.currency_ledger_snapshot_lag_seconds))
+        if horizon_id is None:
+            return stats
+
+        currency = UserCurrency.__table__
+        last_account_id = 0
+        try:
+            while True:
+                account_ids = self.db.execute(
+                    select(currency.c.id)
+                    .where(currency.c.id > last_account_id)
+                    .order_by(currency.c.id)
+                    .limit(self.batch_size)
+                ).scalars().all()
+                if not account_ids:
+                    break
+
+                stats["snapshots_updated"] += self._compact_batch(account_ids, horizon_id, now)
+                stats["accounts"] += len(account_ids)
+                last_account_id = account_ids[-1]
+        except Exception:
+            self.db.rollback()
+            raise
+
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(f"Сворачивание журнала валюты: {stats}")
+        return stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Сворачивание журнала валюты в снимки балансов")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument(
+        "--interval", type=float, default=None, help="Повторять каждые N секунд (без флага - один проход)"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    while True:
+        db = SessionLocal()
+        try:
+            LedgerCompaction(db, batch_size=args.batch_size).run()
+        except Exception:
+            if args.interval is None:
+                raise
+            logger.exception("Ошибка при сворачивании журнала валюты")
+        finally:
+            db.close()
+
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Сверка снимков балансов с журналом валюты.
+
+Для каждого счёта снимок (user_currency.coins/gems) сравнивается с суммой
+записей журнала до snapshot_entry_id включительно, а текущий баланс
+проверяется на отрицательность. Счета обрабатываются пачками по ID, сумма
+пачки считается одним агрегатом по индексу (user_currency_id, id).
+С --fix расходящийся снимок заменяется суммой журнала (журнал - источник
+истины).
+
+Запуск:
+    python -m app.jobs.ledger_reconciliation
+    python -m app.jobs.ledger_reconciliation --fix
+"""
+import argparse
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.marketplace import CurrencyTransaction, UserCurrency
+from app.services.ledger import CURRENCY_TYPES
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class LedgerReconciliation:
+    """Сверка снимков балансов с журналом."""
+
+    def __init__(self, db: Session, batch_size: Optional[int] = None, fix: bool = False):
+        """Инициализация задачи."""
+        self.db = db
+        self.batch_size = batch_size or settings.currency_ledger_batch_size
+        self.fix = fix
+
+    def _check_batch(self, after_id: int) -> List[Row]:
+        """Снимки и суммы журнала для пачки счетов после after_id."""
+        currency = UserCurrency.__table__
+        entries = CurrencyTransaction.__table__
+        accounts = (
+            select(currency)
+            .where(currency.c.id > after_id)
+            .order_by(currency.c.id)
+            .limit(self.batch_size)
+            .subquery()
+        )
+        sums = []
+        for currency_type in CURRENCY_TYPES:
+            of_type = entries.c.currency_type == currency_type
+            sums.append(
+                func.coalesce(
+                    func.sum(entries.c.amount).filter(of_type, entries.c.id <= accounts.c.snapshot_entry_id), 0
+                ).label(f"ledger_{currency_type}")
+            )
+            sums.append(
+                (
+                    getattr(accounts.c, currency_type)
+                    + func.coalesce(
+                        func.sum(entries.c.amount).filter(of_type, entries.c.id > accounts.c.snapshot_entry_id), 0
+                    )
+                ).label(f"balance_{currency_type}")
+            )
+        return self.db.execute(
+            select(
+                accounts.c.id,
+                accounts.c.user_id,
+                accounts.c.coins,
+                accounts.c.gems,
+                accounts.c.snapshot_entry_id,
+                *sums,
+            )
+            .select_from(accounts.outerjoin(entries, entries.c.user_currency_id == accounts.c.id))
+            .group_by(
+                accounts.c.id,
+                accounts.c.user_id,
+                accounts.c.coins,
+                accounts.c.gems,
+                accounts.c.snapshot_entry_id,
+            )
+            .order_by(accounts.c.id)
+        ).all()
+
+    def _fix_snapshot(self, row: Row) -> bool:
+        """Заменить снимок суммой журнала, если снимок не сдвинули с момента проверки."""
+        currency = UserCurrency.__table__
+        result = self.db.execute(
+            currency.update()
+            .where(
+                and_(
+                    currency.c.id == row.id,
+                    currency.c.snapshot_entry_id == row.snapshot_entry_id,
+                )
+            )
+            .values(coins=row.ledger_coins, gems=row.ledger_gems)
+        )
+        return result.rowcount == 1
+
+    def run(self) -> Dict[str, Any]:
+        """Сверить все счета."""
+        started = time.monotonic()
+        stats: Dict[str, Any] = {"accounts": 0, "mismatched": 0, "negative": 0, "fixed": 0}
+        last_account_id = 0
+        try:
+            while True:
+                rows = self._check_batch(last_account_id)
+                if not rows:
+                    break
+
+                for row in rows:
+                    mismatched = [
+                        currency_type
+                        for currency_type in CURRENCY_TYPES
+                        if getattr(row, currency_type) != getattr(row, f"ledger_{currency_type}")
+                    ]
+                    if mismatched:
+                        stats["mismatched"] += 1
+                        logger.warning(
+                            f"Снимок баланса user_id={row.user_id} расходится с журналом: "
+                            f"coins {row.coins} != {row.ledger_coins}, gems {row.gems} != {row.ledger_gems}"
+                        )
+                        if self.fix and self._fix_snapshot(row):
+                            stats["fixed"] += 1
+                    if any(getattr(row, f"balance_{currency_type}") < 0 for currency_type in CURRENCY_TYPES):
+                        stats["negative"] += 1
+                        logger.warning(
+                            f"Отрицательный баланс user_id={row.user_id}: "
+                            f"coins={row.balance_coins}, gems={row.balance_gems}"
+                        )
+
+                if self.fix:
+                    self.db.commit()
+                else:
+                    self.db.rollback()
+                stats["accounts"] += len(rows)
+                last_account_id = rows[-1].id
+        except Exception:
+            self.db.rollback()
+            raise
+
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(f"Сверка журнала валюты: {stats}")
+        return stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Сверка снимков балансов с журналом валюты")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--fix", action="store_true", help="Заменить расходящиеся снимки суммой журнала")
+    args = parser.parse_args()
+
+    setup_logging()
+    db = SessionLocal()
+    try:
+        stats = LedgerReconciliation(db, batch_size=args.batch_size, fix=args.fix).run()
+    finally:
+        db.close()
+    if stats["mismatched"] > stats["fixed"] or stats["negative"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Снятие истекших объявлений торговой площадки.
+
+Активные объявления с expires_at в прошлом переводятся в EXPIRED пачками:
+каждая пачка - один UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP
+LOCKED) RETURNING по частичному индексу активных объявлений и отдельная
+транзакция, поэтому объявления, которые прямо сейчас покупают, пропускаются
+и не блокируют задачу. После работы задачи пути чтения не проверяют
+expires_at.
+
+Кэш минимальной цены (listing_search) живёт в памяти процессов API, задача
+его не видит: истекшее объявление с минимальной ценой уходит из
+/marketplace/floor-price только по истечении
+marketplace_floor_price_cache_ttl_seconds.
+
+Запуск:
+    python -m app.jobs.listing_expiry                # один проход (cron)
+    python -m app.jobs.listing_expiry --interval 60  # периодически
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.marketplace import ListingSearch, ListingStatus, MarketplaceListing
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class ListingExpirySweeper:
+    """Пакетное снятие истекших объявлений."""
+
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        """Инициализация задачи."""
+        self.db = db
+        self.batch_size = batch_size or settings.marketplace_expiry_batch_size
+
+    def _expire_batch(self, now: datetime) -> int:
+        """Перевести в EXPIRED одну пачку истекших объявлений."""
+        listings = MarketplaceListing.__table__
+        batch = (
+            select(listings.c.id)
+            .where(listings.c.status == ListingStatus.ACTIVE, listings.c.expires_at <= now)
+            .order_by(listings.c.expires_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        expired = self.db.execute(
+            listings.update()
+            .where(listings.c.id.in_(batch.scalar_subquery()))
+            .values(status=ListingStatus.EXPIRED, updated_at=now)
+            .returning(listings.c.id)
+        ).scalars().all()
+        if not expired:
+            return 0
+
+        search = ListingSearch.__table__
+        self.db.execute(
+            search.update()
+            .where(search.c.id.in_(expired))
+            .values(status=ListingStatus.EXPIRED)
+        )
+        self.db.commit()
+        return len(expired)
+
+    def run(self) -> Dict[str, Any]:
+        """Снять все истекшие на момент запуска объявления."""
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        stats: Dict[str, Any] = {"expired": 0, "batches": 0}
+        try:
+            while True:
+                expired = self._expire_batch(now)
+                if not expired:
+                    break
+                stats["expired"] += expired
+                stats["batches"] += 1
+        except Exception:
+            self.db.rollback()
+            raise
+
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        if stats["expired"]:
+            logger.info(f"Снятие истекших объявлений: {stats}")
+        return stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Снятие истекших объявлений торговой площадки")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument(
+        "--interval", type=float, default=None, help="Повторять каждые N секунд (без флага - один проход)"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    while True:
+        db = SessionLocal()
+        try:
+            ListingExpirySweeper(db, batch_size=args.batch_size).run()
+        except Exception:
+            if args.interval is None:
+                raise
+            logger.exception("Ошибка при снятии истекших объявлений")
+        finally:
+            db.close()
+
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Инкрементальная агрегация сделок торговой площадки.
+
+Завершённые сделки сворачиваются в market_price_rollups - OHLC цены за
+единицу, объём и число сделок по предмету за час и за сутки. Обработанная
+граница хранится водяным знаком (последний ID сделки) в rollup_watermarks,
+поэтому каждый запуск читает только новые сделки. Пачка сделок агрегируется
+в SQL и дописывается в бакеты одним INSERT ... ON CONFLICT DO UPDATE на
+период; пачка и сдвиг водяного знака фиксируются одной транзакцией.
+
+Сделки моложе market_rollup_safety_lag_seconds не берутся: ID выдаются до
+коммита, и более ранняя сделка может стать видимой позже более поздней.
+
+Запуск:
+    python -m app.jobs.market_rollups                # один проход (cron)
+    python -m app.jobs.market_rollups --interval 60  # периодически
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Float, case, cast, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import Insert, aggregate_order_by, insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.marketplace import MarketPriceRollup, RollupWatermark, Transaction, TransactionStatus
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = "market_price_rollups"
+PERIODS = ("hour", "day")
+
+
+class MarketRollupJob:
+    """Свёртка новых сделок в агрегаты цен."""
+
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        """Инициализация задачи."""
+        self.db = db
+        self.batch_size = batch_size or settings.market_rollup_batch_size
+
+    def _lock_watermark(self) -> int:
+        """Заблокировать водяной знак (один экземпляр задачи за раз) и вернуть его."""
+        watermarks = RollupWatermark.__table__
+        self.db.execute(
+            pg_insert(watermarks)
+            .values(name=WATERMARK_NAME, last_id=0, updated_at=datetime.now(timezone.utc))
+            .on_conflict_do_nothing(index_elements=[watermarks.c.name])
+        )
+        return self.db.execute(
+            select(watermarks.c.last_id).where(watermarks.c.name == WATERMARK_NAME).with_for_update()
+        ).scalar_one()
+
+    def _rollup_statement(self, period: str, after_id: int, up_to_id: int) -> Insert:
+        """INSERT ... SELECT агрегатов пачки сделок (after_id, up_to_id] за период."""
+        trades = Transaction.__table__
+        rollups = MarketPriceRollup.__table__
+        unit_price = cast(trades.c.price, Float) / trades.c.quantity
+        # Период подставляется литералом: с параметром PostgreSQL не считает
+        # date_trunc в SELECT и GROUP BY одним выражением
+        period_literal = literal_column(f"'{period}'")
+        bucket_start = func.date_trunc(period_literal, trades.c.completed_at)
+        aggregated = (
+            select(
+                trades.c.listing_type,
+                trades.c.item_id,
+                period_literal,
+                bucket_start,
+                func.array_agg(aggregate_order_by(unit_price, trades.c.id.asc()))[1],
+                func.max(unit_price),
+                func.min(unit_price),
+                func.array_agg(aggregate_order_by(unit_price, trades.c.id.desc()))[1],
+                func.sum(trades.c.quantity),
+                func.sum(trades.c.price),
+                func.count(),
+                func.min(trades.c.id),
+                func.max(trades.c.id),
+                trades.c.company_id,
+                func.now(),
+            )
+            .where(
+                trades.c.id > after_id,
+                trades.c.id <= up_to_id,
+                trades.c.status == TransactionStatus.COMPLETED,
+            )
+            .group_by(
+                trades.c.company_id,
+                trades.c.listing_type,
+                trades.c.item_id,
+                bucket_start,
+            )
+        )
+        statement = pg_insert(rollups).from_select(
+            [
+                "listing_type", "item_id", "period", "bucket_start",
+                "open_price", "high_price", "low_price", "close_price",
+                "volume", "turnover", "trade_count", "first_trade_id", "last_trade_id",
+                "company_id", "updated_at",
+            ],
+            aggregated,
+        )
+        excluded = statement.excluded
+        return statement.on_conflict_do_update(
+            index_elements=[
+                rollups.c.listing_type,
+                rollups.c.item_id,
+                rollups.c.period,
+                text("COALESCE(company_id, 0)"),
+                rollups.c.bucket_start,
+            ],
+            set_={
+                # open - от самой ранней сделки бакета, close - от самой поздней
+                "open_price": case(
+                    (excluded.first_trade_id < rollups.c.first_trade_id, excluded.open_price),
+                    else_=rollups.c.open_price,
+                ),
+                "close_price": case(
+                    (excluded.last_trade_id > rollups.c.last_trade_id, excluded.close_price),
+                    else_=rollups.c.close_price,
+                ),
+                "high_price": func.greatest(rollups.c.high_price, excluded.high_price),
+                "low_price": func.least(rollups.c.low_price, excluded.low_price),
+                "volume": rollups.c.volume + excluded.volume,
+                "turnover": rollups.c.turnover + excluded.turnover,
+                "trade_count": rollups.c.trade_count + excluded.trade_count,
+                "first_trade_id": func.least(rollups.c.first_trade_id, excluded.first_trade_id),
+                "last_trade_id": func.greatest(rollups.c.last_trade_id, excluded.last_trade_id),
+                "updated_at": excluded.updated_at,
+            },
+        )
+
+    def _process_batch(self, cutoff: datetime) -> int:
+        """Свернуть одну пачку новых сделок; вернуть число сделок."""
+        after_id = self._lock_watermark()
+        trades = Transaction.__table__
+        batch = (
+            select(trades.c.id)
+            .where(trades.c.id > after_id, trades.c.created_at <= cutoff)
+            .order_by(trades.c.id)
+            .limit(self.batch_size)
+            .subquery()
+        )
+        up_to_id, count = self.db.execute(select(func.max(batch.c.id), func.count())).one()
+        if not count:
+            self.db.rollback()
+            return 0
+
+        for period in PERIODS:
+            self.db.execute(self._rollup_statement(period, after_id, up_to_id))
+
+        watermarks = RollupWatermark.__table__
+        self.db.execute(
+            watermarks.update()
+            .where(watermarks.c.name == WATERMARK_NAME)
+            .values(last_id=up_to_id, updated_at=datetime.now(timezone.utc))
+        )
+        self.db.commit()
+        return count
+
+    def run(self) -> Dict[str, Any]:
+        """Свернуть все сделки старше защитного интервала."""
+        started = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.market_rollup_safety_lag_seconds)
+        stats: Dict[str, Any] = {"trades": 0, "batches": 0}
+        try:
+            while True:
+                processed = self._process_batch(cutoff)
+                if not processed:
+                    break
+                stats["trades"] += processed
+                stats["batches"] += 1
+        except Exception:
+            self.db.rollback()
+            raise
+
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        if stats["trades"]:
+            logger.info(f"Агрегация сделок: {stats}")
+        return stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Инкрементальная агрегация сделок торговой площадки")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument(
+        "--interval", type=float, default=None, help="Повторять каждые N секунд (без флага - один проход)"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    while True:
+        db = SessionLocal()
+        try:
+            MarketRollupJob(db, batch_size=args.batch_size).run()
+        except Exception:
+            if args.interval is None:
+                raise
+            logger.exception("Ошибка при агрегации сделок")
+        finally:
+            db.close()
+
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
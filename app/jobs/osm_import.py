@@ -0,0 +1,357 @@
+"""
+Импорт площадных объектов OSM из локального .osm.pbf в таблицу osm_features.
+
+Файл читается потоково через pyosmium, координаты узлов кэшируются на диске
+(индекс dense_file_array/sparse_file_array), поэтому память не зависит от
+размера выгрузки. Полигоны и мультиполигоны собираются из ways и relations,
+пачками загружаются через COPY во временную таблицу и переносятся в
+osm_features с геодезической площадью area_m2.
+
+Повторный импорт инкрементальный: diff-файл (.osc/.osc.gz) применяется к
+базовой выгрузке, пересобираются только затронутые объекты (включая
+мультиполигоны, у которых изменился или удалён way-участник), удалённые
+объекты удаляются из osm_features.
+
+Запуск:
+    python -m app.jobs.osm_import russia-latest.osm.pbf --node-cache /data/nodes.cache
+    python -m app.jobs.osm_import russia-latest.osm.pbf --diff 1234.osc.gz --output russia-updated.osm.pbf
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy.engine import Engine
+
+from app.core.config import get_settings
+from app.services.area_poi_generator import OSM_TAG_MAPPING
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Пары (ключ, значение) тегов, нужные генератору Area POI
+IMPORTED_TAGS: Set[Tuple[str, str]] = {tag for tags in OSM_TAG_MAPPING.values() for tag in tags}
+
+STAGING_COLUMNS = ("osm_type", "osm_id", "name", "tags", "wkb")
+
+_CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS osm_features_staging (
+        osm_type char(1) NOT NULL,
+        osm_id bigint NOT NULL,
+        name text,
+        tags jsonb NOT NULL,
+        wkb text NOT NULL
+    ) ON COMMIT DELETE ROWS
+"""
+
+# Площадь считается один раз при импорте, генератор читает готовую area_m2
+_MERGE_STAGING_SQL = """
+    INSERT INTO osm_features (osm_type, osm_id, name, tags, geometry, area_m2, updated_at)
+    SELECT DISTINCT ON (osm_type, osm_id)
+        osm_type,
+        osm_id,
+        name,
+        tags,
+        geom,
+        ST_Area(geom::geography),
+        now()
+    FROM (
+        SELECT
+            osm_type,
+            osm_id,
+            name,
+            tags,
+            ST_Multi(ST_MakeValid(ST_GeomFromWKB(decode(wkb, 'hex'), 4326))) AS geom
+        FROM osm_features_staging
+    ) AS staged
+    WHERE GeometryType(geom) = 'MULTIPOLYGON'
+    ON CONFLICT (osm_type, osm_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        tags = EXCLUDED.tags,
+        geometry = EXCLUDED.geometry,
+        area_m2 = EXCLUDED.area_m2,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def _load_osmium() -> Any:
+    """Импортировать pyosmium (нужен только для импорта OSM)."""
+    try:
+        import osmium
+    except ImportError as e:
+        raise RuntimeError("Для импорта OSM установите pyosmium: pip install osmium") from e
+    return osmium
+
+
+class OSMFeatureWriter:
+    """Пакетная загрузка собранных объектов в osm_features через COPY."""
+
+    def __init__(self, engine: Engine, batch_size: int = 10000):
+        """Инициализация загрузчика."""
+        self.connection = engine.raw_connection()
+        self.batch_size = batch_size
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.buffered = 0
+        self.written = 0
+        with self.connection.cursor() as cursor:
+            cursor.execute(_CREATE_STAGING_SQL)
+        self.connection.commit()
+
+    def add(self, osm_type: str, osm_id: int, name: Optional[str], tags: Dict[str, str], wkb: str) -> None:
+        """Добавить объект в буфер; при заполнении буфер сбрасывается в БД."""
+        self.writer.writerow((osm_type, osm_id, name, json.dumps(tags, ensure_ascii=False), wkb))
+        self.buffered += 1
+        if self.buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Загрузить буфер через COPY и перенести в osm_features одним запросом."""
+        if not self.buffered:
+            return
+        self.buffer.seek(0)
+        with self.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY osm_features_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                self.buffer,
+            )
+            cursor.execute(_MERGE_STAGING_SQL)
+        self.connection.commit()
+
+        self.written += self.buffered
+        logger.info(f"Загружено объектов OSM: {self.written}")
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.buffered = 0
+
+    def delete(self, ids: Set[Tuple[str, int]]) -> int:
+        """Удалить объекты из osm_features."""
+        if not ids:
+            return 0
+        osm_types, osm_ids = zip(*ids)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                """
+                DELETE FROM osm_features AS f
+                USING unnest(%s::char(1)[], %s::bigint[]) AS d(osm_type, osm_id)
+                WHERE f.osm_type = d.osm_type AND f.osm_id = d.osm_id
+                """,
+                (list(osm_types), list(osm_ids)),
+            )
+            deleted = cursor.rowcount
+        self.connection.commit()
+        return deleted
+
+    def close(self) -> None:
+        """Сбросить остаток буфера и закрыть соединение."""
+        try:
+            self.flush()
+        finally:
+            self.connection.close()
+
+
+def _collect_diff_ids(osmium: Any, diff_path: str) -> Dict[str, Set[int]]:
+    """Собрать ID объектов, изменённых и удалённых в diff-файле."""
+    changes: Dict[str, Set[int]] = {
+        "nodes": set(),
+        "ways": set(),
+        "relations": set(),
+        "deleted_ways": set(),
+        "deleted_relations": set(),
+    }
+
+    class DiffCollector(osmium.SimpleHandler):
+        def node(self, n: Any) -> None:
+            changes["nodes"].add(n.id)
+
+        def way(self, w: Any) -> None:
+            changes["deleted_ways" if w.deleted else "ways"].add(w.id)
+
+        def relation(self, r: Any) -> None:
+            changes["deleted_relations" if r.deleted else "relations"].add(r.id)
+
+    DiffCollector().apply_file(diff_path)
+    return changes
+
+
+def _collect_member_relations(osmium: Any, path: str, way_ids: Set[int]) -> Set[int]:
+    """
+    Собрать ID отношений, в которые входит хотя бы один из ways.
+
+    Мультиполигон меняется вместе с составом узлов своего way, даже если
+    само отношение в diff не попало.
+    """
+    relation_ids: Set[int] = set()
+    if not way_ids:
+        return relation_ids
+
+    class MemberCollector(osmium.SimpleHandler):
+        def relation(self, r: Any) -> None:
+            if any(member.type == "w" and member.ref in way_ids for member in r.members):
+                relation_ids.add(r.id)
+
+    MemberCollector().apply_file(path)
+    return relation_ids
+
+
+class OSMImporter:
+    """Импорт площадных объектов OSM из .osm.pbf."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        node_cache_path: Optional[str] = None,
+        index_type: str = "dense_file_array",
+        batch_size: int = 10000,
+    ):
+        """Инициализация импортёра."""
+        self.engine = engine
+        self.node_cache_path = node_cache_path or os.path.join(tempfile.gettempdir(), "osm_nodes.cache")
+        self.index_type = index_type
+        self.batch_size = batch_size
+        self.osmium = _load_osmium()
+
+    def _make_area_handler(self, writer: OSMFeatureWriter, changes: Optional[Dict[str, Set[int]]] = None) -> Any:
+        """Создать обработчик площадей; при changes пропускаются незатронутые объекты."""
+        osmium = self.osmium
+        wkb_factory = osmium.geom.WKBFactory()
+        emitted: Set[Tuple[str, int]] = set()
+        stats = {"areas": 0, "skipped": 0, "invalid": 0}
+
+        def is_touched(area: Any, osm_type: str, osm_id: int) -> bool:
+            if osm_id in changes["ways" if osm_type == "w" else "relations"]:
+                return True
+            # Геометрия меняется и при перемещении узлов
+            for ring in area.outer_rings():
+                if any(node.ref in changes["nodes"] for node in ring):
+                    return True
+                for inner in area.inner_rings(ring):
+                    if any(node.ref in changes["nodes"] for node in inner):
+                        return True
+            return False
+
+        class AreaHandler(osmium.SimpleHandler):
+            def area(self, area: Any) -> None:
+                if not any((tag.k, tag.v) in IMPORTED_TAGS for tag in area.tags):
+                    return
+                osm_type = "w" if area.from_way() else "r"
+                osm_id = area.orig_id()
+                if changes is not None and not is_touched(area, osm_type, osm_id):
+                    stats["skipped"] += 1
+                    return
+                try:
+                    wkb = wkb_factory.create_multipolygon(area)
+                except RuntimeError:
+                    stats["invalid"] += 1
+                    return
+
+                tags = {tag.k: tag.v for tag in area.tags}
+                writer.add(osm_type, osm_id, tags.get("name"), tags, wkb)
+                emitted.add((osm_type, osm_id))
+                stats["areas"] += 1
+
+        handler = AreaHandler()
+        handler.emitted = emitted
+        handler.stats = stats
+        return handler
+
+    def _apply(self, handler: Any, path: str) -> None:
+        """Прочитать файл с кэшем координат узлов на диске."""
+        handler.apply_file(path, locations=True, idx=f"{self.index_type},{self.node_cache_path}")
+
+    def import_file(self, pbf_path: str) -> Dict[str, int]:
+        """Полный импорт выгрузки."""
+        writer = OSMFeatureWriter(self.engine, self.batch_size)
+        handler = self._make_area_handler(writer)
+        try:
+            self._apply(handler, pbf_path)
+        finally:
+            writer.close()
+        logger.info(f"Импорт {pbf_path} завершён: {handler.stats}")
+        return dict(handler.stats)
+
+    def apply_diff(self, base_path: str, diff_path: str, output_path: str) -> Dict[str, int]:
+        """
+        Инкрементальный импорт из diff-файла.
+
+        Diff применяется к базовой выгрузке (результат записывается в output_path
+        и служит базой для следующего diff), затем пересобираются только
+        затронутые объекты. Объекты, удалённые или переставшие быть нужными
+        площадями, удаляются из osm_features.
+        """
+        osmium = self.osmium
+        changes = _collect_diff_ids(osmium, diff_path)
+
+        merger = osmium.MergeInputReader()
+        merger.add_file(diff_path)
+        reader = osmium.io.Reader(base_path)
+        writer = osmium.io.Writer(output_path, overwrite=True)
+        try:
+            merger.apply_to_reader(reader, writer)
+        finally:
+            writer.close()
+            reader.close()
+        # Отношения, участники которых изменились или удалены, пересобираются целиком
+        changes["relations"] |= _collect_member_relations(
+            osmium, output_path, changes["ways"] | changes["deleted_ways"]
+        )
+
+        feature_writer = OSMFeatureWriter(self.engine, self.batch_size)
+        handler = self._make_area_handler(feature_writer, changes)
+        try:
+            self._apply(handler, output_path)
+            feature_writer.flush()
+            touched = (
+                {("w", way_id) for way_id in changes["ways"] | changes["deleted_ways"]}
+                | {("r", rel_id) for rel_id in changes["relations"] | changes["deleted_relations"]}
+            )
+            deleted = feature_writer.delete(touched - handler.emitted)
+        finally:
+            feature_writer.close()
+
+        stats = dict(handler.stats)
+        stats["deleted"] = deleted
+        logger.info(f"Diff {diff_path} применён: {stats}")
+        return stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import engine
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Импорт площадных объектов OSM в osm_features")
+    parser.add_argument("pbf", help="Путь к .osm.pbf (при --diff - базовая выгрузка)")
+    parser.add_argument("--diff", default=None, help="Diff-файл .osc/.osc.gz для инкрементального импорта")
+    parser.add_argument("--output", default=None, help="Куда записать обновлённую выгрузку (для --diff)")
+    parser.add_argument("--node-cache", default=None, help="Файл кэша координат узлов")
+    parser.add_argument(
+        "--index-type",
+        default="dense_file_array",
+        choices=["dense_file_array", "sparse_file_array"],
+        help="dense_file_array для крупных выгрузок, sparse_file_array для небольших",
+    )
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    setup_logging()
+    importer = OSMImporter(
+        engine,
+        node_cache_path=args.node_cache,
+        index_type=args.index_type,
+        batch_size=args.batch_size,
+    )
+    if args.diff:
+        if not args.output:
+            parser.error("--output обязателен вместе с --diff")
+        importer.apply_diff(args.pbf, args.diff, args.output)
+    else:
+        importer.import_file(args.pbf)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Точный пересчёт очков рейтингов игроков.
+
+Инкрементальные очки (app.services.player_leaderboard) могут разойтись с
+историей: точки офлайн-синхронизации и точки не по порядку времени, события
+мимо PlayerLeaderboardService.record. Задача пересчитывает по истории очки
+областей global, company:{id} и geozone:{id} (посещения и открытия) пачками
+пользователей по ID и перезаписывает строки player_scores одним
+INSERT ... ON CONFLICT на пачку. Ячейки сетки и сезоны ведутся только
+инкрементально. Перед пересчётом строки, шард которых не совпадает с
+user_id % player_leaderboard_shards (после изменения настройки),
+переносятся в свой шард. В конце перестраиваются общие рейтинги в Redis.
+
+Запуск:
+    python -m app.jobs.player_score_recompute                   # один проход (cron)
+    python -m app.jobs.player_score_recompute --interval 3600   # периодически
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.geozone import AreaDiscovery, GeozoneVisit
+from app.models.leaderboard import LeaderboardMetric, PlayerScore
+from app.models.marketplace import CurrencyTransaction, UserCurrency
+from app.models.user import User
+from app.services.achievement_rules import AchievementRuleEngine
+from app.services.player_leaderboard import (
+    GLOBAL_SCOPE,
+    PlayerLeaderboardService,
+    company_scope,
+    geozone_scope,
+    shard_of,
+)
+from app.services.sorted_sets import get_sorted_sets
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class PlayerScoreRecompute:
+    """Пакетный пересчёт очков рейтингов игроков."""
+
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        """Инициализация задачи."""
+        self.db = db
+        self.batch_size = batch_size or settings.player_score_recompute_batch_size
+
+    def _totals(self, user_ids: List[int]) -> Dict[LeaderboardMetric, Iterable[Tuple[int, Any]]]:
+        """Итоги пользователей пачки по каждому показателю: (user_id, значение)."""
+        distances = AchievementRuleEngine(self.db).distance_subquery(user_ids)
+        return {
+            LeaderboardMetric.XP: (
+                self.db.query(UserCurrency.user_id, func.sum(CurrencyTransaction.amount))
+                .join(CurrencyTransaction, CurrencyTransaction.user_currency_id == UserCurrency.id)
+                .filter(UserCurrency.user_id.in_(user_ids), CurrencyTransaction.transaction_type == "xp")
+                .group_by(UserCurrency.user_id)
+            ),
+            LeaderboardMetric.DISTANCE: self.db.query(distances.c.user_id, distances.c.distance),
+            LeaderboardMetric.VISITS: (
+                self.db.query(GeozoneVisit.user_id, func.count(GeozoneVisit.id))
+                .filter(GeozoneVisit.user_id.in_(user_ids))
+                .group_by(GeozoneVisit.user_id)
+            ),
+            LeaderboardMetric.DISCOVERIES: (
+                self.db.query(AreaDiscovery.user_id, func.count(AreaDiscovery.id))
+                .filter(AreaDiscovery.user_id.in_(user_ids))
+                .group_by(AreaDiscovery.user_id)
+            ),
+        }
+
+    def _geozone_totals(self, user_ids: List[int]) -> Dict[LeaderboardMetric, Iterable[Tuple[int, int, int]]]:
+        """Итоги пользователей пачки по геозонам: (user_id, geozone_id, значение)."""
+        return {
+            LeaderboardMetric.VISITS: (
+                self.db.query(GeozoneVisit.user_id, GeozoneVisit.geozone_id, func.count(GeozoneVisit.id))
+                .filter(GeozoneVisit.user_id.in_(user_ids))
+                .group_by(GeozoneVisit.user_id, GeozoneVisit.geozone_id)
+            ),
+            LeaderboardMetric.DISCOVERIES: (
+                self.db.query(AreaDiscovery.user_id, AreaDiscovery.geozone_id, func.count(AreaDiscovery.id))
+                .filter(AreaDiscovery.user_id.in_(user_ids))
+                .group_by(AreaDiscovery.user_id, AreaDiscovery.geozone_id)
+            ),
+        }
+
+    def _recompute_batch(
+        self, users: List[Tuple[int, Optional[int]]], now: datetime, touched: Set[Tuple[LeaderboardMetric, str]]
+    ) -> int:
+        """Перезаписать очки пачки пользователей; вернуть число строк."""
+        companies = dict(users)
+        user_ids = [user_id for user_id, _ in users]
+        rows: List[Dict[str, Any]] = []
+
+        def add(user_id: int, metric: LeaderboardMetric, scope: str, score: Any) -> None:
+            rows.append({
+                "user_id": user_id,
+                "metric": metric.value,
+                "scope": scope,
+                "score": float(score or 0),
+                "shard": shard_of(user_id),
+                "company_id": companies[user_id],
+                "created_at": now,
+                "updated_at": now,
+            })
+            touched.add((metric, scope))
+
+        for metric, totals in self._totals(user_ids).items():
+            for user_id, score in totals:
+                add(user_id, metric, GLOBAL_SCOPE, score)
+                if companies[user_id] is not None:
+                    add(user_id, metric, company_scope(companies[user_id]), score)
+        for metric, totals in self._geozone_totals(user_ids).items():
+            for user_id, geozone_id, score in totals:
+                add(user_id, metric, geozone_scope(geozone_id), score)
+        if not rows:
+            return 0
+
+        rows.sort(key=lambda row: (row["metric"], row["scope"], row["user_id"]))
+        table = PlayerScore.__table__
+        statement = pg_insert(table).values(rows)
+        self.db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.metric, table.c.scope, table.c.user_id],
+                set_={"score": statement.excluded.score, "shard": statement.excluded.shard, "updated_at": now},
+            )
+        )
+        return len(rows)
+
+    def _reshard(self, touched: Set[Tuple[LeaderboardMetric, str]]) -> int:
+        """Перенести строки в шард user_id % player_leaderboard_shards; вернуть число строк."""
+        table = PlayerScore.__table__
+        target = table.c.user_id % settings.player_leaderboard_shards
+        rows = self.db.execute(
+            table.update()
+            .where(table.c.shard != target)
+            .values(shard=target)
+            .returning(table.c.metric, table.c.scope)
+        ).all()
+        touched.update((LeaderboardMetric(row.metric), row.scope) for row in rows)
+        return len(rows)
+
+    def run(self) -> Dict[str, Any]:
+        """Пересчитать очки всех пользователей."""
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        stats: Dict[str, Any] = {"users": 0, "scores": 0, "resharded": 0, "rebuilt": 0}
+        touched: Set[Tuple[LeaderboardMetric, str]] = set()
+        last_user_id = 0
+        try:
+            stats["resharded"] = self._reshard(touched)
+            self.db.commit()
+
+            while True:
+                users = (
+                    self.db.query(User.id, User.company_id)
+                    .filter(User.id > last_user_id, User.deleted_at.is_(None))
+                    .order_by(User.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not users:
+                    break
+
+                stats["scores"] += self._recompute_batch([(row.id, row.company_id) for row in users], now, touched)
+                self.db.commit()
+                stats["users"] += len(users)
+                last_user_id = users[-1].id
+
+            # Рейтинги в памяти процесса задачи никто не читает - перестраиваются только общие
+            if get_sorted_sets().shared:
+                leaderboards = PlayerLeaderboardService(self.db)
+                for metric, scope in sorted(touched):
+                    leaderboards.rebuild(metric, scope)
+                stats["rebuilt"] = len(touched)
+        except Exception:
+            self.db.rollback()
+            raise
+
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(f"Пересчёт рейтингов игроков: {stats}")
+        return stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Точный пересчёт очков рейтингов игроков")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument(
+        "--interval", type=float, default=None, help="Повторять каждые N секунд (без флага - один проход)"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    while True:
+        db = SessionLocal()
+        try:
+            PlayerScoreRecompute(db, batch_size=args.batch_size).run()
+        except Exception:
+            if args.interval is None:
+                raise
+            logger.exception("Ошибка при пересчёте рейтингов игроков")
+        finally:
+            db.close()
+
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Массовый пересчёт прогресса квестов.
+
+Нужен при запуске события с новыми квестами или после изменения requirements:
+все квесты пользователей в статусе in_progress пересчитываются по
+кускам. Для куска прогресс считается одним агрегатным запросом
+(COUNT/SUM по geozone_visits, user_artifacts, user_achievements или
+расстояние по точкам), соединённым с user_quests; изменения прогресса,
+завершения и награды записываются пакетными запросами в транзакции куска.
+
+Запуск:
+    python -m app.jobs.quest_progress_recompute --quest-id 42
+    python -m app.jobs.quest_progress_recompute --event-id 7 --chunk-size 10000
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.achievement import UserAchievement
+from app.models.artifact import UserArtifact
+from app.models.event import Quest, QuestStatus, QuestType, UserQuest
+from app.models.geozone import GeozoneVisit
+from app.services.achievement_rules import AchievementRuleEngine
+from app.services.reward import RewardBundle, RewardService
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# (обработано квестов пользователей, всего, накопленная статистика)
+ProgressCallback = Callable[[int, int, Dict[str, Any]], None]
+
+# Тип квеста -> (ключ значения в progress, ключ порога в progress, ключ порога в requirements, порог по умолчанию)
+PROGRESS_KEYS: Dict[QuestType, Tuple[str, str, str, float]] = {
+    QuestType.VISIT_LOCATIONS: ("visited_count", "required_count", "count", 1),
+    QuestType.COLLECT_ARTIFACTS: ("collected_count", "required_count", "count", 1),
+    QuestType.TRAVEL_DISTANCE: ("distance_traveled", "required_distance", "distance_km", 0),
+    QuestType.COMPLETE_ACHIEVEMENTS: ("completed_count", "required_count", "count", 1),
+}
+
+
+def build_progress_updates(
+    quest_type: QuestType,
+    requirements: Optional[Dict[str, Any]],
+    rows: Iterable[Tuple[int, int, int, Any]],
+    now: datetime,
+) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """
+    Строки пакетного UPDATE прогресса по значениям метрики квеста.
+
+    Args:
+        rows: (id квеста пользователя, user_id, completion_count, значение метрики)
+
+    Returns:
+        (параметры UPDATE, ID пользователей, завершивших квест)
+    """
+    value_key, required_key, requirement_key, default_required = PROGRESS_KEYS[quest_type]
+    required = (requirements or {}).get(requirement_key, default_required)
+
+    updates: List[Dict[str, Any]] = []
+    completed_user_ids: List[int] = []
+    for user_quest_id, user_id, completion_count, value in rows:
+        value = float(value) if quest_type == QuestType.TRAVEL_DISTANCE else int(value)
+        is_completed = value >= required
+        updates.append({
+            "b_id": user_quest_id,
+            "progress": {value_key: value, required_key: required},
+            "status": QuestStatus.COMPLETED if is_completed else QuestStatus.IN_PROGRESS,
+            "completed_at": now if is_completed else None,
+            "completion_count": completion_count + 1 if is_completed else completion_count,
+            "updated_at": now,
+        })
+        if is_completed:
+            completed_user_ids.append(user_id)
+    return updates, completed_user_ids
+
+
+class QuestProgressRecompute:
+    """Пересчёт прогресса всех активных квестов пользователей для квеста."""
+
+    def __init__(self, db: Session, chunk_size: Optional[int] = None):
+        """Инициализация задачи."""
+        self.db = db
+        self.chunk_size = chunk_size or settings.quest_recompute_chunk_size
+
+    def _metric_subquery(self, quest: Quest, user_ids: List[int], company_id: Optional[int] = None):
+        """Подзапрос (user_id, value) с текущим значением метрики квеста для пользователей куска."""
+        requirements = quest.requirements or {}
+
+        if quest.quest_type == QuestType.VISIT_LOCATIONS:
+            geozone_ids = requirements.get("geozone_ids", [])
+            query = (
+                self.db.query(GeozoneVisit.user_id.label("user_id"), func.count(GeozoneVisit.id).label("value"))
+                .filter(GeozoneVisit.user_id.in_(user_ids))
+                .group_by(GeozoneVisit.user_id)
+            )
+            if geozone_ids:
+                query = query.filter(GeozoneVisit.geozone_id.in_(geozone_ids))
+            if company_id is not None:
+                query = query.filter(GeozoneVisit.company_id == company_id)
+            return query.subquery()
+
+        if quest.quest_type == QuestType.COLLECT_ARTIFACTS:
+            artifact_ids = requirements.get("artifact_ids", [])
+            if artifact_ids:
+                value = func.sum(UserArtifact.quantity)
+            else:
+                value = func.count(func.distinct(UserArtifact.artifact_id))
+            query = (
+                self.db.query(UserArtifact.user_id.label("user_id"), value.label("value"))
+                .filter(UserArtifact.user_id.in_(user_ids))
+                .group_by(UserArtifact.user_id)
+            )
+            if artifact_ids:
+                query = query.filter(UserArtifact.artifact_id.in_(artifact_ids))
+            if company_id is not None:
+                query = query.filter(UserArtifact.company_id == company_id)
+            return query.subquery()
+
+        if quest.quest_type == QuestType.COMPLETE_ACHIEVEMENTS:
+            achievement_ids = requirements.get("achievement_ids", [])
+            query = (
+                self.db.query(UserAchievement.user_id.label("user_id"), func.count(UserAchievement.id).label("value"))
+                .filter(UserAchievement.user_id.in_(user_ids))
+                .group_by(UserAchievement.user_id)
+            )
+            if achievement_ids:
+                query = query.filter(UserAchievement.achievement_id.in_(achievement_ids))
+            if company_id is not None:
+                query = query.filter(UserAchievement.company_id == company_id)
+            return query.subquery()
+
+        # TRAVEL_DISTANCE: метры по последовательным точкам
+        distances = AchievementRuleEngine(self.db).distance_subquery(user_ids, company_id)
+        return (
+            self.db.query(distances.c.user_id.label("user_id"), (distances.c.distance / 1000.0).label("value"))
+            .subquery()
+        )
+
+    def _next_chunk(self, quest_id: int, after_id: int, company_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Следующий кусок (id, user_id) активных квестов пользователей по возрастанию id."""
+        query = self.db.query(UserQuest.id, UserQuest.user_id).filter(
+            UserQuest.quest_id == quest_id,
+            UserQuest.status == QuestStatus.IN_PROGRESS,
+            UserQuest.id > after_id,
+        )
+        if company_id is not None:
+            query = query.filter(UserQuest.company_id == company_id)
+        return [tuple(row) for row in query.order_by(UserQuest.id).limit(self.chunk_size).all()]
+
+    def _recompute_chunk(
+        self,
+        quest: Quest,
+        chunk: List[Tuple[int, int]],
+        company_id: Optional[int] = None,
+    ) -> List[int]:
+        """
+        Пересчитать кусок квестов пользователей без коммита.
+
+        Returns:
+            ID пользователей, завершивших квест
+        """
+        user_ids = sorted({user_id for _, user_id in chunk})
+        metric = self._metric_subquery(quest, user_ids, company_id)
+        rows = (
+            self.db.query(
+                UserQuest.id,
+                UserQuest.user_id,
+                UserQuest.completion_count,
+                func.coalesce(metric.c.value, 0),
+            )
+            .outerjoin(metric, metric.c.user_id == UserQuest.user_id)
+            .filter(UserQuest.id.in_([user_quest_id for user_quest_id, _ in chunk]))
+            .all()
+        )
+
+        updates, completed_user_ids = build_progress_updates(
+            quest.quest_type, quest.requirements, rows, datetime.now(timezone.utc)
+        )
+
+        if updates:
+            table = UserQuest.__table__
+            self.db.execute(
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values(
+                    progress=bindparam("progress"),
+                    status=bindparam("status"),
+                    completed_at=bindparam("completed_at"),
+                    completion_count=bindparam("completion_count"),
+                    updated_at=bindparam("updated_at"),
+                ),
+                updates,
+            )
+        if completed_user_ids:
+            self._give_rewards(quest, completed_user_ids, company_id)
+        return completed_user_ids
+
+    def _give_rewards(self, quest: Quest, user_ids: List[int], company_id: Optional[int] = None) -> None:
+        """Выдать награды квеста пользователям куска пакетными запросами."""
+        bundle = RewardBundle.from_rewards(
+            quest.rewards,
+            source="quest",
+            source_id=quest.id,
+            description=f"Награда за квест: {quest.name}",
+        )
+        RewardService(self.db).grant_many(user_ids, bundle, company_id, commit=False)
+
+    def run_quest(
+        self,
+        quest: Quest,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> Dict[str, Any]:
+        """Пересчитать прогресс всех активных квестов пользователей для квеста."""
+        stats: Dict[str, Any] = {"quest_id": quest.id, "processed": 0, "completed": 0, "chunks_failed": 0}
+        if quest.quest_type not in PROGRESS_KEYS:
+            logger.info(f"Квест {quest.id} ({quest.quest_type}) не пересчитывается автоматически")
+            return stats
+
+        company_id = quest.company_id
+        total_query = self.db.query(func.count(UserQuest.id)).filter(
+            UserQuest.quest_id == quest.id,
+            UserQuest.status == QuestStatus.IN_PROGRESS,
+        )
+        if company_id is not None:
+            total_query = total_query.filter(UserQuest.company_id == company_id)
+        total = total_query.scalar() or 0
+        logger.info(f"Пересчёт квеста {quest.id} ({quest.name}): {total} активных квестов пользователей")
+
+        started = time.monotonic()
+        last_id = 0
+        while True:
+            chunk = self._next_chunk(quest.id, last_id, company_id)
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+
+            try:
+                completed_user_ids = self._recompute_chunk(quest, chunk, company_id)
+                self.db.commit()
+                stats["completed"] += len(completed_user_ids)
+            except Exception as e:
+                # Кусок остаётся в статусе in_progress и будет пересчитан при повторном запуске
+                self.db.rollback()
+                stats["chunks_failed"] += 1
+                logger.error(f"Ошибка пересчёта куска квеста {quest.id} после id {chunk[0][0]}: {e}", exc_info=True)
+
+            stats["processed"] += len(chunk)
+            elapsed = max(time.monotonic() - started, 1e-9)
+            logger.info(
+                f"Квест {quest.id}: {stats['processed']}/{total}, завершено {stats['completed']}, "
+                f"{stats['processed'] / elapsed:.0f} квестов/с"
+            )
+            if progress_callback:
+                progress_callback(stats["processed"], total, stats)
+
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        return stats
+
+    def run(
+        self,
+        quest_ids: Optional[List[int]] = None,
+        event_id: Optional[int] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Пересчитать прогресс указанных квестов или всех квестов события.
+
+        Returns:
+            Статистика по каждому квесту
+        """
+        query = self.db.query(Quest).filter(Quest.is_active.is_(True), Quest.deleted_at.is_(None))
+        if quest_ids:
+            query = query.filter(Quest.id.in_(quest_ids))
+        if event_id is not None:
+            query = query.filter(Quest.event_id == event_id)
+        quests = query.order_by(Quest.id).all()
+
+        results = [self.run_quest(quest, progress_callback) for quest in quests]
+        logger.info(f"Пересчёт прогресса квестов завершён: {results}")
+        return results
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+    from app.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Массовый пересчёт прогресса квестов")
+    parser.add_argument("--quest-id", type=int, action="append", dest="quest_ids", default=None)
+    parser.add_argument("--event-id", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=None, help="Квестов пользователей в одной транзакции")
+    args = parser.parse_args()
+
+    if not args.quest_ids and args.event_id is None:
+        parser.error("Нужно указать --quest-id или --event-id")
+
+    setup_logging()
+    db = SessionLocal()
+    try:
+        QuestProgressRecompute(db, chunk_size=args.chunk_size).run(quest_ids=args.quest_ids, event_id=args.event_id)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 """Главный файл приложения."""
 import logging
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
@@ -10,6 +11,7 @@ from slowapi.errors import RateLimitExceeded
 from app.api.v1.router import api_router
 from app.core.config import get_settings
 from app.core.logging_config import setup_logging
+from app.core.pagination import NEXT_CURSOR_HEADER, InvalidCursorError
 
 settings = get_settings()
 
@@ -30,6 +32,13 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+
+@app.exception_handler(InvalidCursorError)
+def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    """Некорректный курсор пагинации - ошибка клиента."""
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": str(exc)})
+
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +46,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 # Подключить роутеры
@@ -3,18 +3,22 @@ from app.models.achievement import Achievement, UserAchievement
 from app.models.geozone import Geozone, GeozoneVisit, AreaDiscovery
 from app.models.location import LocationPoint, LocationSession
 from app.models.user import User
-from app.models.user_home_work import UserHomeWork
+from app.models.user_home_work import HomeWorkAnalysisState, HomeWorkPlace, UserHomeWork
 from app.models.artifact import Artifact, UserArtifact, ArtifactCraftingRequirement
 from app.models.cosmetic import Cosmetic, UserCosmetic, CosmeticCraftingRequirement, UserAvatar
-from app.models.marketplace import MarketplaceListing, Transaction, UserCurrency, CurrencyTransaction
+from app.models.marketplace import (
+    MarketplaceListing, ListingSearch, Transaction, MarketPriceRollup, RollupWatermark, UserCurrency, CurrencyTransaction
+)
 from app.models.event import Event, Quest, UserQuest, UserEvent
 from app.models.guild import Guild, GuildMember, GuildAchievement
+from app.models.leaderboard import PlayerScore
 from app.models.verification import VerificationRequest, UserStatusHistory
 from app.models.creator import Creator, CreatorPayment, QuestModeration
 from app.models.route import Route, RouteProgress, AIConversation
 from app.models.memory import Memory, MemoryTimeline
 from app.models.portal import Portal, PortalInteraction
 from app.models.analytics import BusinessClient, AnalyticsDashboard, AnalyticsExport
+from app.models.osm import AreaPOIGenerationTile, OSMFeature
 
 __all__ = [
     "User",
@@ -26,6 +30,8 @@ __all__ = [
     "LocationPoint",
     "LocationSession",
     "UserHomeWork",
+    "HomeWorkAnalysisState",
+    "HomeWorkPlace",
     "Artifact",
     "UserArtifact",
     "ArtifactCraftingRequirement",
@@ -34,7 +40,10 @@ __all__ = [
     "CosmeticCraftingRequirement",
     "UserAvatar",
     "MarketplaceListing",
+    "ListingSearch",
     "Transaction",
+    "MarketPriceRollup",
+    "RollupWatermark",
     "UserCurrency",
     "CurrencyTransaction",
     "Event",
@@ -44,6 +53,7 @@ __all__ = [
     "Guild",
     "GuildMember",
     "GuildAchievement",
+    "PlayerScore",
     "VerificationRequest",
     "UserStatusHistory",
     "Creator",
@@ -59,4 +69,6 @@ __all__ = [
     "BusinessClient",
     "AnalyticsDashboard",
     "AnalyticsExport",
+    "AreaPOIGenerationTile",
+    "OSMFeature",
 ]
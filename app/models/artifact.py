@@ -2,7 +2,7 @@
 from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, Float
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, Float, text
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -44,6 +44,17 @@ class UserArtifact(Base):
     """Модель артефакта пользователя (инвентарь)."""
 
     __tablename__ = "user_artifacts"
+    __table_args__ = (
+        # Одна строка инвентаря на артефакт пользователя и тенанта (цель ON CONFLICT при выдаче)
+        Index(
+            "uq_user_artifacts_user_artifact_company",
+            "user_id",
+            "artifact_id",
+            text("COALESCE(company_id, 0)"),
+            unique=True,
+        ),
+        Index("ix_user_artifacts_user_obtained_id", "user_id", "obtained_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -2,7 +2,7 @@
 from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, Float, JSON
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, Float, JSON
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -43,6 +43,9 @@ class UserCosmetic(Base):
     """Модель косметического предмета пользователя."""
 
     __tablename__ = "user_cosmetics"
+    __table_args__ = (
+        Index("ix_user_cosmetics_user_obtained_id", "user_id", "obtained_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
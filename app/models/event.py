@@ -2,7 +2,7 @@
 from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, Float, JSON, Enum as SQLEnum
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, Float, JSON, Enum as SQLEnum, text
 from sqlalchemy.orm import relationship
 import enum
 
@@ -48,6 +48,9 @@ class Event(Base):
     """Модель события."""
 
     __tablename__ = "events"
+    __table_args__ = (
+        Index("ix_events_company_start_id", "company_id", "start_date", "id", postgresql_where=text("deleted_at IS NULL")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
@@ -76,6 +79,9 @@ class Quest(Base):
     """Модель квеста."""
 
     __tablename__ = "quests"
+    __table_args__ = (
+        Index("ix_quests_company_created_id", "company_id", "created_at", "id", postgresql_where=text("deleted_at IS NULL")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     event_id = Column(Integer, ForeignKey("events.id"), nullable=True, index=True)
@@ -112,6 +118,9 @@ class UserQuest(Base):
     """Модель прогресса квеста пользователя."""
 
     __tablename__ = "user_quests"
+    __table_args__ = (
+        Index("ix_user_quests_user_created_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -3,8 +3,8 @@ from datetime import datetime, timezone
 from typing import Optional
 
 from geoalchemy2 import Geometry
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, Float, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, Float, JSON, text
+from sqlalchemy.orm import deferred, relationship
 
 from app.core.database import Base
 
@@ -13,11 +13,27 @@ class Geozone(Base):
     """Модель геозоны (полигон)."""
 
     __tablename__ = "geozones"
+    __table_args__ = (
+        # Одна живая геозона на объект OSM, тип области и тенанта (цель ON CONFLICT при импорте)
+        Index(
+            "uq_geozones_osm_area_company",
+            "osm_id",
+            "area_type",
+            text("COALESCE(company_id, 0)"),
+            unique=True,
+            postgresql_where=text("osm_id IS NOT NULL AND deleted_at IS NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
     description = Column(Text, nullable=True)
     polygon = Column(Geometry("POLYGON", srid=4326), nullable=False, index=True)
+    # Упрощённые варианты полигона (LOD) с сохранением топологии
+    # NULL означает, что упрощение не уменьшило число вершин и используется более детальный уровень
+    polygon_fine = deferred(Column(Geometry("POLYGON", srid=4326, spatial_index=False), nullable=True))
+    polygon_medium = deferred(Column(Geometry("POLYGON", srid=4326, spatial_index=False), nullable=True))
+    polygon_coarse = deferred(Column(Geometry("POLYGON", srid=4326), nullable=True, index=True))
     center_latitude = Column(String(50), nullable=False)
     center_longitude = Column(String(50), nullable=False)
     radius_meters = Column(Integer, nullable=True)
@@ -44,6 +60,9 @@ class GeozoneVisit(Base):
     """Модель посещения геозоны."""
 
     __tablename__ = "geozone_visits"
+    __table_args__ = (
+        Index("ix_geozone_visits_user_started_id", "user_id", "visit_started_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -69,6 +88,9 @@ class AreaDiscovery(Base):
     """Модель открытия области (Area POI) пользователем."""
 
     __tablename__ = "area_discoveries"
+    __table_args__ = (
+        Index("ix_area_discoveries_user_updated_id", "user_id", "last_updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
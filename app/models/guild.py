@@ -2,7 +2,7 @@
 from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, Enum as SQLEnum
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 import enum
 
@@ -35,10 +35,15 @@ class Guild(Base):
     banner_url = Column(String(500), nullable=True)
     status = Column(SQLEnum(GuildStatus), default=GuildStatus.ACTIVE, nullable=False, index=True)
     max_members = Column(Integer, default=50, nullable=False)
+    member_count = Column(Integer, default=0, nullable=False)  # Меняется условным UPDATE при вступлении
     level = Column(Integer, default=1, nullable=False)
     experience = Column(Integer, default=0, nullable=False)
     total_achievements = Column(Integer, default=0, nullable=False)
     total_distance = Column(Float, default=0.0, nullable=False)  # Общее пройденное расстояние участниками
+    # Агрегаты активности участников (см. app.services.guild_scoring); experience - сумма их XP
+    total_visits = Column(Integer, default=0, nullable=False)
+    total_discoveries = Column(Integer, default=0, nullable=False)
+    score = Column(Integer, default=0, nullable=False)  # Сумма contribution_score участников
     company_id = Column(Integer, nullable=True, index=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
@@ -56,12 +61,19 @@ class GuildMember(Base):
     """Модель участника гильдии."""
 
     __tablename__ = "guild_members"
+    __table_args__ = (
+        Index("uq_guild_members_guild_user", "guild_id", "user_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     guild_id = Column(Integer, ForeignKey("guilds.id"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     role = Column(SQLEnum(GuildRole), default=GuildRole.MEMBER, nullable=False, index=True)
     contribution_score = Column(Integer, default=0, nullable=False)  # Вклад в гильдию
+    # Активность с момента вступления (см. app.services.guild_scoring)
+    xp = Column(Integer, default=0, nullable=False)
+    visits = Column(Integer, default=0, nullable=False)
+    discoveries = Column(Integer, default=0, nullable=False)
     joined_at = Column(DateTime, nullable=False, index=True)
     company_id = Column(Integer, nullable=True, index=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
@@ -0,0 +1,46 @@
+"""Модели рейтингов игроков."""
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Float
+import enum
+
+from app.core.database import Base
+
+
+class LeaderboardMetric(str, enum.Enum):
+    """Показатель рейтинга игроков."""
+    XP = "xp"
+    DISTANCE = "distance"  # Пройденное расстояние, м
+    DISCOVERIES = "discoveries"
+    VISITS = "visits"
+
+
+class PlayerScore(Base):
+    """
+    Очки игрока по показателю в области рейтинга.
+
+    Область (scope) - global, company:{id}, geozone:{id},
+    cell:{company}:{x}:{y} или event:{id} (см. app.services.player_leaderboard).
+    Строки - источник истины для рейтингов в упорядоченных множествах;
+    shard - шард рейтинга (user_id % player_leaderboard_shards), шард
+    загружается из БД диапазонным чтением индекса (metric, scope, shard).
+    """
+
+    __tablename__ = "player_scores"
+    __table_args__ = (
+        Index("uq_player_scores_metric_scope_user", "metric", "scope", "user_id", unique=True),
+        Index("ix_player_scores_metric_scope_shard", "metric", "scope", "shard"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    metric = Column(String(20), nullable=False)  # xp, distance, discoveries, visits
+    scope = Column(String(100), nullable=False)
+    score = Column(Float, default=0.0, nullable=False)
+    shard = Column(Integer, nullable=False)
+    company_id = Column(Integer, nullable=True, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<PlayerScore(user_id={self.user_id}, metric={self.metric}, scope={self.scope}, score={self.score})>"
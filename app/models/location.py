@@ -3,7 +3,7 @@ from datetime import datetime, timezone
 from typing import Optional
 
 from geoalchemy2 import Geometry
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -37,9 +37,13 @@ class LocationPoint(Base):
     """Модель точки геолокации."""
 
     __tablename__ = "location_points"
+    __table_args__ = (
+        Index("ix_location_points_user_timestamp_id", "user_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("location_sessions.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Копия user_id сессии для выборки истории по индексу
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     point = Column(Geometry("POINT", srid=4326), nullable=False, index=True)
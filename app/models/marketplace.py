@@ -2,7 +2,7 @@
 from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, Float, Enum as SQLEnum
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, Float, Enum as SQLEnum, text
 from sqlalchemy.orm import relationship
 import enum
 
@@ -35,6 +35,24 @@ class MarketplaceListing(Base):
     """Модель объявления на торговой площадке."""
 
     __tablename__ = "marketplace_listings"
+    __table_args__ = (
+        # Частичные индексы: проданные и истекшие объявления в них не попадают
+        Index(
+            "ix_marketplace_listings_active_created_id",
+            "created_at", "id",
+            postgresql_where=text("status = 'ACTIVE'"),
+        ),
+        Index(
+            "ix_marketplace_listings_active_company_created_id",
+            "company_id", "created_at", "id",
+            postgresql_where=text("status = 'ACTIVE'"),
+        ),
+        Index(
+            "ix_marketplace_listings_active_expires_at",
+            "expires_at",
+            postgresql_where=text("status = 'ACTIVE' AND expires_at IS NOT NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     seller_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -57,6 +75,58 @@ class MarketplaceListing(Base):
         return f"<MarketplaceListing(id={self.id}, seller_id={self.seller_id}, listing_type={self.listing_type}, price={self.price})>"
 
 
+class ListingSearch(Base):
+    """
+    Поисковая проекция объявления.
+
+    Денормализованная копия объявления с названием и редкостью предмета:
+    поиск и фасеты не обращаются к таблицам артефактов и косметики.
+    Индексы частичные - только по активным объявлениям.
+    """
+
+    __tablename__ = "listing_search"
+    __table_args__ = (
+        Index(
+            "ix_listing_search_active_created",
+            "company_id", "created_at", "id",
+            postgresql_where=text("status = 'ACTIVE'"),
+        ),
+        Index(
+            "ix_listing_search_active_type_rarity_price",
+            "company_id", "listing_type", "rarity", "price", "id",
+            postgresql_where=text("status = 'ACTIVE'"),
+        ),
+        Index(
+            "ix_listing_search_active_item_price",
+            "company_id", "listing_type", "item_id", "price",
+            postgresql_where=text("status = 'ACTIVE'"),
+        ),
+        Index(
+            "ix_listing_search_active_item_name_trgm",
+            "item_name",
+            postgresql_using="gin",
+            postgresql_ops={"item_name": "gin_trgm_ops"},
+            postgresql_where=text("status = 'ACTIVE'"),
+        ),
+    )
+
+    id = Column(Integer, ForeignKey("marketplace_listings.id", ondelete="CASCADE"), primary_key=True)  # ID объявления
+    seller_id = Column(Integer, nullable=False)
+    listing_type = Column(SQLEnum(ListingType), nullable=False)
+    item_id = Column(Integer, nullable=False)
+    item_name = Column(String(255), nullable=False)
+    rarity = Column(String(50), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    price = Column(Integer, nullable=False)
+    status = Column(SQLEnum(ListingStatus), nullable=False)
+    expires_at = Column(DateTime, nullable=True)
+    company_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ListingSearch(id={self.id}, item_name={self.item_name}, rarity={self.rarity}, price={self.price})>"
+
+
 class Transaction(Base):
     """Модель транзакции на торговой площадке."""
 
@@ -85,8 +155,64 @@ class Transaction(Base):
         return f"<Transaction(id={self.id}, buyer_id={self.buyer_id}, seller_id={self.seller_id}, price={self.price})>"
 
 
+class MarketPriceRollup(Base):
+    """
+    Агрегат сделок по предмету за период (час или сутки).
+
+    Цены - цена за единицу предмета. first_trade_id и last_trade_id нужны,
+    чтобы open и close сливались корректно при дозаписи сделок в бакет.
+    """
+
+    __tablename__ = "market_price_rollups"
+    __table_args__ = (
+        Index(
+            "uq_market_price_rollups_item_period_bucket",
+            "listing_type", "item_id", "period", text("COALESCE(company_id, 0)"), "bucket_start",
+            unique=True,
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    listing_type = Column(SQLEnum(ListingType), nullable=False)
+    item_id = Column(Integer, nullable=False)
+    period = Column(String(10), nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    open_price = Column(Float, nullable=False)
+    high_price = Column(Float, nullable=False)
+    low_price = Column(Float, nullable=False)
+    close_price = Column(Float, nullable=False)
+    volume = Column(Integer, nullable=False)  # Продано единиц
+    turnover = Column(Integer, nullable=False)  # Сумма сделок во внутренней валюте
+    trade_count = Column(Integer, nullable=False)
+    first_trade_id = Column(Integer, nullable=False)
+    last_trade_id = Column(Integer, nullable=False)
+    company_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<MarketPriceRollup(item_id={self.item_id}, period={self.period}, bucket_start={self.bucket_start})>"
+
+
+class RollupWatermark(Base):
+    """Водяной знак инкрементальной агрегации: последний учтённый ID."""
+
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String(100), primary_key=True)
+    last_id = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<RollupWatermark(name={self.name}, last_id={self.last_id})>"
+
+
 class UserCurrency(Base):
-    """Модель внутренней валюты пользователя."""
+    """
+    Модель внутренней валюты пользователя.
+
+    coins и gems - снимок баланса по журналу currency_transactions до
+    snapshot_entry_id включительно; текущий баланс считает LedgerService.
+    """
 
     __tablename__ = "user_currency"
 
@@ -94,6 +220,8 @@ class UserCurrency(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True)
     coins = Column(Integer, default=0, nullable=False)  # Основная валюта
     gems = Column(Integer, default=0, nullable=False)  # Премиум валюта
+    snapshot_entry_id = Column(Integer, default=0, nullable=False)  # Последняя запись журнала в снимке
+    snapshot_at = Column(DateTime, nullable=True)
     company_id = Column(Integer, nullable=True, index=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
@@ -107,12 +235,16 @@ class UserCurrency(Base):
 
 
 class CurrencyTransaction(Base):
-    """Модель транзакции валюты."""
+    """Модель записи журнала валюты (записи только добавляются)."""
 
     __tablename__ = "currency_transactions"
+    __table_args__ = (
+        # Хвост журнала после снимка и история пользователя - диапазоны по этому индексу
+        Index("ix_currency_transactions_user_currency_id_id", "user_currency_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_currency_id = Column(Integer, ForeignKey("user_currency.id"), nullable=False, index=True)
+    user_currency_id = Column(Integer, ForeignKey("user_currency.id"), nullable=False)
     transaction_type = Column(String(50), nullable=False, index=True)  # purchase, sale, reward, craft, quest
     amount = Column(Integer, nullable=False)  # Может быть отрицательным
     currency_type = Column(String(20), nullable=False)  # coins, gems
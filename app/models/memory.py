@@ -2,7 +2,7 @@
 from datetime import datetime, timezone
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, Float, JSON
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, Float, JSON, text
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -12,6 +12,9 @@ class Memory(Base):
     """Модель воспоминания (память о путешествии)."""
 
     __tablename__ = "memories"
+    __table_args__ = (
+        Index("ix_memories_user_created_id", "user_id", "created_at", "id", postgresql_where=text("deleted_at IS NULL")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
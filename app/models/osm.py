@@ -0,0 +1,59 @@
+"""Модели импорта и обработки данных OpenStreetMap."""
+from datetime import datetime, timezone
+
+from geoalchemy2 import Geometry
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Float, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.core.database import Base
+
+
+class OSMFeature(Base):
+    """Площадной объект OSM, импортированный из локального .osm.pbf."""
+
+    __tablename__ = "osm_features"
+    __table_args__ = (
+        UniqueConstraint("osm_type", "osm_id", name="uq_osm_features_type_id"),
+        Index("ix_osm_features_tags", "tags", postgresql_using="gin", postgresql_ops={"tags": "jsonb_path_ops"}),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    osm_id = Column(BigInteger, nullable=False)
+    osm_type = Column(String(1), nullable=False)  # w - way, r - relation
+    name = Column(Text, nullable=True)
+    tags = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    geometry = Column(Geometry("MULTIPOLYGON", srid=4326), nullable=False)
+    area_m2 = Column(Float, nullable=False, index=True)  # Геодезическая площадь, вычисляется при импорте
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<OSMFeature(osm_type={self.osm_type}, osm_id={self.osm_id}, name={self.name})>"
+
+
+class AreaPOIGenerationTile(Base):
+    """Контрольная точка генерации Area POI по тайлу региона."""
+
+    __tablename__ = "area_poi_generation_tiles"
+    __table_args__ = (
+        UniqueConstraint("run_key", "tile_x", "tile_y", name="uq_area_poi_generation_tiles_run_tile"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_key = Column(String(64), nullable=False, index=True)  # Хэш параметров запуска (bbox, типы, компания, размер тайла)
+    tile_x = Column(Integer, nullable=False)
+    tile_y = Column(Integer, nullable=False)
+    min_lon = Column(Float, nullable=False)
+    min_lat = Column(Float, nullable=False)
+    max_lon = Column(Float, nullable=False)
+    max_lat = Column(Float, nullable=False)
+    status = Column(String(20), nullable=False, index=True, default="pending")  # pending, done, failed
+    features_processed = Column(Integer, default=0, nullable=False)
+    geozones_created = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    company_id = Column(Integer, nullable=True, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<AreaPOIGenerationTile(run_key={self.run_key}, x={self.tile_x}, y={self.tile_y}, status={self.status})>"
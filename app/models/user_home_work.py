@@ -3,7 +3,7 @@ from datetime import datetime, timezone
 from typing import Optional
 
 from geoalchemy2 import Geometry
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import JSON, Boolean, Column, DateTime, Float, ForeignKey, Integer, String, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -13,6 +13,9 @@ class UserHomeWork(Base):
     """Модель определения дома/работы пользователя."""
 
     __tablename__ = "user_home_work"
+    __table_args__ = (
+        UniqueConstraint("user_id", "location_type", name="uq_user_home_work_user_type"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -36,3 +39,59 @@ class UserHomeWork(Base):
 
     def __repr__(self) -> str:
         return f"<UserHomeWork(id={self.id}, user_id={self.user_id}, type={self.location_type})>"
+
+
+class HomeWorkAnalysisState(Base):
+    """Водяной знак пакетного анализа дома/работы по пользователю."""
+
+    __tablename__ = "home_work_analysis_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    last_point_at = Column(DateTime, nullable=True)  # Время последней учтённой точки геолокации
+    resume_from = Column(DateTime, nullable=True)  # Начало незавершённого пребывания, с него продолжается обработка
+    last_run_at = Column(DateTime, nullable=True)
+    points_processed = Column(Integer, default=0, nullable=False)
+    company_id = Column(Integer, nullable=True, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<HomeWorkAnalysisState(user_id={self.user_id}, last_point_at={self.last_point_at})>"
+
+
+class HomeWorkPlace(Base):
+    """
+    Кандидат в значимые места пользователя.
+
+    Хранит достаточные статистики кластера точек остановки, поэтому новые
+    остановки добавляются без пересчёта истории.
+    """
+
+    __tablename__ = "home_work_places"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    latitude_sum = Column(Float, default=0.0, nullable=False)
+    longitude_sum = Column(Float, default=0.0, nullable=False)
+    stay_count = Column(Integer, default=0, nullable=False)
+    total_dwell_minutes = Column(Float, default=0.0, nullable=False)
+    hour_of_week_minutes = Column(JSON, nullable=False)  # 168 значений: минуты по weekday * 24 + hour
+    first_seen_at = Column(DateTime, nullable=False)
+    last_seen_at = Column(DateTime, nullable=False)
+    company_id = Column(Integer, nullable=True, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    @property
+    def latitude(self) -> float:
+        """Широта центра кластера."""
+        return self.latitude_sum / self.stay_count
+
+    @property
+    def longitude(self) -> float:
+        """Долгота центра кластера."""
+        return self.longitude_sum / self.stay_count
+
+    def __repr__(self) -> str:
+        return f"<HomeWorkPlace(id={self.id}, user_id={self.user_id}, stays={self.stay_count})>"
@@ -1,6 +1,6 @@
 """Схемы артефактов."""
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 from pydantic import BaseModel
 
@@ -66,3 +66,19 @@ class ArtifactStatisticsResponse(BaseModel):
     total_artifacts: int
     total_quantity: int
     by_rarity: Dict[str, int]
+
+
+class CraftRequirementResponse(BaseModel):
+    """Схема требования рецепта."""
+    item_id: int
+    quantity: int
+
+
+class CraftableRecipeResponse(BaseModel):
+    """Схема рецепта, доступного для крафта."""
+    result_type: str  # artifact или cosmetic
+    result_id: int
+    name: str
+    max_crafts: Optional[int] = None  # None - без ограничений
+    artifacts: List[CraftRequirementResponse]
+    cosmetics: List[CraftRequirementResponse]
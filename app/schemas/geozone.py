@@ -47,6 +47,15 @@ class GeozoneResponse(BaseModel):
         from_attributes = True
 
 
+class GeozoneGeometryResponse(BaseModel):
+    """Схема ответа с геометрией геозоны на заданном уровне детализации."""
+
+    id: int
+    lod: str
+    polygon_coordinates: List[List[float]]
+    vertex_count: int
+
+
 class GeozoneVisitResponse(BaseModel):
     """Схема ответа с посещением геозоны."""
 
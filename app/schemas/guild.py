@@ -28,10 +28,14 @@ class GuildResponse(BaseModel):
     banner_url: Optional[str] = None
     status: str
     max_members: int
+    member_count: int
     level: int
     experience: int
     total_achievements: int
     total_distance: float
+    total_visits: int
+    total_discoveries: int
+    score: int
     created_at: datetime
     updated_at: datetime
 
@@ -46,9 +50,22 @@ class GuildMemberResponse(BaseModel):
     user_id: int
     role: str
     contribution_score: int
+    xp: int
+    visits: int
+    discoveries: int
     joined_at: datetime
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class LeaderboardEntryResponse(BaseModel):
+    """Схема строки рейтинга (гильдии или участника)."""
+    rank: int
+    id: int
+    score: int
+
+    class Config:
+        from_attributes = True
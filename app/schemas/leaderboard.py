@@ -0,0 +1,23 @@
+"""Схемы рейтингов игроков."""
+from pydantic import BaseModel
+
+
+class PlayerLeaderboardEntryResponse(BaseModel):
+    """Схема строки рейтинга игроков."""
+    rank: int
+    user_id: int
+    score: float
+
+    class Config:
+        from_attributes = True
+
+
+class PlayerStandingResponse(BaseModel):
+    """Схема места игрока в рейтинге."""
+    rank: int
+    score: float
+    total: int
+    percentile: float
+
+    class Config:
+        from_attributes = True
@@ -1,6 +1,6 @@
 """Схемы торговой площадки."""
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -33,6 +33,59 @@ class MarketplaceListingResponse(BaseModel):
         from_attributes = True
 
 
+class ListingSearchResponse(BaseModel):
+    """Схема ответа с найденным объявлением."""
+    id: int
+    seller_id: int
+    listing_type: str
+    item_id: int
+    item_name: str
+    rarity: str
+    quantity: int
+    price: int
+    expires_at: Optional[datetime] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ListingFacetsResponse(BaseModel):
+    """Схема ответа с количеством активных объявлений по фасетам."""
+    rarity: Dict[str, int]
+    listing_type: Dict[str, int]
+
+
+class FloorPriceResponse(BaseModel):
+    """Схема ответа с минимальной ценой предмета."""
+    listing_type: str
+    item_id: int
+    floor_price: Optional[int] = None
+
+
+class PriceBucketResponse(BaseModel):
+    """Схема ответа с агрегатом сделок за период."""
+    bucket_start: datetime
+    open_price: float
+    high_price: float
+    low_price: float
+    close_price: float
+    volume: int
+    turnover: int
+    trade_count: int
+
+    class Config:
+        from_attributes = True
+
+
+class PriceHistoryResponse(BaseModel):
+    """Схема ответа с историей цен предмета."""
+    listing_type: str
+    item_id: int
+    period: str
+    buckets: List[PriceBucketResponse]
+
+
 class PurchaseRequest(BaseModel):
     """Схема запроса на покупку."""
     pass  # Все данные берутся из URL
@@ -70,6 +123,20 @@ class CurrencyResponse(BaseModel):
         from_attributes = True
 
 
+class CurrencyTransactionResponse(BaseModel):
+    """Схема ответа с записью журнала валюты."""
+    id: int
+    transaction_type: str
+    amount: int
+    currency_type: str
+    description: Optional[str] = None
+    related_id: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class AddCurrencyRequest(BaseModel):
     """Схема добавления валюты."""
     amount: int = Field(..., ge=1)
@@ -1,15 +1,14 @@
 """Сервис достижений."""
 import logging
-from datetime import datetime, timezone
 from typing import List, Optional
 
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
+from app.core.pagination import paginate
 from app.models.achievement import Achievement, UserAchievement
-from app.models.geozone import GeozoneVisit
-from app.models.location import LocationPoint, LocationSession
+from app.services.achievement_rules import AchievementRuleEngine
+from app.services.reward import RewardBundle, RewardService
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -51,150 +50,45 @@ class AchievementService:
         self, user_id: int, company_id: Optional[int] = None
     ) -> List[UserAchievement]:
         """Проверить и разблокировать достижения пользователя."""
-        unlocked_achievements = []
+        engine = AchievementRuleEngine(self.db)
+        rules = engine.compile(company_id)
+        unlocks = engine.evaluate([user_id], company_id, rules)
+        user_achievement_ids = engine.unlock(unlocks, company_id)
 
-        # Получить все активные достижения с фильтрацией по company_id и soft delete
-        query = (
-            self.db.query(Achievement)
-            .filter(
-                Achievement.is_active.is_(True),
-                Achievement.deleted_at.is_(None)
-            )
-        )
+        if not user_achievement_ids:
+            return []
 
-        if company_id is not None:
-            query = query.filter(Achievement.company_id == company_id)
-
-        achievements = query.all()
+        self.db.commit()
+        unlocked_achievements = (
+            self.db.query(UserAchievement)
+            .filter(UserAchievement.id.in_(user_achievement_ids))
+            .all()
+        )
+        for ua in unlocked_achievements:
+            logger.info(f"Разблокировано достижение: {rules.names[ua.achievement_id]} для пользователя {user_id}")
 
-        for achievement in achievements:
-            # Проверить, не разблокировано ли уже
-            existing = (
-                self.db.query(UserAchievement)
-                .filter(
-                    UserAchievement.user_id == user_id,
-                    UserAchievement.achievement_id == achievement.id,
-                )
-                .first()
+        # Обновить прогресс квестов, зависящих от разблокированных достижений
+        try:
+            from app.services.quest import QuestService
+            from app.services.quest_triggers import QuestEventKind
+            QuestService(self.db).dispatch_event(
+                user_id=user_id,
+                event_kind=QuestEventKind.ACHIEVEMENT_UNLOCKED,
+                keys=[ua.achievement_id for ua in unlocked_achievements],
+                company_id=company_id,
             )
-
-            if existing:
-                continue
-
-            # Проверить условие разблокировки
-            progress = self._calculate_achievement_progress(user_id, achievement, company_id)
-
-            if progress >= (achievement.requirement_value or 1):
-                user_achievement = UserAchievement(
-                    user_id=user_id,
-                    achievement_id=achievement.id,
-                    unlocked_at=datetime.now(timezone.utc),
-                    progress_value=progress,
-                    company_id=company_id,
-                )
-                self.db.add(user_achievement)
-                unlocked_achievements.append(user_achievement)
-                logger.info(f"Разблокировано достижение: {achievement.name} для пользователя {user_id}")
-
-        if unlocked_achievements:
-            self.db.commit()
-            for ua in unlocked_achievements:
-                self.db.refresh(ua)
-
-            # Обновить прогресс квестов при разблокировке достижений
-            try:
-                from app.services.quest import QuestService
-                quest_service = QuestService(self.db)
-                from app.models.event import UserQuest, QuestStatus
-                active_quests = (
-                    self.db.query(UserQuest)
-                    .filter(
-                        UserQuest.user_id == user_id,
-                        UserQuest.status == QuestStatus.IN_PROGRESS
-                    )
-                )
-                if company_id is not None:
-                    active_quests = active_quests.filter(UserQuest.company_id == company_id)
-                for user_quest in active_quests.all():
-                    quest_service.update_quest_progress(
-                        user_id=user_id,
-                        quest_id=user_quest.quest_id,
-                        company_id=company_id,
-                    )
-            except Exception as e:
-                logger.warning(f"Ошибка при обновлении прогресса квестов: {e}")
+        except Exception as e:
+            logger.warning(f"Ошибка при обновлении прогресса квестов: {e}")
 
         return unlocked_achievements
 
-    def _calculate_achievement_progress(
-        self, user_id: int, achievement: Achievement, company_id: Optional[int] = None
-    ) -> int:
-        """Вычислить прогресс достижения."""
-        if achievement.achievement_type == "geozone":
-            if achievement.geozone_id:
-                query = (
-                    self.db.query(func.count(GeozoneVisit.id))
-                    .filter(
-                        GeozoneVisit.user_id == user_id,
-                        GeozoneVisit.geozone_id == achievement.geozone_id,
-                    )
-                )
-                if company_id is not None:
-                    query = query.filter(GeozoneVisit.company_id == company_id)
-                return query.scalar() or 0
-
-        elif achievement.achievement_type == "visits":
-            query = self.db.query(func.count(GeozoneVisit.id)).filter(
-                GeozoneVisit.user_id == user_id
-            )
-            if company_id is not None:
-                query = query.filter(GeozoneVisit.company_id == company_id)
-            return query.scalar() or 0
-
-        elif achievement.achievement_type == "distance":
-            # Подсчет пройденного расстояния в метрах
-            from geopy.distance import distance as geopy_distance
-            
-            # Получить все точки геолокации пользователя
-            points_query = (
-                self.db.query(LocationPoint)
-                .join(LocationSession)
-                .filter(
-                    LocationSession.user_id == user_id,
-                    LocationPoint.is_spoofed.is_(False)
-                )
-                .order_by(LocationPoint.timestamp)
-            )
-            
-            if company_id is not None:
-                points_query = points_query.filter(LocationPoint.company_id == company_id)
-            
-            points = points_query.all()
-            
-            if len(points) < 2:
-                return 0
-            
-            # Вычислить общее расстояние между последовательными точками
-            total_distance_meters = 0.0
-            for i in range(len(points) - 1):
-                point1 = points[i]
-                point2 = points[i + 1]
-                dist = geopy_distance(
-                    (point1.latitude, point1.longitude),
-                    (point2.latitude, point2.longitude)
-                ).meters
-                total_distance_meters += dist
-            
-            return int(total_distance_meters)
-
-        return 0
-
     def get_user_achievements(
         self,
         user_id: int,
         company_id: Optional[int] = None,
         limit: int = 100,
         offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> List[UserAchievement]:
         """Получить достижения пользователя с пагинацией."""
         query = self.db.query(UserAchievement).filter(UserAchievement.user_id == user_id)
@@ -202,7 +96,7 @@ class AchievementService:
         if company_id is not None:
             query = query.filter(UserAchievement.company_id == company_id)
 
-        return query.order_by(UserAchievement.unlocked_at.desc()).offset(offset).limit(limit).all()
+        return paginate(query, UserAchievement.unlocked_at, UserAchievement.id, limit, offset, cursor).all()
 
     def get_achievement_by_id(
         self, achievement_id: int, company_id: Optional[int] = None
@@ -227,7 +121,7 @@ class AchievementService:
     ) -> bool:
         """
         Добавить XP пользователю.
-        XP хранится в UserCurrency как coins (или можно добавить отдельное поле XP).
+        XP начисляется в журнал валюты как coins (или можно добавить отдельное поле XP).
         
         Args:
             user_id: ID пользователя
@@ -238,33 +132,10 @@ class AchievementService:
             True если успешно, False в случае ошибки
         """
         try:
-            from app.models.marketplace import UserCurrency
-            
-            # Получаем или создаём UserCurrency для пользователя
-            user_currency = (
-                self.db.query(UserCurrency)
-                .filter(UserCurrency.user_id == user_id)
-                .first()
-            )
-            
-            if not user_currency:
-                user_currency = UserCurrency(
-                    user_id=user_id,
-                    coins=xp_amount,
-                    gems=0,
-                    company_id=company_id,
-                )
-                self.db.add(user_currency)
-            else:
-                user_currency.coins += xp_amount
-            
-            self.db.commit()
-            self.db.refresh(user_currency)
-            
-            logger.info(f"Добавлено {xp_amount} XP пользователю {user_id} (текущий баланс: {user_currency.coins})")
-            
+            RewardService(self.db).grant(user_id, RewardBundle(xp=xp_amount, source="xp"), company_id)
+            logger.info(f"Добавлено {xp_amount} XP пользователю {user_id}")
             return True
-            
+
         except Exception as e:
             logger.error(f"Ошибка при добавлении XP пользователю {user_id}: {e}", exc_info=True)
             self.db.rollback()
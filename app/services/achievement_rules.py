@@ -0,0 +1,324 @@
+"""
+Движок правил достижений.
+
+Активные достижения компилируются в правила «метрика >= порог», где метрика -
+элемент вектора статистики пользователя (всего посещений, посещения
+конкретной геозоны, пройденное расстояние). Пройденное расстояние берётся из
+накопленных очков рейтинга расстояния (player_scores); по всей истории точек
+оно считается только в задаче дозаполнения (exact_distance) и для
+пользователей, у которых ещё нет строки очков. Для пачки пользователей:
+1. одним анти-join находятся ещё не разблокированные пары (пользователь, достижение);
+2. нужные метрики считаются агрегатными запросами сразу по всем пользователям;
+3. все правила проверяются одной матричной операцией;
+4. разблокировки записываются одним INSERT.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from geoalchemy2 import Geography
+from sqlalchemy import and_, cast, exists, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.achievement import Achievement, UserAchievement
+from app.models.geozone import GeozoneVisit
+from app.models.leaderboard import LeaderboardMetric, PlayerScore
+from app.models.location import LocationPoint, LocationSession
+from app.models.user import User
+from app.services.player_leaderboard import GLOBAL_SCOPE, company_scope
+
+logger = logging.getLogger(__name__)
+
+# Ключ метрики: ("visits",), ("geozone_visits", geozone_id), ("distance",)
+MetricKey = Tuple
+
+
+@dataclass
+class CompiledAchievementRules:
+    """Достижения, скомпилированные в правила над вектором статистики."""
+
+    achievement_ids: np.ndarray  # ID достижения для каждого правила
+    metric_indexes: np.ndarray  # Номер метрики в векторе статистики для каждого правила
+    thresholds: np.ndarray  # Порог для каждого правила
+    metrics: List[MetricKey]  # Метрики вектора статистики
+    names: Dict[int, str]
+
+    def __len__(self) -> int:
+        return len(self.achievement_ids)
+
+
+def compile_achievement_rules(achievements: Sequence[Achievement]) -> CompiledAchievementRules:
+    """Скомпилировать достижения в правила; правила группируются по общим метрикам."""
+    metric_positions: Dict[MetricKey, int] = {}
+    achievement_ids: List[int] = []
+    metric_indexes: List[int] = []
+    thresholds: List[int] = []
+
+    for achievement in achievements:
+        if achievement.achievement_type == "geozone":
+            if not achievement.geozone_id:
+                continue
+            metric = ("geozone_visits", achievement.geozone_id)
+        elif achievement.achievement_type == "visits":
+            metric = ("visits",)
+        elif achievement.achievement_type == "distance":
+            metric = ("distance",)
+        else:
+            # Прогресс остальных типов не вычисляется автоматически
+            continue
+
+        achievement_ids.append(achievement.id)
+        metric_indexes.append(metric_positions.setdefault(metric, len(metric_positions)))
+        thresholds.append(achievement.requirement_value or 1)
+
+    return CompiledAchievementRules(
+        achievement_ids=np.array(achievement_ids, dtype=np.int64),
+        metric_indexes=np.array(metric_indexes, dtype=np.int64),
+        thresholds=np.array(thresholds, dtype=np.int64),
+        metrics=list(metric_positions),
+        names={a.id: a.name for a in achievements},
+    )
+
+
+class AchievementRuleEngine:
+    """Пакетная проверка и разблокировка достижений."""
+
+    def __init__(self, db: Session, exact_distance: bool = False):
+        """
+        Инициализация движка.
+
+        Args:
+            exact_distance: Считать расстояние оконным запросом по всей истории
+                точек (задача дозаполнения) вместо накопленного итога
+        """
+        self.db = db
+        self.exact_distance = exact_distance
+
+    def compile(self, company_id: Optional[int] = None) -> CompiledAchievementRules:
+        """Загрузить активные достижения компании и скомпилировать правила."""
+        query = self.db.query(Achievement).filter(
+            Achievement.is_active.is_(True),
+            Achievement.deleted_at.is_(None),
+        )
+        if company_id is not None:
+            query = query.filter(Achievement.company_id == company_id)
+        return compile_achievement_rules(query.all())
+
+    def _pending_pairs(
+        self, rules: CompiledAchievementRules, user_ids: Sequence[int]
+    ) -> List[Tuple[int, int]]:
+        """Найти неразблокированные пары (пользователь, достижение) одним анти-join."""
+        already_unlocked = exists().where(
+            and_(
+                UserAchievement.user_id == User.id,
+                UserAchievement.achievement_id == Achievement.id,
+            )
+        )
+        return (
+            self.db.query(User.id, Achievement.id)
+            .filter(
+                User.id.in_(user_ids),
+                Achievement.id.in_(rules.achievement_ids.tolist()),
+                ~already_unlocked,
+            )
+            .all()
+        )
+
+    def _load_stats(
+        self,
+        metrics: List[MetricKey],
+        needed: np.ndarray,
+        user_ids: List[int],
+        company_id: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Вычислить вектор статистики для пользователей.
+
+        Каждая группа метрик считается одним агрегатным запросом по всем
+        пользователям; метрики без ожидающих правил не считаются.
+
+        Returns:
+            Матрица (пользователи x метрики)
+        """
+        stats = np.zeros((len(user_ids), len(metrics)))
+        rows = {user_id: position for position, user_id in enumerate(user_ids)}
+        needed_metrics = [metric for metric, is_needed in zip(metrics, needed) if is_needed]
+        columns = {metric: position for position, metric in enumerate(metrics)}
+
+        if ("visits",) in needed_metrics:
+            query = (
+                self.db.query(GeozoneVisit.user_id, func.count(GeozoneVisit.id))
+                .filter(GeozoneVisit.user_id.in_(user_ids))
+            )
+            if company_id is not None:
+                query = query.filter(GeozoneVisit.company_id == company_id)
+            for user_id, count in query.group_by(GeozoneVisit.user_id):
+                stats[rows[user_id], columns[("visits",)]] = count
+
+        geozone_ids = [metric[1] for metric in needed_metrics if metric[0] == "geozone_visits"]
+        if geozone_ids:
+            query = (
+                self.db.query(GeozoneVisit.user_id, GeozoneVisit.geozone_id, func.count(GeozoneVisit.id))
+                .filter(
+                    GeozoneVisit.user_id.in_(user_ids),
+                    GeozoneVisit.geozone_id.in_(geozone_ids),
+                )
+            )
+            if company_id is not None:
+                query = query.filter(GeozoneVisit.company_id == company_id)
+            for user_id, geozone_id, count in query.group_by(GeozoneVisit.user_id, GeozoneVisit.geozone_id):
+                stats[rows[user_id], columns[("geozone_visits", geozone_id)]] = count
+
+        if ("distance",) in needed_metrics:
+            for user_id, distance_meters in self._distance_by_user(user_ids, company_id):
+                stats[rows[user_id], columns[("distance",)]] = int(distance_meters or 0)
+
+        return stats
+
+    def distance_subquery(self, user_ids: List[int], company_id: Optional[int] = None):
+        """
+        Подзапрос (user_id, distance): пройденное расстояние (м) по
+        последовательным точкам каждого пользователя.
+        """
+        geography = cast(LocationPoint.point, Geography(srid=4326))
+        steps = (
+            self.db.query(
+                LocationSession.user_id.label("user_id"),
+                func.ST_Distance(
+                    geography,
+                    func.lag(geography).over(
+                        partition_by=LocationSession.user_id,
+                        order_by=LocationPoint.timestamp,
+                    ),
+                ).label("step"),
+            )
+            .join(LocationPoint, LocationPoint.session_id == LocationSession.id)
+            .filter(
+                LocationSession.user_id.in_(user_ids),
+                LocationPoint.is_spoofed.is_(False),
+            )
+        )
+        if company_id is not None:
+            steps = steps.filter(LocationPoint.company_id == company_id)
+        steps = steps.subquery()
+
+        return (
+            self.db.query(steps.c.user_id.label("user_id"), func.sum(steps.c.step).label("distance"))
+            .group_by(steps.c.user_id)
+            .subquery()
+        )
+
+    def _distance_by_user(self, user_ids: List[int], company_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Пройденное расстояние (м) для каждого пользователя.
+
+        Итог читается из очков рейтинга расстояния области global или
+        company:{id} (по уникальному индексу). Оконный запрос по истории
+        точек выполняется при exact_distance и для пользователей без строки
+        очков (история до появления player_scores, пока задача
+        app.jobs.player_score_recompute её не перенесла).
+        """
+        if self.exact_distance:
+            return self._exact_distance_by_user(user_ids, company_id)
+
+        scope = company_scope(company_id) if company_id is not None else GLOBAL_SCOPE
+        totals = (
+            self.db.query(PlayerScore.user_id, PlayerScore.score)
+            .filter(
+                PlayerScore.metric == LeaderboardMetric.DISTANCE.value,
+                PlayerScore.scope == scope,
+                PlayerScore.user_id.in_(user_ids),
+            )
+            .all()
+        )
+        found = {user_id for user_id, _ in totals}
+        missing = [user_id for user_id in user_ids if user_id not in found]
+        if missing:
+            totals.extend(self._exact_distance_by_user(missing, company_id))
+        return totals
+
+    def _exact_distance_by_user(
+        self, user_ids: List[int], company_id: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """Пройденное расстояние (м) по всей истории точек одним запросом."""
+        distances = self.distance_subquery(user_ids, company_id)
+        return self.db.query(distances.c.user_id, distances.c.distance).all()
+
+    def evaluate(
+        self,
+        user_ids: Sequence[int],
+        company_id: Optional[int] = None,
+        rules: Optional[CompiledAchievementRules] = None,
+    ) -> List[Tuple[int, int, int]]:
+        """
+        Проверить все правила для пачки пользователей.
+
+        Returns:
+            Список (user_id, achievement_id, progress) для разблокировки
+        """
+        if rules is None:
+            rules = self.compile(company_id)
+        user_ids = list(dict.fromkeys(user_ids))
+        if not len(rules) or not user_ids:
+            return []
+
+        pending_pairs = self._pending_pairs(rules, user_ids)
+        if not pending_pairs:
+            return []
+
+        # Маска ожидающих правил (пользователи x правила)
+        rule_positions = {achievement_id: position for position, achievement_id in enumerate(rules.achievement_ids.tolist())}
+        user_positions = {user_id: position for position, user_id in enumerate(user_ids)}
+        pending = np.zeros((len(user_ids), len(rules)), dtype=bool)
+        for user_id, achievement_id in pending_pairs:
+            pending[user_positions[user_id], rule_positions[achievement_id]] = True
+
+        needed_metrics = np.zeros(len(rules.metrics), dtype=bool)
+        needed_metrics[rules.metric_indexes[pending.any(axis=0)]] = True
+        stats = self._load_stats(rules.metrics, needed_metrics, user_ids, company_id)
+
+        progress = stats[:, rules.metric_indexes]
+        unlocked = pending & (progress >= rules.thresholds)
+
+        user_rows, rule_columns = np.nonzero(unlocked)
+        return [
+            (user_ids[row], int(rules.achievement_ids[column]), int(progress[row, column]))
+            for row, column in zip(user_rows.tolist(), rule_columns.tolist())
+        ]
+
+    def unlock(
+        self,
+        unlocks: List[Tuple[int, int, int]],
+        company_id: Optional[int] = None,
+    ) -> List[int]:
+        """
+        Записать разблокировки одним запросом. Коммит выполняет вызывающий код.
+
+        Returns:
+            ID созданных записей (уже существующие пропускаются)
+        """
+        if not unlocks:
+            return []
+
+        now = datetime.now(timezone.utc)
+        statement = (
+            pg_insert(UserAchievement.__table__)
+            .values([
+                {
+                    "user_id": user_id,
+                    "achievement_id": achievement_id,
+                    "unlocked_at": now,
+                    "progress_value": progress,
+                    "company_id": company_id,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for user_id, achievement_id, progress in unlocks
+            ])
+            .on_conflict_do_nothing(constraint="uq_user_achievements_user_achievement")
+            .returning(UserAchievement.id)
+        )
+        return [user_achievement_id for (user_achievement_id,) in self.db.execute(statement)]
@@ -6,12 +6,18 @@ from enum import Enum
 
 from geoalchemy2.shape import from_shape, to_shape
 from shapely.geometry import Point, Polygon, LineString
-from sqlalchemy import func
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
+from app.core.pagination import paginate
+from app.core.geodesy import length_m
 from app.models.geozone import Geozone, AreaDiscovery
+from app.models.leaderboard import LeaderboardMetric
 from app.models.location import LocationPoint, LocationSession
+from app.services.geozone import GeozoneLOD, LOD_TOLERANCES_DEGREES
+from app.services.guild_scoring import GuildScoringService, ScoreDelta
+from app.services.player_leaderboard import PlayerLeaderboardService
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -152,8 +158,14 @@ class AreaDiscoveryService:
         is_transit_mode: bool,
         company_id: Optional[int] = None,
     ) -> List[Geozone]:
-        """Найти все Area POI, пересекающиеся с траекторией."""
+        """
+        Найти все Area POI, пересекающиеся с траекторией.
+
+        Кандидаты отбираются по грубому полигону (coarse LOD) с запасом на допуск
+        упрощения, окончательное решение принимается по полному полигону.
+        """
         trajectory_geom = from_shape(trajectory, srid=4326)
+        coarse_tolerance = LOD_TOLERANCES_DEGREES[GeozoneLOD.COARSE]
         
         # Типы Area POI
         area_types = [
@@ -175,14 +187,27 @@ class AreaDiscoveryService:
                 Geozone.is_active.is_(True),
                 Geozone.deleted_at.is_(None),
                 Geozone.area_type.in_(area_types),
-                func.ST_Intersects(Geozone.polygon, trajectory_geom),
+                or_(
+                    and_(
+                        Geozone.polygon_coarse.isnot(None),
+                        func.ST_DWithin(Geozone.polygon_coarse, trajectory_geom, coarse_tolerance),
+                    ),
+                    and_(
+                        Geozone.polygon_coarse.is_(None),
+                        func.ST_Intersects(Geozone.polygon, trajectory_geom),
+                    ),
+                ),
             )
         )
         
         if company_id is not None:
             query = query.filter(Geozone.company_id == company_id)
         
-        geozones = query.all()
+        # Финальная проверка пересечения по полному полигону
+        geozones = [
+            geozone for geozone in query.all()
+            if to_shape(geozone.polygon).intersects(trajectory)
+        ]
         
         # В Transit Mode фильтруем только крупные области и инфраструктуру
         if is_transit_mode:
@@ -226,6 +251,12 @@ class AreaDiscoveryService:
             )
             self.db.add(discovery)
             self.db.flush()
+
+            # Новое открытие учитывается в очках гильдий и рейтингах (фиксируется вместе с прогрессом)
+            GuildScoringService(self.db).record({user_id: ScoreDelta(discoveries=1)}, company_id)
+            PlayerLeaderboardService(self.db).record(
+                LeaderboardMetric.DISCOVERIES, {user_id: 1}, company_id, geozone_id=geozone_id
+            )
         
         return discovery
 
@@ -251,13 +282,8 @@ class AreaDiscoveryService:
                 return None
             
             # Вычисляем покрытую площадь
-            # Для LineString вычисляем длину пересечения
-            intersection_length = 0.0
-            if hasattr(intersection, 'length'):
-                intersection_length = intersection.length
-            elif hasattr(intersection, 'geoms'):
-                # Для MultiLineString суммируем длины
-                intersection_length = sum(geom.length for geom in intersection.geoms if hasattr(geom, 'length'))
+            # Длина пересечения в метрах (геодезически, а не в градусах)
+            intersection_length = length_m(intersection)
             
             # Вычисляем время, проведённое в зоне
             time_spent = self._calculate_time_in_zone(location_points, polygon)
@@ -395,6 +421,7 @@ class AreaDiscoveryService:
         company_id: Optional[int] = None,
         limit: int = 100,
         offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> List[AreaDiscovery]:
         """Получить открытия областей пользователя."""
         query = self.db.query(AreaDiscovery).filter(AreaDiscovery.user_id == user_id)
@@ -408,7 +435,7 @@ class AreaDiscoveryService:
         if company_id is not None:
             query = query.filter(AreaDiscovery.company_id == company_id)
         
-        return query.order_by(AreaDiscovery.last_updated_at.desc()).offset(offset).limit(limit).all()
+        return paginate(query, AreaDiscovery.last_updated_at, AreaDiscovery.id, limit, offset, cursor).all()
 
     def get_discovery_by_geozone(
         self,
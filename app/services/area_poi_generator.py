@@ -1,23 +1,138 @@
 """Сервис генерации Area POI из геоданных OpenStreetMap."""
+import json
 import logging
-from typing import List, Optional, Dict, Any
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime, timezone
 
-from geoalchemy2.shape import from_shape, to_shape
-from shapely.geometry import Polygon, MultiPolygon
-from shapely.validation import make_valid
-from shapely.ops import transform
-from sqlalchemy import text, func
+import numpy as np
+import shapely
+from geoalchemy2.elements import WKTElement
+from shapely.geometry.base import BaseGeometry
+from sqlalchemy import literal_column, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session
-import pyproj
 
 from app.core.config import get_settings
+from app.core.geodesy import areas_m2
 from app.models.geozone import Geozone
-from app.services.geozone import GeozoneService
+from app.services.geozone import (
+    GEOMETRY_TYPE_POLYGON,
+    GeozoneLOD,
+    GeozoneService,
+    build_lod_polygons_bulk,
+)
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+DEFAULT_AREA_TYPES = [
+    "forest_area",
+    "river_basin",
+    "valley",
+    "national_park",
+    "farmland",
+    "mountain_range",
+    "lake_area",
+    "coastal_area",
+    "rural_settlement_area",
+    "infrastructure_area",
+]
+
+# Маппинг OSM тегов на типы Area POI
+OSM_TAG_MAPPING: Dict[str, List[Tuple[str, str]]] = {
+    "forest_area": [
+        ("landuse", "forest"),
+        ("natural", "wood"),
+    ],
+    "river_basin": [
+        ("waterway", "river"),
+        ("waterway", "stream"),
+        ("natural", "water"),
+    ],
+    "valley": [
+        ("natural", "valley"),
+    ],
+    "national_park": [
+        ("leisure", "nature_reserve"),
+        ("boundary", "national_park"),
+        ("leisure", "park"),
+    ],
+    "farmland": [
+        ("landuse", "farmland"),
+        ("landuse", "agricultural"),
+    ],
+    "mountain_range": [
+        ("natural", "mountain_range"),
+        ("natural", "peak"),
+    ],
+    "lake_area": [
+        ("natural", "water"),
+        ("waterway", "riverbank"),
+    ],
+    "coastal_area": [
+        ("natural", "coastline"),
+        ("place", "bay"),
+    ],
+    "rural_settlement_area": [
+        ("place", "village"),
+        ("place", "hamlet"),
+    ],
+    "infrastructure_area": [
+        ("highway", "motorway"),
+        ("highway", "trunk"),
+        ("railway", "rail"),
+    ],
+}
+
+
+def _make_valid_all(geometries: np.ndarray) -> np.ndarray:
+    """Исправить невалидные геометрии массива."""
+    invalid = ~shapely.is_valid(geometries) & ~shapely.is_missing(geometries)
+    if invalid.any():
+        geometries = geometries.copy()
+        geometries[invalid] = shapely.make_valid(geometries[invalid])
+    return geometries
+
+
+def _to_largest_polygons(geometries: np.ndarray) -> np.ndarray:
+    """
+    Привести геометрии к Polygon.
+
+    Из составных геометрий берётся наибольший полигон, геометрии без
+    полигонов (линии, точки) заменяются на None.
+    """
+    result = np.full(len(geometries), None, dtype=object)
+    parts, index = shapely.get_parts(geometries, return_index=True)
+    is_polygon = shapely.get_type_id(parts) == GEOMETRY_TYPE_POLYGON
+    parts, index = parts[is_polygon], index[is_polygon]
+    if len(parts) == 0:
+        return result
+
+    # Сортируем части по исходному индексу и убыванию площади, берём первую в группе
+    order = np.lexsort((-shapely.area(parts), index))
+    parts, index = parts[order], index[order]
+    _, first = np.unique(index, return_index=True)
+    result[index[first]] = parts[first]
+    return result
+
+
+def _to_geometry_element(geometry: Optional[BaseGeometry]) -> Optional[WKTElement]:
+    """Преобразовать геометрию в значение для вставки в БД."""
+    if geometry is None:
+        return None
+    return WKTElement(shapely.to_wkt(geometry, rounding_precision=-1), srid=4326)
+
+
+def _osm_row_name(row: Any, area_type: str) -> str:
+    """Получить название объекта OSM или сгенерировать его по типу."""
+    fallback = f"{area_type.replace('_', ' ').title()} {row.osm_id}"
+    if row.name:
+        return row.name
+    if isinstance(row.tags, dict):
+        return row.tags.get("name") or row.tags.get("name:en") or fallback
+    return fallback
+
 
 class AreaPOIGenerator:
     """Сервис для генерации Area POI из геоданных."""
@@ -46,113 +161,62 @@ class AreaPOIGenerator:
             Список созданных геозон
         """
         if area_types is None:
-            area_types = [
-                "forest_area",
-                "river_basin",
-                "valley",
-                "national_park",
-                "farmland",
-                "mountain_range",
-                "lake_area",
-                "coastal_area",
-                "rural_settlement_area",
-                "infrastructure_area",
-            ]
+            area_types = DEFAULT_AREA_TYPES
         
         created_geozones = []
         
-        # Маппинг OSM тегов на типы Area POI
-        osm_tag_mapping = {
-            "forest_area": [
-                ("landuse", "forest"),
-                ("natural", "wood"),
-            ],
-            "river_basin": [
-                ("waterway", "river"),
-                ("waterway", "stream"),
-                ("natural", "water"),
-            ],
-            "valley": [
-                ("natural", "valley"),
-            ],
-            "national_park": [
-                ("leisure", "nature_reserve"),
-                ("boundary", "national_park"),
-                ("leisure", "park"),
-            ],
-            "farmland": [
-                ("landuse", "farmland"),
-                ("landuse", "agricultural"),
-            ],
-            "mountain_range": [
-                ("natural", "mountain_range"),
-                ("natural", "peak"),
-            ],
-            "lake_area": [
-                ("natural", "water"),
-                ("waterway", "riverbank"),
-            ],
-            "coastal_area": [
-                ("natural", "coastline"),
-                ("place", "bay"),
-            ],
-            "rural_settlement_area": [
-                ("place", "village"),
-                ("place", "hamlet"),
-            ],
-            "infrastructure_area": [
-                ("highway", "motorway"),
-                ("highway", "trunk"),
-                ("railway", "rail"),
-            ],
-        }
-        
         for area_type in area_types:
-            if area_type not in osm_tag_mapping:
+            if area_type not in OSM_TAG_MAPPING:
                 continue
             
-            tags = osm_tag_mapping[area_type]
+            tags = OSM_TAG_MAPPING[area_type]
             geozones = self._query_osm_features(tags, bbox, area_type, company_id)
             created_geozones.extend(geozones)
         
         return created_geozones
 
-    def _query_osm_features(
+    def _build_osm_features_query(
         self,
-        tags: List[tuple],
+        tags: List[Tuple[str, str]],
         bbox: Optional[Dict[str, float]],
-        area_type: str,
-        company_id: Optional[int],
-    ) -> List[Geozone]:
+        assign_by_point: bool = False,
+    ) -> Tuple[Any, Dict[str, Any]]:
         """
-        Запросить объекты OSM из PostGIS по тегам.
-        
-        Предполагается, что в БД есть таблица osm_features с колонками:
-        - geometry (geometry)
-        - tags (jsonb)
-        - name (text)
-        - osm_id (bigint)
+        Сформировать SQL запрос объектов OSM по тегам и границам.
+
+        При assign_by_point=True объект попадает в выборку, только если его
+        точка на поверхности лежит в полуоткрытом bbox [min, max). Так соседние
+        тайлы не выбирают один и тот же объект дважды.
         """
-        created_geozones = []
+        params: Dict[str, Any] = {}
         
-        try:
-            # Формируем SQL запрос для поиска объектов OSM
-            # Это примерный запрос - в реальности структура таблицы может отличаться
-            query_parts = []
-            params = {}
-            
-            # Условие по тегам
-            tag_conditions = []
-            for i, (key, value) in enumerate(tags):
-                tag_conditions.append(f"tags->>'{key}' = :tag_value_{i}")
-                params[f"tag_value_{i}"] = value
-            
-            tag_where = " OR ".join(tag_conditions)
-            
-            # Условие по bbox
-            bbox_where = ""
-            if bbox:
-                bbox_where = f"""
+        # Условие по тегам: containment (@>) использует GIN индекс по tags
+        tag_conditions = []
+        for i, (key, value) in enumerate(tags):
+            tag_conditions.append(f"tags @> CAST(:tag_{i} AS jsonb)")
+            params[f"tag_{i}"] = json.dumps({key: value})
+        
+        tag_where = " OR ".join(tag_conditions)
+        
+        # Условие по bbox
+        bbox_where = ""
+        if bbox:
+            params.update({
+                "min_lon": bbox["min_lon"],
+                "min_lat": bbox["min_lat"],
+                "max_lon": bbox["max_lon"],
+                "max_lat": bbox["max_lat"],
+            })
+            if assign_by_point:
+                bbox_where = """
+                    AND geometry && ST_MakeEnvelope(:min_lon, :min_lat, :max_lon, :max_lat, 4326)
+                    AND ST_X(ST_PointOnSurface(geometry)) >= :min_lon
+                    AND ST_X(ST_PointOnSurface(geometry)) < :max_lon
+                    AND ST_Y(ST_PointOnSurface(geometry)) >= :min_lat
+                    AND ST_Y(ST_PointOnSurface(geometry)) < :max_lat
+                """
+            else:
+                bbox_where = """
                     AND ST_Intersects(
                         geometry,
                         ST_MakeEnvelope(
@@ -160,162 +224,229 @@ class AreaPOIGenerator:
                         )
                     )
                 """
-                params.update({
-                    "min_lon": bbox["min_lon"],
-                    "min_lat": bbox["min_lat"],
-                    "max_lon": bbox["max_lon"],
-                    "max_lat": bbox["max_lat"],
-                })
-            
-            # Проверяем существование таблицы osm_features
-            # Если таблицы нет, возвращаем пустой список (данные можно загрузить отдельно)
-            check_table_query = text("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'osm_features'
-                )
-            """)
-            table_exists = self.db.execute(check_table_query).scalar()
-            
-            if not table_exists:
-                logger.warning("Таблица osm_features не найдена. Используйте импорт данных OSM.")
-                return []
-            
-            # Запрос объектов OSM
-            sql_query = text(f"""
-                SELECT 
-                    osm_id,
-                    name,
-                    tags,
-                    ST_AsText(geometry) as geometry_wkt,
-                    ST_Area(ST_Transform(geometry, 3857)) as area_m2
-                FROM osm_features
-                WHERE ({tag_where})
-                    AND geometry IS NOT NULL
-                    AND ST_Area(ST_Transform(geometry, 3857)) > :min_area
-                    {bbox_where}
-                LIMIT 1000
-            """)
-            
-            params["min_area"] = self.min_area_square_meters
-            
-            result = self.db.execute(sql_query, params)
-            
-            for row in result:
-                try:
-                    geozone = self._create_geozone_from_osm_row(
-                        row, area_type, company_id
-                    )
-                    if geozone:
-                        created_geozones.append(geozone)
-                except Exception as e:
-                    logger.error(f"Ошибка создания геозоны из OSM объекта {row.osm_id}: {e}")
-                    continue
-                    
+        
+        sql_query = text(f"""
+            SELECT 
+                osm_id,
+                name,
+                tags,
+                ST_AsText(geometry) as geometry_wkt,
+                area_m2,
+                updated_at
+            FROM osm_features
+            WHERE ({tag_where})
+                AND area_m2 > :min_area
+                {bbox_where}
+        """)
+        params["min_area"] = self.min_area_square_meters
+        return sql_query, params
+
+    def iter_osm_rows(
+        self,
+        connection: Connection,
+        tags: List[Tuple[str, str]],
+        bbox: Optional[Dict[str, float]],
+        assign_by_point: bool = False,
+    ) -> Iterator[Any]:
+        """
+        Потоково выбрать объекты OSM через серверный курсор.
+
+        Чтение идёт через отдельное соединение: коммиты сессии записи
+        не закрывают курсор, а в памяти держится только одна пачка строк.
+        """
+        sql_query, params = self._build_osm_features_query(tags, bbox, assign_by_point)
+        result = connection.execute(
+            sql_query.execution_options(
+                stream_results=True,
+                yield_per=settings.area_poi_stream_batch_size,
+            ),
+            params,
+        )
+        yield from result
+
+    def _query_osm_features(
+        self,
+        tags: List[Tuple[str, str]],
+        bbox: Optional[Dict[str, float]],
+        area_type: str,
+        company_id: Optional[int],
+    ) -> List[Geozone]:
+        """
+        Запросить объекты OSM из PostGIS по тегам.
+        
+        Таблица osm_features заполняется импортом: python -m app.jobs.osm_import
+        """
+        try:
+            with self.db.get_bind().connect() as read_connection:
+                rows = self.iter_osm_rows(read_connection, tags, bbox)
+                stats = self.bulk_upsert_osm_rows(rows, area_type, company_id, collect_ids=True)
         except Exception as e:
             logger.error(f"Ошибка запроса OSM объектов: {e}", exc_info=True)
+            self.db.rollback()
+            return []
         
-        return created_geozones
+        if not stats["geozone_ids"]:
+            return []
+        return self.db.query(Geozone).filter(Geozone.id.in_(stats["geozone_ids"])).all()
 
-    def _create_geozone_from_osm_row(
+    def bulk_upsert_osm_rows(
         self,
-        row: Any,
+        rows: Iterable[Any],
         area_type: str,
         company_id: Optional[int],
-    ) -> Optional[Geozone]:
-        """Создать геозону из строки результата OSM запроса."""
-        try:
-            # Проверяем, не существует ли уже такая геозона
-            existing = (
-                self.db.query(Geozone)
-                .filter(
-                    Geozone.osm_id == str(row.osm_id),
-                    Geozone.area_type == area_type,
-                    Geozone.deleted_at.is_(None),
+        chunk_size: Optional[int] = None,
+        collect_ids: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Записать объекты OSM в геозоны пачками.
+
+        На пачку: один запрос существующих osm_id, векторная обработка геометрий
+        новых и изменённых в OSM объектов и один INSERT ... ON CONFLICT DO UPDATE
+        с коммитом.
+
+        Returns:
+            Статистика: processed, inserted, updated, skipped, failed - объекты
+            пачек, запись которых откатилась (и geozone_ids при collect_ids)
+        """
+        chunk_size = chunk_size or settings.area_poi_stream_batch_size
+        stats: Dict[str, Any] = {
+            "processed": 0, "inserted": 0, "updated": 0, "skipped": 0, "failed": 0, "geozone_ids": [],
+        }
+
+        chunk: List[Any] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                self._upsert_osm_chunk(chunk, area_type, company_id, stats, collect_ids)
+                chunk = []
+        if chunk:
+            self._upsert_osm_chunk(chunk, area_type, company_id, stats, collect_ids)
+
+        logger.info(
+            f"Area POI {area_type}: обработано {stats['processed']}, создано {stats['inserted']}, "
+            f"обновлено {stats['updated']}, пропущено {stats['skipped']}, с ошибкой {stats['failed']}"
+        )
+        return stats
+
+    def _upsert_osm_chunk(
+        self,
+        rows: List[Any],
+        area_type: str,
+        company_id: Optional[int],
+        stats: Dict[str, Any],
+        collect_ids: bool,
+    ) -> None:
+        """Записать одну пачку объектов OSM."""
+        stats["processed"] += len(rows)
+
+        # Существующие геозоны этого тенанта пропускаем без обработки геометрии,
+        # если объект OSM не менялся после их последней записи
+        osm_ids = list({str(row.osm_id) for row in rows})
+        existing_query = self.db.query(Geozone.id, Geozone.osm_id, Geozone.updated_at).filter(
+            Geozone.osm_id.in_(osm_ids),
+            Geozone.area_type == area_type,
+            Geozone.deleted_at.is_(None),
+        )
+        if company_id is not None:
+            existing_query = existing_query.filter(Geozone.company_id == company_id)
+        else:
+            existing_query = existing_query.filter(Geozone.company_id.is_(None))
+        existing = {
+            osm_id: (geozone_id, updated_at) for geozone_id, osm_id, updated_at in existing_query.all()
+        }
+
+        new_rows: List[Any] = []
+        seen = set()
+        for row in rows:
+            osm_id = str(row.osm_id)
+            if osm_id in seen:
+                stats["skipped"] += 1
+                continue
+            seen.add(osm_id)
+            current = existing.get(osm_id)
+            feature_updated_at = getattr(row, "updated_at", None)
+            if current is not None and (feature_updated_at is None or feature_updated_at <= current[1]):
+                stats["skipped"] += 1
+                if collect_ids:
+                    stats["geozone_ids"].append(current[0])
+                continue
+            new_rows.append(row)
+
+        if not new_rows:
+            return
+
+        polygons = _to_largest_polygons(
+            _make_valid_all(shapely.from_wkt(np.array([row.geometry_wkt for row in new_rows], dtype=object)))
+        )
+        usable = ~shapely.is_missing(polygons)
+        stats["skipped"] += int((~usable).sum())
+        if not usable.any():
+            return
+        new_rows = [row for row, ok in zip(new_rows, usable) if ok]
+        polygons = polygons[usable]
+
+        areas = np.array(
+            [getattr(row, "area_m2", None) or np.nan for row in new_rows], dtype=float
+        )
+        missing_area = np.isnan(areas)
+        if missing_area.any():
+            areas[missing_area] = areas_m2(polygons[missing_area])
+
+        centroids = shapely.centroid(polygons)
+        center_lons = shapely.get_x(centroids)
+        center_lats = shapely.get_y(centroids)
+        lods = build_lod_polygons_bulk(polygons)
+
+        now = datetime.now(timezone.utc)
+        records = []
+        for i, row in enumerate(new_rows):
+            records.append({
+                "name": _osm_row_name(row, area_type),
+                "description": f"Area POI generated from OpenStreetMap (OSM ID: {row.osm_id})",
+                "polygon": _to_geometry_element(polygons[i]),
+                "polygon_fine": _to_geometry_element(lods[GeozoneLOD.FINE][i]),
+                "polygon_medium": _to_geometry_element(lods[GeozoneLOD.MEDIUM][i]),
+                "polygon_coarse": _to_geometry_element(lods[GeozoneLOD.COARSE][i]),
+                "center_latitude": str(center_lats[i]),
+                "center_longitude": str(center_lons[i]),
+                "geozone_type": "area_poi",
+                "area_type": area_type,
+                "area_square_meters": float(areas[i]),
+                "osm_id": str(row.osm_id),
+                "osm_tags": row.tags if isinstance(row.tags, dict) else {},
+                "is_active": True,
+                "company_id": company_id,
+                "created_at": now,
+                "updated_at": now,
+            })
+
+        insert_stmt = pg_insert(Geozone.__table__).values(records)
+        upsert_stmt = insert_stmt.on_conflict_do_update(
+            index_elements=[Geozone.osm_id, Geozone.area_type, text("COALESCE(company_id, 0)")],
+            index_where=text("osm_id IS NOT NULL AND deleted_at IS NULL"),
+            set_={
+                column: insert_stmt.excluded[column]
+                for column in (
+                    "name", "polygon", "polygon_fine", "polygon_medium", "polygon_coarse",
+                    "center_latitude", "center_longitude", "area_square_meters", "osm_tags", "updated_at",
                 )
-                .first()
-            )
-            
-            if existing:
-                return existing
-            
-            # Парсим WKT геометрию
-            from shapely import wkt as shapely_wkt
-            geometry = shapely_wkt.loads(row.geometry_wkt)
-            
-            # Преобразуем MultiPolygon в Polygon если нужно
-            if isinstance(geometry, MultiPolygon):
-                # Берём самый большой полигон
-                geometry = max(geometry.geoms, key=lambda p: p.area)
-            
-            if not isinstance(geometry, Polygon):
-                logger.warning(f"Неожиданный тип геометрии для OSM объекта {row.osm_id}")
-                return None
-            
-            # Валидация и исправление полигона
-            if not geometry.is_valid:
-                geometry = make_valid(geometry)
-            
-            # Вычисляем центр
-            center = geometry.centroid
-            center_lat = center.y
-            center_lon = center.x
-            
-            # Получаем название
-            name = row.name
-            if not name and row.tags:
-                # Пытаемся извлечь название из тегов
-                if isinstance(row.tags, dict):
-                    name = row.tags.get("name") or row.tags.get("name:en") or f"{area_type.replace('_', ' ').title()} {row.osm_id}"
-                else:
-                    name = f"{area_type.replace('_', ' ').title()} {row.osm_id}"
-            elif not name:
-                name = f"{area_type.replace('_', ' ').title()} {row.osm_id}"
-            
-            # Вычисляем площадь в м²
-            area_m2 = row.area_m2 if hasattr(row, 'area_m2') else None
-            if not area_m2:
-                # Вычисляем площадь через преобразование в проекцию для точного расчёта
-                try:
-                    wgs84 = pyproj.CRS('EPSG:4326')
-                    utm = pyproj.CRS('EPSG:3857')
-                    project = pyproj.Transformer.from_crs(wgs84, utm, always_xy=True).transform
-                    projected_geom = transform(project, geometry)
-                    area_m2 = projected_geom.area
-                except Exception:
-                    # Fallback: приблизительный расчёт
-                    area_m2 = geometry.area * 111000 * 111000  # Примерно
-            
-            # Создаём геозону
-            polygon_coords = [[lon, lat] for lon, lat in geometry.exterior.coords]
-            
-            geozone = self.geozone_service.create_geozone(
-                name=name,
-                polygon_coordinates=polygon_coords,
-                geozone_type="area_poi",
-                description=f"Area POI generated from OpenStreetMap (OSM ID: {row.osm_id})",
-                company_id=company_id,
-            )
-            
-            # Обновляем дополнительные поля
-            geozone.area_type = area_type
-            geozone.area_square_meters = area_m2
-            geozone.osm_id = str(row.osm_id)
-            if row.tags:
-                geozone.osm_tags = row.tags if isinstance(row.tags, dict) else {}
-            
+            },
+        ).returning(Geozone.id, literal_column("xmax = 0").label("inserted"))
+
+        try:
+            result = self.db.execute(upsert_stmt).all()
             self.db.commit()
-            self.db.refresh(geozone)
-            
-            logger.info(f"Создана Area POI: {geozone.name} (ID: {geozone.id}, тип: {area_type})")
-            
-            return geozone
-            
         except Exception as e:
-            logger.error(f"Ошибка создания геозоны: {e}", exc_info=True)
+            logger.error(f"Ошибка пакетной записи Area POI ({area_type}): {e}", exc_info=True)
             self.db.rollback()
-            return None
+            stats["failed"] += len(records)
+            return
+
+        inserted = sum(1 for _, is_inserted in result if is_inserted)
+        stats["inserted"] += inserted
+        stats["updated"] += len(result) - inserted
+        if collect_ids:
+            stats["geozone_ids"].extend(geozone_id for geozone_id, _ in result)
 
     def generate_area_poi_for_region(
         self,
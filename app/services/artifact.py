@@ -1,16 +1,18 @@
 """Сервис работы с артефактами."""
 import logging
-import random
-from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
-from app.models.artifact import Artifact, UserArtifact, ArtifactCraftingRequirement
+from app.core.pagination import paginate
+from app.models.artifact import Artifact, UserArtifact
 from app.models.geozone import GeozoneVisit
 from app.models.location import LocationPoint, LocationSession
+from app.services.drop_tables import get_drop_table, invalidate_drop_tables
+from app.services.inventory import InsufficientItemsError, InventoryService
+from app.services.recipes import Recipe, get_recipe_book, invalidate_recipes
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -57,6 +59,8 @@ class ArtifactService:
         )
         self.db.add(artifact)
         self.db.commit()
+        invalidate_drop_tables(company_id)
+        invalidate_recipes(company_id)
         self.db.refresh(artifact)
         logger.info(f"Создан артефакт: {artifact.id} ({artifact.name})")
         return artifact
@@ -85,6 +89,7 @@ class ArtifactService:
         company_id: Optional[int] = None,
         limit: int = 100,
         offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> List[UserArtifact]:
         """Получить артефакты пользователя."""
         query = (
@@ -103,7 +108,7 @@ class ArtifactService:
         if company_id is not None:
             query = query.filter(UserArtifact.company_id == company_id)
 
-        return query.order_by(UserArtifact.obtained_at.desc()).offset(offset).limit(limit).all()
+        return paginate(query, UserArtifact.obtained_at, UserArtifact.id, limit, offset, cursor).all()
 
     def try_drop_artifact_from_geozone(
         self,
@@ -117,58 +122,21 @@ class ArtifactService:
         Returns:
             UserArtifact если артефакт выпал, None если не выпал
         """
-        # Получить артефакты для этой геозоны
-        artifacts_query = (
-            self.db.query(Artifact)
-            .filter(
-                Artifact.geozone_id == geozone_id,
-                Artifact.is_active.is_(True),
-                Artifact.deleted_at.is_(None)
-            )
-        )
-        if company_id is not None:
-            artifacts_query = artifacts_query.filter(Artifact.company_id == company_id)
-
-        artifacts = artifacts_query.all()
-
-        if not artifacts:
+        artifact_id = get_drop_table(self.db, geozone_id, company_id).sample()
+        if artifact_id is None:
             return None
 
-        # Выбрать артефакт на основе вероятности выпадения
-        for artifact in artifacts:
-            if random.random() <= artifact.drop_chance:
-                # Проверить, есть ли уже у пользователя
-                existing = (
-                    self.db.query(UserArtifact)
-                    .filter(
-                        UserArtifact.user_id == user_id,
-                        UserArtifact.artifact_id == artifact.id
-                    )
-                    .first()
-                )
-
-                if existing:
-                    existing.quantity += 1
-                    existing.updated_at = datetime.now(timezone.utc)
-                    user_artifact = existing
-                else:
-                    user_artifact = UserArtifact(
-                        user_id=user_id,
-                        artifact_id=artifact.id,
-                        quantity=1,
-                        obtained_at=datetime.now(timezone.utc),
-                        obtained_from="geozone_visit",
-                        obtained_from_id=geozone_id,
-                        company_id=company_id,
-                    )
-                    self.db.add(user_artifact)
-
-                self.db.commit()
-                self.db.refresh(user_artifact)
-                logger.info(f"Артефакт выпал пользователю {user_id}: {artifact.name}")
-                return user_artifact
-
-        return None
+        user_artifact = InventoryService(self.db).add_artifact(
+            user_id,
+            artifact_id,
+            quantity=1,
+            obtained_from="geozone_visit",
+            obtained_from_id=geozone_id,
+            company_id=company_id,
+        )
+        self.db.commit()
+        logger.info(f"Артефакт {artifact_id} выпал пользователю {user_id}")
+        return user_artifact
 
     def craft_artifact(
         self,
@@ -177,73 +145,44 @@ class ArtifactService:
         company_id: Optional[int] = None,
     ) -> Optional[UserArtifact]:
         """Создать артефакт через крафт."""
-        artifact = self.get_artifact_by_id(artifact_id, company_id)
-        if not artifact or not artifact.is_craftable:
+        recipe = get_recipe_book(self.db, company_id).artifacts.get(artifact_id)
+        if recipe is None:
             raise ValueError("Артефакт не может быть создан через крафт")
 
-        # Проверить требования для крафта
-        requirements = (
-            self.db.query(ArtifactCraftingRequirement)
-            .filter(ArtifactCraftingRequirement.artifact_id == artifact_id)
-        )
-        if company_id is not None:
-            requirements = requirements.filter(ArtifactCraftingRequirement.company_id == company_id)
-        requirements = requirements.all()
-
-        # Проверить наличие всех требуемых артефактов
-        user_artifacts = {
-            ua.artifact_id: ua.quantity
-            for ua in self.get_user_artifacts(user_id, company_id=company_id, limit=10000)
-        }
-
-        for req in requirements:
-            if user_artifacts.get(req.required_artifact_id, 0) < req.required_quantity:
-                raise ValueError(f"Недостаточно артефактов для крафта: требуется {req.required_quantity}")
-
-        # Удалить использованные артефакты
-        for req in requirements:
-            user_artifact = (
-                self.db.query(UserArtifact)
-                .filter(
-                    UserArtifact.user_id == user_id,
-                    UserArtifact.artifact_id == req.required_artifact_id
-                )
-                .first()
+        # Все требования проверяются и списываются одним условным UPDATE
+        inventory = InventoryService(self.db)
+        try:
+            inventory.consume_artifacts(user_id, recipe.artifacts, company_id)
+            user_artifact = inventory.add_artifact(
+                user_id, artifact_id, quantity=1, obtained_from="craft", company_id=company_id
             )
-            if user_artifact:
-                user_artifact.quantity -= req.required_quantity
-                if user_artifact.quantity <= 0:
-                    self.db.delete(user_artifact)
+            self.db.commit()
+        except InsufficientItemsError:
+            self.db.rollback()
+            raise
 
-        # Создать новый артефакт
-        existing = (
-            self.db.query(UserArtifact)
-            .filter(
-                UserArtifact.user_id == user_id,
-                UserArtifact.artifact_id == artifact_id
-            )
-            .first()
-        )
+        logger.info(f"Артефакт создан через крафт пользователем {user_id}: {recipe.name}")
+        return user_artifact
 
-        if existing:
-            existing.quantity += 1
-            existing.updated_at = datetime.now(timezone.utc)
-            user_artifact = existing
-        else:
-            user_artifact = UserArtifact(
-                user_id=user_id,
-                artifact_id=artifact_id,
-                quantity=1,
-                obtained_at=datetime.now(timezone.utc),
-                obtained_from="craft",
-                company_id=company_id,
-            )
-            self.db.add(user_artifact)
+    def get_craftable(
+        self,
+        user_id: int,
+        company_id: Optional[int] = None,
+    ) -> List[Tuple[Recipe, Optional[int]]]:
+        """
+        Получить рецепты, которые пользователь может выполнить сейчас.
 
-        self.db.commit()
-        self.db.refresh(user_artifact)
-        logger.info(f"Артефакт создан через крафт пользователем {user_id}: {artifact.name}")
-        return user_artifact
+        Инвентарь по требуемым предметам читается двумя запросами, рецепты
+        проверяются одним проходом по кэшированной книге рецептов.
+
+        Returns:
+            (рецепт, сколько раз можно выполнить; None - без ограничений)
+        """
+        book = get_recipe_book(self.db, company_id)
+        inventory = InventoryService(self.db)
+        artifacts = inventory.get_artifact_quantities(user_id, book.required_artifact_ids, company_id)
+        cosmetics = inventory.get_cosmetic_counts(user_id, book.required_cosmetic_ids, company_id)
+        return book.craftable(artifacts, cosmetics)
 
     def get_artifact_statistics(
         self,
@@ -0,0 +1,230 @@
+"""
+Кэш конфигураций аватаров.
+
+Конфигурация аватара читается при каждом просмотре профиля, а меняется
+только при надевании и снятии косметики, поэтому кэш сквозной записи:
+CosmeticService после коммита кладёт новую конфигурацию в кэш, чтения идут
+из кэша без запросов к БД.
+
+Два уровня: LRU в памяти процесса (avatar_cache_size записей,
+avatar_cache_local_ttl_seconds - ограничивает расхождение между процессами)
+и, если avatar_cache_redis_enabled, общий Redis (avatar_cache_ttl_seconds).
+Redis - необязательная зависимость (pip install redis); ошибки Redis не
+ломают запрос, кэш просто пропускается.
+
+Каждая запись версионируется ETag - хэшем канонического JSON конфигурации,
+одинаковым во всех процессах. Кроме того, запись хранит версию - момент
+изменения строки user_avatars (avatar_version): изменения одного аватара
+коммитятся под блокировкой строки, но пишутся в кэш уже после коммита и
+могут прийти в обратном порядке, поэтому запись не заменяется более старой
+версией (в Redis - атомарным скриптом).
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.redis_client import get_redis
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "avatar"
+
+# Записать payload (ARGV[1]), если в ключе нет записи новее версии ARGV[2]; вернуть запись ключа
+_SET_IF_NEWER_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, payload = pcall(cjson.decode, current)
+    if ok and payload['version'] and tonumber(payload['version']) > tonumber(ARGV[2]) then
+        return current
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return ARGV[1]
+"""
+
+
+@dataclass(frozen=True)
+class CachedAvatar:
+    """Конфигурация аватара и её версия."""
+
+    config: Dict[str, Any]
+    etag: str
+    version: float = 0.0  # avatar_version строки user_avatars; 0 - строки нет
+
+
+def avatar_version(updated_at: Optional[datetime]) -> float:
+    """Версия записи кэша по user_avatars.updated_at (время без зоны - UTC)."""
+    if updated_at is None:
+        return 0.0
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return updated_at.timestamp()
+
+
+def compute_etag(config: Dict[str, Any]) -> str:
+    """ETag конфигурации: хэш канонического JSON."""
+    canonical = json.dumps(config, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return '"' + hashlib.sha1(canonical.encode()).hexdigest() + '"'
+
+
+def equip_in_config(
+    config: Optional[Dict[str, Any]], cosmetic_id: int, slot: Optional[str], cosmetic_type: str
+) -> Dict[str, Any]:
+    """Новая конфигурация после надевания косметики: предмет заменяет предмет того же слота."""
+    cosmetics = [
+        item
+        for item in (config or {}).get("cosmetics", [])
+        if item["cosmetic_id"] != cosmetic_id and not (slot and item.get("slot") == slot)
+    ]
+    cosmetics.append({"cosmetic_id": cosmetic_id, "slot": slot, "type": cosmetic_type})
+    return {**(config or {}), "cosmetics": cosmetics}
+
+
+def unequip_in_config(config: Optional[Dict[str, Any]], cosmetic_id: int) -> Dict[str, Any]:
+    """Новая конфигурация после снятия косметики."""
+    cosmetics: List[Dict[str, Any]] = [
+        item for item in (config or {}).get("cosmetics", []) if item["cosmetic_id"] != cosmetic_id
+    ]
+    return {**(config or {}), "cosmetics": cosmetics}
+
+
+class AvatarCache:
+    """Двухуровневый кэш конфигураций аватаров."""
+
+    def __init__(
+        self,
+        max_size: int,
+        local_ttl_seconds: float,
+        redis_ttl_seconds: int,
+        redis_client: Any = None,
+    ):
+        """Инициализация кэша."""
+        self.max_size = max_size
+        self.local_ttl_seconds = local_ttl_seconds
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.redis = redis_client
+        self._lock = threading.Lock()
+        # ключ -> (момент записи, конфигурация)
+        self._local: "OrderedDict[str, Tuple[float, CachedAvatar]]" = OrderedDict()
+
+    @staticmethod
+    def key(user_id: int, company_id: Optional[int] = None) -> str:
+        """Ключ записи пользователя."""
+        return f"{REDIS_KEY_PREFIX}:{company_id or 0}:{user_id}"
+
+    def get(self, user_id: int, company_id: Optional[int] = None) -> Optional[CachedAvatar]:
+        """Получить конфигурацию из кэша (сначала из памяти, затем из Redis)."""
+        key = self.key(user_id, company_id)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._local.get(key)
+            if cached is not None:
+                if now - cached[0] < self.local_ttl_seconds:
+                    self._local.move_to_end(key)
+                    return cached[1]
+                del self._local[key]
+
+        if self.redis is None:
+            return None
+        try:
+            raw = self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Redis недоступен, кэш аватаров пропущен: {e}")
+            return None
+        if raw is None:
+            return None
+        return self._remember(key, self._decode(raw), now)
+
+    def set(
+        self, user_id: int, company_id: Optional[int], config: Dict[str, Any], version: float = 0.0
+    ) -> CachedAvatar:
+        """
+        Записать конфигурацию в оба уровня кэша, если там нет версии новее.
+
+        Returns:
+            Запись кэша после записи (более новая, если запись отклонена)
+        """
+        key = self.key(user_id, company_id)
+        avatar = CachedAvatar(config=config, etag=compute_etag(config), version=version)
+        avatar = self._remember(key, avatar, time.monotonic())
+        if self.redis is not None:
+            payload = json.dumps(
+                {"config": avatar.config, "etag": avatar.etag, "version": avatar.version}, ensure_ascii=False
+            )
+            try:
+                stored = self.redis.eval(
+                    _SET_IF_NEWER_SCRIPT, 1, key, payload, avatar.version, self.redis_ttl_seconds
+                )
+            except Exception as e:
+                logger.warning(f"Redis недоступен, кэш аватаров пропущен: {e}")
+            else:
+                # Скрипт возвращает запись ключа - свою или более новую
+                avatar = self._remember(key, self._decode(stored), time.monotonic())
+        return avatar
+
+    def invalidate(self, user_id: int, company_id: Optional[int] = None) -> None:
+        """Удалить запись пользователя из обоих уровней."""
+        key = self.key(user_id, company_id)
+        with self._lock:
+            self._local.pop(key, None)
+        if self.redis is not None:
+            try:
+                self.redis.delete(key)
+            except Exception as e:
+                logger.warning(f"Redis недоступен, кэш аватаров пропущен: {e}")
+
+    @staticmethod
+    def _decode(raw: Any) -> CachedAvatar:
+        """Запись кэша из JSON Redis."""
+        payload = json.loads(raw)
+        return CachedAvatar(config=payload["config"], etag=payload["etag"], version=payload.get("version", 0.0))
+
+    def _remember(self, key: str, avatar: CachedAvatar, now: float) -> CachedAvatar:
+        """
+        Положить запись в LRU, вытеснив самую старую при переполнении.
+
+        Returns:
+            Запись LRU: более новая версия остаётся на месте
+        """
+        with self._lock:
+            cached = self._local.get(key)
+            if cached is not None and cached[1].version > avatar.version:
+                avatar = cached[1]
+            self._local[key] = (now, avatar)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+        return avatar
+
+
+def _connect_redis() -> Any:
+    """Клиент Redis, если общий уровень кэша включён."""
+    if not settings.avatar_cache_redis_enabled:
+        return None
+    return get_redis()
+
+
+_avatar_cache: Optional[AvatarCache] = None
+_avatar_cache_lock = threading.Lock()
+
+
+def get_avatar_cache() -> AvatarCache:
+    """Кэш аватаров процесса."""
+    global _avatar_cache
+    with _avatar_cache_lock:
+        if _avatar_cache is None:
+            _avatar_cache = AvatarCache(
+                max_size=settings.avatar_cache_size,
+                local_ttl_seconds=settings.avatar_cache_local_ttl_seconds,
+                redis_ttl_seconds=settings.avatar_cache_ttl_seconds,
+                redis_client=_connect_redis(),
+            )
+        return _avatar_cache
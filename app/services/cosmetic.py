@@ -1,15 +1,24 @@
 """Сервис работы с косметикой."""
 import logging
 from datetime import datetime, timezone
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict, Tuple
 
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session, contains_eager
 
 from app.core.config import get_settings
-from app.models.cosmetic import Cosmetic, UserCosmetic, CosmeticCraftingRequirement, UserAvatar
+from app.core.pagination import paginate
+from app.models.cosmetic import Cosmetic, UserCosmetic, UserAvatar
 from app.models.user import User
-from app.models.artifact import UserArtifact
+from app.services.avatar_cache import (
+    CachedAvatar,
+    avatar_version,
+    equip_in_config,
+    get_avatar_cache,
+    unequip_in_config,
+)
+from app.services.inventory import InsufficientItemsError, InventoryService
+from app.services.recipes import get_recipe_book, invalidate_recipes
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -54,6 +63,7 @@ class CosmeticService:
         )
         self.db.add(cosmetic)
         self.db.commit()
+        invalidate_recipes(company_id)
         self.db.refresh(cosmetic)
         logger.info(f"Создана косметика: {cosmetic.id} ({cosmetic.name})")
         return cosmetic
@@ -66,6 +76,7 @@ class CosmeticService:
         company_id: Optional[int] = None,
         limit: int = 100,
         offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> List[UserCosmetic]:
         """Получить косметику пользователя."""
         query = (
@@ -84,7 +95,7 @@ class CosmeticService:
         if company_id is not None:
             query = query.filter(UserCosmetic.company_id == company_id)
 
-        return query.order_by(UserCosmetic.obtained_at.desc()).offset(offset).limit(limit).all()
+        return paginate(query, UserCosmetic.obtained_at, UserCosmetic.id, limit, offset, cursor).all()
 
     def equip_cosmetic(
         self,
@@ -96,6 +107,7 @@ class CosmeticService:
         user_cosmetic = (
             self.db.query(UserCosmetic)
             .join(Cosmetic)
+            .options(contains_eager(UserCosmetic.cosmetic))
             .filter(
                 UserCosmetic.user_id == user_id,
                 UserCosmetic.cosmetic_id == cosmetic_id,
@@ -109,31 +121,41 @@ class CosmeticService:
         if not user_cosmetic:
             raise ValueError("Косметика не найдена у пользователя")
 
-        # Снять другую косметику того же слота
+        now = datetime.now(timezone.utc)
+        # Снять другую косметику того же слота одним UPDATE
         cosmetic = user_cosmetic.cosmetic
         if cosmetic.slot:
+            user_cosmetics = UserCosmetic.__table__
+            slot_cosmetic_ids = select(Cosmetic.id).where(
+                Cosmetic.slot == cosmetic.slot,
+                Cosmetic.deleted_at.is_(None),
+            )
             other_equipped = (
-                self.db.query(UserCosmetic)
-                .join(Cosmetic)
-                .filter(
-                    UserCosmetic.user_id == user_id,
-                    UserCosmetic.is_equipped.is_(True),
-                    Cosmetic.slot == cosmetic.slot,
-                    Cosmetic.deleted_at.is_(None)
+                user_cosmetics.update()
+                .where(
+                    user_cosmetics.c.user_id == user_id,
+                    user_cosmetics.c.is_equipped.is_(True),
+                    user_cosmetics.c.cosmetic_id.in_(slot_cosmetic_ids),
+                    user_cosmetics.c.id != user_cosmetic.id,
                 )
+                .values(is_equipped=False, updated_at=now)
             )
             if company_id is not None:
-                other_equipped = other_equipped.filter(UserCosmetic.company_id == company_id)
-            for uc in other_equipped.all():
-                uc.is_equipped = False
+                other_equipped = other_equipped.where(user_cosmetics.c.company_id == company_id)
+            self.db.execute(other_equipped)
 
         user_cosmetic.is_equipped = True
-        user_cosmetic.updated_at = datetime.now(timezone.utc)
+        user_cosmetic.updated_at = now
 
-        # Обновить конфигурацию аватара
-        self._update_avatar_config(user_id, company_id)
+        # Обновить конфигурацию аватара: заменить предмет слота
+        avatar_config, version = self._write_avatar_config(
+            user_id,
+            company_id,
+            lambda config: equip_in_config(config, cosmetic.id, cosmetic.slot, cosmetic.cosmetic_type),
+        )
 
         self.db.commit()
+        get_avatar_cache().set(user_id, company_id, avatar_config, version)
         self.db.refresh(user_cosmetic)
         logger.info(f"Косметика надета пользователем {user_id}: {cosmetic.name}")
         return user_cosmetic
@@ -162,22 +184,66 @@ class CosmeticService:
         user_cosmetic.is_equipped = False
         user_cosmetic.updated_at = datetime.now(timezone.utc)
 
-        # Обновить конфигурацию аватара
-        self._update_avatar_config(user_id, company_id)
+        # Обновить конфигурацию аватара: убрать предмет
+        avatar_config, version = self._write_avatar_config(
+            user_id, company_id, lambda config: unequip_in_config(config, cosmetic_id)
+        )
 
         self.db.commit()
+        get_avatar_cache().set(user_id, company_id, avatar_config, version)
         self.db.refresh(user_cosmetic)
         return user_cosmetic
 
-    def _update_avatar_config(
+    def _write_avatar_config(
+        self,
+        user_id: int,
+        company_id: Optional[int],
+        change: Callable[[Optional[Dict]], Dict],
+    ) -> Tuple[Dict, float]:
+        """
+        Изменить конфигурацию аватара (без коммита); вернуть новую конфигурацию
+        и её версию для кэша.
+
+        Строка аватара блокируется, чтобы параллельные изменения слотов не
+        затирали друг друга. Если строки ещё нет, конфигурация собирается
+        из надетой косметики: изменение is_equipped ещё не записано в БД
+        (autoflush выключен), поэтому change применяется и к собранной
+        конфигурации.
+        """
+        user_avatar = (
+            self.db.query(UserAvatar)
+            .filter(UserAvatar.user_id == user_id)
+        )
+        if company_id is not None:
+            user_avatar = user_avatar.filter(UserAvatar.company_id == company_id)
+        user_avatar = user_avatar.with_for_update().first()
+
+        now = datetime.now(timezone.utc)
+        if user_avatar:
+            avatar_config = change(user_avatar.avatar_config)
+            user_avatar.avatar_config = avatar_config
+            user_avatar.updated_at = now
+        else:
+            avatar_config = change(self._build_avatar_config(user_id, company_id))
+            user_avatar = UserAvatar(
+                user_id=user_id,
+                avatar_config=avatar_config,
+                company_id=company_id,
+                updated_at=now,
+            )
+            self.db.add(user_avatar)
+        return avatar_config, avatar_version(now)
+
+    def _build_avatar_config(
         self,
         user_id: int,
         company_id: Optional[int] = None,
-    ) -> None:
-        """Обновить конфигурацию аватара пользователя."""
+    ) -> Dict:
+        """Собрать конфигурацию аватара из надетой косметики одним запросом."""
         equipped_cosmetics = (
             self.db.query(UserCosmetic)
             .join(Cosmetic)
+            .options(contains_eager(UserCosmetic.cosmetic))
             .filter(
                 UserCosmetic.user_id == user_id,
                 UserCosmetic.is_equipped.is_(True),
@@ -188,7 +254,7 @@ class CosmeticService:
             equipped_cosmetics = equipped_cosmetics.filter(UserCosmetic.company_id == company_id)
         equipped_cosmetics = equipped_cosmetics.all()
 
-        avatar_config = {
+        return {
             "cosmetics": [
                 {
                     "cosmetic_id": uc.cosmetic_id,
@@ -199,24 +265,26 @@ class CosmeticService:
             ]
         }
 
-        user_avatar = (
-            self.db.query(UserAvatar)
-            .filter(UserAvatar.user_id == user_id)
-        )
+    def get_avatar(
+        self,
+        user_id: int,
+        company_id: Optional[int] = None,
+    ) -> CachedAvatar:
+        """Получить конфигурацию аватара с ETag (из кэша, при промахе - из БД)."""
+        cache = get_avatar_cache()
+        avatar = cache.get(user_id, company_id)
+        if avatar is not None:
+            return avatar
+
+        query = self.db.query(UserAvatar.avatar_config, UserAvatar.updated_at).filter(UserAvatar.user_id == user_id)
         if company_id is not None:
-            user_avatar = user_avatar.filter(UserAvatar.company_id == company_id)
-        user_avatar = user_avatar.first()
-
-        if user_avatar:
-            user_avatar.avatar_config = avatar_config
-            user_avatar.updated_at = datetime.now(timezone.utc)
-        else:
-            user_avatar = UserAvatar(
-                user_id=user_id,
-                avatar_config=avatar_config,
-                company_id=company_id,
-            )
-            self.db.add(user_avatar)
+            query = query.filter(UserAvatar.company_id == company_id)
+        row = query.first()
+        # Пустая конфигурация тоже кэшируется, чтобы не ходить в БД за аватарами без косметики
+        if row is None:
+            return cache.set(user_id, company_id, {})
+        # Версия строки не даёт чтению, начатому до чужого коммита, затереть новую запись
+        return cache.set(user_id, company_id, row.avatar_config or {}, avatar_version(row.updated_at))
 
     def get_avatar_config(
         self,
@@ -224,14 +292,7 @@ class CosmeticService:
         company_id: Optional[int] = None,
     ) -> Optional[Dict]:
         """Получить конфигурацию аватара пользователя."""
-        query = self.db.query(UserAvatar).filter(UserAvatar.user_id == user_id)
-        if company_id is not None:
-            query = query.filter(UserAvatar.company_id == company_id)
-        user_avatar = query.first()
-
-        if user_avatar:
-            return user_avatar.avatar_config
-        return None
+        return self.get_avatar(user_id, company_id).config or None
 
     def craft_cosmetic(
         self,
@@ -240,71 +301,26 @@ class CosmeticService:
         company_id: Optional[int] = None,
     ) -> UserCosmetic:
         """Создать косметику через крафт."""
-        cosmetic = (
-            self.db.query(Cosmetic)
-            .filter(
-                Cosmetic.id == cosmetic_id,
-                Cosmetic.is_active.is_(True),
-                Cosmetic.deleted_at.is_(None)
-            )
-        )
-        if company_id is not None:
-            cosmetic = cosmetic.filter(Cosmetic.company_id == company_id)
-        cosmetic = cosmetic.first()
-
-        if not cosmetic or not cosmetic.is_craftable:
+        recipe = get_recipe_book(self.db, company_id).cosmetics.get(cosmetic_id)
+        if recipe is None:
             raise ValueError("Косметика не может быть создана через крафт")
 
-        # Проверить требования для крафта
-        requirements = (
-            self.db.query(CosmeticCraftingRequirement)
-            .filter(CosmeticCraftingRequirement.cosmetic_id == cosmetic_id)
-        )
-        if company_id is not None:
-            requirements = requirements.filter(CosmeticCraftingRequirement.company_id == company_id)
-        requirements = requirements.all()
-
-        # Проверить наличие всех требуемых предметов
-        for req in requirements:
-            if req.required_artifact_id:
-                user_artifact = (
-                    self.db.query(UserArtifact)
-                    .filter(
-                        UserArtifact.user_id == user_id,
-                        UserArtifact.artifact_id == req.required_artifact_id
-                    )
-                )
-                if company_id is not None:
-                    user_artifact = user_artifact.filter(UserArtifact.company_id == company_id)
-                user_artifact = user_artifact.first()
-                
-                if not user_artifact or user_artifact.quantity < req.required_quantity:
-                    raise ValueError(f"Недостаточно артефактов для крафта")
-            elif req.required_cosmetic_id:
-                user_cosmetics = self.get_user_cosmetics(
-                    user_id, company_id=company_id, limit=10000
-                )
-                cosmetic_count = sum(
-                    1 for uc in user_cosmetics if uc.cosmetic_id == req.required_cosmetic_id
-                )
-                if cosmetic_count < req.required_quantity:
+        # Проверить наличие требуемой косметики одним агрегатом
+        inventory = InventoryService(self.db)
+        if recipe.cosmetics:
+            counts = inventory.get_cosmetic_counts(
+                user_id, (required_id for required_id, _ in recipe.cosmetics), company_id
+            )
+            for required_id, quantity in recipe.cosmetics:
+                if counts.get(required_id, 0) < quantity:
                     raise ValueError(f"Недостаточно косметики для крафта")
 
-        # Удалить использованные предметы
-        for req in requirements:
-            if req.required_artifact_id:
-                user_artifact = (
-                    self.db.query(UserArtifact)
-                    .filter(
-                        UserArtifact.user_id == user_id,
-                        UserArtifact.artifact_id == req.required_artifact_id
-                    )
-                    .first()
-                )
-                if user_artifact:
-                    user_artifact.quantity -= req.required_quantity
-                    if user_artifact.quantity <= 0:
-                        self.db.delete(user_artifact)
+        # Списать требуемые артефакты одним условным UPDATE
+        try:
+            inventory.consume_artifacts(user_id, recipe.artifacts, company_id)
+        except InsufficientItemsError:
+            self.db.rollback()
+            raise ValueError(f"Недостаточно артефактов для крафта")
 
         # Создать новую косметику
         user_cosmetic = UserCosmetic(
@@ -318,5 +334,5 @@ class CosmeticService:
         self.db.add(user_cosmetic)
         self.db.commit()
         self.db.refresh(user_cosmetic)
-        logger.info(f"Косметика создана через крафт пользователем {user_id}: {cosmetic.name}")
+        logger.info(f"Косметика создана через крафт пользователем {user_id}: {recipe.name}")
         return user_cosmetic
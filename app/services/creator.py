@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 from app.core.config import get_settings
 from app.models.creator import Creator, CreatorPayment, QuestModeration, CreatorStatus, QuestModerationStatus
 from app.models.event import Quest
+from app.services.quest_triggers import invalidate_quest_trigger_index
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -126,6 +127,7 @@ class CreatorService:
 
         self.db.commit()
         self.db.refresh(quest)
+        invalidate_quest_trigger_index(company_id)
         logger.info(f"Создан платный квест: {quest.id} создателем {creator_id}")
         return quest
 
@@ -0,0 +1,128 @@
+"""
+Таблицы выпадения артефактов.
+
+Для каждой геозоны строится таблица выпадения по drop_chance её активных
+артефактов: drop_chance - доля вероятности артефакта, остаток до 1 -
+вероятность, что ничего не выпадет (если сумма шансов больше 1, шансы
+нормируются и что-то выпадает всегда). Таблица хранится в виде alias-таблицы
+(метод Vose), поэтому исход выбирается за O(1) независимо от порядка и
+количества артефактов. Таблицы кэшируются на процесс для каждой пары
+(компания, геозона) и сбрасываются при изменении артефактов компании.
+"""
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.artifact import Artifact
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class AliasTable:
+    """Alias-таблица дискретного распределения (метод Vose)."""
+
+    outcomes: Tuple[Optional[int], ...]  # ID артефакта или None - ничего не выпало
+    probabilities: Tuple[float, ...]
+    aliases: Tuple[int, ...]
+
+    @classmethod
+    def build(cls, outcomes: Sequence[Optional[int]], weights: Sequence[float]) -> "AliasTable":
+        """Построить таблицу по неотрицательным весам исходов."""
+        total = float(sum(weights))
+        if not outcomes or total <= 0:
+            return cls(outcomes=(None,), probabilities=(1.0,), aliases=(0,))
+
+        count = len(outcomes)
+        scaled = [weight * count / total for weight in weights]
+        probabilities = [0.0] * count
+        aliases = list(range(count))
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            probabilities[less] = scaled[less]
+            aliases[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # Остатки из-за погрешности округления равны 1
+        for index in small + large:
+            probabilities[index] = 1.0
+
+        return cls(outcomes=tuple(outcomes), probabilities=tuple(probabilities), aliases=tuple(aliases))
+
+    def sample(self, rng: Optional[random.Random] = None) -> Optional[int]:
+        """Выбрать исход за O(1)."""
+        uniform = rng.random if rng is not None else random.random
+        column = int(uniform() * len(self.outcomes))
+        if uniform() < self.probabilities[column]:
+            return self.outcomes[column]
+        return self.outcomes[self.aliases[column]]
+
+
+def build_drop_table(drop_chances: Sequence[Tuple[int, float]]) -> AliasTable:
+    """Построить таблицу выпадения по (artifact_id, drop_chance) с исходом «ничего»."""
+    outcomes: List[Optional[int]] = []
+    weights: List[float] = []
+    for artifact_id, drop_chance in drop_chances:
+        if drop_chance and drop_chance > 0:
+            outcomes.append(artifact_id)
+            weights.append(float(drop_chance))
+
+    no_drop = 1.0 - sum(weights)
+    if no_drop > 0:
+        outcomes.append(None)
+        weights.append(no_drop)
+    return AliasTable.build(outcomes, weights)
+
+
+_cache_lock = threading.Lock()
+# (company_id, geozone_id) -> (момент построения, таблица)
+_drop_table_cache: Dict[Tuple[Optional[int], int], Tuple[float, AliasTable]] = {}
+
+
+def get_drop_table(db: Session, geozone_id: int, company_id: Optional[int] = None) -> AliasTable:
+    """
+    Получить таблицу выпадения геозоны.
+
+    Таблица кэшируется на artifact_drop_table_cache_ttl_seconds; в текущем
+    процессе кэш сбрасывается при создании артефакта.
+    """
+    key = (company_id, geozone_id)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _drop_table_cache.get(key)
+    if cached is not None and now - cached[0] < settings.artifact_drop_table_cache_ttl_seconds:
+        return cached[1]
+
+    query = db.query(Artifact.id, Artifact.drop_chance).filter(
+        Artifact.geozone_id == geozone_id,
+        Artifact.is_active.is_(True),
+        Artifact.deleted_at.is_(None),
+    )
+    if company_id is not None:
+        query = query.filter(Artifact.company_id == company_id)
+    table = build_drop_table(query.order_by(Artifact.id).all())
+
+    with _cache_lock:
+        _drop_table_cache[key] = (now, table)
+    return table
+
+
+def invalidate_drop_tables(company_id: Optional[int] = None) -> None:
+    """Сбросить таблицы выпадения компании (и таблицы без фильтра по компании)."""
+    with _cache_lock:
+        for key in [key for key in _drop_table_cache if key[0] in (company_id, None)]:
+            del _drop_table_cache[key]
@@ -10,6 +10,7 @@ from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
+from app.core.pagination import paginate
 from app.models.location import LocationPoint, LocationSession
 
 settings = get_settings()
@@ -62,9 +63,12 @@ class GeolocationService:
         if timestamp is None:
             timestamp = datetime.now(timezone.utc)
 
+        session = self.db.query(LocationSession).filter(LocationSession.id == session_id).first()
+
         point = Point(longitude, latitude)
         location_point = LocationPoint(
             session_id=session_id,
+            user_id=session.user_id if session else None,
             latitude=latitude,
             longitude=longitude,
             point=from_shape(point, srid=4326),
@@ -82,8 +86,36 @@ class GeolocationService:
         self.db.commit()
         self.db.refresh(location_point)
 
-        # Получаем сессию для обработки траектории
-        session = self.db.query(LocationSession).filter(LocationSession.id == session_id).first()
+        if session and not is_spoofed:
+            # Прибавить шаг от предыдущей точки пользователя к пройденному расстоянию в рейтингах
+            try:
+                from app.models.leaderboard import LeaderboardMetric
+                from app.services.player_leaderboard import PlayerLeaderboardService
+                previous = (
+                    self.db.query(LocationPoint.latitude, LocationPoint.longitude)
+                    .filter(
+                        LocationPoint.user_id == session.user_id,
+                        LocationPoint.timestamp < timestamp,
+                        LocationPoint.is_spoofed.is_(False),
+                    )
+                    .order_by(LocationPoint.timestamp.desc())
+                    .first()
+                )
+                if previous is not None:
+                    step = self.calculate_distance_between_points(
+                        previous.latitude, previous.longitude, latitude, longitude
+                    )
+                    PlayerLeaderboardService(self.db).record(
+                        LeaderboardMetric.DISTANCE,
+                        {session.user_id: step},
+                        company_id,
+                        location=(latitude, longitude),
+                    )
+                    self.db.commit()
+            except Exception as e:
+                self.db.rollback()
+                logger.warning(f"Ошибка при обновлении рейтинга расстояния: {e}")
+
         if session:
             # Обработка открытия Area POI по траектории
             try:
@@ -112,26 +144,15 @@ class GeolocationService:
             except Exception as e:
                 logger.warning(f"Ошибка при обработке Area POI discovery: {e}")
 
-            # Обновить прогресс квестов при добавлении точки геолокации
+            # Обновить прогресс квестов, зависящих от пройденного расстояния
             try:
                 from app.services.quest import QuestService
-                quest_service = QuestService(self.db)
-                from app.models.event import UserQuest, QuestStatus
-                active_quests = (
-                    self.db.query(UserQuest)
-                    .filter(
-                        UserQuest.user_id == session.user_id,
-                        UserQuest.status == QuestStatus.IN_PROGRESS
-                    )
+                from app.services.quest_triggers import QuestEventKind
+                QuestService(self.db).dispatch_event(
+                    user_id=session.user_id,
+                    event_kind=QuestEventKind.LOCATION_POINT,
+                    company_id=company_id,
                 )
-                if company_id is not None:
-                    active_quests = active_quests.filter(UserQuest.company_id == company_id)
-                for user_quest in active_quests.all():
-                    quest_service.update_quest_progress(
-                        user_id=session.user_id,
-                        quest_id=user_quest.quest_id,
-                        company_id=company_id,
-                    )
             except Exception as e:
                 logger.warning(f"Ошибка при обновлении прогресса квестов: {e}")
 
@@ -145,13 +166,10 @@ class GeolocationService:
         limit: int = 100,
         offset: int = 0,
         company_id: Optional[int] = None,
+        cursor: Optional[str] = None,
     ) -> List[LocationPoint]:
-        """Получить точки геолокации пользователя с пагинацией."""
-        query = (
-            self.db.query(LocationPoint)
-            .join(LocationSession)
-            .filter(LocationSession.user_id == user_id)
-        )
+        """Получить точки геолокации пользователя с пагинацией (курсор или offset)."""
+        query = self.db.query(LocationPoint).filter(LocationPoint.user_id == user_id)
 
         if company_id is not None:
             query = query.filter(LocationPoint.company_id == company_id)
@@ -161,7 +179,7 @@ class GeolocationService:
         if end_time:
             query = query.filter(LocationPoint.timestamp <= end_time)
 
-        return query.order_by(LocationPoint.timestamp.desc()).offset(offset).limit(limit).all()
+        return paginate(query, LocationPoint.timestamp, LocationPoint.id, limit, offset, cursor).all()
 
     def get_last_location_point(
         self, user_id: int, company_id: Optional[int] = None
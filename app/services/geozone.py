@@ -1,21 +1,80 @@
 """Сервис работы с геозонами (полигонами)."""
 import logging
 from datetime import datetime, timezone
-from typing import List, Optional
+from enum import Enum
+from typing import Dict, List, Optional
 
+import numpy as np
+import shapely
 from geoalchemy2.shape import from_shape, to_shape
 from shapely.geometry import Point, Polygon
+from shapely.geometry.base import BaseGeometry
 from shapely.validation import make_valid
 from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, defer
 
 from app.core.config import get_settings
+from app.core.pagination import paginate
+from app.core.geodesy import area_m2
 from app.models.geozone import Geozone, GeozoneVisit
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
 
+class GeozoneLOD(str, Enum):
+    """Уровень детализации полигона геозоны."""
+    FULL = "full"  # Исходный полигон - только для финальной проверки вхождения
+    FINE = "fine"
+    MEDIUM = "medium"
+    COARSE = "coarse"  # Отбор кандидатов и обзорные карты
+
+
+# Допуски упрощения в градусах (~11 м, ~55 м, ~220 м на экваторе)
+LOD_TOLERANCES_DEGREES: Dict[GeozoneLOD, float] = {
+    GeozoneLOD.FINE: 0.0001,
+    GeozoneLOD.MEDIUM: 0.0005,
+    GeozoneLOD.COARSE: 0.002,
+}
+
+GEOMETRY_TYPE_POLYGON = 3  # shapely.GeometryType.POLYGON
+
+# Порядок отката к более детальному уровню, если упрощённый вариант не сохранён
+_LOD_FALLBACK_ORDER = [GeozoneLOD.COARSE, GeozoneLOD.MEDIUM, GeozoneLOD.FINE, GeozoneLOD.FULL]
+
+
+def build_lod_polygons_bulk(polygons: np.ndarray) -> Dict[GeozoneLOD, np.ndarray]:
+    """
+    Построить упрощённые варианты для массива полигонов (векторизованно).
+
+    Упрощение выполняется с сохранением топологии. Если уровень не уменьшает
+    число вершин относительно более детального, он не сохраняется (None).
+    """
+    polygons = np.asarray(polygons, dtype=object)
+    previous_counts = shapely.get_num_coordinates(polygons)
+    lods: Dict[GeozoneLOD, np.ndarray] = {}
+    for lod, tolerance in LOD_TOLERANCES_DEGREES.items():
+        simplified = shapely.simplify(polygons, tolerance, preserve_topology=True)
+        counts = shapely.get_num_coordinates(simplified)
+        keep = (
+            (shapely.get_type_id(simplified) == GEOMETRY_TYPE_POLYGON)
+            & ~shapely.is_empty(simplified)
+            & (counts < previous_counts)
+        )
+        level = np.full(len(polygons), None, dtype=object)
+        level[keep] = simplified[keep]
+        lods[lod] = level
+        previous_counts = np.where(keep, counts, previous_counts)
+    return lods
+
+
+def build_lod_polygons(polygon: BaseGeometry) -> Dict[GeozoneLOD, Optional[Polygon]]:
+    """Построить упрощённые варианты одного полигона для всех уровней детализации."""
+    if not isinstance(polygon, Polygon) or polygon.is_empty:
+        return {lod: None for lod in LOD_TOLERANCES_DEGREES}
+    return {lod: level[0] for lod, level in build_lod_polygons_bulk(np.array([polygon], dtype=object)).items()}
+
+
 class GeozoneService:
     """Сервис для работы с геозонами."""
 
@@ -45,13 +104,19 @@ class GeozoneService:
         center_lat = center.y
         center_lon = center.x
 
+        lods = build_lod_polygons(polygon)
+
         geozone = Geozone(
             name=name,
             description=description,
             polygon=from_shape(polygon, srid=4326),
+            polygon_fine=self._to_lod_geometry(lods[GeozoneLOD.FINE]),
+            polygon_medium=self._to_lod_geometry(lods[GeozoneLOD.MEDIUM]),
+            polygon_coarse=self._to_lod_geometry(lods[GeozoneLOD.COARSE]),
             center_latitude=str(center_lat),
             center_longitude=str(center_lon),
             geozone_type=geozone_type,
+            area_square_meters=area_m2(polygon),
             company_id=company_id,
         )
         self.db.add(geozone)
@@ -59,6 +124,33 @@ class GeozoneService:
         self.db.refresh(geozone)
         return geozone
 
+    @staticmethod
+    def _to_lod_geometry(polygon: Optional[Polygon]):
+        """Преобразовать упрощённый полигон в геометрию БД."""
+        return from_shape(polygon, srid=4326) if polygon is not None else None
+
+    @staticmethod
+    def lod_column(lod: GeozoneLOD):
+        """Получить колонку модели для уровня детализации."""
+        return {
+            GeozoneLOD.FULL: Geozone.polygon,
+            GeozoneLOD.FINE: Geozone.polygon_fine,
+            GeozoneLOD.MEDIUM: Geozone.polygon_medium,
+            GeozoneLOD.COARSE: Geozone.polygon_coarse,
+        }[lod]
+
+    def get_geozone_shape(self, geozone: Geozone, lod: GeozoneLOD = GeozoneLOD.FULL) -> BaseGeometry:
+        """
+        Получить полигон геозоны на заданном уровне детализации.
+
+        Если упрощённый вариант не сохранён, используется ближайший более детальный.
+        """
+        for level in _LOD_FALLBACK_ORDER[_LOD_FALLBACK_ORDER.index(lod):]:
+            geometry = getattr(geozone, self.lod_column(level).key)
+            if geometry is not None:
+                return to_shape(geometry)
+        return to_shape(geozone.polygon)
+
     def check_point_in_geozone(
         self, latitude: float, longitude: float, geozone_id: int
     ) -> bool:
@@ -121,7 +213,22 @@ class GeozoneService:
         self.db.commit()
         self.db.refresh(visit)
 
+        # Учесть посещение в очках гильдий и рейтингах игроков
+        try:
+            from app.models.leaderboard import LeaderboardMetric
+            from app.services.guild_scoring import GuildScoringService, ScoreDelta
+            from app.services.player_leaderboard import PlayerLeaderboardService
+            GuildScoringService(self.db).record({user_id: ScoreDelta(visits=1)}, company_id)
+            PlayerLeaderboardService(self.db).record(
+                LeaderboardMetric.VISITS, {user_id: 1}, company_id, geozone_id=geozone_id
+            )
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.warning(f"Ошибка при обновлении очков гильдий и рейтингов: {e}")
+
         # Попытаться выдать артефакт при посещении геозоны
+        dropped_artifact = None
         try:
             from app.services.artifact import ArtifactService
             artifact_service = ArtifactService(self.db)
@@ -135,27 +242,17 @@ class GeozoneService:
         except Exception as e:
             logger.warning(f"Ошибка при выдаче артефакта: {e}")
 
-        # Обновить прогресс квестов
+        # Обновить прогресс квестов, зависящих от геозоны
+        # (квесты на сбор выпавшего артефакта обновляются при его начислении)
         try:
             from app.services.quest import QuestService
-            quest_service = QuestService(self.db)
-            # Получить активные квесты пользователя
-            from app.models.event import UserQuest, QuestStatus
-            active_quests = (
-                self.db.query(UserQuest)
-                .filter(
-                    UserQuest.user_id == user_id,
-                    UserQuest.status == QuestStatus.IN_PROGRESS
-                )
+            from app.services.quest_triggers import QuestEventKind
+            QuestService(self.db).dispatch_event(
+                user_id=user_id,
+                event_kind=QuestEventKind.GEOZONE_VISIT,
+                keys=[geozone_id],
+                company_id=company_id,
             )
-            if company_id is not None:
-                active_quests = active_quests.filter(UserQuest.company_id == company_id)
-            for user_quest in active_quests.all():
-                quest_service.update_quest_progress(
-                    user_id=user_id,
-                    quest_id=user_quest.quest_id,
-                    company_id=company_id,
-                )
         except Exception as e:
             logger.warning(f"Ошибка при обновлении прогресса квестов: {e}")
 
@@ -184,6 +281,7 @@ class GeozoneService:
         company_id: Optional[int] = None,
         limit: int = 100,
         offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> List[GeozoneVisit]:
         """Получить посещения геозон пользователя с пагинацией."""
         query = self.db.query(GeozoneVisit).filter(GeozoneVisit.user_id == user_id)
@@ -194,7 +292,7 @@ class GeozoneService:
         if company_id is not None:
             query = query.filter(GeozoneVisit.company_id == company_id)
 
-        return query.order_by(GeozoneVisit.visit_started_at.desc()).offset(offset).limit(limit).all()
+        return paginate(query, GeozoneVisit.visit_started_at, GeozoneVisit.id, limit, offset, cursor).all()
 
     def get_geozone_by_id(
         self, geozone_id: int, company_id: Optional[int] = None
@@ -219,8 +317,10 @@ class GeozoneService:
         offset: int = 0,
     ) -> List[Geozone]:
         """Получить все активные геозоны с фильтрацией по soft delete и пагинацией."""
+        # Полигон не входит в ответ списка - не загружаем полную геометрию
         query = (
             self.db.query(Geozone)
+            .options(defer(Geozone.polygon))
             .filter(
                 Geozone.is_active.is_(True),
                 Geozone.deleted_at.is_(None)
@@ -1,18 +1,32 @@
 """Сервис работы с гильдиями."""
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
 from app.models.guild import Guild, GuildMember, GuildAchievement, GuildRole, GuildStatus
 from app.models.achievement import Achievement, UserAchievement
+from app.services.guild_scoring import GuildScoringService
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+_membership_lock = threading.Lock()
+# (company_id, user_id) -> (момент загрузки, колонки участника или None)
+_membership_cache: "OrderedDict[Tuple[Optional[int], int], Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+
+
+def invalidate_membership(user_id: int, company_id: Optional[int] = None) -> None:
+    """Сбросить кэш участия пользователя в гильдии."""
+    with _membership_lock:
+        _membership_cache.pop((company_id, user_id), None)
+
 
 class GuildService:
     """Сервис для работы с гильдиями."""
@@ -50,6 +64,7 @@ class GuildService:
             tag=tag,
             banner_url=banner_url,
             max_members=max_members,
+            member_count=1,  # Лидер
             company_id=company_id,
         )
         self.db.add(guild)
@@ -64,9 +79,13 @@ class GuildService:
             company_id=company_id,
         )
         self.db.add(leader)
+        scoring = GuildScoringService(self.db)
+        scoring.guild_created(guild.id, company_id)
+        scoring.member_joined(guild.id, leader_id)
 
         self.db.commit()
         self.db.refresh(guild)
+        invalidate_membership(leader_id, company_id)
         logger.info(f"Создана гильдия: {guild.id} ({guild.name}) лидером {leader_id}")
         return guild
 
@@ -76,56 +95,101 @@ class GuildService:
         user_id: int,
         company_id: Optional[int] = None,
     ) -> GuildMember:
-        """Присоединиться к гильдии."""
-        guild = (
-            self.db.query(Guild)
-            .filter(
-                Guild.id == guild_id,
-                Guild.status == GuildStatus.ACTIVE,
-                Guild.deleted_at.is_(None)
+        """
+        Присоединиться к гильдии.
+
+        Место занимается условным UPDATE счётчика member_count: проверка
+        max_members и увеличение счётчика атомарны, поэтому конкурентные
+        вступления не переполняют гильдию. Повторное вступление отсекает
+        уникальный индекс (guild_id, user_id) - вставка участника с
+        ON CONFLICT DO NOTHING, откат возвращает занятое место.
+        """
+        now = datetime.now(timezone.utc)
+        guilds = Guild.__table__
+        take_seat = (
+            guilds.update()
+            .where(
+                guilds.c.id == guild_id,
+                guilds.c.status == GuildStatus.ACTIVE,
+                guilds.c.deleted_at.is_(None),
+                guilds.c.member_count < guilds.c.max_members,
             )
+            .values(member_count=guilds.c.member_count + 1, updated_at=now)
+            .returning(guilds.c.id)
         )
         if company_id is not None:
-            guild = guild.filter(Guild.company_id == company_id)
-        guild = guild.first()
-
-        if not guild:
-            raise ValueError("Гильдия не найдена")
-
-        # Проверить количество участников
-        member_count = (
-            self.db.query(func.count(GuildMember.id))
-            .filter(GuildMember.guild_id == guild_id)
-            .scalar() or 0
-        )
-        if member_count >= guild.max_members:
+            take_seat = take_seat.where(guilds.c.company_id == company_id)
+        if self.db.execute(take_seat).first() is None:
+            self.db.rollback()
+            # Редкий путь: различить отсутствующую и переполненную гильдию
+            guild = self.db.query(Guild.id).filter(
+                Guild.id == guild_id,
+                Guild.status == GuildStatus.ACTIVE,
+                Guild.deleted_at.is_(None),
+            )
+            if company_id is not None:
+                guild = guild.filter(Guild.company_id == company_id)
+            if guild.first() is None:
+                raise ValueError("Гильдия не найдена")
             raise ValueError("Гильдия переполнена")
 
-        # Проверить, не состоит ли уже в гильдии
-        existing = (
-            self.db.query(GuildMember)
-            .filter(
-                GuildMember.user_id == user_id,
-                GuildMember.guild_id == guild_id
+        member = self.db.scalars(
+            pg_insert(GuildMember)
+            .values(
+                guild_id=guild_id,
+                user_id=user_id,
+                role=GuildRole.MEMBER,
+                joined_at=now,
+                company_id=company_id,
+                created_at=now,
+                updated_at=now,
             )
-            .first()
-        )
-        if existing:
+            .on_conflict_do_nothing(index_elements=["guild_id", "user_id"])
+            .returning(GuildMember)
+        ).first()
+        if member is None:
+            self.db.rollback()
             raise ValueError("Вы уже состоите в этой гильдии")
 
-        member = GuildMember(
-            guild_id=guild_id,
-            user_id=user_id,
-            role=GuildRole.MEMBER,
-            joined_at=datetime.now(timezone.utc),
-            company_id=company_id,
-        )
-        self.db.add(member)
+        GuildScoringService(self.db).member_joined(guild_id, user_id)
         self.db.commit()
-        self.db.refresh(member)
+        invalidate_membership(user_id, company_id)
         logger.info(f"Пользователь {user_id} присоединился к гильдии {guild_id}")
         return member
 
+    def get_membership(self, user_id: int, company_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Участие пользователя в гильдии (первое по ID) или None.
+
+        Результат, в том числе отсутствие участия, кэшируется в процессе на
+        guild_membership_cache_ttl_seconds (LRU на guild_membership_cache_size
+        пользователей); вступление и смена роли сбрасывают запись.
+        contribution_score в кэше может отставать на TTL.
+        """
+        key = (company_id, user_id)
+        now = time.monotonic()
+        with _membership_lock:
+            cached = _membership_cache.get(key)
+            if cached is not None and now - cached[0] < settings.guild_membership_cache_ttl_seconds:
+                _membership_cache.move_to_end(key)
+                return cached[1]
+
+        query = self.db.query(GuildMember).filter(GuildMember.user_id == user_id)
+        if company_id is not None:
+            query = query.filter(GuildMember.company_id == company_id)
+        member = query.order_by(GuildMember.id).first()
+        membership = (
+            {column.key: getattr(member, column.key) for column in GuildMember.__table__.columns}
+            if member is not None else None
+        )
+
+        with _membership_lock:
+            _membership_cache[key] = (now, membership)
+            _membership_cache.move_to_end(key)
+            while len(_membership_cache) > settings.guild_membership_cache_size:
+                _membership_cache.popitem(last=False)
+        return membership
+
     def update_member_role(
         self,
         guild_id: int,
@@ -166,6 +230,7 @@ class GuildService:
         member.updated_at = datetime.now(timezone.utc)
         self.db.commit()
         self.db.refresh(member)
+        invalidate_membership(member.user_id, company_id)
         logger.info(f"Роль участника {member_id} изменена на {new_role}")
         return member
 
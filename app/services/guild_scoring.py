@@ -0,0 +1,270 @@
+"""
+Очки и рейтинги гильдий.
+
+Активность участника с момента вступления (XP, посещения геозон, открытия
+областей) накапливается в guild_members (xp, visits, discoveries,
+contribution_score), сумма по участникам - в guilds (experience,
+total_visits, total_discoveries, score). События применяются инкрементально:
+GuildScoringService.record обновляет строки участников и их гильдий двумя
+UPDATE ... FROM (VALUES ...), новые очки берутся из RETURNING.
+
+Рейтинги гильдий компании и участников гильдии хранятся упорядоченными
+множествами (app.services.sorted_sets): новые очки записываются в них после
+коммита транзакции, место, топ и окрестность читаются за O(log n) без
+запросов к БД. Отсутствующий рейтинг загружается из БД целиком.
+
+Инкременты могут разойтись с историей (откат после записи в Redis, события
+мимо record) - задача app.jobs.guild_score_recompute периодически
+пересчитывает агрегаты точно и перестраивает рейтинги.
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Mapping, Optional
+
+from sqlalchemy import Integer, column, select, values
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.guild import Guild, GuildMember, GuildStatus
+from app.services.sorted_sets import get_sorted_sets, queue_update
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Ограничения размера ответа рейтинга
+MAX_LEADERBOARD_LIMIT = 100
+MAX_LEADERBOARD_RADIUS = 50
+
+
+@dataclass(frozen=True)
+class ScoreDelta:
+    """Прирост активности пользователя."""
+
+    xp: int = 0
+    visits: int = 0
+    discoveries: int = 0
+
+    @property
+    def score(self) -> int:
+        """Вклад в очки гильдии."""
+        return (
+            self.xp
+            + self.visits * settings.guild_score_visit_weight
+            + self.discoveries * settings.guild_score_discovery_weight
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.xp or self.visits or self.discoveries)
+
+
+@dataclass(frozen=True)
+class LeaderboardEntry:
+    """Строка рейтинга."""
+
+    rank: int  # С 1
+    id: int  # ID гильдии или пользователя
+    score: int
+
+
+def guilds_key(company_id: Optional[int]) -> str:
+    """Ключ рейтинга гильдий компании."""
+    return f"leaderboard:guilds:{company_id or 0}"
+
+
+def guild_members_key(guild_id: int) -> str:
+    """Ключ рейтинга участников гильдии."""
+    return f"leaderboard:guild:{guild_id}:members"
+
+
+class GuildScoringService:
+    """Сервис очков и рейтингов гильдий."""
+
+    def __init__(self, db: Session):
+        """Инициализация сервиса."""
+        self.db = db
+
+    def record(self, deltas: Mapping[int, ScoreDelta], company_id: Optional[int] = None) -> None:
+        """
+        Учесть активность пользователей в очках их гильдий (без коммита).
+
+        Строки блокируются в порядке ID, чтобы пакетные обновления не
+        взаимоблокировались. Рейтинги обновляются после коммита.
+
+        Args:
+            deltas: user_id -> прирост активности
+        """
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        now = datetime.now(timezone.utc)
+        members = GuildMember.__table__
+        member_changes = values(
+            column("user_id", Integer),
+            column("xp", Integer),
+            column("visits", Integer),
+            column("discoveries", Integer),
+            column("score", Integer),
+            name="changes",
+        ).data([
+            (user_id, delta.xp, delta.visits, delta.discoveries, delta.score)
+            for user_id, delta in sorted(deltas.items())
+        ])
+        locked_members = (
+            select(members.c.id)
+            .where(members.c.user_id.in_(list(deltas)))
+            .order_by(members.c.id)
+            .with_for_update()
+        )
+        if company_id is not None:
+            locked_members = locked_members.where(members.c.company_id == company_id)
+        member_rows = self.db.execute(
+            members.update()
+            .where(members.c.id.in_(locked_members), members.c.user_id == member_changes.c.user_id)
+            .values(
+                xp=members.c.xp + member_changes.c.xp,
+                visits=members.c.visits + member_changes.c.visits,
+                discoveries=members.c.discoveries + member_changes.c.discoveries,
+                contribution_score=members.c.contribution_score + member_changes.c.score,
+                updated_at=now,
+            )
+            .returning(members.c.guild_id, members.c.user_id, members.c.contribution_score)
+        ).all()
+        if not member_rows:
+            return
+
+        per_guild: Dict[int, List[int]] = defaultdict(lambda: [0, 0, 0, 0])
+        for row in member_rows:
+            delta = deltas[row.user_id]
+            totals = per_guild[row.guild_id]
+            totals[0] += delta.xp
+            totals[1] += delta.visits
+            totals[2] += delta.discoveries
+            totals[3] += delta.score
+            self._queue_update(guild_members_key(row.guild_id), row.user_id, row.contribution_score)
+
+        guilds = Guild.__table__
+        guild_changes = values(
+            column("guild_id", Integer),
+            column("xp", Integer),
+            column("visits", Integer),
+            column("discoveries", Integer),
+            column("score", Integer),
+            name="changes",
+        ).data([(guild_id, *totals) for guild_id, totals in sorted(per_guild.items())])
+        locked_guilds = (
+            select(guilds.c.id)
+            .where(guilds.c.id.in_(list(per_guild)))
+            .order_by(guilds.c.id)
+            .with_for_update()
+        )
+        guild_rows = self.db.execute(
+            guilds.update()
+            .where(guilds.c.id.in_(locked_guilds), guilds.c.id == guild_changes.c.guild_id)
+            .values(
+                experience=guilds.c.experience + guild_changes.c.xp,
+                total_visits=guilds.c.total_visits + guild_changes.c.visits,
+                total_discoveries=guilds.c.total_discoveries + guild_changes.c.discoveries,
+                score=guilds.c.score + guild_changes.c.score,
+                updated_at=now,
+            )
+            .returning(guilds.c.id, guilds.c.score, guilds.c.status, guilds.c.deleted_at, guilds.c.company_id)
+        ).all()
+        for row in guild_rows:
+            if row.status == GuildStatus.ACTIVE and row.deleted_at is None:
+                self._queue_update(guilds_key(row.company_id), row.id, row.score)
+
+    def guild_created(self, guild_id: int, company_id: Optional[int] = None) -> None:
+        """Добавить новую гильдию в рейтинг компании после коммита."""
+        self._queue_update(guilds_key(company_id), guild_id, 0)
+
+    def member_joined(self, guild_id: int, user_id: int) -> None:
+        """Добавить нового участника в рейтинг гильдии после коммита."""
+        self._queue_update(guild_members_key(guild_id), user_id, 0)
+
+    def _queue_update(self, key: str, member_id: int, score: int) -> None:
+        """Отложить запись очков в рейтинг до коммита."""
+        queue_update(self.db, key, str(member_id), score)
+
+    def top_guilds(self, company_id: Optional[int] = None, limit: int = 10) -> List[LeaderboardEntry]:
+        """Топ гильдий компании."""
+        key = self._ensure_guilds_loaded(company_id)
+        return self._entries(key, 0, min(limit, MAX_LEADERBOARD_LIMIT))
+
+    def guilds_around(
+        self, guild_id: int, company_id: Optional[int] = None, radius: int = 5
+    ) -> List[LeaderboardEntry]:
+        """Гильдия и radius соседей выше и ниже в рейтинге компании."""
+        key = self._ensure_guilds_loaded(company_id)
+        return self._around(key, guild_id, radius)
+
+    def top_members(self, guild_id: int, limit: int = 10) -> List[LeaderboardEntry]:
+        """Топ участников гильдии."""
+        key = self._ensure_members_loaded(guild_id)
+        return self._entries(key, 0, min(limit, MAX_LEADERBOARD_LIMIT))
+
+    def members_around(self, guild_id: int, user_id: int, radius: int = 5) -> List[LeaderboardEntry]:
+        """Участник и radius соседей выше и ниже в рейтинге гильдии."""
+        key = self._ensure_members_loaded(guild_id)
+        return self._around(key, user_id, radius)
+
+    def _ensure_guilds_loaded(self, company_id: Optional[int]) -> str:
+        """Загрузить рейтинг гильдий компании, если его нет в хранилище."""
+        key = guilds_key(company_id)
+        store = get_sorted_sets()
+        if not store.exists(key):
+            store.replace(key, self._load_guild_scores(company_id))
+        return key
+
+    def _ensure_members_loaded(self, guild_id: int) -> str:
+        """Загрузить рейтинг участников гильдии, если его нет в хранилище."""
+        key = guild_members_key(guild_id)
+        store = get_sorted_sets()
+        if not store.exists(key):
+            store.replace(key, self._load_member_scores(guild_id))
+        return key
+
+    def _load_guild_scores(self, company_id: Optional[int]) -> Dict[str, int]:
+        """Очки активных гильдий компании из БД."""
+        query = self.db.query(Guild.id, Guild.score).filter(
+            Guild.status == GuildStatus.ACTIVE,
+            Guild.deleted_at.is_(None),
+        )
+        if company_id is not None:
+            query = query.filter(Guild.company_id == company_id)
+        return {str(guild_id): score for guild_id, score in query}
+
+    def _load_member_scores(self, guild_id: int) -> Dict[str, int]:
+        """Очки участников гильдии из БД."""
+        query = self.db.query(GuildMember.user_id, GuildMember.contribution_score).filter(
+            GuildMember.guild_id == guild_id
+        )
+        return {str(user_id): score for user_id, score in query}
+
+    def rebuild_guilds(self, company_id: Optional[int] = None) -> None:
+        """Перестроить рейтинг гильдий компании по БД."""
+        get_sorted_sets().replace(guilds_key(company_id), self._load_guild_scores(company_id))
+
+    def rebuild_members(self, guild_id: int) -> None:
+        """Перестроить рейтинг участников гильдии по БД."""
+        get_sorted_sets().replace(guild_members_key(guild_id), self._load_member_scores(guild_id))
+
+    @staticmethod
+    def _entries(key: str, start: int, count: int) -> List[LeaderboardEntry]:
+        """Строки рейтинга начиная с позиции start (с 0)."""
+        return [
+            LeaderboardEntry(rank=start + offset + 1, id=int(member), score=int(score))
+            for offset, (member, score) in enumerate(get_sorted_sets().rev_range(key, start, count))
+        ]
+
+    def _around(self, key: str, member_id: int, radius: int) -> List[LeaderboardEntry]:
+        """Окрестность участника рейтинга; пусто, если его нет в рейтинге."""
+        radius = min(max(radius, 0), MAX_LEADERBOARD_RADIUS)
+        rank = get_sorted_sets().rev_rank(key, str(member_id))
+        if rank is None:
+            return []
+        start = max(rank - radius, 0)
+        return self._entries(key, start, rank - start + radius + 1)
+
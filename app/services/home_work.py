@@ -1,21 +1,53 @@
 """Сервис автоматического определения дома и работы."""
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 from geoalchemy2.shape import from_shape
-from geopy.distance import distance
 from shapely.geometry import Point
 from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
 from app.models.location import LocationPoint, LocationSession
-from app.models.user_home_work import UserHomeWork
+from app.models.user_home_work import HomeWorkAnalysisState, HomeWorkPlace, UserHomeWork
+from app.services.stay_points import (
+    HOURS_PER_WEEK,
+    StayPoint,
+    dbscan_haversine,
+    detect_closed_stay_points,
+    haversine_meters,
+    hour_of_week_minutes,
+)
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# Маски часов недели (индекс - weekday * 24 + hour)
+_HOUR_OF_WEEK = np.arange(HOURS_PER_WEEK)
+NIGHT_HOURS_MASK = (_HOUR_OF_WEEK % 24 >= 22) | (_HOUR_OF_WEEK % 24 <= 6)
+WORK_HOURS_MASK = (_HOUR_OF_WEEK // 24 < 5) & (_HOUR_OF_WEEK % 24 >= 8) & (_HOUR_OF_WEEK % 24 <= 18)
+WEEKEND_HOURS_MASK = _HOUR_OF_WEEK // 24 >= 5
+
+
+def build_home_work_row(user_id: int, company_id: Optional[int], location: Dict[str, Any]) -> Dict[str, Any]:
+    """Подготовить строку user_home_work для массового сохранения."""
+    now = datetime.now(timezone.utc)
+    return {
+        **location,
+        "user_id": user_id,
+        "company_id": company_id,
+        "point": from_shape(Point(location["longitude"], location["latitude"]), srid=4326),
+        "radius_meters": settings.home_work_cluster_radius_meters,
+        "is_confirmed": False,
+        "last_updated_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+
 
 class HomeWorkDetectionService:
     """Сервис для автоматического определения дома и работы."""
@@ -24,41 +56,40 @@ class HomeWorkDetectionService:
         """Инициализация сервиса."""
         self.db = db
 
-    def cluster_location_points(
-        self, points: List[LocationPoint], radius_meters: float
-    ) -> List[List[LocationPoint]]:
-        """Кластеризовать точки геолокации по близости."""
-        if not points:
-            return []
-
-        clusters: List[List[LocationPoint]] = []
-        used_points = set()
-
-        for point in points:
-            if point.id in used_points:
-                continue
-
-            cluster = [point]
-            used_points.add(point.id)
-
-            for other_point in points:
-                if other_point.id in used_points:
-                    continue
+    def load_track(
+        self,
+        user_id: int,
+        since: datetime,
+        until: datetime,
+        company_id: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, List[datetime]]:
+        """
+        Загрузить точки трека пользователя за период одним запросом.
 
-                dist = distance(
-                    (point.latitude, point.longitude),
-                    (other_point.latitude, other_point.longitude),
-                ).meters
+        Returns:
+            (широты, долготы, время), упорядоченные по времени
+        """
+        query = (
+            self.db.query(LocationPoint.latitude, LocationPoint.longitude, LocationPoint.timestamp)
+            .join(LocationSession, LocationPoint.session_id == LocationSession.id)
+            .filter(
+                LocationSession.user_id == user_id,
+                LocationPoint.timestamp >= since,
+                LocationPoint.timestamp <= until,
+            )
+        )
 
-                if dist <= radius_meters:
-                    cluster.append(other_point)
-                    used_points.add(other_point.id)
+        if company_id is not None:
+            query = query.filter(LocationSession.company_id == company_id)
 
-            clusters.append(cluster)
+        rows = query.order_by(LocationPoint.timestamp).all()
+        if not rows:
+            return np.zeros(0), np.zeros(0), []
 
-        return clusters
+        latitudes, longitudes, timestamps = zip(*rows)
+        return np.array(latitudes, dtype=float), np.array(longitudes, dtype=float), list(timestamps)
 
-    def calculate_cluster_center(self, cluster: List[LocationPoint]) -> Tuple[float, float]:
+    def calculate_cluster_center(self, cluster: List[StayPoint]) -> Tuple[float, float]:
         """Вычислить центр кластера."""
         if not cluster:
             raise ValueError("Кластер не может быть пустым")
@@ -69,159 +100,313 @@ class HomeWorkDetectionService:
 
         return total_lat / count, total_lon / count
 
-    def analyze_location_for_home_work(
+    def _find_nearest_place(
+        self, places: List[HomeWorkPlace], latitude: float, longitude: float
+    ) -> Optional[HomeWorkPlace]:
+        """Найти ближайшее место в радиусе кластера."""
+        if not places:
+            return None
+
+        distances = haversine_meters(
+            latitude,
+            longitude,
+            np.array([p.latitude for p in places]),
+            np.array([p.longitude for p in places]),
+        )
+        nearest = int(np.argmin(distances))
+        if distances[nearest] > settings.home_work_cluster_radius_meters:
+            return None
+        return places[nearest]
+
+    def merge_stay_points(
         self,
         user_id: int,
-        start_date: Optional[datetime] = None,
-        end_date: Optional[datetime] = None,
-        company_id: Optional[int] = None,
-    ) -> List[UserHomeWork]:
+        company_id: Optional[int],
+        places: List[HomeWorkPlace],
+        stay_points: List[StayPoint],
+    ) -> List[HomeWorkPlace]:
         """
-        Проанализировать геолокацию пользователя и определить дом/работу.
+        Добавить новые точки остановки в места пользователя.
 
-        Алгоритм:
-        1. Получить все точки геолокации за период
-        2. Кластеризовать точки по близости
-        3. Для каждого кластера вычислить:
-           - Общее количество посещений
-           - Общее время пребывания
-           - Время суток посещений
-        4. Определить дом (ночные посещения, долгое время)
-        5. Определить работу (дневные посещения в будни, регулярность)
+        Новые остановки группируются DBSCAN, каждая группа присоединяется к
+        ближайшему месту в радиусе кластера или образует новое место.
+        Обновляются только достаточные статистики, история не пересчитывается.
         """
-        if start_date is None:
-            start_date = datetime.now(timezone.utc) - timedelta(days=30)
-        if end_date is None:
-            end_date = datetime.now(timezone.utc)
-
-        # Получить все точки геолокации
-        sessions = (
-            self.db.query(LocationSession)
-            .filter(
-                LocationSession.user_id == user_id,
-                LocationSession.session_started_at >= start_date,
-                LocationSession.session_started_at <= end_date,
-            )
-            .all()
-        )
-
-        if company_id is not None:
-            sessions = [s for s in sessions if s.company_id == company_id]
-
-        all_points: List[LocationPoint] = []
-        for session in sessions:
-            all_points.extend(session.points)
-
-        if not all_points:
-            return []
-
-        # Кластеризовать точки
-        clusters = self.cluster_location_points(
-            all_points, settings.home_work_cluster_radius_meters
+        if not stay_points:
+            return places
+
+        labels = dbscan_haversine(
+            np.array([s.latitude for s in stay_points]),
+            np.array([s.longitude for s in stay_points]),
+            eps_meters=settings.home_work_cluster_radius_meters,
+            min_samples=1,
         )
+        groups: Dict[int, List[StayPoint]] = defaultdict(list)
+        for stay_point, label in zip(stay_points, labels.tolist()):
+            groups[label].append(stay_point)
+
+        for group in groups.values():
+            center_lat, center_lon = self.calculate_cluster_center(group)
+            place = self._find_nearest_place(places, center_lat, center_lon)
+            if place is None:
+                place = HomeWorkPlace(
+                    user_id=user_id,
+                    company_id=company_id,
+                    latitude_sum=0.0,
+                    longitude_sum=0.0,
+                    stay_count=0,
+                    total_dwell_minutes=0.0,
+                    hour_of_week_minutes=[0.0] * HOURS_PER_WEEK,
+                    first_seen_at=group[0].arrived_at,
+                    last_seen_at=group[-1].departed_at,
+                )
+                self.db.add(place)
+                places.append(place)
 
-        detected_locations: List[UserHomeWork] = []
+            histogram = np.array(place.hour_of_week_minutes, dtype=float)
+            for stay_point in group:
+                place.latitude_sum += stay_point.latitude
+                place.longitude_sum += stay_point.longitude
+                place.stay_count += 1
+                place.total_dwell_minutes += stay_point.duration_minutes
+                histogram += hour_of_week_minutes(stay_point.arrived_at, stay_point.departed_at)
 
-        for cluster in clusters:
-            if len(cluster) < settings.home_work_min_visits:
-                continue
+            # JSON-колонка отслеживает изменения только при присваивании нового значения
+            place.hour_of_week_minutes = histogram.tolist()
+            place.first_seen_at = min(place.first_seen_at, group[0].arrived_at)
+            place.last_seen_at = max(place.last_seen_at, group[-1].departed_at)
 
-            center_lat, center_lon = self.calculate_cluster_center(cluster)
+        return places
 
-            # Анализ времени посещений
-            visit_times = [p.timestamp for p in cluster]
-            visit_times.sort()
+    def classify_places(self, places: List[HomeWorkPlace]) -> List[Dict[str, Any]]:
+        """
+        Определить дом и работу по профилям мест по часам недели.
 
-            # Вычислить общее время
-            total_time_minutes = 0
-            if len(visit_times) > 1:
-                time_span = (visit_times[-1] - visit_times[0]).total_seconds() / 60
-                total_time_minutes = int(time_span)
+        Дом - место с наибольшим временем ночью, где пользователь бывает и в
+        выходные. Работа - место с наибольшим временем в будни днём, где
+        выходные составляют меньше 20% времени.
+        """
+        candidates = [
+            place for place in places
+            if place.stay_count >= settings.home_work_min_visits
+            and place.total_dwell_minutes >= settings.home_work_min_time_minutes
+        ]
+        if not candidates:
+            return []
 
-            # Определить тип локации по времени суток
-            night_visits = sum(1 for t in visit_times if 22 <= t.hour or t.hour <= 6)
-            day_visits = sum(1 for t in visit_times if 8 <= t.hour <= 18)
-            weekend_visits = sum(1 for t in visit_times if t.weekday() >= 5)
+        histograms = np.array([place.hour_of_week_minutes for place in candidates], dtype=float)
+        totals = np.maximum(histograms.sum(axis=1), 1e-9)
+        night = histograms[:, NIGHT_HOURS_MASK].sum(axis=1)
+        work = histograms[:, WORK_HOURS_MASK].sum(axis=1)
+        weekend = histograms[:, WEEKEND_HOURS_MASK].sum(axis=1)
+        regularity = np.minimum(
+            1.0, np.array([place.stay_count for place in candidates]) / (settings.home_work_min_visits * 2)
+        )
 
-            # Определить тип
-            location_type = None
-            confidence = 0.0
+        locations: List[Dict[str, Any]] = []
+        home_index = None
 
-            # Дом: ночные посещения, долгое время, не только будни
-            if (
-                night_visits >= settings.home_work_min_visits
-                and total_time_minutes >= settings.home_work_min_time_minutes
-                and weekend_visits > 0
-            ):
-                location_type = "home"
+        # Дом: доля всего ночного времени, ночная доля профиля места, регулярность
+        if night.sum() > 0:
+            index = int(np.argmax(night))
+            if weekend[index] > 0:
                 confidence = min(
                     1.0,
-                    (night_visits / len(cluster)) * 0.5
-                    + (total_time_minutes / (settings.home_work_min_time_minutes * 2)) * 0.3
-                    + (weekend_visits / len(cluster)) * 0.2,
+                    (night[index] / night.sum()) * 0.5
+                    + (night[index] / totals[index]) * 0.3
+                    + regularity[index] * 0.2,
                 )
+                if confidence > 0.5:
+                    home_index = index
+                    locations.append(self._place_location("home", candidates[index], confidence))
+
+        # Работа: доля рабочего времени в будни, дневная доля профиля места, регулярность
+        eligible = (weekend / totals < 0.2) & (work > 0)
+        if home_index is not None:
+            eligible[home_index] = False
+        if eligible.any():
+            work_eligible = np.where(eligible, work, 0.0)
+            index = int(np.argmax(work_eligible))
+            confidence = min(
+                1.0,
+                (work[index] / work_eligible.sum()) * 0.5
+                + (work[index] / totals[index]) * 0.3
+                + regularity[index] * 0.2,
+            )
+            if confidence > 0.5:
+                locations.append(self._place_location("work", candidates[index], confidence))
+
+        return locations
+
+    @staticmethod
+    def _place_location(location_type: str, place: HomeWorkPlace, confidence: float) -> Dict[str, Any]:
+        """Данные локации дома/работы по месту."""
+        return {
+            "location_type": location_type,
+            "latitude": place.latitude,
+            "longitude": place.longitude,
+            "confidence_score": float(confidence),
+            "total_visits": place.stay_count,
+            "total_time_minutes": int(place.total_dwell_minutes),
+            "first_detected_at": place.first_seen_at,
+        }
+
+    def process_new_data(
+        self,
+        user_id: int,
+        company_id: Optional[int] = None,
+        rebuild_from: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        Обработать новые точки пользователя и обновить статистики мест.
 
-            # Работа: дневные посещения в будни, регулярность
-            elif (
-                day_visits >= settings.home_work_min_visits
-                and total_time_minutes >= settings.home_work_min_time_minutes
-                and weekend_visits / len(cluster) < 0.2
-            ):
-                location_type = "work"
-                confidence = min(
-                    1.0,
-                    (day_visits / len(cluster)) * 0.5
-                    + (total_time_minutes / (settings.home_work_min_time_minutes * 2)) * 0.3
-                    + ((len(cluster) - weekend_visits) / len(cluster)) * 0.2,
-                )
+        Обрабатываются только точки с водяного знака (начала незавершённого
+        пребывания), поэтому стоимость пропорциональна объёму новых данных.
+        При rebuild_from места пользователя пересобираются с этой даты.
+        Коммит выполняет вызывающий код.
 
-            if location_type and confidence > 0.5:
-                # Проверить, не существует ли уже такая локация
-                existing = (
-                    self.db.query(UserHomeWork)
-                    .filter(
-                        UserHomeWork.user_id == user_id,
-                        UserHomeWork.location_type == location_type,
-                    )
-                    .first()
-                )
+        Returns:
+            {'locations': строки user_home_work, 'state': водяной знак, 'points_processed': число точек}
+        """
+        now = datetime.now(timezone.utc)
+        state = (
+            self.db.query(HomeWorkAnalysisState)
+            .filter(HomeWorkAnalysisState.user_id == user_id)
+            .first()
+        )
+        places = self.db.query(HomeWorkPlace).filter(HomeWorkPlace.user_id == user_id).all()
+
+        if rebuild_from is not None:
+            for place in places:
+                self.db.delete(place)
+            places = []
+            since = rebuild_from
+        elif state and state.resume_from:
+            since = state.resume_from
+        else:
+            since = now - timedelta(days=settings.home_work_window_days)
+
+        latitudes, longitudes, timestamps = self.load_track(user_id, since, until or now, company_id)
+        stay_points, tail_start = detect_closed_stay_points(
+            latitudes.tolist(),
+            longitudes.tolist(),
+            timestamps,
+            radius_meters=settings.home_work_stay_radius_meters,
+            min_duration_minutes=settings.home_work_stay_min_minutes,
+        )
+        self.merge_stay_points(user_id, company_id, places, stay_points)
+        self.db.flush()
+
+        locations = [
+            build_home_work_row(user_id, company_id, location)
+            for location in self.classify_places(places)
+        ]
+        last_point_at = timestamps[-1] if timestamps else (state.last_point_at if state else None)
+
+        return {
+            "locations": locations,
+            "state": {
+                "user_id": user_id,
+                "company_id": company_id,
+                "last_point_at": last_point_at,
+                # Незавершённое пребывание будет дочитано при следующем запуске
+                "resume_from": timestamps[tail_start] if tail_start is not None else since,
+                "last_run_at": now,
+                "points_processed": len(timestamps),
+                "created_at": now,
+                "updated_at": now,
+            },
+            "points_processed": len(timestamps),
+        }
 
-                if existing:
-                    # Обновить существующую
-                    existing.latitude = center_lat
-                    existing.longitude = center_lon
-                    existing.point = from_shape(Point(center_lon, center_lat), srid=4326)
-                    existing.confidence_score = max(existing.confidence_score, confidence)
-                    existing.total_visits += len(cluster)
-                    existing.total_time_minutes += total_time_minutes
-                    existing.last_updated_at = datetime.now(timezone.utc)
-                    detected_locations.append(existing)
-                else:
-                    # Создать новую
-                    new_location = UserHomeWork(
-                        user_id=user_id,
-                        location_type=location_type,
-                        latitude=center_lat,
-                        longitude=center_lon,
-                        point=from_shape(Point(center_lon, center_lat), srid=4326),
-                        radius_meters=settings.home_work_cluster_radius_meters,
-                        confidence_score=confidence,
-                        total_visits=len(cluster),
-                        total_time_minutes=total_time_minutes,
-                        first_detected_at=visit_times[0],
-                        last_updated_at=datetime.now(timezone.utc),
-                        company_id=company_id,
-                    )
-                    self.db.add(new_location)
-                    detected_locations.append(new_location)
+    def analyze_location_for_home_work(
+        self,
+        user_id: int,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        company_id: Optional[int] = None,
+    ) -> List[UserHomeWork]:
+        """
+        Проанализировать геолокацию пользователя и определить дом/работу.
 
+        Алгоритм:
+        1. Получить новые точки геолокации (с водяного знака или с start_date)
+        2. Выделить завершённые точки остановки
+        3. Сгруппировать их DBSCAN и добавить в места пользователя
+           (центр, число посещений, время по часам недели)
+        4. Определить дом (ночное время, бывает в выходные)
+        5. Определить работу (дневное время в будни)
+
+        Если передан start_date, места пересобираются с этой даты.
+        """
+        result = self.process_new_data(user_id, company_id, rebuild_from=start_date, until=end_date)
+        location_ids = self.upsert_home_work(result["locations"])
+        self.upsert_analysis_states([result["state"]])
         self.db.commit()
-        for location in detected_locations:
-            self.db.refresh(location)
 
+        if not location_ids:
+            return []
+
+        detected_locations = (
+            self.db.query(UserHomeWork).filter(UserHomeWork.id.in_(location_ids)).all()
+        )
         logger.info(f"Определено {len(detected_locations)} локаций для пользователя {user_id}")
         return detected_locations
 
+    def upsert_home_work(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Сохранить дом/работу одним запросом (для одного или многих пользователей).
+
+        Посещения, время и уверенность берутся из статистик места и
+        заменяются. Коммит выполняет вызывающий код.
+
+        Returns:
+            ID сохранённых записей
+        """
+        if not rows:
+            return []
+
+        statement = pg_insert(UserHomeWork.__table__).values(rows)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            constraint="uq_user_home_work_user_type",
+            set_={
+                "latitude": excluded.latitude,
+                "longitude": excluded.longitude,
+                "point": excluded.point,
+                "radius_meters": excluded.radius_meters,
+                "confidence_score": excluded.confidence_score,
+                "total_visits": excluded.total_visits,
+                "total_time_minutes": excluded.total_time_minutes,
+                "first_detected_at": func.least(UserHomeWork.first_detected_at, excluded.first_detected_at),
+                "last_updated_at": excluded.last_updated_at,
+                "updated_at": excluded.updated_at,
+            },
+        ).returning(UserHomeWork.id)
+        return [location_id for (location_id,) in self.db.execute(statement)]
+
+    def upsert_analysis_states(self, states: List[Dict[str, Any]]) -> None:
+        """Сохранить водяные знаки анализа одним запросом. Коммит выполняет вызывающий код."""
+        if not states:
+            return
+
+        statement = pg_insert(HomeWorkAnalysisState.__table__).values(states)
+        excluded = statement.excluded
+        self.db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[HomeWorkAnalysisState.user_id],
+                set_={
+                    "last_point_at": excluded.last_point_at,
+                    "resume_from": excluded.resume_from,
+                    "last_run_at": excluded.last_run_at,
+                    "points_processed": HomeWorkAnalysisState.points_processed + excluded.points_processed,
+                    "company_id": excluded.company_id,
+                    "updated_at": excluded.updated_at,
+                },
+            )
+        )
+
     def get_user_home_work(
         self, user_id: int, location_type: Optional[str] = None, company_id: Optional[int] = None
     ) -> List[UserHomeWork]:
@@ -0,0 +1,322 @@
+"""
+Сервис инвентаря пользователя.
+
+Изменения инвентаря выполняются одним запросом без чтения строки в Python:
+начисление - INSERT ... ON CONFLICT DO UPDATE по уникальному ключу
+(user_id, artifact_id, COALESCE(company_id, 0)), списание - условный
+UPDATE ... WHERE quantity >= n RETURNING. Параллельные начисления не
+создают дубликатов, параллельные списания не уводят количество в минус,
+один экземпляр косметики не может быть забран дважды.
+Методы не фиксируют транзакцию - это делает вызывающий код.
+
+Все начисления артефактов (выпадение, крафт, покупка, награды) проходят
+через add_artifact/add_artifacts, которые в той же транзакции обновляют
+прогресс квестов на сбор артефактов (событие ARTIFACT_OBTAINED).
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, column, func, select, text, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.artifact import UserArtifact
+from app.models.cosmetic import UserCosmetic
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientItemsError(ValueError):
+    """Недостаточно предметов для списания."""
+
+
+class InventoryService:
+    """Сервис атомарных изменений инвентаря."""
+
+    def __init__(self, db: Session):
+        """Инициализация сервиса."""
+        self.db = db
+
+    def add_artifact(
+        self,
+        user_id: int,
+        artifact_id: int,
+        quantity: int,
+        obtained_from: str,
+        obtained_from_id: Optional[int] = None,
+        company_id: Optional[int] = None,
+    ) -> UserArtifact:
+        """Начислить артефакт одним INSERT ... ON CONFLICT DO UPDATE."""
+        now = datetime.now(timezone.utc)
+        statement = pg_insert(UserArtifact).values(
+            user_id=user_id,
+            artifact_id=artifact_id,
+            quantity=quantity,
+            obtained_at=now,
+            obtained_from=obtained_from,
+            obtained_from_id=obtained_from_id,
+            is_favorite=False,
+            company_id=company_id,
+            created_at=now,
+            updated_at=now,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[UserArtifact.user_id, UserArtifact.artifact_id, text("COALESCE(company_id, 0)")],
+            set_={
+                "quantity": UserArtifact.quantity + statement.excluded.quantity,
+                "updated_at": statement.excluded.updated_at,
+            },
+        ).returning(UserArtifact)
+        user_artifact = self.db.scalars(statement, execution_options={"populate_existing": True}).one()
+        self._artifacts_obtained([user_id], [artifact_id], company_id)
+        return user_artifact
+
+    def add_artifacts(
+        self,
+        user_ids: Sequence[int],
+        artifacts: Mapping[int, int],
+        obtained_from: str,
+        obtained_from_id: Optional[int] = None,
+        company_id: Optional[int] = None,
+    ) -> Dict[Tuple[int, int], int]:
+        """
+        Начислить артефакты пользователям одним многострочным upsert.
+
+        Args:
+            user_ids: ID пользователей без повторов
+            artifacts: artifact_id -> количество каждому пользователю
+
+        Returns:
+            (user_id, artifact_id) -> количество после начисления
+        """
+        if not user_ids or not artifacts:
+            return {}
+
+        now = datetime.now(timezone.utc)
+        table = UserArtifact.__table__
+        # Строки блокируются в порядке (user_id, artifact_id), параллельные начисления не взаимоблокируются
+        statement = pg_insert(table).values([
+            {
+                "user_id": user_id,
+                "artifact_id": artifact_id,
+                "quantity": quantity,
+                "obtained_at": now,
+                "obtained_from": obtained_from,
+                "obtained_from_id": obtained_from_id,
+                "is_favorite": False,
+                "company_id": company_id,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for user_id in sorted(user_ids)
+            for artifact_id, quantity in sorted(artifacts.items())
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.artifact_id, text("COALESCE(company_id, 0)")],
+            set_={
+                "quantity": table.c.quantity + statement.excluded.quantity,
+                "updated_at": statement.excluded.updated_at,
+            },
+        ).returning(table.c.user_id, table.c.artifact_id, table.c.quantity)
+        quantities = {
+            (user_id, artifact_id): quantity for user_id, artifact_id, quantity in self.db.execute(statement)
+        }
+        self._artifacts_obtained(user_ids, list(artifacts), company_id)
+        return quantities
+
+    def _artifacts_obtained(
+        self,
+        user_ids: Iterable[int],
+        artifact_ids: Sequence[int],
+        company_id: Optional[int],
+    ) -> None:
+        """Обновить прогресс квестов на сбор артефактов в транзакции начисления."""
+        # Импорт внутри: QuestService выдаёт награды за квесты через этот сервис
+        from app.services.quest import QuestService
+        from app.services.quest_triggers import QuestEventKind
+
+        quests = QuestService(self.db)
+        for user_id in sorted(set(user_ids)):
+            quests.dispatch_event(
+                user_id, QuestEventKind.ARTIFACT_OBTAINED, artifact_ids, company_id, commit=False
+            )
+
+    def consume_artifact(
+        self,
+        user_id: int,
+        artifact_id: int,
+        quantity: int,
+        company_id: Optional[int] = None,
+    ) -> int:
+        """
+        Списать артефакт условным UPDATE.
+
+        Строка с нулевым остатком удаляется.
+
+        Returns:
+            Остаток после списания
+
+        Raises:
+            InsufficientItemsError: у пользователя меньше quantity артефактов
+        """
+        artifacts = UserArtifact.__table__
+        row = self.db.execute(
+            artifacts.update()
+            .where(
+                artifacts.c.user_id == user_id,
+                artifacts.c.artifact_id == artifact_id,
+                func.coalesce(artifacts.c.company_id, 0) == (company_id or 0),
+                artifacts.c.quantity >= quantity,
+            )
+            .values(
+                quantity=artifacts.c.quantity - quantity,
+                updated_at=datetime.now(timezone.utc),
+            )
+            .returning(artifacts.c.id, artifacts.c.quantity)
+        ).first()
+        if row is None:
+            raise InsufficientItemsError(f"Недостаточно артефактов: требуется {quantity}")
+
+        if row.quantity <= 0:
+            # Строка заблокирована UPDATE выше, удаление не гонится с начислением
+            self.db.execute(artifacts.delete().where(artifacts.c.id == row.id))
+        return row.quantity
+
+    def consume_artifacts(
+        self,
+        user_id: int,
+        requirements: Sequence[Tuple[int, int]],
+        company_id: Optional[int] = None,
+    ) -> None:
+        """
+        Списать несколько артефактов одним условным UPDATE ... FROM (VALUES ...).
+
+        Списание всё или ничего: если хотя бы одного артефакта не хватает,
+        исключение бросается до коммита и вызывающий код откатывает
+        транзакцию. Строки блокируются в порядке artifact_id, чтобы
+        параллельные списания не взаимоблокировались. Строки с нулевым
+        остатком удаляются.
+
+        Args:
+            requirements: (artifact_id, количество) без повторов artifact_id
+
+        Raises:
+            InsufficientItemsError: не хватает хотя бы одного артефакта
+        """
+        if not requirements:
+            return
+
+        artifacts = UserArtifact.__table__
+        required = values(
+            column("artifact_id", Integer), column("quantity", Integer), name="required"
+        ).data(list(requirements))
+        locked_ids = (
+            select(artifacts.c.id)
+            .where(
+                artifacts.c.user_id == user_id,
+                artifacts.c.artifact_id.in_([artifact_id for artifact_id, _ in requirements]),
+                func.coalesce(artifacts.c.company_id, 0) == (company_id or 0),
+            )
+            .order_by(artifacts.c.artifact_id)
+            .with_for_update()
+        )
+        rows = self.db.execute(
+            artifacts.update()
+            .where(
+                artifacts.c.id.in_(locked_ids),
+                artifacts.c.artifact_id == required.c.artifact_id,
+                artifacts.c.quantity >= required.c.quantity,
+            )
+            .values(
+                quantity=artifacts.c.quantity - required.c.quantity,
+                updated_at=datetime.now(timezone.utc),
+            )
+            .returning(artifacts.c.id, artifacts.c.quantity)
+        ).all()
+        if len(rows) < len(requirements):
+            raise InsufficientItemsError("Недостаточно артефактов")
+
+        empty_ids = [row.id for row in rows if row.quantity <= 0]
+        if empty_ids:
+            self.db.execute(artifacts.delete().where(artifacts.c.id.in_(empty_ids)))
+
+    def get_artifact_quantities(
+        self,
+        user_id: int,
+        artifact_ids: Iterable[int],
+        company_id: Optional[int] = None,
+    ) -> Dict[int, int]:
+        """Количества артефактов пользователя: artifact_id -> количество."""
+        artifact_ids = list(artifact_ids)
+        if not artifact_ids:
+            return {}
+
+        artifacts = UserArtifact.__table__
+        rows = self.db.execute(
+            select(artifacts.c.artifact_id, artifacts.c.quantity).where(
+                artifacts.c.user_id == user_id,
+                artifacts.c.artifact_id.in_(artifact_ids),
+                func.coalesce(artifacts.c.company_id, 0) == (company_id or 0),
+            )
+        )
+        return {artifact_id: quantity for artifact_id, quantity in rows}
+
+    def get_cosmetic_counts(
+        self,
+        user_id: int,
+        cosmetic_ids: Iterable[int],
+        company_id: Optional[int] = None,
+    ) -> Dict[int, int]:
+        """Число экземпляров косметики пользователя: cosmetic_id -> количество."""
+        cosmetic_ids = list(cosmetic_ids)
+        if not cosmetic_ids:
+            return {}
+
+        cosmetics = UserCosmetic.__table__
+        query = (
+            select(cosmetics.c.cosmetic_id, func.count())
+            .where(cosmetics.c.user_id == user_id, cosmetics.c.cosmetic_id.in_(cosmetic_ids))
+            .group_by(cosmetics.c.cosmetic_id)
+        )
+        if company_id is not None:
+            query = query.where(cosmetics.c.company_id == company_id)
+        return {cosmetic_id: count for cosmetic_id, count in self.db.execute(query)}
+
+    def consume_cosmetic(
+        self,
+        user_id: int,
+        cosmetic_id: int,
+        company_id: Optional[int] = None,
+    ) -> int:
+        """
+        Забрать у пользователя один неэкипированный экземпляр косметики.
+
+        Экземпляр выбирается и удаляется одним DELETE; экземпляры, уже
+        заблокированные параллельными транзакциями, пропускаются.
+
+        Returns:
+            ID удалённой записи UserCosmetic
+
+        Raises:
+            InsufficientItemsError: у пользователя нет свободного экземпляра
+        """
+        cosmetics = UserCosmetic.__table__
+        copy_id = (
+            select(cosmetics.c.id)
+            .where(
+                cosmetics.c.user_id == user_id,
+                cosmetics.c.cosmetic_id == cosmetic_id,
+                cosmetics.c.is_equipped.is_(False),
+            )
+        )
+        if company_id is not None:
+            copy_id = copy_id.where(cosmetics.c.company_id == company_id)
+        copy_id = copy_id.limit(1).with_for_update(skip_locked=True).scalar_subquery()
+
+        deleted_id = self.db.execute(
+            cosmetics.delete().where(cosmetics.c.id == copy_id).returning(cosmetics.c.id)
+        ).scalar()
+        if deleted_id is None:
+            raise InsufficientItemsError("Косметика не найдена или надета")
+        return deleted_id
@@ -0,0 +1,234 @@
+"""
+Журнал валюты.
+
+currency_transactions - журнал только на добавление: каждое изменение
+баланса - новая запись, записи одной операции вставляются одним
+многострочным INSERT. Строка user_currency хранит снимок: coins и gems -
+баланс по записям журнала до snapshot_entry_id включительно. Текущий баланс
+равен снимку плюс хвост записей после snapshot_entry_id; хвост ограничен,
+так как задача app.jobs.ledger_compaction периодически сворачивает его в
+снимок.
+
+Начисления строку user_currency не блокируют. Списания сериализуются
+advisory-блокировкой транзакции на пользователя (в порядке user_id), чтобы
+проверка баланса и запись списания были атомарны.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.pagination import paginate
+from app.models.marketplace import CurrencyTransaction, UserCurrency
+
+logger = logging.getLogger(__name__)
+
+# Первый ключ pg_advisory_xact_lock(int, int) для блокировок счетов
+LEDGER_LOCK_NAMESPACE = 45001
+CURRENCY_TYPES = ("coins", "gems")
+
+
+class InsufficientFundsError(ValueError):
+    """Недостаточно средств для списания."""
+
+
+@dataclass
+class LedgerEntry:
+    """Запись журнала валюты до вставки."""
+
+    user_id: int
+    amount: int  # Отрицательная - списание
+    currency_type: str = "coins"
+    transaction_type: str = "reward"
+    description: Optional[str] = None
+    related_id: Optional[int] = None
+
+
+@dataclass
+class CurrencyBalance:
+    """Текущий баланс пользователя (снимок + хвост журнала)."""
+
+    id: int  # ID строки user_currency
+    user_id: int
+    coins: int
+    gems: int
+    created_at: datetime
+    updated_at: datetime
+
+
+class LedgerService:
+    """Сервис журнала валюты."""
+
+    def __init__(self, db: Session):
+        """Инициализация сервиса."""
+        self.db = db
+
+    def ensure_accounts(self, user_ids: Iterable[int], company_id: Optional[int] = None) -> Dict[int, int]:
+        """
+        Получить ID строк user_currency пользователей, создав недостающие.
+
+        Returns:
+            user_id -> ID строки user_currency
+        """
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return {}
+
+        currency = UserCurrency.__table__
+        accounts = self._account_ids(user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in accounts]
+        if missing:
+            now = datetime.now(timezone.utc)
+            self.db.execute(
+                pg_insert(currency)
+                .values([
+                    {
+                        "user_id": user_id,
+                        "coins": 0,
+                        "gems": 0,
+                        "snapshot_entry_id": 0,
+                        "company_id": company_id,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for user_id in missing
+                ])
+                .on_conflict_do_nothing(index_elements=[currency.c.user_id])
+            )
+            accounts.update(self._account_ids(missing))
+        return accounts
+
+    def _account_ids(self, user_ids: Sequence[int]) -> Dict[int, int]:
+        """ID существующих строк user_currency."""
+        currency = UserCurrency.__table__
+        rows = self.db.execute(
+            select(currency.c.user_id, currency.c.id).where(currency.c.user_id.in_(user_ids))
+        )
+        return {user_id: currency_id for user_id, currency_id in rows}
+
+    def get_balances(self, user_ids: Iterable[int]) -> Dict[int, CurrencyBalance]:
+        """Текущие балансы пользователей одним запросом (снимок + хвост)."""
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return {}
+
+        currency = UserCurrency.__table__
+        entries = CurrencyTransaction.__table__
+        tail = {
+            currency_type: func.coalesce(
+                func.sum(entries.c.amount).filter(entries.c.currency_type == currency_type), 0
+            )
+            for currency_type in CURRENCY_TYPES
+        }
+        rows = self.db.execute(
+            select(
+                currency.c.id,
+                currency.c.user_id,
+                (currency.c.coins + tail["coins"]).label("coins"),
+                (currency.c.gems + tail["gems"]).label("gems"),
+                currency.c.created_at,
+                currency.c.updated_at,
+            )
+            .select_from(
+                currency.outerjoin(
+                    entries,
+                    and_(
+                        entries.c.user_currency_id == currency.c.id,
+                        entries.c.id > currency.c.snapshot_entry_id,
+                    ),
+                )
+            )
+            .where(currency.c.user_id.in_(user_ids))
+            .group_by(currency.c.id)
+        )
+        return {row.user_id: CurrencyBalance(**row._mapping) for row in rows}
+
+    def get_balance(self, user_id: int, company_id: Optional[int] = None) -> CurrencyBalance:
+        """Текущий баланс пользователя (строка user_currency создаётся при первом обращении)."""
+        self.ensure_accounts([user_id], company_id)
+        return self.get_balances([user_id])[user_id]
+
+    def get_entries(
+        self,
+        user_id: int,
+        currency_type: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> List[CurrencyTransaction]:
+        """История операций пользователя от новых к старым (диапазон индекса (user_currency_id, id))."""
+        account_id = self._account_ids([user_id]).get(user_id)
+        if account_id is None:
+            return []
+
+        query = self.db.query(CurrencyTransaction).filter(CurrencyTransaction.user_currency_id == account_id)
+        if currency_type:
+            query = query.filter(CurrencyTransaction.currency_type == currency_type)
+        return paginate(query, CurrencyTransaction.id, CurrencyTransaction.id, limit, cursor=cursor).all()
+
+    def lock_accounts(self, user_ids: Iterable[int]) -> None:
+        """
+        Заблокировать счета пользователей до конца транзакции.
+
+        Блокировки берутся в порядке user_id; повторная блокировка в той же
+        транзакции не ждёт.
+        """
+        for user_id in sorted(set(user_ids)):
+            self.db.execute(select(func.pg_advisory_xact_lock(literal(LEDGER_LOCK_NAMESPACE), user_id)))
+
+    def post(self, entries: Sequence[LedgerEntry], company_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Записать операцию в журнал (без коммита).
+
+        Если в операции есть списания, счета списания блокируются и
+        проверяется, что баланс каждой валюты не уйдёт в минус.
+
+        Returns:
+            (user_id, ID записи) вставленных записей; порядок строк RETURNING
+            не гарантирован, поэтому запись сопоставляется по счёту
+
+        Raises:
+            InsufficientFundsError: списание больше баланса
+        """
+        entries = [entry for entry in entries if entry.amount]
+        if not entries:
+            return []
+
+        accounts = self.ensure_accounts((entry.user_id for entry in entries), company_id)
+        debited = sorted({entry.user_id for entry in entries if entry.amount < 0})
+        if debited:
+            self.lock_accounts(debited)
+            balances = self.get_balances(debited)
+            for user_id in debited:
+                for currency_type in CURRENCY_TYPES:
+                    change = sum(
+                        entry.amount
+                        for entry in entries
+                        if entry.user_id == user_id and entry.currency_type == currency_type
+                    )
+                    if getattr(balances[user_id], currency_type) + change < 0:
+                        raise InsufficientFundsError("Недостаточно средств")
+
+        now = datetime.now(timezone.utc)
+        inserted = self.db.execute(
+            pg_insert(CurrencyTransaction.__table__)
+            .values([
+                {
+                    "user_currency_id": accounts[entry.user_id],
+                    "transaction_type": entry.transaction_type,
+                    "amount": entry.amount,
+                    "currency_type": entry.currency_type,
+                    "description": entry.description,
+                    "related_id": entry.related_id,
+                    "company_id": company_id,
+                    "created_at": now,
+                }
+                for entry in entries
+            ])
+            .returning(CurrencyTransaction.__table__.c.user_currency_id, CurrencyTransaction.__table__.c.id)
+        )
+        users = {account_id: user_id for user_id, account_id in accounts.items()}
+        return [(users[account_id], entry_id) for account_id, entry_id in inserted]
@@ -0,0 +1,212 @@
+"""
+Поиск по торговой площадке.
+
+Объявления дублируются в проекцию listing_search вместе с названием и
+редкостью предмета; поиск, сортировка и фасеты работают по ней и по
+частичным индексам активных объявлений, без обращений к артефактам и
+косметике. Минимальная цена предмета (floor) кэшируется на процесс: при
+выставлении объявления кэш понижается до новой цены, при снятии объявления
+с минимальной ценой запись сбрасывается и при следующем обращении
+пересчитывается по индексу. Объявления, снятые в других процессах (истечение
+в app.jobs.listing_expiry), учитываются по истечении
+marketplace_floor_price_cache_ttl_seconds.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Query, Session
+
+from app.core.config import get_settings
+from app.core.pagination import paginate
+from app.models.marketplace import ListingSearch, ListingStatus, ListingType, MarketplaceListing
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Сортировка -> (атрибут ключа сортировки, по возрастанию)
+SORT_OPTIONS: Dict[str, Tuple[str, bool]] = {
+    "newest": ("created_at", False),
+    "price_asc": ("price", True),
+    "price_desc": ("price", False),
+}
+
+
+def _like_pattern(item_query: str) -> str:
+    """Шаблон ILIKE «содержит» с экранированием спецсимволов."""
+    escaped = item_query.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    return f"%{escaped}%"
+
+
+class ListingSearchService:
+    """Сервис поиска объявлений."""
+
+    def __init__(self, db: Session):
+        """Инициализация сервиса."""
+        self.db = db
+
+    def index_listing(self, listing: MarketplaceListing, item_name: str, rarity: str) -> ListingSearch:
+        """Добавить объявление в проекцию (без коммита, ID объявления должен быть известен)."""
+        entry = ListingSearch(
+            id=listing.id,
+            seller_id=listing.seller_id,
+            listing_type=listing.listing_type,
+            item_id=listing.item_id,
+            item_name=item_name,
+            rarity=rarity,
+            quantity=listing.quantity,
+            price=listing.price,
+            status=listing.status or ListingStatus.ACTIVE,
+            expires_at=listing.expires_at,
+            company_id=listing.company_id,
+            created_at=listing.created_at,
+        )
+        self.db.add(entry)
+        return entry
+
+    def set_status(self, listing_id: int, status: ListingStatus) -> None:
+        """Обновить статус объявления в проекции (без коммита)."""
+        self.db.query(ListingSearch).filter(ListingSearch.id == listing_id).update(
+            {ListingSearch.status: status}, synchronize_session=False
+        )
+
+    def _active(
+        self,
+        query: Query,
+        company_id: Optional[int],
+        item_query: Optional[str],
+        seller_id: Optional[int],
+        min_price: Optional[int],
+        max_price: Optional[int],
+    ) -> Query:
+        """Отфильтровать активные объявления (истекшие снимает app.jobs.listing_expiry)."""
+        query = query.filter(ListingSearch.status == ListingStatus.ACTIVE)
+        if company_id is not None:
+            query = query.filter(ListingSearch.company_id == company_id)
+        if item_query:
+            query = query.filter(ListingSearch.item_name.ilike(_like_pattern(item_query), escape="/"))
+        if seller_id:
+            query = query.filter(ListingSearch.seller_id == seller_id)
+        if min_price:
+            query = query.filter(ListingSearch.price >= min_price)
+        if max_price:
+            query = query.filter(ListingSearch.price <= max_price)
+        return query
+
+    def search(
+        self,
+        item_query: Optional[str] = None,
+        listing_type: Optional[ListingType] = None,
+        rarity: Optional[str] = None,
+        seller_id: Optional[int] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        company_id: Optional[int] = None,
+        sort: str = "newest",
+        limit: int = 50,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> List[ListingSearch]:
+        """
+        Найти активные объявления.
+
+        Args:
+            item_query: Подстрока названия предмета
+            sort: newest, price_asc или price_desc
+        """
+        if sort not in SORT_OPTIONS:
+            raise ValueError(f"Неизвестная сортировка: {sort}")
+        sort_attr, ascending = SORT_OPTIONS[sort]
+
+        query = self._active(
+            self.db.query(ListingSearch), company_id, item_query, seller_id, min_price, max_price
+        )
+        if listing_type:
+            query = query.filter(ListingSearch.listing_type == listing_type)
+        if rarity:
+            query = query.filter(ListingSearch.rarity == rarity)
+
+        return paginate(
+            query, getattr(ListingSearch, sort_attr), ListingSearch.id, limit, offset, cursor, ascending=ascending
+        ).all()
+
+    def facets(
+        self,
+        item_query: Optional[str] = None,
+        seller_id: Optional[int] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        company_id: Optional[int] = None,
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Посчитать активные объявления по редкости и по типу предмета.
+
+        Обе группировки считаются одним запросом через GROUPING SETS.
+        """
+        query = self._active(
+            self.db.query(ListingSearch.rarity, ListingSearch.listing_type, func.count(ListingSearch.id)),
+            company_id, item_query, seller_id, min_price, max_price,
+        )
+        rows = query.group_by(
+            func.grouping_sets(tuple_(ListingSearch.rarity), tuple_(ListingSearch.listing_type))
+        ).all()
+
+        result: Dict[str, Dict[str, int]] = {"rarity": {}, "listing_type": {}}
+        for rarity, listing_type, count in rows:
+            if rarity is not None:
+                result["rarity"][rarity] = count
+            else:
+                result["listing_type"][listing_type.value] = count
+        return result
+
+    def get_floor_price(
+        self,
+        listing_type: ListingType,
+        item_id: int,
+        company_id: Optional[int] = None,
+    ) -> Optional[int]:
+        """Минимальная цена активных объявлений предмета (None - объявлений нет)."""
+        key = (company_id, listing_type, item_id)
+        now = time.monotonic()
+        with _floor_lock:
+            cached = _floor_cache.get(key)
+        if cached is not None and now - cached[0] < settings.marketplace_floor_price_cache_ttl_seconds:
+            return cached[1]
+
+        query = self._active(
+            self.db.query(func.min(ListingSearch.price)), company_id, None, None, None, None
+        ).filter(
+            ListingSearch.listing_type == listing_type,
+            ListingSearch.item_id == item_id,
+        )
+        floor = query.scalar()
+
+        with _floor_lock:
+            _floor_cache[key] = (now, floor)
+        return floor
+
+
+_floor_lock = threading.Lock()
+# (company_id, listing_type, item_id) -> (момент расчёта, минимальная цена)
+_floor_cache: Dict[Tuple[Optional[int], ListingType, int], Tuple[float, Optional[int]]] = {}
+
+
+def record_listing_added(company_id: Optional[int], listing_type: ListingType, item_id: int, price: int) -> None:
+    """Учесть в кэше floor новое объявление."""
+    key = (company_id, listing_type, item_id)
+    with _floor_lock:
+        cached = _floor_cache.get(key)
+        if cached is not None and (cached[1] is None or price < cached[1]):
+            _floor_cache[key] = (cached[0], price)
+
+
+def record_listing_removed(company_id: Optional[int], listing_type: ListingType, item_id: int, price: int) -> None:
+    """Учесть в кэше floor проданное или снятое объявление."""
+    key = (company_id, listing_type, item_id)
+    with _floor_lock:
+        cached = _floor_cache.get(key)
+        # Ушло объявление с минимальной ценой - следующий floor неизвестен без запроса
+        if cached is not None and cached[1] is not None and price <= cached[1]:
+            del _floor_cache[key]
@@ -0,0 +1,66 @@
+"""
+Статистика цен торговой площадки.
+
+История цен читается из market_price_rollups, которые ведёт задача
+app.jobs.market_rollups: график из N бакетов - это N строк по уникальному
+индексу, независимо от числа сделок.
+"""
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.marketplace import ListingType, MarketPriceRollup
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("hour", "day")
+
+
+class MarketStatsService:
+    """Сервис статистики торговой площадки."""
+
+    def __init__(self, db: Session):
+        """Инициализация сервиса."""
+        self.db = db
+
+    def get_price_history(
+        self,
+        listing_type: ListingType,
+        item_id: int,
+        period: str = "day",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company_id: Optional[int] = None,
+        limit: int = 90,
+    ) -> List[MarketPriceRollup]:
+        """
+        Получить OHLC, объём и число сделок по предмету.
+
+        Args:
+            period: hour или day
+            start: Начало интервала (включительно)
+            end: Конец интервала (не включительно)
+            limit: Сколько последних бакетов вернуть
+
+        Returns:
+            Бакеты в хронологическом порядке
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Неизвестный период: {period}")
+
+        query = self.db.query(MarketPriceRollup).filter(
+            MarketPriceRollup.listing_type == listing_type,
+            MarketPriceRollup.item_id == item_id,
+            MarketPriceRollup.period == period,
+            func.coalesce(MarketPriceRollup.company_id, 0) == (company_id or 0),
+        )
+        if start is not None:
+            query = query.filter(MarketPriceRollup.bucket_start >= start)
+        if end is not None:
+            query = query.filter(MarketPriceRollup.bucket_start < end)
+
+        buckets = query.order_by(MarketPriceRollup.bucket_start.desc()).limit(limit).all()
+        return list(reversed(buckets))
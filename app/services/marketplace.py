@@ -3,16 +3,20 @@ import logging
 from datetime import datetime, timezone, timedelta
 from typing import List, Optional
 
-from sqlalchemy import func, and_
+from sqlalchemy import Row, func, and_, or_
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
+from app.core.pagination import paginate
 from app.models.marketplace import (
-    MarketplaceListing, Transaction, UserCurrency, CurrencyTransaction,
+    MarketplaceListing, Transaction, CurrencyTransaction,
     ListingStatus, ListingType, TransactionStatus
 )
 from app.models.artifact import UserArtifact, Artifact
 from app.models.cosmetic import UserCosmetic, Cosmetic
+from app.services.inventory import InsufficientItemsError, InventoryService
+from app.services.ledger import CurrencyBalance, InsufficientFundsError, LedgerEntry, LedgerService
+from app.services.listing_search import ListingSearchService, record_listing_added, record_listing_removed
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -53,6 +57,7 @@ class MarketplaceService:
 
             if not artifact:
                 raise ValueError("Артефакт не найден или не может быть продан")
+            item = artifact
 
             user_item = (
                 self.db.query(UserArtifact)
@@ -83,6 +88,7 @@ class MarketplaceService:
 
             if not cosmetic:
                 raise ValueError("Косметика не найдена или не может быть продана")
+            item = cosmetic
 
             user_item = (
                 self.db.query(UserCosmetic)
@@ -114,8 +120,11 @@ class MarketplaceService:
             company_id=company_id,
         )
         self.db.add(listing)
+        self.db.flush()
+        ListingSearchService(self.db).index_listing(listing, item.name, item.rarity)
         self.db.commit()
         self.db.refresh(listing)
+        record_listing_added(company_id, listing_type, item_id, price)
         logger.info(f"Создано объявление: {listing.id} продавцом {seller_id}")
         return listing
 
@@ -125,7 +134,81 @@ class MarketplaceService:
         buyer_id: int,
         company_id: Optional[int] = None,
     ) -> Transaction:
-        """Купить предмет по объявлению."""
+        """
+        Купить предмет по объявлению.
+
+        Покупка выполняется одной короткой транзакцией. Объявление
+        захватывается условным UPDATE ... WHERE status = 'active' RETURNING,
+        поэтому из параллельных покупателей его получает ровно один; срок
+        действия проверяется здесь же, так как задача снятия истекших
+        объявлений работает с задержкой. Оплата записывается в журнал валюты
+        одним INSERT под блокировками счетов в порядке user_id.
+        """
+        now = datetime.now(timezone.utc)
+        listings = MarketplaceListing.__table__
+        claim = (
+            listings.update()
+            .where(
+                listings.c.id == listing_id,
+                listings.c.status == ListingStatus.ACTIVE,
+                listings.c.seller_id != buyer_id,
+                or_(listings.c.expires_at.is_(None), listings.c.expires_at >= now),
+            )
+            .values(status=ListingStatus.SOLD, updated_at=now)
+            .returning(
+                listings.c.seller_id,
+                listings.c.listing_type,
+                listings.c.item_id,
+                listings.c.quantity,
+                listings.c.price,
+            )
+        )
+        if company_id is not None:
+            claim = claim.where(listings.c.company_id == company_id)
+        listing = self.db.execute(claim).first()
+        if listing is None:
+            self._raise_listing_unavailable(listing_id, buyer_id, company_id, now)
+
+        try:
+            transaction = Transaction(
+                listing_id=listing_id,
+                buyer_id=buyer_id,
+                seller_id=listing.seller_id,
+                listing_type=listing.listing_type,
+                item_id=listing.item_id,
+                quantity=listing.quantity,
+                price=listing.price,
+                status=TransactionStatus.COMPLETED,
+                completed_at=now,
+                company_id=company_id,
+            )
+            self.db.add(transaction)
+            self.db.flush()  # ID транзакции нужен для журнала и obtained_from_id
+
+            # Счета обоих участников блокируются в порядке user_id: встречные
+            # покупки двух пользователей не взаимоблокируются на предметах
+            LedgerService(self.db).lock_accounts([buyer_id, listing.seller_id])
+            self._transfer_coins(buyer_id, listing.seller_id, listing.price, transaction.id, company_id)
+            self._transfer_item(listing, buyer_id, transaction.id, company_id, now)
+            ListingSearchService(self.db).set_status(listing_id, ListingStatus.SOLD)
+            self.db.commit()
+        except ValueError:
+            self.db.rollback()
+            raise
+
+        record_listing_removed(company_id, listing.listing_type, listing.item_id, listing.price)
+
+        logger.info(f"Транзакция завершена: {transaction.id}, покупатель {buyer_id}, продавец {listing.seller_id}")
+        return transaction
+
+    def _raise_listing_unavailable(
+        self,
+        listing_id: int,
+        buyer_id: int,
+        company_id: Optional[int],
+        now: datetime,
+    ) -> None:
+        """Объяснить, почему объявление не удалось захватить."""
         listing = (
             self.db.query(MarketplaceListing)
             .filter(
@@ -143,133 +226,73 @@ class MarketplaceService:
         if listing.seller_id == buyer_id:
             raise ValueError("Нельзя купить свой собственный предмет")
 
-        if listing.expires_at and listing.expires_at < datetime.now(timezone.utc):
+        if listing.expires_at and listing.expires_at < now:
             listing.status = ListingStatus.EXPIRED
+            ListingSearchService(self.db).set_status(listing_id, ListingStatus.EXPIRED)
             self.db.commit()
+            record_listing_removed(company_id, listing.listing_type, listing.item_id, listing.price)
             raise ValueError("Объявление истекло")
 
-        # Проверить баланс покупателя
-        buyer_currency = self._get_or_create_currency(buyer_id, company_id)
-        if buyer_currency.coins < listing.price:
-            raise ValueError("Недостаточно средств")
-
-        # Создать транзакцию
-        transaction = Transaction(
-            listing_id=listing_id,
-            buyer_id=buyer_id,
-            seller_id=listing.seller_id,
-            listing_type=listing.listing_type,
-            item_id=listing.item_id,
-            quantity=listing.quantity,
-            price=listing.price,
-            status=TransactionStatus.PENDING,
-            company_id=company_id,
-        )
-        self.db.add(transaction)
+        raise ValueError("Объявление не найдено или неактивно")
 
-        # Передать предмет покупателю
-        if listing.listing_type == ListingType.ARTIFACT:
-            buyer_item = (
-                self.db.query(UserArtifact)
-                .filter(
-                    UserArtifact.user_id == buyer_id,
-                    UserArtifact.artifact_id == listing.item_id
-                )
+    def _transfer_coins(
+        self,
+        buyer_id: int,
+        seller_id: int,
+        price: int,
+        transaction_id: int,
+        company_id: Optional[int],
+    ) -> None:
+        """Записать в журнал списание у покупателя и начисление продавцу."""
+        try:
+            LedgerService(self.db).post(
+                [
+                    LedgerEntry(buyer_id, -price, "coins", "purchase", related_id=transaction_id),
+                    LedgerEntry(seller_id, price, "coins", "sale", related_id=transaction_id),
+                ],
+                company_id,
             )
-            if company_id is not None:
-                buyer_item = buyer_item.filter(UserArtifact.company_id == company_id)
-            buyer_item = buyer_item.first()
-
-            if buyer_item:
-                buyer_item.quantity += listing.quantity
-                buyer_item.updated_at = datetime.now(timezone.utc)
-            else:
-                buyer_item = UserArtifact(
-                    user_id=buyer_id,
-                    artifact_id=listing.item_id,
-                    quantity=listing.quantity,
-                    obtained_at=datetime.now(timezone.utc),
-                    obtained_from="trade",
-                    obtained_from_id=transaction.id,
-                    company_id=company_id,
-                )
-                self.db.add(buyer_item)
+        except InsufficientFundsError:
+            raise ValueError("Недостаточно средств")
 
-            # Удалить у продавца
-            seller_item = (
-                self.db.query(UserArtifact)
-                .filter(
-                    UserArtifact.user_id == listing.seller_id,
-                    UserArtifact.artifact_id == listing.item_id
-                )
+    def _transfer_item(
+        self,
+        listing: Row,
+        buyer_id: int,
+        transaction_id: int,
+        company_id: Optional[int],
+        now: datetime,
+    ) -> None:
+        """Передать предмет объявления от продавца покупателю."""
+        inventory = InventoryService(self.db)
+        if listing.listing_type == ListingType.ARTIFACT:
+            try:
+                inventory.consume_artifact(listing.seller_id, listing.item_id, listing.quantity, company_id)
+            except InsufficientItemsError:
+                raise ValueError("У продавца недостаточно артефактов")
+            inventory.add_artifact(
+                buyer_id,
+                listing.item_id,
+                listing.quantity,
+                obtained_from="trade",
+                obtained_from_id=transaction_id,
+                company_id=company_id,
             )
-            if company_id is not None:
-                seller_item = seller_item.filter(UserArtifact.company_id == company_id)
-            seller_item = seller_item.first()
-
-            if seller_item:
-                seller_item.quantity -= listing.quantity
-                if seller_item.quantity <= 0:
-                    self.db.delete(seller_item)
 
         elif listing.listing_type == ListingType.COSMETIC:
-            buyer_cosmetic = UserCosmetic(
+            try:
+                inventory.consume_cosmetic(listing.seller_id, listing.item_id, company_id)
+            except InsufficientItemsError:
+                raise ValueError("У продавца нет этой косметики")
+            self.db.add(UserCosmetic(
                 user_id=buyer_id,
                 cosmetic_id=listing.item_id,
                 is_equipped=False,
-                obtained_at=datetime.now(timezone.utc),
+                obtained_at=now,
                 obtained_from="trade",
-                obtained_from_id=transaction.id,
+                obtained_from_id=transaction_id,
                 company_id=company_id,
-            )
-            self.db.add(buyer_cosmetic)
-
-            # Удалить у продавца
-            seller_cosmetic = (
-                self.db.query(UserCosmetic)
-                .filter(
-                    UserCosmetic.user_id == listing.seller_id,
-                    UserCosmetic.cosmetic_id == listing.item_id
-                )
-            )
-            if company_id is not None:
-                seller_cosmetic = seller_cosmetic.filter(UserCosmetic.company_id == company_id)
-            seller_cosmetic = seller_cosmetic.first()
-
-            if seller_cosmetic:
-                self.db.delete(seller_cosmetic)
-
-        # Перевести деньги
-        buyer_currency.coins -= listing.price
-        self._add_currency_transaction(
-            buyer_currency.id,
-            -listing.price,
-            "coins",
-            "purchase",
-            transaction.id,
-            company_id
-        )
-
-        seller_currency = self._get_or_create_currency(listing.seller_id, company_id)
-        seller_currency.coins += listing.price
-        self._add_currency_transaction(
-            seller_currency.id,
-            listing.price,
-            "coins",
-            "sale",
-            transaction.id,
-            company_id
-        )
-
-        # Обновить статусы
-        listing.status = ListingStatus.SOLD
-        transaction.status = TransactionStatus.COMPLETED
-        transaction.completed_at = datetime.now(timezone.utc)
-
-        self.db.commit()
-        self.db.refresh(transaction)
-        logger.info(f"Транзакция завершена: {transaction.id}, покупатель {buyer_id}, продавец {listing.seller_id}")
-        return transaction
+            ))
 
     def get_listings(
         self,
@@ -280,6 +303,7 @@ class MarketplaceService:
         company_id: Optional[int] = None,
         limit: int = 100,
         offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> List[MarketplaceListing]:
         """Получить список объявлений."""
         query = (
@@ -298,63 +322,26 @@ class MarketplaceService:
         if company_id is not None:
             query = query.filter(MarketplaceListing.company_id == company_id)
 
-        # Фильтр истекших объявлений
-        query = query.filter(
-            (MarketplaceListing.expires_at.is_(None)) |
-            (MarketplaceListing.expires_at > datetime.now(timezone.utc))
-        )
-
-        return query.order_by(MarketplaceListing.created_at.desc()).offset(offset).limit(limit).all()
+        # Истекшие объявления снимает задача app.jobs.listing_expiry
+        return paginate(query, MarketplaceListing.created_at, MarketplaceListing.id, limit, offset, cursor).all()
 
-    def _get_or_create_currency(
+    def get_currency(
         self,
         user_id: int,
         company_id: Optional[int] = None,
-    ) -> UserCurrency:
-        """Получить или создать валюту пользователя."""
-        currency = (
-            self.db.query(UserCurrency)
-            .filter(UserCurrency.user_id == user_id)
-        )
-        if company_id is not None:
-            currency = currency.filter(UserCurrency.company_id == company_id)
-        currency = currency.first()
-
-        if not currency:
-            currency = UserCurrency(
-                user_id=user_id,
-                coins=0,
-                gems=0,
-                company_id=company_id,
-            )
-            self.db.add(currency)
-            self.db.commit()
-            self.db.refresh(currency)
+    ) -> CurrencyBalance:
+        """Получить баланс валюты пользователя."""
+        return LedgerService(self.db).get_balance(user_id, company_id)
 
-        return currency
-
-    def _add_currency_transaction(
+    def get_currency_history(
         self,
-        user_currency_id: int,
-        amount: int,
-        currency_type: str,
-        transaction_type: str,
-        related_id: Optional[int] = None,
-        description: Optional[str] = None,
-        company_id: Optional[int] = None,
-    ) -> CurrencyTransaction:
-        """Добавить транзакцию валюты."""
-        transaction = CurrencyTransaction(
-            user_currency_id=user_currency_id,
-            amount=amount,
-            currency_type=currency_type,
-            transaction_type=transaction_type,
-            related_id=related_id,
-            description=description,
-            company_id=company_id,
-        )
-        self.db.add(transaction)
-        return transaction
+        user_id: int,
+        currency_type: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> List[CurrencyTransaction]:
+        """Получить историю операций с валютой."""
+        return LedgerService(self.db).get_entries(user_id, currency_type, limit, cursor)
 
     def add_currency(
         self,
@@ -364,27 +351,14 @@ class MarketplaceService:
         transaction_type: str = "reward",
         description: Optional[str] = None,
         company_id: Optional[int] = None,
-    ) -> UserCurrency:
+    ) -> CurrencyBalance:
         """Добавить валюту пользователю."""
-        currency = self._get_or_create_currency(user_id, company_id)
-
-        if currency_type == "coins":
-            currency.coins += amount
-        elif currency_type == "gems":
-            currency.gems += amount
-
-        trans = self._add_currency_transaction(
-            currency.id,
-            amount,
-            currency_type,
-            transaction_type,
-            description=description,
-            company_id=company_id,
+        ledger = LedgerService(self.db)
+        ledger.post(
+            [LedgerEntry(user_id, amount, currency_type, transaction_type, description)],
+            company_id,
         )
-        trans.description = description
-
-        currency.updated_at = datetime.now(timezone.utc)
         self.db.commit()
-        self.db.refresh(currency)
+        currency = ledger.get_balance(user_id, company_id)
         logger.info(f"Добавлена валюта пользователю {user_id}: {amount} {currency_type}")
         return currency
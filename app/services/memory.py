@@ -6,6 +6,7 @@ from typing import List, Optional, Dict
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
+from app.core.pagination import paginate
 from app.models.memory import Memory, MemoryTimeline
 
 settings = get_settings()
@@ -80,6 +81,7 @@ class MemoryService:
         company_id: Optional[int] = None,
         limit: int = 100,
         offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> List[Memory]:
         """Получить воспоминания пользователя."""
         query = (
@@ -97,7 +99,7 @@ class MemoryService:
         if company_id is not None:
             query = query.filter(Memory.company_id == company_id)
 
-        return query.order_by(Memory.created_at.desc()).offset(offset).limit(limit).all()
+        return paginate(query, Memory.created_at, Memory.id, limit, offset, cursor).all()
 
     def get_memory_timeline(
         self,
@@ -0,0 +1,294 @@
+"""
+Рейтинги игроков.
+
+Показатели (LeaderboardMetric): XP, пройденное расстояние, открытия областей
+и посещения геозон. Каждое событие прибавляет очки игроку в нескольких
+областях рейтинга:
+
+- global - все игроки;
+- company:{id} - игроки компании;
+- geozone:{id} и cell:{company}:{x}:{y} - регион: геозона события или
+  ячейка сетки player_leaderboard_cell_size_degrees по координатам;
+- event:{id} - сезон: активное сезонное событие (Event) на момент записи.
+
+Очки хранятся в player_scores и обновляются одним INSERT ... ON CONFLICT в
+транзакции события. Рейтинг области - player_leaderboard_shards упорядоченных
+множеств (app.services.sorted_sets), игрок попадает в шард user_id % shards
+(колонка player_scores.shard); новые очки записываются в шарды после коммита.
+
+Отсутствующий в хранилище шард загружается из БД диапазонным чтением индекса
+(metric, scope, shard). В Redis (leaderboard_redis_enabled) шарды общие и
+загружаются один раз; без Redis каждый процесс держит шарды в памяти и
+перечитывает их через leaderboard_memory_ttl_seconds (чтение в запросе стоит
+O(размер области)) - этого достаточно для одного процесса и небольших
+областей, для нескольких процессов API нужен Redis.
+
+Чтения за O(шарды * log n):
+
+- топ - слияние топов шардов, первые player_leaderboard_top_size мест
+  кэшируются в процессе на player_leaderboard_top_cache_ttl_seconds и
+  отдаются страницами;
+- место игрока - 1 + число очков выше его очков по всем шардам, перцентиль -
+  доля игроков ниже. Шарды обновляются независимо, поэтому вне топа место и
+  перцентиль приблизительны.
+
+Очки global и company:{id} периодически пересчитываются по истории задачей
+app.jobs.player_score_recompute.
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.event import Event, EventType
+from app.models.leaderboard import LeaderboardMetric, PlayerScore
+from app.services.sorted_sets import get_sorted_sets, queue_update
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = "global"
+
+
+def company_scope(company_id: int) -> str:
+    """Область игроков компании."""
+    return f"company:{company_id}"
+
+
+def geozone_scope(geozone_id: int) -> str:
+    """Область игроков геозоны."""
+    return f"geozone:{geozone_id}"
+
+
+def cell_scope(latitude: float, longitude: float, company_id: Optional[int] = None) -> str:
+    """Область игроков ячейки сетки, содержащей точку."""
+    size = settings.player_leaderboard_cell_size_degrees
+    return f"cell:{company_id or 0}:{math.floor(latitude / size)}:{math.floor(longitude / size)}"
+
+
+def season_scope(event_id: int) -> str:
+    """Область игроков сезона."""
+    return f"event:{event_id}"
+
+
+def shard_key(metric: LeaderboardMetric, scope: str, shard: int) -> str:
+    """Ключ шарда рейтинга."""
+    return f"leaderboard:players:{metric.value}:{scope}:{shard}"
+
+
+def shard_of(user_id: int) -> int:
+    """Шард игрока."""
+    return user_id % settings.player_leaderboard_shards
+
+
+@dataclass(frozen=True)
+class PlayerLeaderboardEntry:
+    """Строка рейтинга игроков."""
+
+    rank: int  # С 1
+    user_id: int
+    score: float
+
+
+@dataclass(frozen=True)
+class PlayerStanding:
+    """Место игрока в рейтинге."""
+
+    rank: int  # С 1
+    score: float
+    total: int  # Игроков в рейтинге
+    percentile: float  # Доля остальных игроков с меньшими очками, %
+
+
+_cache_lock = threading.Lock()
+# (metric, scope) -> (момент построения, топ)
+_top_cache: Dict[Tuple[LeaderboardMetric, str], Tuple[float, List[PlayerLeaderboardEntry]]] = {}
+# company_id -> (момент загрузки, ID активных сезонов)
+_season_cache: Dict[Optional[int], Tuple[float, List[int]]] = {}
+
+
+class PlayerLeaderboardService:
+    """Сервис рейтингов игроков."""
+
+    def __init__(self, db: Session):
+        """Инициализация сервиса."""
+        self.db = db
+
+    def scopes_for(
+        self,
+        company_id: Optional[int] = None,
+        geozone_id: Optional[int] = None,
+        location: Optional[Tuple[float, float]] = None,
+    ) -> List[str]:
+        """
+        Области рейтинга события.
+
+        Args:
+            geozone_id: Геозона события (регион)
+            location: (широта, долгота) события (ячейка сетки)
+        """
+        scopes = [GLOBAL_SCOPE]
+        if company_id is not None:
+            scopes.append(company_scope(company_id))
+        if geozone_id is not None:
+            scopes.append(geozone_scope(geozone_id))
+        if location is not None:
+            scopes.append(cell_scope(location[0], location[1], company_id))
+        scopes.extend(season_scope(event_id) for event_id in self._active_season_ids(company_id))
+        return scopes
+
+    def _active_season_ids(self, company_id: Optional[int]) -> List[int]:
+        """ID идущих сезонных событий (кэшируются на player_leaderboard_season_cache_ttl_seconds)."""
+        now = time.monotonic()
+        with _cache_lock:
+            cached = _season_cache.get(company_id)
+        if cached is not None and now - cached[0] < settings.player_leaderboard_season_cache_ttl_seconds:
+            return cached[1]
+
+        moment = datetime.now(timezone.utc)
+        query = self.db.query(Event.id).filter(
+            Event.event_type == EventType.SEASONAL,
+            Event.is_active.is_(True),
+            Event.deleted_at.is_(None),
+            Event.start_date <= moment,
+            Event.end_date > moment,
+        )
+        if company_id is not None:
+            query = query.filter(Event.company_id == company_id)
+        event_ids = [event_id for (event_id,) in query.order_by(Event.id)]
+
+        with _cache_lock:
+            _season_cache[company_id] = (now, event_ids)
+        return event_ids
+
+    def record(
+        self,
+        metric: LeaderboardMetric,
+        amounts: Mapping[int, float],
+        company_id: Optional[int] = None,
+        geozone_id: Optional[int] = None,
+        location: Optional[Tuple[float, float]] = None,
+    ) -> None:
+        """
+        Прибавить очки игрокам во всех областях события (без коммита).
+
+        Рейтинги обновляются после коммита.
+
+        Args:
+            amounts: user_id -> прирост показателя
+        """
+        amounts = {user_id: amount for user_id, amount in amounts.items() if amount}
+        if not amounts:
+            return
+
+        scopes = self.scopes_for(company_id, geozone_id, location)
+        now = datetime.now(timezone.utc)
+        # Порядок строк одинаков во всех транзакциях - конкурентные вставки не взаимоблокируются
+        rows = [
+            {
+                "user_id": user_id,
+                "metric": metric.value,
+                "scope": scope,
+                "score": amounts[user_id],
+                "shard": shard_of(user_id),
+                "company_id": company_id,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for scope in sorted(scopes)
+            for user_id in sorted(amounts)
+        ]
+        table = PlayerScore.__table__
+        statement = pg_insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.metric, table.c.scope, table.c.user_id],
+            set_={
+                "score": table.c.score + statement.excluded.score,
+                "shard": statement.excluded.shard,
+                "updated_at": now,
+            },
+        ).returning(table.c.user_id, table.c.scope, table.c.score)
+        for row in self.db.execute(statement):
+            queue_update(self.db, shard_key(metric, row.scope, shard_of(row.user_id)), str(row.user_id), row.score)
+
+    def top(
+        self, metric: LeaderboardMetric, scope: str, offset: int = 0, limit: int = 20
+    ) -> List[PlayerLeaderboardEntry]:
+        """Страница топа области (в пределах первых player_leaderboard_top_size мест)."""
+        offset = max(offset, 0)
+        limit = max(min(limit, settings.player_leaderboard_top_size - offset), 0)
+        return self._top(metric, scope)[offset:offset + limit]
+
+    def _top(self, metric: LeaderboardMetric, scope: str) -> List[PlayerLeaderboardEntry]:
+        """Топ области: слияние топов шардов, кэшируется в процессе."""
+        key = (metric, scope)
+        now = time.monotonic()
+        with _cache_lock:
+            cached = _top_cache.get(key)
+        if cached is not None and now - cached[0] < settings.player_leaderboard_top_cache_ttl_seconds:
+            return cached[1]
+
+        size = settings.player_leaderboard_top_size
+        store = get_sorted_sets()
+        candidates: List[Tuple[float, int]] = []
+        for shard in range(settings.player_leaderboard_shards):
+            shard_set = self._ensure_loaded(metric, scope, shard)
+            candidates.extend((score, int(member)) for member, score in store.rev_range(shard_set, 0, size))
+        # При равенстве очков выше игрок с меньшим ID
+        best = heapq.nsmallest(size, candidates, key=lambda item: (-item[0], item[1]))
+        top = [
+            PlayerLeaderboardEntry(rank=rank, user_id=user_id, score=score)
+            for rank, (score, user_id) in enumerate(best, start=1)
+        ]
+
+        with _cache_lock:
+            _top_cache[key] = (now, top)
+        return top
+
+    def standing(self, metric: LeaderboardMetric, scope: str, user_id: int) -> Optional[PlayerStanding]:
+        """Место и перцентиль игрока в области; None, если у игрока нет очков в ней."""
+        store = get_sorted_sets()
+        keys = [self._ensure_loaded(metric, scope, shard) for shard in range(settings.player_leaderboard_shards)]
+        score = store.score(keys[shard_of(user_id)], str(user_id))
+        if score is None:
+            return None
+
+        rank = 1 + sum(store.count_above(key, score) for key in keys)
+        total = sum(store.card(key) for key in keys)
+        # Доля остальных игроков с очками ниже; единственный игрок - 100%
+        below = max(total - rank, 0)
+        percentile = 100.0 * below / (total - 1) if total > 1 else 100.0
+        return PlayerStanding(rank=rank, score=score, total=total, percentile=round(percentile, 2))
+
+    def _ensure_loaded(self, metric: LeaderboardMetric, scope: str, shard: int) -> str:
+        """Загрузить шард из БД, если его нет в хранилище."""
+        key = shard_key(metric, scope, shard)
+        store = get_sorted_sets()
+        if not store.exists(key):
+            store.replace(key, self._load_shard(metric, scope, shard))
+        return key
+
+    def _load_shard(self, metric: LeaderboardMetric, scope: str, shard: int) -> Dict[str, float]:
+        """Очки игроков шарда из БД (диапазон индекса (metric, scope, shard))."""
+        query = self.db.query(PlayerScore.user_id, PlayerScore.score).filter(
+            PlayerScore.metric == metric.value,
+            PlayerScore.scope == scope,
+            PlayerScore.shard == shard,
+        )
+        return {str(user_id): score for user_id, score in query}
+
+    def rebuild(self, metric: LeaderboardMetric, scope: str) -> None:
+        """Перестроить все шарды области по БД."""
+        store = get_sorted_sets()
+        for shard in range(settings.player_leaderboard_shards):
+            store.replace(shard_key(metric, scope, shard), self._load_shard(metric, scope, shard))
+        with _cache_lock:
+            _top_cache.pop((metric, scope), None)
@@ -11,7 +11,8 @@ from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
 from app.models.portal import Portal, PortalInteraction, PortalType, PortalStatus
-from app.models.artifact import UserArtifact
+from app.services.inventory import InsufficientItemsError, InventoryService
+from app.services.reward import RewardBundle, RewardService
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -128,74 +129,42 @@ class PortalService:
 
         if interaction_type == "leave_artifact" and artifact_left_id:
             # Оставить артефакт в портале
-            user_artifact = (
-                self.db.query(UserArtifact)
-                .filter(
-                    UserArtifact.user_id == user_id,
-                    UserArtifact.artifact_id == artifact_left_id,
-                    UserArtifact.quantity > 0
-                )
-            )
-            if company_id is not None:
-                user_artifact = user_artifact.filter(UserArtifact.company_id == company_id)
-            user_artifact = user_artifact.first()
-
-            if not user_artifact:
+            try:
+                InventoryService(self.db).consume_artifact(user_id, artifact_left_id, 1, company_id)
+            except InsufficientItemsError:
                 raise ValueError("Артефакт не найден у пользователя")
 
-            user_artifact.quantity -= 1
-            if user_artifact.quantity <= 0:
-                self.db.delete(user_artifact)
-
             portal.installed_artifact_id = artifact_left_id
             portal.installed_by_user_id = user_id
             portal.installed_at = datetime.now(timezone.utc)
 
         elif interaction_type == "take_artifact" and portal.installed_artifact_id:
             # Взять артефакт из портала
-            existing = (
-                self.db.query(UserArtifact)
-                .filter(
-                    UserArtifact.user_id == user_id,
-                    UserArtifact.artifact_id == portal.installed_artifact_id
-                )
-                .first()
+            artifact_taken_id = portal.installed_artifact_id
+            RewardService(self.db).grant(
+                user_id,
+                RewardBundle(artifacts={artifact_taken_id: 1}, source="portal", source_id=portal_id),
+                company_id,
+                commit=False,
             )
 
-            if existing:
-                existing.quantity += 1
-                user_artifact = existing
-            else:
-                user_artifact = UserArtifact(
-                    user_id=user_id,
-                    artifact_id=portal.installed_artifact_id,
-                    quantity=1,
-                    obtained_at=datetime.now(timezone.utc),
-                    obtained_from="portal",
-                    obtained_from_id=portal_id,
-                    company_id=company_id,
-                )
-                self.db.add(user_artifact)
-
             portal.installed_artifact_id = None
             portal.installed_by_user_id = None
             portal.installed_at = None
-            artifact_taken_id = portal.installed_artifact_id
 
         elif interaction_type == "activate":
             # Активировать портал (может дать награды)
-            from app.services.marketplace import MarketplaceService
-            marketplace_service = MarketplaceService(self.db)
-            
-            # Награда за активацию
             reward_coins = 10
-            marketplace_service.add_currency(
+            RewardService(self.db).grant(
                 user_id,
-                reward_coins,
-                "coins",
-                "portal_activation",
-                f"Активация портала: {portal.name}",
-                company_id
+                RewardBundle(
+                    coins=reward_coins,
+                    source="portal_activation",
+                    source_id=portal_id,
+                    description=f"Активация портала: {portal.name}",
+                ),
+                company_id,
+                commit=False,
             )
             reward_received = {"coins": reward_coins}
 
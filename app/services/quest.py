@@ -1,18 +1,21 @@
 """Сервис работы с квестами и событиями."""
 import logging
 from datetime import datetime, timezone
-from typing import List, Optional, Dict
+from typing import Iterable, List, Optional, Dict
 
 from sqlalchemy import func, and_
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager
 
 from app.core.config import get_settings
+from app.core.pagination import paginate
 from app.models.event import Event, Quest, UserQuest, UserEvent, EventStatus, QuestStatus, QuestType
 from app.models.achievement import UserAchievement
 from app.models.geozone import GeozoneVisit
 from app.models.location import LocationPoint, LocationSession
 from app.models.artifact import UserArtifact
-from app.services.marketplace import MarketplaceService
+from app.services.ledger import InsufficientFundsError, LedgerEntry, LedgerService
+from app.services.reward import RewardBundle, RewardService
+from app.services.quest_triggers import QuestEventKind, get_quest_trigger_index, invalidate_quest_trigger_index
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -90,6 +93,7 @@ class QuestService:
         self.db.add(quest)
         self.db.commit()
         self.db.refresh(quest)
+        invalidate_quest_trigger_index(company_id)
         logger.info(f"Создан квест: {quest.id} ({quest.name})")
         return quest
 
@@ -100,6 +104,7 @@ class QuestService:
         company_id: Optional[int] = None,
         limit: int = 100,
         offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> List[Quest]:
         """Получить доступные квесты для пользователя."""
         query = (
@@ -130,7 +135,7 @@ class QuestService:
             (~Quest.id.in_(completed_quest_ids))
         )
 
-        return query.order_by(Quest.created_at.desc()).offset(offset).limit(limit).all()
+        return paginate(query, Quest.created_at, Quest.id, limit, offset, cursor).all()
 
     def start_quest(
         self,
@@ -155,23 +160,16 @@ class QuestService:
             raise ValueError("Квест не найден")
 
         if quest.is_premium and quest.price:
-            # Проверить оплату для платных квестов
-            marketplace_service = MarketplaceService(self.db)
-            currency = marketplace_service._get_or_create_currency(user_id, company_id)
-            if currency.coins < quest.price:
+            # Списать оплату платного квеста (баланс проверяется под блокировкой счёта)
+            try:
+                LedgerService(self.db).post(
+                    [LedgerEntry(user_id, -quest.price, "coins", "quest_purchase", related_id=quest_id)],
+                    company_id,
+                )
+            except InsufficientFundsError:
+                self.db.rollback()
                 raise ValueError("Недостаточно средств для покупки квеста")
 
-            # Списать деньги
-            currency.coins -= quest.price
-            marketplace_service._add_currency_transaction(
-                currency.id,
-                -quest.price,
-                "coins",
-                "quest_purchase",
-                quest_id,
-                company_id
-            )
-
         # Проверить, не начат ли уже квест
         existing = (
             self.db.query(UserQuest)
@@ -229,9 +227,71 @@ class QuestService:
         if not user_quest:
             return None
 
+        if not self._refresh_user_quest(user_quest, company_id):
+            return None
+
+        self.db.commit()
+        self.db.refresh(user_quest)
+        return user_quest
+
+    def dispatch_event(
+        self,
+        user_id: int,
+        event_kind: QuestEventKind,
+        keys: Optional[Iterable[int]] = None,
+        company_id: Optional[int] = None,
+        commit: bool = True,
+    ) -> List[UserQuest]:
+        """
+        Обновить прогресс квестов пользователя, зависящих от события.
+
+        Квесты выбираются по индексу триггеров, активные квесты пользователя
+        загружаются одним запросом, изменения сохраняются одним коммитом.
+
+        Args:
+            user_id: ID пользователя
+            event_kind: Тип события
+            keys: ID объектов события (геозоны, артефакта, достижения)
+            company_id: ID компании
+            commit: Зафиксировать транзакцию; False - прогресс входит в транзакцию вызывающего кода
+
+        Returns:
+            Обновлённые квесты пользователя
+        """
+        quest_ids = get_quest_trigger_index(self.db, company_id).match(event_kind, keys)
+        if not quest_ids:
+            return []
+
+        user_quests = (
+            self.db.query(UserQuest)
+            .join(Quest, UserQuest.quest_id == Quest.id)
+            .options(contains_eager(UserQuest.quest))
+            .filter(
+                UserQuest.user_id == user_id,
+                UserQuest.status == QuestStatus.IN_PROGRESS,
+                UserQuest.quest_id.in_(sorted(quest_ids)),
+            )
+        )
+        if company_id is not None:
+            user_quests = user_quests.filter(UserQuest.company_id == company_id)
+
+        # Квест, выполненный выше в этой же транзакции (награда за квест начислила
+        # артефакт), ещё не записан в БД - его статус проверяется в памяти
+        updated = [
+            user_quest for user_quest in user_quests.all()
+            if user_quest.status == QuestStatus.IN_PROGRESS and self._refresh_user_quest(user_quest, company_id)
+        ]
+        if updated and commit:
+            self.db.commit()
+        return updated
+
+    def _refresh_user_quest(self, user_quest: UserQuest, company_id: Optional[int] = None) -> bool:
+        """Пересчитать прогресс квеста пользователя без коммита."""
         quest = user_quest.quest
         if not quest or quest.deleted_at:
-            return None
+            return False
+
+        user_id = user_quest.user_id
 
         # Вычислить текущий прогресс на основе типа квеста
         new_progress = self._calculate_progress(user_id, quest, company_id)
@@ -250,9 +310,7 @@ class QuestService:
 
             logger.info(f"Квест выполнен пользователем {user_id}: {quest.name}")
 
-        self.db.commit()
-        self.db.refresh(user_quest)
-        return user_quest
+        return True
 
     def _initialize_progress(self, quest: Quest) -> Dict:
         """Инициализировать прогресс квеста."""
@@ -386,68 +444,11 @@ class QuestService:
         quest: Quest,
         company_id: Optional[int] = None,
     ) -> None:
-        """Выдать награды за выполнение квеста."""
-        rewards = quest.rewards or {}
-        marketplace_service = MarketplaceService(self.db)
-
-        if "coins" in rewards:
-            marketplace_service.add_currency(
-                user_id,
-                rewards["coins"],
-                "coins",
-                "quest",
-                f"Награда за квест: {quest.name}",
-                company_id
-            )
-
-        if "gems" in rewards:
-            marketplace_service.add_currency(
-                user_id,
-                rewards["gems"],
-                "gems",
-                "quest",
-                f"Награда за квест: {quest.name}",
-                company_id
-            )
-
-        # Выдать артефакты/косметику если указаны в наградах
-        if "artifacts" in rewards:
-            for artifact_id, quantity in rewards["artifacts"].items():
-                existing = (
-                    self.db.query(UserArtifact)
-                    .filter(
-                        UserArtifact.user_id == user_id,
-                        UserArtifact.artifact_id == int(artifact_id)
-                    )
-                )
-                if company_id is not None:
-                    existing = existing.filter(UserArtifact.company_id == company_id)
-                existing = existing.first()
-                
-                if existing:
-                    existing.quantity += quantity
-                else:
-                    user_artifact = UserArtifact(
-                        user_id=user_id,
-                        artifact_id=int(artifact_id),
-                        quantity=quantity,
-                        obtained_at=datetime.now(timezone.utc),
-                        obtained_from="quest",
-                        obtained_from_id=quest.id,
-                        company_id=company_id,
-                    )
-                    self.db.add(user_artifact)
-
-        if "cosmetics" in rewards:
-            from app.models.cosmetic import UserCosmetic
-            for cosmetic_id in rewards["cosmetics"]:
-                user_cosmetic = UserCosmetic(
-                    user_id=user_id,
-                    cosmetic_id=int(cosmetic_id),
-                    is_equipped=False,
-                    obtained_at=datetime.now(timezone.utc),
-                    obtained_from="quest",
-                    obtained_from_id=quest.id,
-                    company_id=company_id,
-                )
-                self.db.add(user_cosmetic)
+        """Выдать награды за выполнение квеста в транзакции вызывающего кода."""
+        bundle = RewardBundle.from_rewards(
+            quest.rewards,
+            source="quest",
+            source_id=quest.id,
+            description=f"Награда за квест: {quest.name}",
+        )
+        RewardService(self.db).grant(user_id, bundle, company_id, commit=False)
@@ -0,0 +1,123 @@
+"""
+Индекс триггеров квестов.
+
+Сопоставляет события (точка геолокации, посещение геозоны, получение
+артефакта, разблокировка достижения) с квестами, прогресс которых от них
+зависит. Индекс строится по quest_type и requirements квестов и кэшируется
+на процесс для каждой компании, поэтому событие передаётся только
+подходящим квестам пользователя.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.event import Quest, QuestType
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class QuestEventKind(str, Enum):
+    """Тип события, влияющего на прогресс квестов."""
+
+    LOCATION_POINT = "location_point"
+    GEOZONE_VISIT = "geozone_visit"
+    ARTIFACT_OBTAINED = "artifact_obtained"
+    ACHIEVEMENT_UNLOCKED = "achievement_unlocked"
+
+
+# Тип квеста -> (событие, ключ requirements с ID объектов или None, если важны все события)
+QUEST_TYPE_TRIGGERS: Dict[QuestType, Tuple[QuestEventKind, Optional[str]]] = {
+    QuestType.VISIT_LOCATIONS: (QuestEventKind.GEOZONE_VISIT, "geozone_ids"),
+    QuestType.COLLECT_ARTIFACTS: (QuestEventKind.ARTIFACT_OBTAINED, "artifact_ids"),
+    QuestType.TRAVEL_DISTANCE: (QuestEventKind.LOCATION_POINT, None),
+    QuestType.COMPLETE_ACHIEVEMENTS: (QuestEventKind.ACHIEVEMENT_UNLOCKED, "achievement_ids"),
+}
+
+
+@dataclass
+class _EventTriggers:
+    """Квесты, зависящие от одного типа события."""
+
+    any_key: Set[int] = field(default_factory=set)  # Квесты без списка ID - реагируют на любой ключ
+    by_key: Dict[int, Set[int]] = field(default_factory=dict)
+
+
+class QuestTriggerIndex:
+    """Индекс: тип события и ключ -> ID квестов."""
+
+    def __init__(self) -> None:
+        """Инициализация пустого индекса."""
+        self._triggers: Dict[QuestEventKind, _EventTriggers] = {}
+
+    @classmethod
+    def build(cls, quests: Iterable[Tuple[int, QuestType, Optional[Dict[str, Any]]]]) -> "QuestTriggerIndex":
+        """Построить индекс по (id, quest_type, requirements) квестов."""
+        index = cls()
+        for quest_id, quest_type, requirements in quests:
+            trigger = QUEST_TYPE_TRIGGERS.get(quest_type)
+            if trigger is None:
+                continue
+            event_kind, requirement_key = trigger
+            triggers = index._triggers.setdefault(event_kind, _EventTriggers())
+
+            keys = (requirements or {}).get(requirement_key) if requirement_key else None
+            if not keys:
+                triggers.any_key.add(quest_id)
+                continue
+            for key in keys:
+                triggers.by_key.setdefault(int(key), set()).add(quest_id)
+        return index
+
+    def match(self, event_kind: QuestEventKind, keys: Optional[Iterable[int]] = None) -> Set[int]:
+        """Найти квесты, прогресс которых зависит от события."""
+        triggers = self._triggers.get(event_kind)
+        if triggers is None:
+            return set()
+
+        quest_ids = set(triggers.any_key)
+        for key in keys or ():
+            quest_ids |= triggers.by_key.get(int(key), set())
+        return quest_ids
+
+
+_cache_lock = threading.Lock()
+# company_id -> (момент построения, индекс)
+_index_cache: Dict[Optional[int], Tuple[float, QuestTriggerIndex]] = {}
+
+
+def get_quest_trigger_index(db: Session, company_id: Optional[int] = None) -> QuestTriggerIndex:
+    """
+    Получить индекс триггеров квестов компании.
+
+    Индекс кэшируется на quest_trigger_cache_ttl_seconds; в текущем процессе
+    кэш сбрасывается при создании квеста.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _index_cache.get(company_id)
+    if cached is not None and now - cached[0] < settings.quest_trigger_cache_ttl_seconds:
+        return cached[1]
+
+    query = db.query(Quest.id, Quest.quest_type, Quest.requirements).filter(Quest.deleted_at.is_(None))
+    if company_id is not None:
+        query = query.filter(Quest.company_id == company_id)
+    index = QuestTriggerIndex.build(query.all())
+
+    with _cache_lock:
+        _index_cache[company_id] = (now, index)
+    return index
+
+
+def invalidate_quest_trigger_index(company_id: Optional[int] = None) -> None:
+    """Сбросить кэш индекса компании (и индекс без фильтра по компании)."""
+    with _cache_lock:
+        _index_cache.pop(company_id, None)
+        _index_cache.pop(None, None)
+
@@ -0,0 +1,195 @@
+"""
+Рецепты крафта.
+
+Граф требований крафта артефактов и косметики компании собирается в книгу
+рецептов двумя запросами и кэшируется на процесс. Рецепт хранит требования
+как кортежи (ID предмета, количество) с суммированными дублями, поэтому
+списание выполняется одним UPDATE по всем артефактам рецепта, а проверка
+«что можно скрафтить сейчас» - один проход по рецептам против вектора
+инвентаря пользователя.
+
+Требуемые артефакты списываются при крафте, требуемая косметика только
+проверяется (должна быть у пользователя).
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import and_, null
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.artifact import Artifact, ArtifactCraftingRequirement
+from app.models.cosmetic import Cosmetic, CosmeticCraftingRequirement
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# (ID результата, название, ID требуемого артефакта, ID требуемой косметики, количество);
+# ID требований None - у результата нет требований
+RecipeRow = Tuple[int, str, Optional[int], Optional[int], Optional[int]]
+
+
+@dataclass(frozen=True)
+class Recipe:
+    """Рецепт крафта предмета."""
+
+    result_type: str  # artifact или cosmetic
+    result_id: int
+    name: str
+    artifacts: Tuple[Tuple[int, int], ...]  # (artifact_id, количество) по возрастанию ID
+    cosmetics: Tuple[Tuple[int, int], ...]  # (cosmetic_id, количество) по возрастанию ID
+
+    def max_crafts(self, artifacts: Mapping[int, int], cosmetics: Mapping[int, int]) -> Optional[int]:
+        """
+        Сколько раз рецепт можно выполнить с данным инвентарём.
+
+        Returns:
+            Число крафтов или None, если рецепт не расходует артефакты
+            (ограничений нет)
+        """
+        for cosmetic_id, quantity in self.cosmetics:
+            if cosmetics.get(cosmetic_id, 0) < quantity:
+                return 0
+        if not self.artifacts:
+            return None
+        return min(artifacts.get(artifact_id, 0) // quantity for artifact_id, quantity in self.artifacts)
+
+
+@dataclass(frozen=True)
+class RecipeBook:
+    """Рецепты компании."""
+
+    artifacts: Dict[int, Recipe]  # artifact_id результата -> рецепт
+    cosmetics: Dict[int, Recipe]  # cosmetic_id результата -> рецепт
+    required_artifact_ids: FrozenSet[int]
+    required_cosmetic_ids: FrozenSet[int]
+
+    @classmethod
+    def build(cls, artifact_rows: Iterable[RecipeRow], cosmetic_rows: Iterable[RecipeRow]) -> "RecipeBook":
+        """Построить книгу по строкам требований."""
+        artifacts = _build_recipes("artifact", artifact_rows)
+        cosmetics = _build_recipes("cosmetic", cosmetic_rows)
+        recipes = list(artifacts.values()) + list(cosmetics.values())
+        return cls(
+            artifacts=artifacts,
+            cosmetics=cosmetics,
+            required_artifact_ids=frozenset(item_id for recipe in recipes for item_id, _ in recipe.artifacts),
+            required_cosmetic_ids=frozenset(item_id for recipe in recipes for item_id, _ in recipe.cosmetics),
+        )
+
+    def craftable(
+        self, artifacts: Mapping[int, int], cosmetics: Mapping[int, int]
+    ) -> List[Tuple[Recipe, Optional[int]]]:
+        """Рецепты, выполнимые с данным инвентарём, и сколько раз (None - без ограничений)."""
+        result = []
+        for recipe in list(self.artifacts.values()) + list(self.cosmetics.values()):
+            max_crafts = recipe.max_crafts(artifacts, cosmetics)
+            if max_crafts is None or max_crafts > 0:
+                result.append((recipe, max_crafts))
+        return result
+
+
+def _build_recipes(result_type: str, rows: Iterable[RecipeRow]) -> Dict[int, Recipe]:
+    """Сгруппировать строки требований по результату."""
+    names: Dict[int, str] = {}
+    artifacts: Dict[int, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    cosmetics: Dict[int, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    for result_id, name, required_artifact_id, required_cosmetic_id, quantity in rows:
+        names[result_id] = name
+        if required_artifact_id is not None:
+            artifacts[result_id][required_artifact_id] += quantity or 1
+        if required_cosmetic_id is not None:
+            cosmetics[result_id][required_cosmetic_id] += quantity or 1
+
+    return {
+        result_id: Recipe(
+            result_type=result_type,
+            result_id=result_id,
+            name=name,
+            artifacts=tuple(sorted(artifacts[result_id].items())),
+            cosmetics=tuple(sorted(cosmetics[result_id].items())),
+        )
+        for result_id, name in names.items()
+    }
+
+
+def _load_recipe_book(db: Session, company_id: Optional[int]) -> RecipeBook:
+    """Загрузить рецепты компании из БД."""
+    artifact_join = ArtifactCraftingRequirement.artifact_id == Artifact.id
+    if company_id is not None:
+        artifact_join = and_(artifact_join, ArtifactCraftingRequirement.company_id == company_id)
+    artifact_rows = (
+        db.query(
+            Artifact.id,
+            Artifact.name,
+            ArtifactCraftingRequirement.required_artifact_id,
+            null(),
+            ArtifactCraftingRequirement.required_quantity,
+        )
+        .outerjoin(ArtifactCraftingRequirement, artifact_join)
+        .filter(
+            Artifact.is_craftable.is_(True),
+            Artifact.is_active.is_(True),
+            Artifact.deleted_at.is_(None),
+        )
+    )
+    if company_id is not None:
+        artifact_rows = artifact_rows.filter(Artifact.company_id == company_id)
+
+    cosmetic_join = CosmeticCraftingRequirement.cosmetic_id == Cosmetic.id
+    if company_id is not None:
+        cosmetic_join = and_(cosmetic_join, CosmeticCraftingRequirement.company_id == company_id)
+    cosmetic_rows = (
+        db.query(
+            Cosmetic.id,
+            Cosmetic.name,
+            CosmeticCraftingRequirement.required_artifact_id,
+            CosmeticCraftingRequirement.required_cosmetic_id,
+            CosmeticCraftingRequirement.required_quantity,
+        )
+        .outerjoin(CosmeticCraftingRequirement, cosmetic_join)
+        .filter(
+            Cosmetic.is_craftable.is_(True),
+            Cosmetic.is_active.is_(True),
+            Cosmetic.deleted_at.is_(None),
+        )
+    )
+    if company_id is not None:
+        cosmetic_rows = cosmetic_rows.filter(Cosmetic.company_id == company_id)
+
+    return RecipeBook.build(artifact_rows.all(), cosmetic_rows.all())
+
+
+_cache_lock = threading.Lock()
+# company_id -> (момент построения, книга рецептов)
+_recipe_cache: Dict[Optional[int], Tuple[float, RecipeBook]] = {}
+
+
+def get_recipe_book(db: Session, company_id: Optional[int] = None) -> RecipeBook:
+    """
+    Получить рецепты компании.
+
+    Книга кэшируется на crafting_recipe_cache_ttl_seconds; в текущем процессе
+    кэш сбрасывается при создании артефакта или косметики.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _recipe_cache.get(company_id)
+    if cached is not None and now - cached[0] < settings.crafting_recipe_cache_ttl_seconds:
+        return cached[1]
+
+    book = _load_recipe_book(db, company_id)
+    with _cache_lock:
+        _recipe_cache[company_id] = (now, book)
+    return book
+
+
+def invalidate_recipes(company_id: Optional[int] = None) -> None:
+    """Сбросить рецепты компании (и рецепты без фильтра по компании)."""
+    with _cache_lock:
+        _recipe_cache.pop(company_id, None)
+        _recipe_cache.pop(None, None)
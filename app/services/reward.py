@@ -0,0 +1,225 @@
+"""
+Сервис выдачи наград.
+
+Набор наград (монеты, гемы, XP, артефакты, косметика) выдаётся одной
+транзакцией одному пользователю (grant) или сразу многим (grant_many):
+начисления валюты дописываются в журнал одним INSERT без блокировки строки
+баланса, артефакты - одним многострочным upsert, косметика - одним
+многострочным INSERT.
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.cosmetic import UserCosmetic
+from app.models.leaderboard import LeaderboardMetric
+from app.services.guild_scoring import GuildScoringService, ScoreDelta
+from app.services.inventory import InventoryService
+from app.services.ledger import LedgerEntry, LedgerService
+from app.services.player_leaderboard import PlayerLeaderboardService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RewardBundle:
+    """Набор наград за одно действие."""
+
+    coins: int = 0
+    gems: int = 0
+    xp: int = 0  # XP начисляется как coins с типом записи xp
+    artifacts: Dict[int, int] = field(default_factory=dict)  # artifact_id -> количество
+    cosmetics: List[int] = field(default_factory=list)
+    source: str = "reward"  # Тип транзакции и obtained_from предметов
+    source_id: Optional[int] = None
+    description: Optional[str] = None
+
+    @classmethod
+    def from_rewards(
+        cls,
+        rewards: Optional[Dict[str, Any]],
+        source: str,
+        source_id: Optional[int] = None,
+        description: Optional[str] = None,
+    ) -> "RewardBundle":
+        """Собрать набор из JSON наград (формат Quest.rewards)."""
+        rewards = rewards or {}
+        return cls(
+            coins=int(rewards.get("coins", 0)),
+            gems=int(rewards.get("gems", 0)),
+            xp=int(rewards.get("xp", 0)),
+            artifacts={int(artifact_id): int(quantity) for artifact_id, quantity in (rewards.get("artifacts") or {}).items()},
+            cosmetics=[int(cosmetic_id) for cosmetic_id in rewards.get("cosmetics") or []],
+            source=source,
+            source_id=source_id,
+            description=description,
+        )
+
+    def is_empty(self) -> bool:
+        """Набор не содержит наград."""
+        return not (self.coins or self.gems or self.xp or self.artifacts or self.cosmetics)
+
+    def currency_entries(self) -> List[Tuple[str, int, str]]:
+        """Ненулевые начисления валюты: (тип записи журнала, сумма, валюта)."""
+        entries = [
+            (self.source, self.coins, "coins"),
+            (self.source, self.gems, "gems"),
+            ("xp", self.xp, "coins"),
+        ]
+        return [entry for entry in entries if entry[1]]
+
+
+@dataclass
+class GrantedRewards:
+    """Результат выдачи наград."""
+
+    ledger_entry_ids: List[int] = field(default_factory=list)  # ID записей журнала валюты
+    artifacts: Dict[int, int] = field(default_factory=dict)  # artifact_id -> количество после выдачи
+    cosmetic_ids: List[int] = field(default_factory=list)  # ID созданных записей UserCosmetic
+
+
+class RewardService:
+    """Сервис для выдачи наград."""
+
+    def __init__(self, db: Session):
+        """Инициализация сервиса."""
+        self.db = db
+
+    def grant(
+        self,
+        user_id: int,
+        bundle: RewardBundle,
+        company_id: Optional[int] = None,
+        commit: bool = True,
+    ) -> GrantedRewards:
+        """
+        Выдать набор наград пользователю атомарно.
+
+        Args:
+            user_id: ID пользователя
+            bundle: Набор наград
+            company_id: ID компании
+            commit: Зафиксировать транзакцию; False - награда входит в транзакцию вызывающего кода
+
+        Returns:
+            Новые балансы и количества предметов
+        """
+        return self.grant_many([user_id], bundle, company_id, commit).get(user_id, GrantedRewards())
+
+    def grant_many(
+        self,
+        user_ids: Sequence[int],
+        bundle: RewardBundle,
+        company_id: Optional[int] = None,
+        commit: bool = True,
+    ) -> Dict[int, GrantedRewards]:
+        """
+        Выдать один набор наград нескольким пользователям атомарно.
+
+        Каждый вид награды записывается одним запросом на всех пользователей.
+
+        Args:
+            user_ids: ID пользователей без повторов
+            bundle: Набор наград
+            company_id: ID компании
+            commit: Зафиксировать транзакцию; False - награда входит в транзакцию вызывающего кода
+
+        Returns:
+            user_id -> новые балансы и количества предметов
+        """
+        results = {user_id: GrantedRewards() for user_id in user_ids}
+        if not user_ids or bundle.is_empty():
+            return results
+
+        now = datetime.now(timezone.utc)
+        try:
+            self._grant_currency(user_ids, bundle, company_id, now, results)
+            self._grant_artifacts(user_ids, bundle, company_id, now, results)
+            self._grant_cosmetics(user_ids, bundle, company_id, now, results)
+            if bundle.xp:
+                GuildScoringService(self.db).record(
+                    {user_id: ScoreDelta(xp=bundle.xp) for user_id in user_ids}, company_id
+                )
+                PlayerLeaderboardService(self.db).record(
+                    LeaderboardMetric.XP, {user_id: bundle.xp for user_id in user_ids}, company_id
+                )
+            if commit:
+                self.db.commit()
+        except Exception:
+            if commit:
+                self.db.rollback()
+            raise
+
+        logger.info(
+            f"Выданы награды пользователям {list(user_ids)} ({bundle.source} {bundle.source_id}): "
+            f"coins={bundle.coins}, gems={bundle.gems}, xp={bundle.xp}, "
+            f"artifacts={bundle.artifacts}, cosmetics={bundle.cosmetics}"
+        )
+        return results
+
+    def _grant_currency(
+        self,
+        user_ids: Sequence[int],
+        bundle: RewardBundle,
+        company_id: Optional[int],
+        now: datetime,
+        results: Dict[int, GrantedRewards],
+    ) -> None:
+        """Записать начисления валюты в журнал одним INSERT."""
+        entries = [
+            LedgerEntry(user_id, amount, currency_type, transaction_type, bundle.description, bundle.source_id)
+            for user_id in user_ids
+            for transaction_type, amount, currency_type in bundle.currency_entries()
+        ]
+        for user_id, entry_id in LedgerService(self.db).post(entries, company_id):
+            results[user_id].ledger_entry_ids.append(entry_id)
+
+    def _grant_artifacts(
+        self,
+        user_ids: Sequence[int],
+        bundle: RewardBundle,
+        company_id: Optional[int],
+        now: datetime,
+        results: Dict[int, GrantedRewards],
+    ) -> None:
+        """Начислить артефакты одним многострочным upsert."""
+        quantities = InventoryService(self.db).add_artifacts(
+            user_ids, bundle.artifacts, bundle.source, bundle.source_id, company_id
+        )
+        for (user_id, artifact_id), quantity in quantities.items():
+            results[user_id].artifacts[artifact_id] = quantity
+
+    def _grant_cosmetics(
+        self,
+        user_ids: Sequence[int],
+        bundle: RewardBundle,
+        company_id: Optional[int],
+        now: datetime,
+        results: Dict[int, GrantedRewards],
+    ) -> None:
+        """Выдать косметику одним многострочным INSERT."""
+        if not bundle.cosmetics:
+            return
+
+        cosmetics = UserCosmetic.__table__
+        statement = pg_insert(cosmetics).values([
+            {
+                "user_id": user_id,
+                "cosmetic_id": cosmetic_id,
+                "is_equipped": False,
+                "obtained_at": now,
+                "obtained_from": bundle.source,
+                "obtained_from_id": bundle.source_id,
+                "company_id": company_id,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for user_id in user_ids
+            for cosmetic_id in bundle.cosmetics
+        ]).returning(cosmetics.c.user_id, cosmetics.c.id)
+        for user_id, user_cosmetic_id in self.db.execute(statement):
+            results[user_id].cosmetic_ids.append(user_cosmetic_id)
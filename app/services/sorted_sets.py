@@ -0,0 +1,338 @@
+"""
+Упорядоченные множества для рейтингов.
+
+Рейтинг - множество (участник, очки), упорядоченное по убыванию очков.
+Хранилище поддерживает обновление очков участника и чтение места, топа и
+окрестности участника за O(log n):
+
+- RedisSortedSets - общие для всех процессов ZSET в Redis
+  (leaderboard_redis_enabled);
+- InMemorySortedSets - индексируемый skip list в памяти процесса. Рейтинг
+  каждого процесса перечитывается из БД через leaderboard_memory_ttl_seconds,
+  это ограничивает расхождение между процессами.
+
+Множество, которого нет в хранилище (не загружено или устарело), вызывающий
+код заполняет целиком через replace; точечные обновления применяются только
+к загруженным множествам, чтобы частично заполненный рейтинг не выглядел
+полным. При равенстве очков порядок участников зависит от хранилища.
+
+Изменения очков в транзакции БД откладываются через queue_update и
+записываются в хранилище только после коммита.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.redis_client import get_redis
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_MAX_LEVEL = 32
+
+# Ключ Session.info с обновлениями множеств, ожидающими коммита
+PENDING_UPDATES_KEY = "sorted_set_updates"
+
+
+class _Node:
+    """Узел skip list."""
+
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: Any, level: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * level
+        # Сколько узлов нижнего уровня до следующего узла на этом уровне
+        self.width: List[int] = [1] * level
+
+
+class IndexableSkipList:
+    """
+    Skip list с ширинами ссылок: вставка, удаление, позиция ключа и доступ
+    по позиции за O(log n) в среднем. Ключи уникальны и сравнимы.
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        """Инициализация пустого списка."""
+        self.head = _Node(None, _MAX_LEVEL)
+        self.size = 0
+        self._random = (rng or random.Random()).random
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _random_level(self) -> int:
+        """Высота нового узла (геометрическое распределение с p = 1/2)."""
+        level = 1
+        while level < _MAX_LEVEL and self._random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key: Any) -> None:
+        """Вставить ключ."""
+        chain: List[_Node] = [self.head] * _MAX_LEVEL
+        steps_at_level = [0] * _MAX_LEVEL
+        node = self.head
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key <= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        new_level = self._random_level()
+        new_node = _Node(key, new_level)
+        steps = 0
+        for level in range(new_level):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(new_level, _MAX_LEVEL):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key: Any) -> None:
+        """Удалить ключ."""
+        chain: List[_Node] = [self.head] * _MAX_LEVEL
+        node = self.head
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), _MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def index(self, key: Any) -> int:
+        """Число ключей меньше key (позиция key, если он есть в списке)."""
+        position = 0
+        node = self.head
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def slice(self, start: int, count: int) -> List[Any]:
+        """count ключей начиная с позиции start."""
+        if start < 0 or start >= self.size or count <= 0:
+            return []
+        # Найти узел на позиции start (позиции узлов от 1, у головы - 0)
+        remaining = start + 1
+        node = self.head
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class _MemorySortedSet:
+    """Одно множество: очки участников и skip list по (-очки, участник)."""
+
+    def __init__(self, items: Mapping[str, float]):
+        self.scores: Dict[str, float] = {}
+        self.order = IndexableSkipList()
+        for member, score in items.items():
+            self.add(member, score)
+
+    def add(self, member: str, score: float) -> None:
+        previous = self.scores.get(member)
+        if previous is not None:
+            self.order.remove((-previous, member))
+        self.scores[member] = score
+        self.order.insert((-score, member))
+
+    def remove(self, member: str) -> None:
+        previous = self.scores.pop(member, None)
+        if previous is not None:
+            self.order.remove((-previous, member))
+
+
+class InMemorySortedSets:
+    """Упорядоченные множества в памяти процесса."""
+
+    shared = False
+
+    def __init__(self, ttl_seconds: float):
+        """Инициализация хранилища."""
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # ключ -> (момент загрузки, множество)
+        self._sets: Dict[str, Tuple[float, _MemorySortedSet]] = {}
+
+    def _get(self, key: str) -> Optional[_MemorySortedSet]:
+        """Множество, если оно загружено и не устарело (вызывать под блокировкой)."""
+        loaded = self._sets.get(key)
+        if loaded is None:
+            return None
+        if time.monotonic() - loaded[0] >= self.ttl_seconds:
+            del self._sets[key]
+            return None
+        return loaded[1]
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            return self._get(key) is not None
+
+    def replace(self, key: str, items: Mapping[str, float]) -> None:
+        sorted_set = _MemorySortedSet(items)
+        with self._lock:
+            self._sets[key] = (time.monotonic(), sorted_set)
+
+    def add(self, key: str, member: str, score: float) -> None:
+        with self._lock:
+            sorted_set = self._get(key)
+            if sorted_set is not None:
+                sorted_set.add(member, score)
+
+    def remove(self, key: str, member: str) -> None:
+        with self._lock:
+            sorted_set = self._get(key)
+            if sorted_set is not None:
+                sorted_set.remove(member)
+
+    def rev_rank(self, key: str, member: str) -> Optional[int]:
+        with self._lock:
+            sorted_set = self._get(key)
+            if sorted_set is None or member not in sorted_set.scores:
+                return None
+            return sorted_set.order.index((-sorted_set.scores[member], member))
+
+    def score(self, key: str, member: str) -> Optional[float]:
+        with self._lock:
+            sorted_set = self._get(key)
+            return sorted_set.scores.get(member) if sorted_set is not None else None
+
+    def count_above(self, key: str, score: float) -> int:
+        with self._lock:
+            sorted_set = self._get(key)
+            if sorted_set is None:
+                return 0
+            # "" меньше любого участника: позиция - число очков строго больше score
+            return sorted_set.order.index((-score, ""))
+
+    def rev_range(self, key: str, start: int, count: int) -> List[Tuple[str, float]]:
+        with self._lock:
+            sorted_set = self._get(key)
+            if sorted_set is None:
+                return []
+            return [(member, -negative_score) for negative_score, member in sorted_set.order.slice(start, count)]
+
+    def card(self, key: str) -> int:
+        with self._lock:
+            sorted_set = self._get(key)
+            return len(sorted_set.scores) if sorted_set is not None else 0
+
+
+class RedisSortedSets:
+    """Упорядоченные множества в Redis (ZSET)."""
+
+    shared = True
+
+    def __init__(self, client: Any):
+        """Инициализация хранилища."""
+        self.redis = client
+
+    def exists(self, key: str) -> bool:
+        return bool(self.redis.exists(key))
+
+    def replace(self, key: str, items: Mapping[str, float]) -> None:
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.delete(key)
+        if items:
+            pipeline.zadd(key, dict(items))
+        pipeline.execute()
+
+    def add(self, key: str, member: str, score: float) -> None:
+        # Только в существующее множество: иначе рейтинг выглядел бы полным
+        if self.redis.exists(key):
+            self.redis.zadd(key, {member: score})
+
+    def remove(self, key: str, member: str) -> None:
+        self.redis.zrem(key, member)
+
+    def rev_rank(self, key: str, member: str) -> Optional[int]:
+        return self.redis.zrevrank(key, member)
+
+    def score(self, key: str, member: str) -> Optional[float]:
+        return self.redis.zscore(key, member)
+
+    def count_above(self, key: str, score: float) -> int:
+        return self.redis.zcount(key, f"({score}", "+inf")
+
+    def rev_range(self, key: str, start: int, count: int) -> List[Tuple[str, float]]:
+        if count <= 0:
+            return []
+        return [
+            (member.decode() if isinstance(member, bytes) else member, score)
+            for member, score in self.redis.zrevrange(key, start, start + count - 1, withscores=True)
+        ]
+
+    def card(self, key: str) -> int:
+        return self.redis.zcard(key)
+
+
+_store: Any = None
+_store_lock = threading.Lock()
+
+
+def get_sorted_sets() -> Any:
+    """Хранилище рейтингов процесса: Redis, если включён и доступен, иначе память."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            client = get_redis() if settings.leaderboard_redis_enabled else None
+            if client is not None:
+                _store = RedisSortedSets(client)
+            else:
+                _store = InMemorySortedSets(settings.leaderboard_memory_ttl_seconds)
+        return _store
+
+
+def queue_update(session: Session, key: str, member: str, score: float) -> None:
+    """Отложить запись очков участника в множество до коммита сессии."""
+    session.info.setdefault(PENDING_UPDATES_KEY, []).append((key, member, score))
+
+
+def _apply_pending_updates(session: Session) -> None:
+    """Записать очки зафиксированной транзакции в множества."""
+    updates: List[Tuple[str, str, float]] = session.info.pop(PENDING_UPDATES_KEY, None)
+    if not updates:
+        return
+    store = get_sorted_sets()
+    try:
+        for key, member, score in updates:
+            store.add(key, member, score)
+    except Exception as e:
+        # Рейтинги поправят периодические пересчёты
+        logger.warning(f"Не удалось обновить рейтинги: {e}")
+
+
+def _discard_pending_updates(session: Session) -> None:
+    """Отбросить обновления множеств откаченной транзакции."""
+    session.info.pop(PENDING_UPDATES_KEY, None)
+
+
+event.listen(Session, "after_commit", _apply_pending_updates)
+event.listen(Session, "after_rollback", _discard_pending_updates)
@@ -0,0 +1,256 @@
+"""
+Выделение точек остановки (stay points) и их кластеризация.
+
+Точка остановки - отрезок трека, на котором пользователь оставался в пределах
+радиуса не меньше заданного времени. Отрезки находятся за один проход по
+точкам, упорядоченным по времени. Затем точки остановки кластеризуются DBSCAN
+с гаверсинусным расстоянием; соседи ищутся через хэш-сетку, поэтому сравниваются
+только точки из соседних ячеек.
+
+Для инкрементальной обработки последнее (возможно, незавершённое) окно трека
+откладывается до следующего запуска, а время пребывания раскладывается по
+часам недели для накопления профиля места.
+"""
+import math
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_METERS = 6371008.8
+
+# Метка шума DBSCAN
+NOISE = -1
+
+HOURS_PER_WEEK = 7 * 24
+
+
+@dataclass
+class StayPoint:
+    """Отрезок трека, на котором пользователь оставался на месте."""
+
+    latitude: float
+    longitude: float
+    arrived_at: datetime
+    departed_at: datetime
+    point_count: int
+
+    @property
+    def duration_minutes(self) -> float:
+        """Длительность пребывания в минутах."""
+        return (self.departed_at - self.arrived_at).total_seconds() / 60
+
+
+def haversine_meters(
+    latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray
+) -> np.ndarray:
+    """Расстояния от точки до массива точек по большому кругу в метрах."""
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(latitudes)
+    dlat = lat2 - lat1
+    dlon = np.radians(longitudes) - math.radians(longitude)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _haversine_scalar(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между двумя точками в метрах."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def _stay_windows(
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    radius_meters: float,
+) -> Iterator[Tuple[int, int]]:
+    """
+    Разбить трек на окна [начало, конец).
+
+    Окно начинается с опорной точки и расширяется, пока точки остаются в
+    радиусе от неё. Следующее окно начинается с первой точки за радиусом,
+    поэтому каждая точка просматривается один раз.
+    """
+    count = len(latitudes)
+    anchor = 0
+    while anchor < count:
+        anchor_lat = latitudes[anchor]
+        anchor_lon = longitudes[anchor]
+        end = anchor + 1
+        while end < count and _haversine_scalar(anchor_lat, anchor_lon, latitudes[end], longitudes[end]) <= radius_meters:
+            end += 1
+        yield anchor, end
+        anchor = end
+
+
+def _make_stay_point(
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    timestamps: Sequence[datetime],
+    start: int,
+    end: int,
+) -> StayPoint:
+    """Собрать точку остановки из окна трека."""
+    return StayPoint(
+        latitude=float(np.mean(latitudes[start:end])),
+        longitude=float(np.mean(longitudes[start:end])),
+        arrived_at=timestamps[start],
+        departed_at=timestamps[end - 1],
+        point_count=end - start,
+    )
+
+
+def detect_stay_points(
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    timestamps: Sequence[datetime],
+    radius_meters: float,
+    min_duration_minutes: float,
+) -> List[StayPoint]:
+    """
+    Найти точки остановки в треке.
+
+    Точки должны быть упорядочены по времени. Окно трека становится точкой
+    остановки, если время от первой до последней его точки не меньше
+    min_duration_minutes; переезд к следующей точке в пребывание не входит.
+    """
+    stay_points, tail_start = detect_closed_stay_points(
+        latitudes, longitudes, timestamps, radius_meters, min_duration_minutes
+    )
+    if tail_start is not None:
+        tail = _make_stay_point(latitudes, longitudes, timestamps, tail_start, len(timestamps))
+        if tail.duration_minutes >= min_duration_minutes:
+            stay_points.append(tail)
+    return stay_points
+
+
+def detect_closed_stay_points(
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    timestamps: Sequence[datetime],
+    radius_meters: float,
+    min_duration_minutes: float,
+) -> Tuple[List[StayPoint], Optional[int]]:
+    """
+    Найти завершённые точки остановки для инкрементальной обработки.
+
+    Последнее окно трека может продолжиться следующими точками, поэтому оно
+    не возвращается; вместо него возвращается индекс его первой точки, с
+    которой нужно продолжить обработку.
+
+    Returns:
+        (завершённые точки остановки, начало последнего окна или None для пустого трека)
+    """
+    stay_points: List[StayPoint] = []
+    min_duration_seconds = min_duration_minutes * 60
+    tail_start: Optional[int] = None
+
+    for start, end in _stay_windows(latitudes, longitudes, radius_meters):
+        if end == len(timestamps):
+            tail_start = start
+            break
+        if (timestamps[end - 1] - timestamps[start]).total_seconds() >= min_duration_seconds:
+            stay_points.append(_make_stay_point(latitudes, longitudes, timestamps, start, end))
+
+    return stay_points, tail_start
+
+
+def hour_of_week_minutes(arrived_at: datetime, departed_at: datetime) -> np.ndarray:
+    """
+    Распределить время пребывания по часам недели.
+
+    Returns:
+        Массив из HOURS_PER_WEEK минут; индекс - weekday * 24 + hour (понедельник = 0)
+    """
+    histogram = np.zeros(HOURS_PER_WEEK)
+    moment = arrived_at
+    while moment < departed_at:
+        hour_start = moment.replace(minute=0, second=0, microsecond=0)
+        next_hour = min(hour_start + timedelta(hours=1), departed_at)
+        histogram[moment.weekday() * 24 + moment.hour] += (next_hour - moment).total_seconds() / 60
+        moment = next_hour
+    return histogram
+
+
+def _grid_cells(
+    latitudes: np.ndarray, longitudes: np.ndarray, eps_meters: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Номера ячеек сетки для точек.
+
+    Шаг по долготе берётся для самой высокой широты в наборе, поэтому соседи
+    в радиусе eps всегда находятся в соседних ячейках.
+    """
+    lat_step = math.degrees(eps_meters / EARTH_RADIUS_METERS)
+    max_abs_lat = min(float(np.max(np.abs(latitudes))) + lat_step, 89.0)
+    lon_step = lat_step / math.cos(math.radians(max_abs_lat))
+    return (
+        np.floor(latitudes / lat_step).astype(np.int64),
+        np.floor(longitudes / lon_step).astype(np.int64),
+    )
+
+
+def dbscan_haversine(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    eps_meters: float,
+    min_samples: int,
+) -> np.ndarray:
+    """
+    DBSCAN с гаверсинусным расстоянием.
+
+    Returns:
+        Метки кластеров для каждой точки (NOISE для шума)
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    count = len(latitudes)
+    labels = np.full(count, NOISE, dtype=np.int64)
+    if count == 0:
+        return labels
+
+    cell_y, cell_x = _grid_cells(latitudes, longitudes, eps_meters)
+    cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for index, key in enumerate(zip(cell_y.tolist(), cell_x.tolist())):
+        cells[key].append(index)
+    cell_members = {key: np.array(members) for key, members in cells.items()}
+
+    neighbors: List[np.ndarray] = []
+    for index in range(count):
+        y, x = int(cell_y[index]), int(cell_x[index])
+        candidates = [
+            cell_members[(y + dy, x + dx)]
+            for dy in (-1, 0, 1)
+            for dx in (-1, 0, 1)
+            if (y + dy, x + dx) in cell_members
+        ]
+        candidates = np.concatenate(candidates)
+        distances = haversine_meters(latitudes[index], longitudes[index], latitudes[candidates], longitudes[candidates])
+        neighbors.append(candidates[distances <= eps_meters])
+
+    is_core = np.array([len(n) >= min_samples for n in neighbors], dtype=bool)
+
+    cluster_id = 0
+    for index in range(count):
+        if labels[index] != NOISE or not is_core[index]:
+            continue
+        labels[index] = cluster_id
+        queue = deque([index])
+        while queue:
+            current = queue.popleft()
+            if not is_core[current]:
+                continue
+            for neighbor in neighbors[current]:
+                if labels[neighbor] == NOISE:
+                    labels[neighbor] = cluster_id
+                    queue.append(neighbor)
+        cluster_id += 1
+
+    return labels
@@ -0,0 +1,132 @@
+"""
+Бенчмарк пагинации истории геолокации: OFFSET против курсора.
+
+Для каждой глубины истории измеряется время получения страницы через
+GeolocationService.get_user_location_points в режиме offset и в режиме
+курсора (курсор на нужной глубине получается заранее и в замер не входит).
+С курсором время страницы должно оставаться постоянным, с OFFSET - расти
+линейно с глубиной.
+
+Запуск (нужна PostgreSQL с применёнными миграциями):
+    python -m benchmarks.keyset_pagination --user-id 1
+    python -m benchmarks.keyset_pagination --seed 1000000 --depths 0 1000 10000 100000 900000
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.pagination import encode_cursor
+from app.models.location import LocationPoint
+from app.models.user import User
+from app.services.geolocation import GeolocationService
+
+
+def _seed_points(db: Session, count: int) -> int:
+    """Создать пользователя с одной сессией и count точками; вернуть ID пользователя."""
+    user_id = db.execute(
+        text("""
+            INSERT INTO users (email, username, hashed_password, is_active, is_verified, created_at, updated_at)
+            VALUES ('keyset-bench-' || md5(random()::text) || '@example.com', 'keyset-bench-' || md5(random()::text),
+                    '-', true, false, now(), now())
+            RETURNING id
+        """)
+    ).scalar_one()
+    session_id = db.execute(
+        text("""
+            INSERT INTO location_sessions (user_id, session_started_at, is_background, is_offline, created_at, updated_at)
+            VALUES (:user_id, now(), false, false, now(), now())
+            RETURNING id
+        """),
+        {"user_id": user_id},
+    ).scalar_one()
+    db.execute(
+        text("""
+            INSERT INTO location_points (session_id, user_id, latitude, longitude, point, timestamp, is_spoofed, created_at)
+            SELECT :session_id, :user_id, 55.75, 37.61, ST_SetSRID(ST_MakePoint(37.61, 55.75), 4326),
+                   now() - make_interval(secs => n), false, now()
+            FROM generate_series(1, :count) AS n
+        """),
+        {"session_id": session_id, "user_id": user_id, "count": count},
+    )
+    db.execute(text("ANALYZE location_points"))
+    return user_id
+
+
+def _measure(fetch: Callable[[], List], repeats: int) -> float:
+    """Медианное время вызова в миллисекундах."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fetch()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run_benchmark(
+    db: Session,
+    user_id: int,
+    depths: List[int],
+    page_size: int = 100,
+    repeats: int = 5,
+) -> List[Dict[str, float]]:
+    """Измерить время страницы на каждой глубине в режимах offset и курсора."""
+    service = GeolocationService(db)
+    results = []
+    for depth in depths:
+        cursor: Optional[str] = None
+        if depth:
+            boundary = (
+                db.query(LocationPoint.timestamp, LocationPoint.id)
+                .filter(LocationPoint.user_id == user_id)
+                .order_by(LocationPoint.timestamp.desc(), LocationPoint.id.desc())
+                .offset(depth - 1)
+                .first()
+            )
+            if boundary is None:
+                break
+            cursor = encode_cursor(boundary.timestamp, boundary.id)
+
+        offset_ms = _measure(
+            lambda: service.get_user_location_points(user_id, limit=page_size, offset=depth), repeats
+        )
+        cursor_ms = _measure(
+            lambda: service.get_user_location_points(user_id, limit=page_size, cursor=cursor), repeats
+        )
+        results.append({"depth": depth, "offset_ms": offset_ms, "cursor_ms": cursor_ms})
+        print(f"глубина {depth:>10}: offset {offset_ms:9.2f} мс, курсор {cursor_ms:7.2f} мс")
+    return results
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Бенчмарк keyset-пагинации истории геолокации")
+    parser.add_argument("--user-id", type=int, default=None, help="Пользователь с длинной историей")
+    parser.add_argument("--seed", type=int, default=None, help="Создать временного пользователя с N точками")
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10000, 100000])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.user_id is None and args.seed is None:
+        parser.error("Нужно указать --user-id или --seed")
+
+    db = SessionLocal()
+    try:
+        user_id = _seed_points(db, args.seed) if args.seed else args.user_id
+        if db.query(User.id).filter(User.id == user_id).first() is None:
+            parser.error(f"Пользователь {user_id} не найден")
+        run_benchmark(db, user_id, args.depths, args.page_size, args.repeats)
+    finally:
+        # Сгенерированные данные не сохраняются
+        db.rollback()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
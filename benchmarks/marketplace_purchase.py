@@ -0,0 +1,233 @@
+"""
+Нагрузочный тест покупок на торговой площадке.
+
+Создаются продавец с запасом артефакта, набор объявлений и покупатели с
+монетами. Потоки (у каждого своя сессия) параллельно покупают случайные
+объявления из общего пула, пока все объявления не будут проданы. Тест
+измеряет число покупок в секунду и проверяет, что ни одно объявление не
+продано дважды и балансы сошлись. Созданные данные удаляются в конце.
+
+Запуск (нужна PostgreSQL с применёнными миграциями):
+    python -m benchmarks.marketplace_purchase
+    python -m benchmarks.marketplace_purchase --listings 5000 --buyers 200 --threads 32
+"""
+import argparse
+import random
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.services.ledger import LedgerEntry, LedgerService
+from app.services.marketplace import MarketplaceService
+
+
+def _create_user(db: Session, prefix: str) -> int:
+    """Создать тестового пользователя."""
+    return db.execute(
+        text("""
+            INSERT INTO users (email, username, hashed_password, is_active, is_verified, created_at, updated_at)
+            VALUES (:prefix || md5(random()::text) || '@example.com', :prefix || md5(random()::text),
+                    '-', true, false, now(), now())
+            RETURNING id
+        """),
+        {"prefix": prefix},
+    ).scalar_one()
+
+
+def _seed(db: Session, listings: int, buyers: int, price: int) -> Dict[str, List[int]]:
+    """Создать продавца, покупателей, артефакт и объявления; вернуть созданные ID."""
+    seller_id = _create_user(db, "market-bench-seller-")
+    buyer_ids = [_create_user(db, "market-bench-buyer-") for _ in range(buyers)]
+    artifact_id = db.execute(
+        text("""
+            INSERT INTO artifacts (name, rarity, artifact_type, drop_chance, is_active, is_tradeable,
+                                   is_craftable, base_value, created_at, updated_at)
+            VALUES ('market-bench', 'common', 'special', 0, true, true, false, 0, now(), now())
+            RETURNING id
+        """)
+    ).scalar_one()
+    db.execute(
+        text("""
+            INSERT INTO user_artifacts (user_id, artifact_id, quantity, obtained_at, obtained_from,
+                                        is_favorite, created_at, updated_at)
+            VALUES (:seller_id, :artifact_id, :listings, now(), 'bench', false, now(), now())
+        """),
+        {"seller_id": seller_id, "artifact_id": artifact_id, "listings": listings},
+    )
+    # Каждому покупателю хватает монет на все объявления: отказы возможны только из-за гонки
+    LedgerService(db).post(
+        [
+            LedgerEntry(user_id, listings * price, "coins", "opening_balance")
+            for user_id in [seller_id] + buyer_ids
+        ]
+    )
+    listing_ids = db.execute(
+        text("""
+            INSERT INTO marketplace_listings (seller_id, listing_type, item_id, quantity, price, status,
+                                              created_at, updated_at)
+            SELECT :seller_id, 'ARTIFACT', :artifact_id, 1, :price, 'ACTIVE', now(), now()
+            FROM generate_series(1, :listings)
+            RETURNING id
+        """),
+        {"seller_id": seller_id, "artifact_id": artifact_id, "price": price, "listings": listings},
+    ).scalars().all()
+    db.commit()
+    return {
+        "seller": [seller_id],
+        "buyers": buyer_ids,
+        "artifact": [artifact_id],
+        "listings": listing_ids,
+    }
+
+
+def _cleanup(db: Session, seeded: Dict[str, List[int]]) -> None:
+    """Удалить данные теста."""
+    user_ids = seeded["seller"] + seeded["buyers"]
+    params = {"user_ids": user_ids, "listing_ids": seeded["listings"], "artifact_ids": seeded["artifact"]}
+    for statement in (
+        "DELETE FROM currency_transactions WHERE user_currency_id IN "
+        "(SELECT id FROM user_currency WHERE user_id = ANY(:user_ids))",
+        "DELETE FROM user_currency WHERE user_id = ANY(:user_ids)",
+        "DELETE FROM transactions WHERE listing_id = ANY(:listing_ids)",
+        "DELETE FROM marketplace_listings WHERE id = ANY(:listing_ids)",
+        "DELETE FROM user_artifacts WHERE artifact_id = ANY(:artifact_ids)",
+        "DELETE FROM artifacts WHERE id = ANY(:artifact_ids)",
+        "DELETE FROM users WHERE id = ANY(:user_ids)",
+    ):
+        db.execute(text(statement), params)
+    db.commit()
+
+
+def run_load_test(
+    session_factory: sessionmaker,
+    seeded: Dict[str, List[int]],
+    threads: int,
+    price: int,
+) -> Dict[str, float]:
+    """Параллельно раскупить объявления и проверить результат."""
+    listing_ids = seeded["listings"]
+    buyer_ids = seeded["buyers"]
+    sold = 0
+    rejected = 0
+    errors: List[str] = []
+    remaining = set(listing_ids)
+    lock = threading.Lock()
+
+    def worker(seed: int) -> None:
+        nonlocal sold, rejected
+        rng = random.Random(seed)
+        db = session_factory()
+        try:
+            service = MarketplaceService(db)
+            while True:
+                with lock:
+                    if not remaining:
+                        return
+                    # Случайный выбор из общего пула создаёт гонки за одни и те же объявления
+                    listing_id = rng.choice(tuple(remaining))
+                try:
+                    service.purchase_listing(listing_id, rng.choice(buyer_ids))
+                except ValueError:
+                    with lock:
+                        rejected += 1
+                        remaining.discard(listing_id)
+                    continue
+                except Exception as e:
+                    db.rollback()
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                with lock:
+                    sold += 1
+                    remaining.discard(listing_id)
+        finally:
+            db.close()
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    db = session_factory()
+    try:
+        params = {"listing_ids": listing_ids, "seller_id": seeded["seller"][0], "buyer_ids": buyer_ids}
+        double_sold = db.execute(
+            text("""
+                SELECT count(*) FROM (
+                    SELECT listing_id FROM transactions
+                    WHERE listing_id = ANY(:listing_ids)
+                    GROUP BY listing_id HAVING count(*) > 1
+                ) AS duplicates
+            """),
+            params,
+        ).scalar_one()
+        transactions = db.execute(
+            text("SELECT count(*) FROM transactions WHERE listing_id = ANY(:listing_ids)"), params
+        ).scalar_one()
+        unsold = db.execute(
+            text("SELECT count(*) FROM marketplace_listings WHERE id = ANY(:listing_ids) AND status <> 'SOLD'"),
+            params,
+        ).scalar_one()
+        balances = LedgerService(db).get_balances(seeded["seller"] + buyer_ids)
+        seller_stock = db.execute(
+            text("SELECT coalesce(sum(quantity), 0) FROM user_artifacts WHERE user_id = :seller_id"), params
+        ).scalar_one()
+    finally:
+        db.close()
+
+    start_coins = len(listing_ids) * price
+    seller_coins = balances[seeded["seller"][0]].coins
+    buyers_spent = sum(start_coins - balances[buyer_id].coins for buyer_id in buyer_ids)
+    checks = {
+        "нет двойных продаж": double_sold == 0,
+        "одна транзакция на проданное объявление": transactions == sold == len(listing_ids) - unsold,
+        "продавец получил оплату за каждую продажу": seller_coins - start_coins == sold * price,
+        "покупатели заплатили за каждую покупку": buyers_spent == sold * price,
+        "запас продавца уменьшился на число продаж": seller_stock == len(listing_ids) - sold,
+    }
+    print(f"продано {sold} из {len(listing_ids)} за {elapsed:.2f} с: {sold / elapsed:.1f} покупок/с")
+    print(f"отказов {rejected}, ошибок {len(errors)}")
+    for error in errors[:5]:
+        print(f"  {error}")
+    for name, passed in checks.items():
+        print(f"{'OK  ' if passed else 'FAIL'} {name}")
+    if errors or not all(checks.values()):
+        raise SystemExit(1)
+    return {"sold": sold, "elapsed_s": elapsed, "purchases_per_second": sold / elapsed}
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Нагрузочный тест покупок на торговой площадке")
+    parser.add_argument("--listings", type=int, default=1000)
+    parser.add_argument("--buyers", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--price", type=int, default=10)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        seeded = _seed(db, args.listings, args.buyers, args.price)
+    finally:
+        db.close()
+
+    try:
+        run_load_test(SessionLocal, seeded, args.threads, args.price)
+    finally:
+        db = SessionLocal()
+        try:
+            _cleanup(db, seeded)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Тесты для движка правил достижений."""
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services.achievement_rules import AchievementRuleEngine, compile_achievement_rules
+
+
+def _achievement(achievement_id, achievement_type, requirement_value=None, geozone_id=None):
+    return SimpleNamespace(
+        id=achievement_id,
+        name=f"Достижение {achievement_id}",
+        achievement_type=achievement_type,
+        requirement_value=requirement_value,
+        geozone_id=geozone_id,
+    )
+
+
+def test_compile_groups_rules_by_shared_metric():
+    """Тест: правила с общей метрикой ссылаются на одну колонку, неподдерживаемые типы пропускаются."""
+    rules = compile_achievement_rules([
+        _achievement(1, "visits", 5),
+        _achievement(2, "geozone", 2, geozone_id=7),
+        _achievement(3, "visits", 10),
+        _achievement(4, "geozone"),
+        _achievement(5, "streak", 3),
+        _achievement(6, "distance"),
+    ])
+
+    assert rules.achievement_ids.tolist() == [1, 2, 3, 6]
+    assert rules.metrics == [("visits",), ("geozone_visits", 7), ("distance",)]
+    assert rules.metric_indexes.tolist() == [0, 1, 0, 2]
+    assert rules.thresholds.tolist() == [5, 2, 10, 1]
+
+
+def test_evaluate_unlocks_only_pending_rules_over_threshold(monkeypatch):
+    """Тест: разблокируются только ожидающие правила, чья метрика достигла порога."""
+    rules = compile_achievement_rules([_achievement(1, "visits", 5), _achievement(2, "distance", 1000)])
+    engine = AchievementRuleEngine(db=None)
+    loaded = {}
+
+    def load_stats(metrics, needed, user_ids, company_id=None):
+        loaded["needed"] = needed.tolist()
+        # Пользователь 10: 6 посещений, 500 м; пользователь 20: 5 посещений, 2000 м
+        return np.array([[6, 500], [5, 2000]])
+
+    monkeypatch.setattr(engine, "_pending_pairs", lambda rules, user_ids: [(10, 1), (10, 2), (20, 2)])
+    monkeypatch.setattr(engine, "_load_stats", load_stats)
+
+    unlocks = engine.evaluate([10, 20, 10], rules=rules)
+
+    assert loaded["needed"] == [True, True]
+    assert unlocks == [(10, 1, 6), (20, 2, 2000)]
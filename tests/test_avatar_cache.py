@@ -0,0 +1,40 @@
+"""Тесты для кэша конфигураций аватаров."""
+from app.services.avatar_cache import AvatarCache, compute_etag, equip_in_config, unequip_in_config
+
+
+def test_equip_replaces_item_in_same_slot():
+    """Тест: надевание заменяет предмет того же слота, снятие убирает предмет."""
+    config = equip_in_config(None, 1, "head", "hat")
+    config = equip_in_config(config, 2, "body", "shirt")
+    config = equip_in_config(config, 3, "head", "helmet")
+
+    assert config == {
+        "cosmetics": [
+            {"cosmetic_id": 2, "slot": "body", "type": "shirt"},
+            {"cosmetic_id": 3, "slot": "head", "type": "helmet"},
+        ]
+    }
+    assert unequip_in_config(config, 2) == {"cosmetics": [{"cosmetic_id": 3, "slot": "head", "type": "helmet"}]}
+
+
+def test_cache_evicts_least_recently_used_and_versions_by_content():
+    """Тест: LRU вытесняет давно не читанную запись, ETag зависит только от содержимого."""
+    cache = AvatarCache(max_size=2, local_ttl_seconds=60, redis_ttl_seconds=60)
+    first = cache.set(1, None, {"cosmetics": []})
+    cache.set(2, None, {"cosmetics": []})
+    assert cache.get(1) == first
+    cache.set(3, None, {"cosmetics": [{"cosmetic_id": 7, "slot": None, "type": "badge"}]})
+
+    assert cache.get(2) is None
+    assert cache.get(1).etag == compute_etag({"cosmetics": []})
+    assert cache.get(3).etag != first.etag
+
+
+def test_older_version_does_not_overwrite_newer_entry():
+    """Тест: запись кэша после коммита, пришедшая позже более новой, не затирает её."""
+    cache = AvatarCache(max_size=2, local_ttl_seconds=60, redis_ttl_seconds=60)
+    newer = cache.set(1, None, {"cosmetics": [{"cosmetic_id": 2, "slot": "head", "type": "hat"}]}, version=20.0)
+
+    assert cache.set(1, None, {"cosmetics": []}, version=10.0) == newer
+    assert cache.get(1) == newer
+    assert cache.set(1, None, {"cosmetics": []}, version=30.0).etag == compute_etag({"cosmetics": []})
@@ -0,0 +1,29 @@
+"""Тесты для таблиц выпадения артефактов."""
+import random
+from collections import Counter
+
+import pytest
+
+from app.services.drop_tables import build_drop_table
+
+
+def test_drop_table_matches_drop_chances_with_no_drop_mass():
+    """Тест: частоты выпадения равны drop_chance, остаток - «ничего не выпало»."""
+    table = build_drop_table([(1, 0.5), (2, 0.2), (3, 0.05)])
+    rng = random.Random(42)
+    samples = 200_000
+    counts = Counter(table.sample(rng) for _ in range(samples))
+
+    assert counts[1] / samples == pytest.approx(0.5, abs=0.01)
+    assert counts[2] / samples == pytest.approx(0.2, abs=0.01)
+    assert counts[3] / samples == pytest.approx(0.05, abs=0.005)
+    assert counts[None] / samples == pytest.approx(0.25, abs=0.01)
+
+
+def test_drop_table_normalizes_chances_above_one():
+    """Тест: при сумме шансов больше 1 что-то выпадает всегда."""
+    table = build_drop_table([(1, 1.0), (2, 1.0)])
+    rng = random.Random(7)
+
+    assert None not in {table.sample(rng) for _ in range(1000)}
+    assert build_drop_table([]).sample(rng) is None
@@ -51,3 +51,44 @@ def test_check_point_in_geozone(db_session):
     # Точка снаружи
     is_outside = service.check_point_in_geozone(55.7000, 37.5000, geozone.id)
     assert is_outside is False
+
+
+def test_build_lod_polygons_simplifies_dense_polygon():
+    """Тест построения упрощённых вариантов полигона с большим числом вершин."""
+    import math
+
+    from shapely.geometry import Polygon
+
+    from app.services.geozone import GeozoneLOD, build_lod_polygons
+
+    # Окружность радиусом ~1 км с 2000 вершин
+    coords = [
+        (37.6 + 0.01 * math.cos(2 * math.pi * i / 2000), 55.75 + 0.01 * math.sin(2 * math.pi * i / 2000))
+        for i in range(2000)
+    ]
+    polygon = Polygon(coords)
+
+    lods = build_lod_polygons(polygon)
+
+    fine = lods[GeozoneLOD.FINE]
+    coarse = lods[GeozoneLOD.COARSE]
+    assert fine is not None and coarse is not None
+    assert fine.is_valid and coarse.is_valid
+    assert len(coarse.exterior.coords) < len(fine.exterior.coords) < len(polygon.exterior.coords)
+    assert coarse.hausdorff_distance(polygon) <= 0.002 + 1e-9
+
+
+def test_areas_m2_matches_geodesic_area_at_high_latitude():
+    """Тест: площадь в равновеликой проекции совпадает с геодезической и не завышена."""
+    import numpy as np
+    from shapely.geometry import Polygon
+
+    from app.core.geodesy import area_m2, areas_m2
+
+    # Квадрат 0.01° на широте 70° - в EPSG:3857 площадь завышается примерно в 8.5 раз
+    polygon = Polygon([(20, 70), (20.01, 70), (20.01, 70.01), (20, 70.01)])
+
+    vectorized = areas_m2(np.array([polygon], dtype=object))[0]
+
+    assert vectorized == pytest.approx(area_m2(polygon), rel=1e-4)
+    assert vectorized == pytest.approx(425_915, rel=1e-3)
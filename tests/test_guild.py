@@ -0,0 +1,71 @@
+"""Тесты для сервиса гильдий."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import guild
+from app.services.guild import GuildService, invalidate_membership
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self.db = db
+
+    def filter(self, *criteria):
+        return self
+
+    def order_by(self, *columns):
+        return self
+
+    def first(self):
+        self.db.loads += 1
+        return self.db.member
+
+
+class FakeSession:
+    """Сессия, считающая загрузки участника гильдии."""
+
+    def __init__(self, member=None):
+        self.member = member
+        self.loads = 0
+
+    def query(self, *entities):
+        return FakeQuery(self)
+
+
+@pytest.fixture(autouse=True)
+def membership_cache(monkeypatch):
+    """Пустой кэш участия с размером на два пользователя."""
+    monkeypatch.setattr(guild, "_membership_cache", guild.OrderedDict())
+    monkeypatch.setattr(guild.settings, "guild_membership_cache_size", 2)
+    monkeypatch.setattr(guild.settings, "guild_membership_cache_ttl_seconds", 60)
+    return guild._membership_cache
+
+
+def test_membership_is_cached_including_absence(membership_cache):
+    """Тест: отсутствие участия кэшируется, сброс записи вызывает повторную загрузку."""
+    db = FakeSession()
+    service = GuildService(db)
+
+    assert service.get_membership(1) is None
+    assert service.get_membership(1) is None
+    assert db.loads == 1
+
+    invalidate_membership(1)
+    db.member = SimpleNamespace(**{column.key: 7 for column in guild.GuildMember.__table__.columns})
+    assert service.get_membership(1)["guild_id"] == 7
+    assert db.loads == 2
+
+
+def test_membership_cache_evicts_least_recently_used(membership_cache):
+    """Тест: при переполнении вытесняется давно не читавшийся пользователь."""
+    db = FakeSession()
+    service = GuildService(db)
+
+    service.get_membership(1)
+    service.get_membership(2)
+    service.get_membership(1)
+    service.get_membership(3)
+
+    assert list(membership_cache) == [(None, 1), (None, 3)]
+    assert db.loads == 3
@@ -0,0 +1,58 @@
+"""Тесты для определения дома и работы."""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.stay_points import NOISE, dbscan_haversine, detect_stay_points, hour_of_week_minutes
+
+
+def test_detect_stay_points_splits_track_by_dwell():
+    """Тест: остановки выделяются по времени пребывания, проезд пропускается."""
+    start = datetime(2024, 1, 15, 8, 0)
+    latitudes, longitudes, timestamps = [], [], []
+
+    # 30 минут на месте, 5 минут в пути, 20 минут на другом месте
+    for minute in range(30):
+        latitudes.append(55.7558)
+        longitudes.append(37.6173)
+        timestamps.append(start + timedelta(minutes=minute))
+    for minute in range(5):
+        latitudes.append(55.76 + minute * 0.005)
+        longitudes.append(37.62)
+        timestamps.append(start + timedelta(minutes=30 + minute))
+    for minute in range(20):
+        latitudes.append(55.80)
+        longitudes.append(37.70)
+        timestamps.append(start + timedelta(minutes=35 + minute))
+
+    stay_points = detect_stay_points(latitudes, longitudes, timestamps, radius_meters=100, min_duration_minutes=10)
+
+    assert len(stay_points) == 2
+    assert stay_points[0].duration_minutes == 29
+    assert stay_points[0].point_count == 30
+    assert stay_points[1].latitude == pytest.approx(55.80)
+
+
+def test_dbscan_haversine_groups_nearby_points():
+    """Тест: близкие точки объединяются в кластер, одиночная точка - шум."""
+    latitudes = np.array([55.7558, 55.7559, 55.7557, 55.7558, 56.0])
+    longitudes = np.array([37.6173, 37.6174, 37.6172, 37.6175, 38.0])
+
+    labels = dbscan_haversine(latitudes, longitudes, eps_meters=200, min_samples=3)
+
+    assert len(set(labels[:4].tolist())) == 1
+    assert labels[0] != NOISE
+    assert labels[4] == NOISE
+
+
+def test_hour_of_week_minutes_splits_overnight_stay():
+    """Тест: пребывание через полночь распределяется по часам недели."""
+    # Воскресенье 22:30 - понедельник 01:15
+    histogram = hour_of_week_minutes(datetime(2024, 1, 14, 22, 30), datetime(2024, 1, 15, 1, 15))
+
+    assert histogram.sum() == 165
+    assert histogram[6 * 24 + 22] == 30
+    assert histogram[6 * 24 + 23] == 60
+    assert histogram[0] == 60
+    assert histogram[1] == 15
@@ -0,0 +1,59 @@
+"""Тесты для сервиса инвентаря."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.inventory import InsufficientItemsError, InventoryService
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Сессия, возвращающая заранее заданные строки RETURNING."""
+
+    def __init__(self, returned_rows):
+        self.returned_rows = returned_rows
+        self.statements = []
+
+    def execute(self, statement, *args):
+        self.statements.append(statement)
+        return FakeResult(self.returned_rows if statement.is_update else [])
+
+
+def _row(row_id, quantity):
+    return SimpleNamespace(id=row_id, quantity=quantity)
+
+
+def test_consume_artifacts_raises_when_any_artifact_is_short():
+    """Тест: если условный UPDATE затронул не все артефакты, списание отменяется исключением."""
+    db = FakeSession([_row(1, 3)])
+
+    with pytest.raises(InsufficientItemsError):
+        InventoryService(db).consume_artifacts(10, [(5, 1), (6, 2)])
+
+    assert len(db.statements) == 1
+
+
+def test_consume_artifacts_deletes_emptied_rows():
+    """Тест: строки с нулевым остатком удаляются после списания."""
+    db = FakeSession([_row(1, 0), _row(2, 4)])
+
+    InventoryService(db).consume_artifacts(10, [(5, 1), (6, 2)])
+
+    assert [statement.is_delete for statement in db.statements] == [False, True]
+    assert db.statements[1].compile().params == {"id_1": [1]}
+
+
+def test_consume_artifacts_without_requirements_is_noop():
+    """Тест: пустой список требований не выполняет запросов."""
+    db = FakeSession([])
+
+    InventoryService(db).consume_artifacts(10, [])
+
+    assert db.statements == []
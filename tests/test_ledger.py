@@ -0,0 +1,60 @@
+"""Тесты для журнала валюты."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.ledger import InsufficientFundsError, LedgerEntry, LedgerService
+
+
+class FakeSession:
+    """Сессия, возвращающая строки RETURNING в обратном порядке вставки."""
+
+    def __init__(self):
+        self.inserted = []
+
+    def execute(self, statement):
+        params = statement.compile().params
+        count = sum(1 for key in params if key.startswith("user_currency_id_m"))
+        self.inserted = [params[f"user_currency_id_m{position}"] for position in range(count)]
+        return [(account_id, 100 + position) for position, account_id in reversed(list(enumerate(self.inserted)))]
+
+
+def _ledger(monkeypatch, balances):
+    ledger = LedgerService(FakeSession())
+    locked = []
+    monkeypatch.setattr(
+        ledger, "ensure_accounts", lambda user_ids, company_id=None: {user_id: user_id * 10 for user_id in user_ids}
+    )
+    monkeypatch.setattr(ledger, "lock_accounts", lambda user_ids: locked.extend(user_ids))
+    monkeypatch.setattr(
+        ledger,
+        "get_balances",
+        lambda user_ids: {user_id: SimpleNamespace(coins=balances[user_id], gems=0) for user_id in user_ids},
+    )
+    return ledger, locked
+
+
+def test_post_rejects_debit_over_balance(monkeypatch):
+    """Тест: списание больше баланса не записывается."""
+    ledger, locked = _ledger(monkeypatch, {1: 10})
+
+    with pytest.raises(InsufficientFundsError):
+        ledger.post([LedgerEntry(1, -15, transaction_type="purchase"), LedgerEntry(2, 15, transaction_type="sale")])
+
+    assert locked == [1]
+    assert ledger.db.inserted == []
+
+
+def test_post_maps_entry_ids_by_account(monkeypatch):
+    """Тест: ID записей сопоставляются пользователям по счёту, а не по порядку RETURNING."""
+    ledger, locked = _ledger(monkeypatch, {1: 15})
+
+    posted = ledger.post([
+        LedgerEntry(1, -15, transaction_type="purchase"),
+        LedgerEntry(2, 15, transaction_type="sale"),
+        LedgerEntry(3, 0),
+    ])
+
+    assert ledger.db.inserted == [10, 20]
+    assert sorted(posted) == [(1, 100), (2, 101)]
+    assert locked == [1]
@@ -0,0 +1,62 @@
+"""Тесты для снятия истекших объявлений."""
+import pytest
+
+from app.jobs.listing_expiry import ListingExpirySweeper
+
+
+class FakeResult:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.ids
+
+
+class FakeSession:
+    """Сессия, возвращающая заданные пачки ID истекших объявлений."""
+
+    def __init__(self, batches, fail_on_batch=None):
+        self.batches = list(batches)
+        self.fail_on_batch = fail_on_batch
+        self.listing_updates = 0
+        self.search_updates = 0
+        self.commits = 0
+        self.rollbacks = 0
+
+    def execute(self, statement):
+        if statement.table.name == "listing_search":
+            self.search_updates += 1
+            return FakeResult([])
+        self.listing_updates += 1
+        if self.listing_updates == self.fail_on_batch:
+            raise RuntimeError("deadlock")
+        return FakeResult(self.batches.pop(0) if self.batches else [])
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def test_run_expires_batches_until_none_left():
+    """Тест: пачки снимаются до пустого ответа, каждая в своей транзакции."""
+    db = FakeSession([[1, 2], [3]])
+
+    stats = ListingExpirySweeper(db, batch_size=2).run()
+
+    assert (stats["expired"], stats["batches"]) == (3, 2)
+    assert (db.listing_updates, db.search_updates, db.commits) == (3, 2, 2)
+
+
+def test_run_rolls_back_failed_batch_and_keeps_committed_ones():
+    """Тест: ошибка пачки откатывает только её, предыдущие пачки уже зафиксированы."""
+    db = FakeSession([[1, 2]], fail_on_batch=2)
+
+    with pytest.raises(RuntimeError):
+        ListingExpirySweeper(db, batch_size=2).run()
+
+    assert (db.commits, db.rollbacks) == (1, 1)
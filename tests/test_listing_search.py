@@ -0,0 +1,26 @@
+"""Тесты для поиска по торговой площадке."""
+import time
+
+from app.models.marketplace import ListingType
+from app.services import listing_search
+from app.services.listing_search import record_listing_added, record_listing_removed
+
+
+def test_floor_price_cache_follows_listings():
+    """Тест: новое объявление понижает floor, продажа минимального сбрасывает его."""
+    key = (1, ListingType.ARTIFACT, 7)
+    listing_search._floor_cache[key] = (time.monotonic(), 100)
+    try:
+        record_listing_added(1, ListingType.ARTIFACT, 7, 150)
+        assert listing_search._floor_cache[key][1] == 100
+
+        record_listing_added(1, ListingType.ARTIFACT, 7, 80)
+        assert listing_search._floor_cache[key][1] == 80
+
+        record_listing_removed(1, ListingType.ARTIFACT, 7, 120)
+        assert listing_search._floor_cache[key][1] == 80
+
+        record_listing_removed(1, ListingType.ARTIFACT, 7, 80)
+        assert key not in listing_search._floor_cache
+    finally:
+        listing_search._floor_cache.pop(key, None)
@@ -0,0 +1,85 @@
+"""Тесты для инкрементальной агрегации сделок."""
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from app.jobs.market_rollups import MarketRollupJob
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def scalar_one(self):
+        return self.row
+
+    def one(self):
+        return self.row
+
+
+class FakeSession:
+    """Сессия с водяным знаком и заданной пачкой сделок (max id, count)."""
+
+    def __init__(self, last_id, batch):
+        self.last_id = last_id
+        self.batch = batch
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        if statement.is_select and "last_id" in statement.selected_columns:
+            return FakeResult(self.last_id)
+        if statement.is_select:
+            return FakeResult(self.batch)
+        return FakeResult(None)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def _sql(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_merge_takes_open_from_first_and_close_from_last_trade():
+    """Тест: при дозаписи open берётся от более ранней сделки, close - от более поздней."""
+    sql = _sql(MarketRollupJob(db=None, batch_size=10)._rollup_statement("hour", 5, 15))
+
+    assert (
+        "open_price = CASE WHEN (excluded.first_trade_id < market_price_rollups.first_trade_id) "
+        "THEN excluded.open_price ELSE market_price_rollups.open_price END"
+    ) in sql
+    assert (
+        "close_price = CASE WHEN (excluded.last_trade_id > market_price_rollups.last_trade_id) "
+        "THEN excluded.close_price ELSE market_price_rollups.close_price END"
+    ) in sql
+    assert "trade_count = (market_price_rollups.trade_count + excluded.trade_count)" in sql
+    assert "date_trunc('hour', transactions.completed_at)" in sql
+
+
+def test_process_batch_advances_watermark_in_same_transaction():
+    """Тест: агрегаты обоих периодов и новый водяной знак фиксируются одним коммитом."""
+    db = FakeSession(last_id=5, batch=(15, 10))
+
+    processed = MarketRollupJob(db, batch_size=10)._process_batch(datetime.now(timezone.utc))
+
+    upserts = [s for s in db.statements if s.is_insert and s.table.name == "market_price_rollups"]
+    watermark_update = db.statements[-1]
+    assert processed == 10
+    assert len(upserts) == 2
+    assert watermark_update.is_update and watermark_update.compile().params["last_id"] == 15
+    assert db.commits == 1
+
+
+def test_process_batch_without_new_trades_keeps_watermark():
+    """Тест: без новых сделок водяной знак не сдвигается."""
+    db = FakeSession(last_id=5, batch=(None, 0))
+
+    assert MarketRollupJob(db, batch_size=10)._process_batch(datetime.now(timezone.utc)) == 0
+    assert (db.commits, db.rollbacks) == (0, 1)
+    assert not any(statement.is_update for statement in db.statements)
@@ -0,0 +1,32 @@
+"""Тесты для keyset-пагинации."""
+from datetime import datetime
+
+import pytest
+
+from app.core.pagination import InvalidCursorError, decode_cursor, encode_cursor, next_cursor
+
+
+def test_cursor_roundtrip_preserves_sort_key_and_id():
+    """Тест: курсор восстанавливает значение сортировки и ID последней строки."""
+    timestamp = datetime(2024, 2, 27, 12, 30, 15, 123456)
+
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+    assert decode_cursor(encode_cursor(150, 7)) == (150, 7)
+
+
+def test_invalid_cursor_is_rejected():
+    """Тест: повреждённый курсор - ошибка клиента, а не ошибка сервера."""
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor")
+
+
+def test_next_cursor_only_for_full_page():
+    """Тест: курсор следующей страницы выдаётся только для полной страницы."""
+
+    class Row:
+        def __init__(self, row_id):
+            self.id = row_id
+            self.created_at = datetime(2024, 1, row_id)
+
+    assert next_cursor([Row(1)], "created_at", limit=2) is None
+    assert decode_cursor(next_cursor([Row(2), Row(1)], "created_at", limit=2)) == (datetime(2024, 1, 1), 1)
@@ -0,0 +1,84 @@
+"""Тесты для шардированных рейтингов игроков."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import get_settings
+from app.models.leaderboard import LeaderboardMetric
+from app.services import player_leaderboard
+from app.services.player_leaderboard import PlayerLeaderboardService, shard_key, shard_of
+from app.services.sorted_sets import InMemorySortedSets
+
+settings = get_settings()
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Отдельное хранилище рейтингов в памяти на время теста."""
+    memory_store = InMemorySortedSets(ttl_seconds=60)
+    monkeypatch.setattr(player_leaderboard, "get_sorted_sets", lambda: memory_store)
+    return memory_store
+
+
+def _fill(store, scope: str, scores: dict) -> None:
+    """Разложить очки игроков по шардам хранилища."""
+    for shard in range(settings.player_leaderboard_shards):
+        store.replace(
+            shard_key(LeaderboardMetric.XP, scope, shard),
+            {str(user_id): score for user_id, score in scores.items() if shard_of(user_id) == shard},
+        )
+
+
+def test_top_merges_shards_in_score_order(store):
+    """Тест: топ собирается из всех шардов по убыванию очков, при равенстве - по ID."""
+    scores = {user_id: float(user_id % 37) for user_id in range(1, 301)}
+    _fill(store, "test:top", scores)
+    service = PlayerLeaderboardService(db=None)
+
+    expected = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    page = service.top(LeaderboardMetric.XP, "test:top", offset=10, limit=5)
+
+    assert [(entry.user_id, entry.score) for entry in page] == expected[10:15]
+    assert [entry.rank for entry in page] == [11, 12, 13, 14, 15]
+    assert service.top(LeaderboardMetric.XP, "test:top", offset=95, limit=20)[-1].rank == settings.player_leaderboard_top_size
+
+
+def test_standing_counts_higher_scores_across_shards(store):
+    """Тест: место - 1 + число игроков с очками выше во всех шардах, перцентиль - доля ниже."""
+    scores = {user_id: float(user_id) for user_id in range(1, 101)}
+    _fill(store, "test:standing", scores)
+    service = PlayerLeaderboardService(db=None)
+
+    standing = service.standing(LeaderboardMetric.XP, "test:standing", 75)
+
+    assert standing.rank == 26
+    assert standing.total == 100
+    assert standing.percentile == round(100.0 * 74 / 99, 2)
+    assert service.standing(LeaderboardMetric.XP, "test:standing", 1000) is None
+
+
+class _ShardQuery:
+    """Запрос очков шарда: шард берётся из последнего условия фильтра."""
+
+    def __init__(self, scores: dict, loads: list):
+        self.scores = scores
+        self.loads = loads
+
+    def filter(self, *criteria):
+        shard = criteria[-1].right.value
+        self.loads.append(shard)
+        return [(user_id, score) for user_id, score in self.scores.items() if shard_of(user_id) == shard]
+
+
+def test_memory_store_loads_each_shard_once_within_ttl(store):
+    """Тест: без Redis шарды загружаются из БД по колонке shard и не перечитываются до истечения TTL."""
+    scores = {user_id: float(user_id) for user_id in range(1, 41)}
+    loads: list = []
+    service = PlayerLeaderboardService(db=SimpleNamespace(query=lambda *columns: _ShardQuery(scores, loads)))
+
+    first = service.standing(LeaderboardMetric.XP, "test:memory", 40)
+    second = service.standing(LeaderboardMetric.XP, "test:memory", 1)
+
+    assert (first.rank, first.total) == (1, 40)
+    assert (second.rank, second.percentile) == (40, 0.0)
+    assert sorted(loads) == list(range(settings.player_leaderboard_shards))
@@ -0,0 +1,30 @@
+"""Тесты для массового пересчёта прогресса квестов."""
+from datetime import datetime, timezone
+
+from app.jobs.quest_progress_recompute import build_progress_updates
+from app.models.event import QuestStatus, QuestType
+
+
+def test_progress_updates_complete_quests_that_reach_requirement():
+    """Тест: квест завершается при значении не ниже требования, счётчик завершений растёт."""
+    now = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    updates, completed = build_progress_updates(
+        QuestType.VISIT_LOCATIONS, {"count": 3}, [(1, 10, 0, 2), (2, 11, 1, 3), (3, 12, 0, 5)], now
+    )
+
+    assert completed == [11, 12]
+    assert [update["status"] for update in updates] == [
+        QuestStatus.IN_PROGRESS, QuestStatus.COMPLETED, QuestStatus.COMPLETED,
+    ]
+    assert updates[0]["progress"] == {"visited_count": 2, "required_count": 3}
+    assert (updates[0]["completed_at"], updates[1]["completed_at"]) == (None, now)
+    assert [update["completion_count"] for update in updates] == [0, 2, 1]
+
+
+def test_progress_updates_use_default_requirement_and_float_distance():
+    """Тест: без требования берётся значение по умолчанию, расстояние остаётся дробным."""
+    now = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    updates, completed = build_progress_updates(QuestType.TRAVEL_DISTANCE, None, [(1, 10, 0, 0.25)], now)
+
+    assert completed == [10]
+    assert updates[0]["progress"] == {"distance_traveled": 0.25, "required_distance": 0}
@@ -0,0 +1,72 @@
+"""Тесты для индекса триггеров квестов."""
+import time
+from types import SimpleNamespace
+
+from app.models.event import QuestType
+from app.services import recipes
+from app.services.artifact import ArtifactService
+from app.services.quest import QuestService
+from app.services.quest_triggers import QuestEventKind, QuestTriggerIndex
+from app.services.recipes import RecipeBook
+
+
+def test_quest_trigger_index_routes_events_by_type_and_key():
+    """Тест: событие передаётся только квестам, которые от него зависят."""
+    index = QuestTriggerIndex.build([
+        (1, QuestType.VISIT_LOCATIONS, {"geozone_ids": [10, 11], "count": 2}),
+        (2, QuestType.VISIT_LOCATIONS, {"count": 5}),
+        (3, QuestType.TRAVEL_DISTANCE, {"distance_km": 10}),
+        (4, QuestType.COMPLETE_ACHIEVEMENTS, {"achievement_ids": [7]}),
+        (5, QuestType.CUSTOM, {}),
+    ])
+
+    assert index.match(QuestEventKind.GEOZONE_VISIT, [10]) == {1, 2}
+    assert index.match(QuestEventKind.GEOZONE_VISIT, [99]) == {2}
+    assert index.match(QuestEventKind.LOCATION_POINT) == {3}
+    assert index.match(QuestEventKind.ACHIEVEMENT_UNLOCKED, [8]) == set()
+    assert index.match(QuestEventKind.ARTIFACT_OBTAINED, [1]) == set()
+
+
+
+class _Session:
+    """Сессия без БД: списание и начисление артефактов всегда успешны."""
+
+    def __init__(self):
+        self.commits = 0
+
+    def execute(self, statement, *args, **kwargs):
+        return SimpleNamespace(all=lambda: [SimpleNamespace(id=1, quantity=1)])
+
+    def scalars(self, statement, execution_options=None):
+        return SimpleNamespace(one=lambda: SimpleNamespace(artifact_id=20, quantity=1))
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def test_crafted_artifact_advances_collect_quest(monkeypatch):
+    """Тест: начисление артефакта крафтом передаёт квестам на сбор событие в транзакции крафта."""
+    company_id = 9001
+    index = QuestTriggerIndex.build([
+        (1, QuestType.COLLECT_ARTIFACTS, {"artifact_ids": [20], "count": 1}),
+        (2, QuestType.COLLECT_ARTIFACTS, {"artifact_ids": [21], "count": 1}),
+    ])
+    monkeypatch.setitem(recipes._recipe_cache, company_id, (time.monotonic(), RecipeBook.build(
+        [(20, "Меч", 10, None, 1)], [],
+    )))
+    dispatched = []
+
+    def dispatch_event(self, user_id, event_kind, keys=None, company_id=None, commit=True):
+        dispatched.append((user_id, index.match(event_kind, keys), commit))
+        return []
+
+    monkeypatch.setattr(QuestService, "dispatch_event", dispatch_event)
+    session = _Session()
+
+    ArtifactService(session).craft_artifact(user_id=5, artifact_id=20, company_id=company_id)
+
+    assert dispatched == [(5, {1}, False)]
+    assert session.commits == 1
@@ -0,0 +1,32 @@
+"""Тесты для книги рецептов крафта."""
+from app.services.recipes import RecipeBook
+
+
+def test_recipe_book_sums_duplicate_requirements():
+    """Тест: повторные требования одного предмета складываются, требования упорядочены по ID."""
+    book = RecipeBook.build(
+        [(10, "Меч", 3, None, 2), (10, "Меч", 1, None, 1), (10, "Меч", 3, None, 1), (11, "Камень", None, None, None)],
+        [(20, "Плащ", 1, 5, 1)],
+    )
+
+    assert book.artifacts[10].artifacts == ((1, 1), (3, 3))
+    assert book.artifacts[11].artifacts == ()
+    assert book.cosmetics[20].artifacts == ((1, 1),)
+    assert book.cosmetics[20].cosmetics == ((5, 1),)
+    assert book.required_artifact_ids == {1, 3}
+    assert book.required_cosmetic_ids == {5}
+
+
+def test_craftable_evaluates_all_recipes_against_inventory():
+    """Тест: число крафтов ограничено самым дефицитным артефактом, косметика только проверяется."""
+    book = RecipeBook.build(
+        [(10, "Меч", 1, None, 2), (10, "Меч", 3, None, 1), (11, "Камень", None, None, None)],
+        [(20, "Плащ", 1, 5, 1), (21, "Шляпа", None, 6, 1)],
+    )
+
+    craftable = {
+        (recipe.result_type, recipe.result_id): max_crafts
+        for recipe, max_crafts in book.craftable({1: 5, 3: 7}, {5: 1})
+    }
+
+    assert craftable == {("artifact", 10): 2, ("artifact", 11): None, ("cosmetic", 20): 5}
@@ -0,0 +1,45 @@
+"""Тесты для выдачи наград."""
+from datetime import datetime, timezone
+
+from app.services import reward
+from app.services.reward import GrantedRewards, RewardBundle, RewardService
+
+
+def test_bundle_from_quest_rewards():
+    """Тест: JSON наград квеста приводится к набору с числовыми ID артефактов."""
+    bundle = RewardBundle.from_rewards(
+        {"coins": "50", "xp": 20, "artifacts": {"3": 2}, "cosmetics": ["9"]}, "quest", source_id=4
+    )
+
+    assert (bundle.coins, bundle.gems, bundle.xp) == (50, 0, 20)
+    assert bundle.artifacts == {3: 2}
+    assert bundle.cosmetics == [9]
+    assert (bundle.source, bundle.source_id) == ("quest", 4)
+    assert RewardBundle.from_rewards(None, "quest").is_empty()
+
+
+def test_currency_entries_skip_zero_amounts():
+    """Тест: нулевые начисления не попадают в журнал, XP пишется как coins с типом xp."""
+    bundle = RewardBundle(coins=10, xp=5, source="achievement")
+
+    assert bundle.currency_entries() == [("achievement", 10, "coins"), ("xp", 5, "coins")]
+
+
+def test_currency_entry_ids_are_mapped_by_user(monkeypatch):
+    """Тест: ID записей журнала раскладываются по пользователям из ответа post, а не по порядку."""
+    class FakeLedger:
+        def __init__(self, db):
+            pass
+
+        def post(self, entries, company_id=None):
+            return [(2, 101), (1, 102), (2, 103), (1, 104)]
+
+    monkeypatch.setattr(reward, "LedgerService", FakeLedger)
+    results = {1: GrantedRewards(), 2: GrantedRewards()}
+
+    RewardService(db=None)._grant_currency(
+        [1, 2], RewardBundle(coins=10, gems=1), None, datetime.now(timezone.utc), results
+    )
+
+    assert results[1].ledger_entry_ids == [102, 104]
+    assert results[2].ledger_entry_ids == [101, 103]
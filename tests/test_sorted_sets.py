@@ -0,0 +1,42 @@
+"""Тесты для упорядоченных множеств рейтингов."""
+import random
+
+from app.services.sorted_sets import IndexableSkipList, InMemorySortedSets
+
+
+def test_skip_list_matches_sorted_list():
+    """Тест: позиции и срезы skip list совпадают с отсортированным списком."""
+    rng = random.Random(3)
+    skip_list = IndexableSkipList(rng=random.Random(5))
+    reference = []
+    for _ in range(2000):
+        key = rng.randrange(500)
+        if key in reference:
+            skip_list.remove(key)
+            reference.remove(key)
+        else:
+            skip_list.insert(key)
+            reference.append(key)
+        reference.sort()
+
+    assert len(skip_list) == len(reference)
+    assert skip_list.slice(0, len(reference)) == reference
+    for position, key in enumerate(reference):
+        assert skip_list.index(key) == position
+    assert skip_list.slice(10, 5) == reference[10:15]
+
+
+def test_memory_sorted_sets_rank_and_range():
+    """Тест: место и диапазон по убыванию очков, обновления только загруженных множеств."""
+    store = InMemorySortedSets(ttl_seconds=60)
+    store.add("board", "x", 100)
+    assert not store.exists("board")
+
+    store.replace("board", {"a": 10, "b": 30, "c": 20})
+    store.add("board", "a", 40)
+    store.add("board", "d", 5)
+
+    assert store.rev_range("board", 0, 10) == [("a", 40), ("b", 30), ("c", 20), ("d", 5)]
+    assert store.rev_rank("board", "c") == 2
+    assert store.rev_rank("board", "missing") is None
+    assert store.card("board") == 4